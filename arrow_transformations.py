@@ -0,0 +1,309 @@
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.acero as acero
+import pyarrow.compute as pc
+from typing import List, Optional, Tuple
+
+from metrics import RunMetrics
+from schema import ColumnRule
+from transformations import (
+    IMPRESSIONS_DEDUP_COLUMNS,
+    TIMESTAMP_FORMAT,
+    _extract_hour,
+    get_schema_dtypes,
+    get_schema_validator
+)
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Raw impressions timestamps in TIMESTAMP_FORMAT with optional fraction of a second, their first 19 characters
+# are parsed by arrow strptime. Other values and values strptime rejects, e.g. days which do not exist
+# in their month, are parsed with pandas the same way as by the pandas engine, see _extract_hour
+TIMESTAMP_PATTERN = r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d{1,6})?$'
+
+# Position of every row in the table, the first row of every dedup key is kept
+ROW_COLUMN = '__ROW'
+
+
+def aggregate_impressions(
+    table: pa.Table,
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Arrow engine version of transformations.aggregate_impressions, gives the same result.
+    Validates table with compute kernels, deduplicates it and counts impressions by hour and campaign id
+    with acero query plans, which run on all cores.
+
+    :param table: arrow table with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with CAMPAIGN_ID, HOUR and IMPRESSIONS_COUNT columns
+
+    """
+
+    return _aggregate(table, schema_path, 'CAMPAIGN_ID', True, columns_to_dedup, metrics)
+
+def aggregate_advertiser_impressions(
+    table: pa.Table,
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Arrow engine version of transformations.aggregate_advertiser_impressions, see aggregate_impressions
+
+    :param table: arrow table with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with ADVERTISER_ID, HOUR and IMPRESSIONS_COUNT columns
+
+    """
+
+    return _aggregate(table, schema_path, 'ADVERTISER_ID', True, columns_to_dedup, metrics)
+
+def aggregate_order_impressions(
+    table: pa.Table,
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Arrow engine version of transformations.aggregate_order_impressions, see aggregate_impressions
+
+    :param table: arrow table with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with ORDER_ID and IMPRESSIONS_COUNT columns
+
+    """
+
+    return _aggregate(table, schema_path, 'ORDER_ID', False, columns_to_dedup, metrics)
+
+def aggregate_agency_impressions(
+    table: pa.Table,
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Arrow engine version of transformations.aggregate_agency_impressions, see aggregate_impressions
+
+    :param table: arrow table with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with AGENCY_ID and IMPRESSIONS_COUNT columns
+
+    """
+
+    return _aggregate(table, schema_path, 'AGENCY_ID', False, columns_to_dedup, metrics)
+
+def validate_table(table: pa.Table, schema_path: str) -> List[str]:
+    """
+    Validates arrow table against schema with the same rules and messages as SchemaValidator.validate:
+    presence of all columns, nulls in not nullable columns, declared dtypes and formats of string columns.
+    Values of columns with fixed width format are matched with a regular expression,
+    only the values not matching it are parsed with pandas.
+
+    :param table: arrow table with data to validate.
+    :param schema_path: path to yaml schema file with required columns.
+    :return: list of errors, empty when data match schema
+
+    """
+
+    validator = get_schema_validator(schema_path)
+    missing = [col for col in validator.columns if col not in table.column_names]
+    if missing:
+        return [f'Required column {col} is missing in dataset' for col in missing]
+
+    errors = []
+    for rule in validator.rules:
+        values = table.column(rule.name)
+        if not rule.nullable and values.null_count:
+            errors.append(f'Column {rule.name} has none values but should NOT be nullable')
+        if rule.dtype is not None and not _is_type_compatible(values.type, rule.dtype, rule.format):
+            errors.append(f'Column {rule.name} has dtype {values.type}, expected {rule.dtype}')
+        elif rule.format is not None and not _matches_format(values, rule, validator.templates[rule.name]):
+            errors.append(f'Column {rule.name} has values not matching format {rule.format}')
+
+    return errors
+
+def _aggregate(
+    table: pa.Table,
+    schema_path: str,
+    key: str,
+    hourly: bool,
+    columns_to_dedup: Tuple[str, ...],
+    metrics: Optional[RunMetrics]
+) -> pd.DataFrame:
+    """
+    Validates, deduplicates and counts impressions for each key, at each hour when hourly.
+    Dedup and count are a single acero plan run by to_table on the arrow thread pool, the deduplicated
+    table is never materialized. The plan is timed as count stage, dedup stage records its rows only.
+
+    :param table: arrow table with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param key: key column to count by, e.g. CAMPAIGN_ID.
+    :param hourly: count by key and hour, otherwise by key over the day.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with key, HOUR when hourly and IMPRESSIONS_COUNT columns
+
+    """
+
+    metrics = metrics if metrics is not None else RunMetrics()
+
+    # validate table
+    with metrics.stage('validate') as stage:
+        stage.rows_in += table.num_rows
+        errors = validate_table(table, schema_path)
+        for error in errors:
+            logger.error(f'Warning! {error}')
+        if errors:
+            raise ValueError(f'Impressions dataset does not match schema {schema_path}')
+        stage.rows_out += table.num_rows
+
+    # the first row of every dedup key is selected by its position, nulls are equal like in drop_duplicates
+    with metrics.stage('dedup') as stage:
+        positions = pa.array(np.arange(table.num_rows))
+        rows = table.select(list(columns_to_dedup)).append_column(ROW_COLUMN, positions)
+        first = acero.Declaration.from_sequence([
+            acero.Declaration('table_source', acero.TableSourceNodeOptions(rows)),
+            acero.Declaration('aggregate', acero.AggregateNodeOptions(
+                [(ROW_COLUMN, 'hash_min', None, ROW_COLUMN)], keys=list(columns_to_dedup))),
+            acero.Declaration('project', acero.ProjectNodeOptions([pc.field(ROW_COLUMN)], [ROW_COLUMN]))
+        ])
+        stage.rows_in += table.num_rows
+
+    # only the first rows are counted for each key at each hour, dedup runs in the same plan
+    with metrics.stage('count') as stage:
+        keys = [key]
+        counted = table.select([key]).append_column(ROW_COLUMN, positions)
+        if hourly:
+            hours = _extract_hours(table.column('IMPRESSION_DATETIME'))
+            counted = counted.append_column('HOUR', hours)
+            keys.append('HOUR')
+        counts = acero.Declaration.from_sequence([
+            acero.Declaration('hashjoin', acero.HashJoinNodeOptions('left semi', [ROW_COLUMN], [ROW_COLUMN]), inputs=[
+                acero.Declaration('table_source', acero.TableSourceNodeOptions(counted)), first]),
+            acero.Declaration('aggregate', acero.AggregateNodeOptions(
+                [([], 'hash_count_all', None, 'IMPRESSIONS_COUNT')], keys=keys)),
+            acero.Declaration('order_by', acero.OrderByNodeOptions([(name, 'ascending') for name in keys]))
+        ]).to_table()
+        deduplicated = pc.sum(counts.column('IMPRESSIONS_COUNT')).as_py() or 0
+        # rows with null key or hour are not counted, their groups are dropped
+        is_counted = pc.is_valid(counts.column(key))
+        if hourly:
+            is_counted = pc.and_(is_counted, pc.is_valid(counts.column('HOUR')))
+        counts = counts.filter(is_counted)
+        stage.rows_in += deduplicated
+        stage.rows_out += counts.num_rows
+
+    stage = metrics.get_stage('dedup')
+    stage.rows_out += deduplicated
+    stage.rows_dropped += table.num_rows - deduplicated
+
+    df = counts.to_pandas()
+    key_dtype = get_schema_dtypes(schema_path).get(key)
+    if key_dtype is not None:
+        df[key] = df[key].astype(key_dtype)
+    if hourly and hours.null_count:
+        # pandas engine hours with nulls are floats
+        df['HOUR'] = df['HOUR'].astype(np.float64)
+    return df
+
+def _extract_hours(timestamps: pa.ChunkedArray) -> pa.Array:
+    """
+    Extracts hour from impressions timestamps, the same as transformations._extract_hour.
+    Well formed values are parsed by arrow strptime, only the ones it fails on are parsed with pandas.
+
+    :param timestamps: arrow array with impressions timestamps, strings or parsed timestamps.
+    :return: arrow int64 array with hour of each timestamp, null when timestamp is null
+
+    """
+
+    if pa.types.is_timestamp(timestamps.type):
+        return pc.cast(pc.hour(timestamps), pa.int64()).combine_chunks()
+
+    well_formed = pc.match_substring_regex(timestamps, TIMESTAMP_PATTERN)
+    seconds = pc.if_else(well_formed, pc.utf8_slice_codeunits(timestamps, 0, 19), None)
+    parsed = pc.strptime(seconds, format=TIMESTAMP_FORMAT, unit='s', error_is_null=True)
+    hours = pc.cast(pc.hour(parsed), pa.int64()).combine_chunks()
+    # strptime rolls days past the end of the month and second 60 over instead of failing, pandas rejects them
+    rolled_over = pc.or_(pc.not_equal(pc.day(parsed), _two_digits(seconds, 8)),
+                         pc.not_equal(pc.second(parsed), _two_digits(seconds, 17)))
+    # null timestamps have null hour, the same as in pandas
+    failed = pc.and_(pc.is_valid(timestamps), pc.fill_null(rolled_over, True))
+    if not pc.any(failed).as_py():
+        return hours
+
+    malformed = np.flatnonzero(failed.to_numpy(zero_copy_only=False))
+    fallback = _extract_hour(timestamps.take(malformed).to_pandas()).to_numpy(dtype=np.float64, na_value=np.nan)
+    values = hours.to_numpy(zero_copy_only=False).astype(np.float64)
+    values[malformed] = fallback
+    return pc.cast(pa.array(values, from_pandas=True), pa.int64())
+
+def _two_digits(values: pa.ChunkedArray, position: int) -> pa.ChunkedArray:
+    """Number of two digits at the position of every string"""
+    return pc.cast(pc.utf8_slice_codeunits(values, position, position + 2), pa.int64())
+
+def _is_type_compatible(actual: pa.DataType, dtype: str, date_format: Optional[str] = None) -> bool:
+    """
+    Checks if arrow column type is compatible with declared dtype, see schema._is_dtype_compatible.
+
+    :param actual: arrow type of the column.
+    :param dtype: declared dtype.
+    :param date_format: declared format of string column.
+    :return: True when column type is compatible
+    """
+    if dtype == 'category' or pa.types.is_dictionary(actual):
+        return True
+    if dtype in ('str', 'object', 'string'):
+        return pa.types.is_string(actual) or pa.types.is_large_string(actual) \
+            or (date_format is not None and pa.types.is_timestamp(actual))
+
+    expected = pd.api.types.pandas_dtype(dtype)
+    if pd.api.types.is_integer_dtype(expected):
+        return pa.types.is_integer(actual)
+    if pd.api.types.is_float_dtype(expected):
+        return pa.types.is_integer(actual) or pa.types.is_floating(actual)
+    if pd.api.types.is_bool_dtype(expected):
+        return pa.types.is_boolean(actual)
+    return actual.to_pandas_dtype() == expected
+
+def _matches_format(values: pa.ChunkedArray, rule: ColumnRule, templates: Tuple[bytes, ...]) -> bool:
+    """
+    Checks that all not null values match column format, values not matching any of the fixed width
+    templates are parsed with pandas, see SchemaValidator._matches_format.
+
+    :param values: arrow array with column values.
+    :param rule: column rule with format.
+    :param templates: fixed width templates of the format, empty when format has variable width.
+    :return: True when all values match format
+    """
+    if pa.types.is_timestamp(values.type):
+        return True
+
+    if templates:
+        matched = pc.match_substring_regex(values, _template_pattern(templates))
+        values = values.filter(pc.invert(matched))
+    values = values.drop_null()
+    if len(values) == 0:
+        return True
+
+    parsed = pd.to_datetime(values.to_pandas(), format=rule.format, errors='coerce')
+    return not parsed.isna().any()
+
+def _template_pattern(templates: Tuple[bytes, ...]) -> str:
+    """Regular expression matching values of any of fixed width templates, see schema.compile_templates"""
+    return '^(' + '|'.join(''.join(r'\d' if char == 'd' else re.escape(char) for char in template.decode('ascii'))
+                           for template in templates) + ')$'
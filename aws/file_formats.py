@@ -0,0 +1,312 @@
+from typing import TYPE_CHECKING, BinaryIO, Dict, Iterator, List, Optional, Tuple
+import pandas as pd
+
+# pyarrow is imported on first use by the arrow engine, it is needed here for annotations
+if TYPE_CHECKING:
+    import pyarrow
+
+# Data file formats the client can read and write, picked by object key extension
+CSV = 'csv'
+PARQUET = 'parquet'
+FILE_FORMATS = {'.csv': CSV, '.parquet': PARQUET}
+
+# Compressions of csv files, picked by the extension following the format one, e.g. .csv.gz.
+# Parquet files are compressed internally
+GZIP = 'gzip'
+ZSTD = 'zstd'
+COMPRESSIONS = {'.gz': GZIP, '.zst': ZSTD}
+
+# Row filters in pyarrow DNF notation, e.g. [('CAMPAIGN_ID', '!=', 0)]
+Filters = List[Tuple[str, str, object]]
+
+
+def get_compression(file_key: str) -> Optional[str]:
+    """
+    Gets compression from object key extension.
+
+    :param file_key: Key of object.
+    :return: compression name, None when object is not compressed
+    """
+
+    for suffix, compression in COMPRESSIONS.items():
+        if file_key.endswith(suffix):
+            return compression
+    return None
+
+
+def get_file_format(file_key: str) -> str:
+    """
+    Gets data file format from object key extension, csv when extension is unknown.
+
+    :param file_key: Key of object, optionally with compression extension.
+    :return: file format name
+    """
+
+    file_key = strip_compression(file_key)
+    for suffix, file_format in FILE_FORMATS.items():
+        if file_key.endswith(suffix):
+            return file_format
+    return CSV
+
+
+def strip_compression(file_key: str) -> str:
+    """
+    Removes compression extension from object key.
+
+    :param file_key: Key of object.
+    :return: key without compression extension
+    """
+
+    for suffix in COMPRESSIONS:
+        if file_key.endswith(suffix):
+            return file_key[:-len(suffix)]
+    return file_key
+
+
+def is_splittable(file_key: str) -> bool:
+    """
+    Checks if object can be split into byte ranges parsed independently,
+    only plain csv can be, compressed files are decoded from the start.
+
+    :param file_key: Key of object.
+    :return: True when object lines can be read from any offset
+    """
+
+    return get_file_format(file_key) == CSV and get_compression(file_key) is None
+
+
+def is_data_file(file_key: str) -> bool:
+    """
+    Checks if object key has extension of supported data file format,
+    csv files can be compressed.
+
+    :param file_key: Key of object.
+    :return: True when file can be read by the client
+    """
+
+    if get_compression(file_key) is not None:
+        return strip_compression(file_key).endswith('.csv')
+    return file_key.endswith(tuple(FILE_FORMATS))
+
+
+def get_file_extension(file_format: str, compression: Optional[str] = None) -> str:
+    """
+    Gets object key extension for file format and compression.
+
+    :param file_format: file format name.
+    :param compression: compression name, None for not compressed file.
+    :return: extension without leading dot, e.g. csv.gz
+    """
+
+    if compression is None or file_format != CSV:
+        return file_format
+
+    suffix = next(suffix for suffix, name in COMPRESSIONS.items() if name == compression)
+    return f'{file_format}{suffix}'
+
+
+def read_csv_kwargs(
+    columns: Optional[Dict[str, Optional[str]]],
+    compression: Optional[str] = None
+) -> dict:
+    """
+    Builds pandas read_csv arguments to parse only given columns with declared dtypes.
+    Compressed file is decompressed as a stream while it is parsed.
+
+    :param columns: The columns to load with their dtypes, None to load all columns.
+    :param compression: compression of the file, None for plain text.
+    :return: dictionary with read_csv keyword arguments
+    """
+
+    kwargs = {} if compression is None else {'compression': compression}
+    if columns is None:
+        return kwargs
+
+    return {
+        **kwargs,
+        'usecols': list(columns),
+        'dtype': {col: dtype for col, dtype in columns.items() if dtype is not None}
+    }
+
+
+def read_parquet(
+    file: BinaryIO,
+    columns: Optional[Dict[str, Optional[str]]] = None,
+    filters: Optional[Filters] = None
+) -> pd.DataFrame:
+    """
+    Reads parquet file to pandas dataframe. Only the given columns are read and row groups
+    not matching filters are skipped using their statistics, so with a seekable file
+    the rest of the file is never fetched.
+
+    :param file: seekable binary file with parquet data.
+    :param columns: The columns to load with their dtypes, None to load all columns.
+    :param filters: row filters pushed down to the reader.
+    :return: The pandas DataFrame with file data.
+    """
+
+    parquet = _import_parquet()
+    table = parquet.read_table(file, columns=list(columns) if columns else None, filters=filters)
+    return _cast_columns(table.to_pandas(), columns)
+
+
+def iter_parquet(
+    file: BinaryIO,
+    chunksize: int,
+    columns: Optional[Dict[str, Optional[str]]] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads parquet file as a stream of pandas dataframe chunks, only the given columns are read.
+
+    :param file: seekable binary file with parquet data.
+    :param chunksize: The maximum number of rows in a single chunk.
+    :param columns: The columns to load with their dtypes, None to load all columns.
+    :return: Iterator over pandas DataFrame chunks.
+    """
+
+    parquet = _import_parquet()
+    parquet_file = parquet.ParquetFile(file)
+    for batch in parquet_file.iter_batches(batch_size=chunksize, columns=list(columns) if columns else None):
+        yield _cast_columns(batch.to_pandas(), columns)
+
+
+def read_table(
+    file: BinaryIO,
+    file_format: str,
+    columns: Optional[Dict[str, Optional[str]]] = None,
+    compression: Optional[str] = None
+) -> 'pyarrow.Table':
+    """
+    Reads csv or parquet file to arrow table for the arrow engine. Csv is parsed by the multithreaded
+    arrow reader, blocks of the file are parsed in parallel, only the given columns are converted
+    to the arrow types of declared dtypes. Empty strings are nulls, same as with pandas read_csv.
+
+    :param file: binary file with data, seekable for parquet.
+    :param file_format: file format name.
+    :param columns: The columns to load with their dtypes, None to load all columns.
+    :param compression: compression of csv file, None for plain text.
+    :return: The arrow Table with file data.
+    """
+
+    pyarrow, csv = _import_arrow()
+    if file_format == PARQUET:
+        table = _import_parquet().read_table(file, columns=list(columns) if columns else None)
+        types = _arrow_types(columns)
+        # parquet timestamps are kept as they are, they do not need string parsing
+        return table.cast(pyarrow.schema([
+            field.with_type(types[field.name])
+            if field.name in types and not pyarrow.types.is_timestamp(field.type) else field
+            for field in table.schema
+        ]))
+
+    types = _arrow_types(columns)
+    convert_options = csv.ConvertOptions(strings_can_be_null=True)
+    if columns is not None:
+        # pandas reads integers written as floats, e.g. 42.0 of ids with nulls, small integers are parsed
+        # as floats and cast back, casts of fractional values fail as in pandas
+        convert_options.include_columns = list(columns)
+        convert_options.column_types = {
+            col: pyarrow.float64() if pyarrow.types.is_integer(value) and value.bit_width <= 32 else value
+            for col, value in types.items()
+        }
+
+    if compression is None:
+        table = csv.read_csv(file, read_options=csv.ReadOptions(use_threads=True), convert_options=convert_options)
+    else:
+        with pyarrow.CompressedInputStream(pyarrow.PythonFile(file, mode='r'), compression) as stream:
+            table = csv.read_csv(stream, read_options=csv.ReadOptions(use_threads=True),
+                                 convert_options=convert_options)
+    return table.cast(pyarrow.schema([field.with_type(types.get(field.name, field.type)) for field in table.schema]))
+
+
+def concat_tables(tables: List['pyarrow.Table']) -> 'pyarrow.Table':
+    """
+    Concatenates arrow tables of several files without copying their data.
+
+    :param tables: The arrow Tables with the same columns.
+    :return: The arrow Table with rows of all tables in order.
+    """
+
+    pyarrow, _ = _import_arrow()
+    return pyarrow.concat_tables(tables, promote_options='permissive')
+
+
+def write_df(df: pd.DataFrame, file: BinaryIO, file_format: str, compression: Optional[str] = None) -> None:
+    """
+    Writes pandas dataframe to binary file in the given format.
+
+    :param df: The pandas DataFrame to write.
+    :param file: binary file to write to.
+    :param file_format: file format name.
+    :param compression: compression of csv file, None for plain text.
+        Parquet files are always compressed internally.
+    :return: N/A
+    """
+
+    if file_format == PARQUET:
+        _import_parquet()
+        df.to_parquet(file, index=False)
+    else:
+        df.to_csv(file, index=False, compression=compression)
+
+
+def _cast_columns(df: pd.DataFrame, columns: Optional[Dict[str, Optional[str]]]) -> pd.DataFrame:
+    """
+    Casts columns read from parquet to declared dtypes. Parquet timestamps are kept
+    as they are, they do not need string parsing.
+
+    :param df: The pandas DataFrame read from parquet.
+    :param columns: The columns with their dtypes.
+    :return: The pandas DataFrame with declared dtypes.
+    """
+
+    if not columns:
+        return df
+
+    dtypes = {
+        col: dtype for col, dtype in columns.items()
+        if dtype is not None and not pd.api.types.is_datetime64_any_dtype(df[col])
+    }
+    return df.astype(dtypes)
+
+
+def _arrow_types(columns: Optional[Dict[str, Optional[str]]]) -> Dict[str, 'pyarrow.DataType']:
+    """
+    Maps declared pandas dtypes to arrow types, strings and categories are read as strings.
+
+    :param columns: The columns with their dtypes.
+    :return: dictionary with arrow type of every column with declared dtype
+    """
+
+    pyarrow, _ = _import_arrow()
+    types = {}
+    for col, dtype in (columns or {}).items():
+        if dtype is None:
+            continue
+        if dtype in ('str', 'object', 'string', 'category'):
+            types[col] = pyarrow.string()
+        else:
+            pandas_dtype = pd.api.types.pandas_dtype(dtype)
+            types[col] = pyarrow.from_numpy_dtype(getattr(pandas_dtype, 'numpy_dtype', pandas_dtype))
+    return types
+
+
+def _import_arrow():
+    """Imports pyarrow and its csv module, which are needed only by the arrow engine"""
+
+    try:
+        import pyarrow
+        import pyarrow.csv as csv
+    except ImportError as e:
+        raise ImportError('pyarrow is required by the arrow engine') from e
+    return pyarrow, csv
+
+
+def _import_parquet():
+    """Imports pyarrow parquet module, which is needed only for parquet files"""
+
+    try:
+        import pyarrow.parquet as parquet
+    except ImportError as e:
+        raise ImportError('pyarrow is required to read and write parquet files') from e
+    return parquet
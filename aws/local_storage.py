@@ -0,0 +1,246 @@
+import mmap
+import os
+import tempfile
+from io import BytesIO, RawIOBase
+from typing import BinaryIO, List, Optional, Tuple
+
+from aws.object_cache import MappedFile
+from aws.s3_client import S3GetObjectError, S3PutObjectError, StorageClient
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LocalStorageClient(StorageClient):
+    """
+    Storage client over a local directory instead of S3, e.g. an on-prem mount or a local mirror
+    of the bucket, no credentials are needed. Buckets are directories under the root and object
+    keys are paths in them, so objects keep the same YYYY/MM/DD layout,
+    e.g. <root>/<bucket>/2022/04/15/impressions.csv.
+    Only the storage calls are implemented here, listing, parsing and writing of dataframes
+    are inherited. Files are read through read-only memory maps, so parsers read the page cache
+    without copying it, and written to a temporary name and renamed, so readers never see
+    partial objects.
+    """
+
+    def __init__(self, root: str, max_workers: int = 1, range_size: Optional[int] = None):
+        """
+        :param root: directory with a sub-directory per bucket.
+        :param max_workers: number of objects to read and parse concurrently.
+        :param range_size: plain csv objects larger than this number of bytes are parsed
+            in byte ranges by max_workers threads, see StorageClient.read_csv_range.
+        """
+        super().__init__(max_workers=max_workers, range_size=range_size)
+        self.root = root
+
+    def bucket_exist(self, name: str) -> bool:
+        """
+        Validates if a given bucket directory exists.
+
+        :param name: Name of the bucket to validate
+        :return: True when the bucket directory exists
+        """
+        return os.path.isdir(self._path(name))
+
+    def _list_objects(
+        self,
+        bucket: str,
+        prefix: str,
+        delimiter: Optional[str] = None
+    ) -> Tuple[List[dict], List[str]]:
+        """
+        Lists files of a bucket directory with keys starting with given prefix,
+        only directories which can hold such keys are walked. Hidden files, e.g. files
+        being written, are skipped. ETag of a file is made of its modification time and size.
+
+        :param bucket: the bucket name
+        :param prefix: the file prefix used to filter the resulting entries.
+        :param delimiter: when provided, keys are grouped by it into common prefixes,
+            with '/' sub-directories are not walked.
+
+        :return: a tuple of objects entries and common prefixes, ordered by key.
+        """
+
+        base = self._path(bucket)
+        contents, common_prefixes = [], set()
+        for path, directories, files in os.walk(self._path(bucket, prefix.rpartition('/')[0])):
+            relative = os.path.relpath(path, base).replace(os.sep, '/')
+            relative = '' if relative == '.' else relative + '/'
+            directories[:] = sorted(
+                name for name in directories
+                if not name.startswith('.')
+                and ((relative + name + '/').startswith(prefix) or prefix.startswith(relative + name + '/'))
+            )
+            if delimiter == '/':
+                common_prefixes.update(relative + name + '/' for name in directories
+                                       if (relative + name + '/').startswith(prefix))
+                directories[:] = [name for name in directories if not (relative + name + '/').startswith(prefix)]
+
+            for name in files:
+                key = relative + name
+                if name.startswith('.') or not key.startswith(prefix):
+                    continue
+                if delimiter and delimiter in key[len(prefix):]:
+                    common_prefixes.add(key[:key.index(delimiter, len(prefix)) + len(delimiter)])
+                    continue
+                stat = os.stat(os.path.join(path, name))
+                contents.append({'Key': key, 'Size': stat.st_size, 'ETag': _etag(stat)})
+
+        contents.sort(key=lambda item: item['Key'])
+        return contents, sorted(common_prefixes)
+
+    def get_object(self, bucket: str, file_key: str, byte_range: Optional[Tuple[int, int]] = None) -> dict:
+        """
+        Opens file content as memory-mapped read-only file.
+
+        :param bucket: Bucket to get from
+        :param file_key: Key of object to get
+        :param byte_range: first and last (inclusive) byte to get, whole object when not provided
+        :raises S3GetObjectError: When file failed to open
+        :return: object as a dictionary with Body and ContentLength
+        """
+
+        try:
+            with open(self._path(bucket, file_key), 'rb') as file:
+                size = os.fstat(file.fileno()).st_size
+                # empty files can not be memory-mapped
+                body = MappedFile(file.fileno(), 0, access=mmap.ACCESS_READ) if size else BytesIO()
+        except (OSError, ValueError) as e:
+            raise S3GetObjectError(bucket, file_key) from e
+
+        if byte_range is not None:
+            body = BytesIO(body[byte_range[0]:byte_range[1] + 1] if size else b'')
+            size = len(body.getbuffer())
+        self.transfer.add_downloaded(size)
+        return {'Body': body, 'ContentLength': size}
+
+    def open_object(self, bucket: str, file_key: str) -> BinaryIO:
+        """
+        Opens file as seekable read-only binary file, see get_object.
+
+        :param bucket: The name of the bucket.
+        :param file_key: Key of object to open
+        :raises S3GetObjectError: When file failed to open
+        :return: memory-mapped file
+        """
+        return self.get_object(bucket, file_key)['Body']
+
+    def _get_size(self, bucket: str, file_key: str) -> int:
+        """File size in bytes"""
+        try:
+            return os.path.getsize(self._path(bucket, file_key))
+        except (OSError, ValueError) as e:
+            raise S3GetObjectError(bucket, file_key) from e
+
+    def put_object(self, bucket: str, file_key: str, body: bytes) -> dict:
+        """
+        Writes file to the bucket directory, missing directories are created.
+
+        :param bucket: Name of the bucket to write data to
+        :param file_key: file key
+        :param body: data in bytes
+        :raises S3PutObjectError: When file failed to write
+        :return: dictionary with ETag of the file
+        """
+        with self.open_writer(bucket, file_key) as writer:
+            writer.write(body)
+        return {'ETag': _etag(os.stat(writer.path))}
+
+    def open_writer(self, bucket: str, file_key: str, part_size: int = 0) -> 'LocalFileWriter':
+        """
+        Opens file for writing as binary file, see LocalFileWriter.
+
+        :param bucket: The name of the bucket.
+        :param file_key: Key of object to write.
+        :param part_size: ignored, files are written as a stream.
+        :raises S3PutObjectError: When file failed to open
+        :return: binary file, it is stored when it is closed
+        """
+        return LocalFileWriter(self, bucket, file_key)
+
+    def _path(self, bucket: str, file_key: str = '') -> str:
+        """Path of bucket directory or file of the object, keys can not point outside the bucket"""
+        base = os.path.join(self.root, bucket)
+        path = os.path.normpath(os.path.join(base, *file_key.split('/')))
+        if os.path.commonpath([os.path.abspath(base), os.path.abspath(path)]) != os.path.abspath(base):
+            raise ValueError(f'Key {file_key} points outside of bucket {bucket}')
+        return path
+
+
+class LocalFileWriter(RawIOBase):
+    """
+    Write-only binary file storing data as a file of the bucket directory.
+    Data are written to a hidden temporary file next to the target, which is renamed
+    on close, or removed on error when used as a context manager.
+    """
+
+    def __init__(self, storage_client: LocalStorageClient, bucket: str, file_key: str):
+        """
+        :param storage_client: local storage client to count written bytes in.
+        :param bucket: The name of the bucket.
+        :param file_key: Key of object to write.
+        :raises S3PutObjectError: When temporary file failed to open
+        """
+        self.storage_client = storage_client
+        self.bucket = bucket
+        self.file_key = file_key
+        try:
+            self.path = storage_client._path(bucket, file_key)
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix='.', suffix='.tmp')
+        except (OSError, ValueError) as e:
+            super().close()
+            raise S3PutObjectError(bucket, file_key) from e
+        self._file = os.fdopen(fd, 'wb')
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        written = self._file.write(data)
+        self.storage_client.transfer.add_uploaded(written)
+        return written
+
+    def close(self) -> None:
+        """
+        Renames written file to its key.
+
+        :raises S3PutObjectError: When file failed to write, the temporary file is removed
+        :return: N/A
+        """
+        if self.closed:
+            return
+
+        try:
+            self._file.close()
+            os.replace(self.tmp_path, self.path)
+        except OSError as e:
+            self.abort()
+            raise S3PutObjectError(self.bucket, self.file_key) from e
+        finally:
+            super().close()
+
+    def abort(self) -> None:
+        """
+        Removes the temporary file, the target file is left as it was.
+
+        :return: N/A
+        """
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def _etag(stat: os.stat_result) -> str:
+    """Stand-in for ETag of a file, changes whenever the file is rewritten"""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
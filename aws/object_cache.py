@@ -0,0 +1,169 @@
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+from io import BytesIO
+from typing import BinaryIO, List, Optional, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 10 * 1024 ** 3
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+class MappedFile(mmap.mmap):
+    """
+    Read-only memory map of a file marked as binary file, readers which tell text and binary files
+    by their mode, e.g. pandas, would not decompress a plain memory map
+    """
+
+    mode = 'rb'
+
+
+class S3ObjectCache():
+    """
+    On-disk cache of S3 objects content keyed by bucket, key and ETag.
+    Every object is stored as a data file with a small json file next to it
+    holding its bucket, key and ETag. Data files modification time is bumped on every hit,
+    so when the total size exceeds max_size the least recently used entries are evicted first.
+    Files are written to a temporary name and renamed, so several processes can share the directory.
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_CACHE_SIZE):
+        """
+        :param directory: directory to store cached objects in, created when missing.
+        :param max_size: maximum total size of cached objects in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get_etag(self, bucket: str, file_key: str) -> Optional[str]:
+        """
+        Gets ETag of cached object content.
+
+        :param bucket: The name of the S3 bucket.
+        :param file_key: Key of object.
+        :return: ETag of cached content, None when object is not cached
+        """
+        try:
+            with open(self._meta_path(bucket, file_key)) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if (meta.get('bucket'), meta.get('key')) != (bucket, file_key) \
+                or not os.path.exists(self._data_path(bucket, file_key)):
+            return None
+        return meta.get('etag')
+
+    def open(self, bucket: str, file_key: str) -> BinaryIO:
+        """
+        Opens cached object content as memory-mapped read-only file
+        and marks the entry as recently used.
+
+        :param bucket: The name of the S3 bucket.
+        :param file_key: Key of object.
+        :raises FileNotFoundError: When object is not cached
+        :return: memory-mapped file, it supports read, seek and the buffer protocol
+        """
+        path = self._data_path(bucket, file_key)
+        os.utime(path)
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                # empty files can not be memory-mapped
+                return BytesIO()
+            return MappedFile(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def put(self, bucket: str, file_key: str, etag: str, body: BinaryIO) -> None:
+        """
+        Stores object content read from stream and evicts least recently used
+        entries when cache is over its size.
+
+        :param bucket: The name of the S3 bucket.
+        :param file_key: Key of object.
+        :param etag: ETag of object content.
+        :param body: binary stream with object content, read in chunks.
+        :return: N/A
+        """
+        # drop old ETag first, so it never describes the new content
+        _remove(self._meta_path(bucket, file_key))
+        data_path = self._data_path(bucket, file_key)
+        self._write(data_path, lambda file: _copy(body, file))
+        meta = json.dumps({'bucket': bucket, 'key': file_key, 'etag': etag}).encode()
+        self._write(self._meta_path(bucket, file_key), lambda file: file.write(meta))
+        self.evict(keep=data_path)
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Removes least recently used entries until total size fits max_size.
+
+        :param keep: path of data file not to evict, e.g. the one just stored.
+        :return: N/A
+        """
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_size:
+                    break
+                if path == keep:
+                    continue
+                _remove(f'{os.path.splitext(path)[0]}.json')
+                _remove(path)
+                total -= size
+                logger.info(f'Evicted {path} from s3 objects cache')
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """Lists cached data files with their last use time and size"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.data'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, entry.name)))
+        return entries
+
+    def _write(self, path: str, write) -> None:
+        """Writes file to temporary name in cache directory and renames it, so readers never see partial file"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                write(file)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _entry_name(self, bucket: str, file_key: str) -> str:
+        return hashlib.sha256(f'{bucket}/{file_key}'.encode()).hexdigest()
+
+    def _data_path(self, bucket: str, file_key: str) -> str:
+        return os.path.join(self.directory, f'{self._entry_name(bucket, file_key)}.data')
+
+    def _meta_path(self, bucket: str, file_key: str) -> str:
+        return os.path.join(self.directory, f'{self._entry_name(bucket, file_key)}.json')
+
+
+def _copy(source: BinaryIO, target: BinaryIO) -> None:
+    """Copies stream in chunks, so object is never held in memory as a whole"""
+    while True:
+        chunk = source.read(COPY_BUFFER_SIZE)
+        if not chunk:
+            return
+        target.write(chunk)
+
+
+def _remove(path: str) -> None:
+    """Removes file which may be already removed by another process"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,41 +1,159 @@
-from io import BytesIO
-from typing import List, Optional, Dict
+from io import BytesIO, RawIOBase, SEEK_CUR, SEEK_END, SEEK_SET
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+from typing import TYPE_CHECKING, BinaryIO, Deque, Iterator, List, NamedTuple, Optional, Dict, Tuple
 from boto3 import client
+from botocore.client import BaseClient
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import pandas as pd
 
-class S3Client():
+if TYPE_CHECKING:
+    import pyarrow
+
+from aws.object_cache import S3ObjectCache
+from aws.file_formats import (
+    CSV, PARQUET, Filters, concat_tables, get_compression, get_file_format, is_data_file, is_splittable, iter_parquet,
+    read_csv_kwargs, read_parquet, read_table, write_df
+)
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# botocore default size of the connection pool
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+
+# S3 multipart upload parts, all parts but the last one should be at least 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+# bytes requested at a time when looking for the end of a line crossing a byte range boundary
+LINE_PROBE_SIZE = 64 * 1024
+
+
+class S3ObjectInfo(NamedTuple):
+    """Metadata of S3 object returned by listing"""
+
+    key: str
+    size: int
+    etag: str
+
+
+class TransferStats():
+    """Bytes downloaded from and uploaded to S3 by a client, updated by all its threads"""
+
+    def __init__(self):
+        self.downloaded = 0
+        self.uploaded = 0
+        self._lock = Lock()
+
+    def add_downloaded(self, size: int) -> None:
+        with self._lock:
+            self.downloaded += size
+
+    def add_uploaded(self, size: int) -> None:
+        with self._lock:
+            self.uploaded += size
+
+
+class StorageClient():
     """
-    Wrapper client class which provides custom functional interactions with AWS S3 via the
-    Boto3 Client
+    Base of the storage clients: lists data objects, parses them to pandas dataframes or arrow tables
+    and writes dataframes back. Storages implement the primitives only, bucket_exist, _list_objects,
+    get_object, _get_size, open_object, put_object and open_writer.
     """
 
-    def __init__(self, config: Dict[str, Dict[str, str]] ):
-        aws_config = config['aws']
-        aws_access_key_id = aws_config['access_key_id']
-        aws_secret_access_key = aws_config['secret_access_key']
-        self.client = client('s3', 
-                            aws_access_key_id=aws_access_key_id,
-                            aws_secret_access_key=aws_secret_access_key,
-                            region_name=aws_config['region']
-                            )
-    
+    def __init__(self, max_workers: int = 1, range_size: Optional[int] = None):
+        """
+        :param max_workers: number of objects to fetch and parse concurrently.
+        :param range_size: plain csv objects larger than this number of bytes are fetched
+            and parsed in byte ranges by max_workers threads, see read_csv_range.
+        """
+        self.max_workers = max_workers
+        self.range_size = range_size
+        self.transfer = TransferStats()
+
     def bucket_exist(self, name: str) -> bool:
         """
-        bucket_exist Validates if a given bucket exists.
+        Validates if a given bucket exists.
 
         :param name: Name of the bucket to validate
         :return: True when the bucket exists
-                 False when the bucket (i) don't exists (ii) lack of permission or (iii) client
-                 error
         """
-        try:
-            self.client.head_bucket(Bucket=name)
-            return True
-        except ClientError:
-            return False
-        
-    def get_csv_file_list(self, bucket: str, prefix: Optional[str] = None) -> List[str]:
+        raise NotImplementedError
+
+    def _list_objects(
+        self,
+        bucket: str,
+        prefix: str,
+        delimiter: Optional[str] = None
+    ) -> Tuple[List[dict], List[str]]:
+        """
+        Lists all objects in a bucket for given prefix.
+
+        :param bucket: the bucket name
+        :param prefix: the file prefix used to filter the resulting entries.
+        :param delimiter: when provided, keys are grouped by it into common prefixes.
+
+        :return: a tuple of objects entries with Key, Size and ETag, and common prefixes.
+        """
+        raise NotImplementedError
+
+    def get_object(self, bucket: str, file_key: str, byte_range: Optional[Tuple[int, int]] = None) -> dict:
+        """
+        Gets object content.
+
+        :param bucket: Bucket to get from
+        :param file_key: Key of object to get
+        :param byte_range: first and last (inclusive) byte to get, whole object when not provided
+        :raises S3GetObjectError: When object failed to load
+        :return: object as a dictionary with Body and ContentLength
+        """
+        raise NotImplementedError
+
+    def _get_size(self, bucket: str, file_key: str) -> int:
+        """Object size in bytes"""
+        raise NotImplementedError
+
+    def open_object(self, bucket: str, file_key: str) -> BinaryIO:
+        """
+        Opens object as seekable read-only binary file.
+
+        :param bucket: The name of the bucket.
+        :param file_key: Key of object to open
+        :raises S3GetObjectError: When object failed to open
+        :return: binary file
+        """
+        raise NotImplementedError
+
+    def put_object(self, bucket: str, file_key: str, body: bytes) -> dict:
+        """
+        Stores object in the bucket.
+
+        :param bucket: Name of the bucket to write data to
+        :param file_key: file key
+        :param body: data in bytes
+        :raises S3PutObjectError: When object failed to store
+        :return: dictionary with ETag of the object
+        """
+        raise NotImplementedError
+
+    def open_writer(self, bucket: str, file_key: str, part_size: int = DEFAULT_PART_SIZE) -> BinaryIO:
+        """
+        Opens object for writing as binary file, object is stored when it is closed.
+
+        :param bucket: The name of the bucket.
+        :param file_key: Key of object to write.
+        :param part_size: size of the parts data are stored in, when storage writes in parts.
+        :raises S3PutObjectError: When object failed to open
+        :return: binary file
+        """
+        raise NotImplementedError
+
+    def get_csv_file_list(self, bucket: str, prefix: Optional[str] = None, fan_out: bool = False) -> List[str]:
         """
         Retrieves the list of scv files in a bucket. Optionally, a file prefix can be used
         to filter the resulting entries.
@@ -43,31 +161,327 @@ class S3Client():
         :param bucket: the bucket name
         :param prefix: the file prefix used to filter the resulting entries. If no prefix
             is supplied, all bucket files are returned.
+        :param fan_out: list sub-prefixes of the given prefix in parallel, see list_csv_objects.
 
         :return: a list of csv file names in given bucket and prefix.
         """
-        res = self.client.list_objects_v2(Bucket=bucket, Prefix=prefix)
 
-        return [item['Key'] for item in res['Contents'] if item['Key'].endswith('.csv')] if 'Contents' in res else []
-    
-    def export_s3_to_df(self, bucket: str, file_keys: List[str]) -> pd.DataFrame:
+        return [obj.key for obj in self.list_csv_objects(bucket, prefix, fan_out=fan_out)]
+
+    def list_csv_objects(
+        self,
+        bucket: str,
+        prefix: Optional[str] = None,
+        fan_out: bool = False
+    ) -> List[S3ObjectInfo]:
+        """
+        Retrieves csv objects, plain or compressed, in a bucket together with their size and ETag,
+        see list_data_objects.
+
+        :param bucket: the bucket name
+        :param prefix: the file prefix used to filter the resulting entries.
+        :param fan_out: list sub-prefixes of the given prefix in parallel.
+
+        :return: a list of csv objects metadata in given bucket and prefix, ordered by key.
+        """
+
+        return [
+            obj for obj in self.list_data_objects(bucket, prefix, fan_out=fan_out)
+            if get_file_format(obj.key) == CSV
+        ]
+
+    def list_data_objects(
+        self,
+        bucket: str,
+        prefix: Optional[str] = None,
+        fan_out: bool = False
+    ) -> List[S3ObjectInfo]:
+        """
+        Retrieves data objects (csv, gzip or zstd compressed csv and parquet) in a bucket
+        together with their size and ETag.
+        Follows ContinuationToken, so partitions with more than 1000 objects are listed fully.
+        With fan_out the sub-prefixes of the given prefix (e.g. hourly folders under YYYY/MM/DD)
+        are found with a delimited listing and then listed in parallel by max_workers threads.
+
+        :param bucket: the bucket name
+        :param prefix: the file prefix used to filter the resulting entries. If no prefix
+            is supplied, all bucket files are returned.
+        :param fan_out: list sub-prefixes of the given prefix in parallel.
+
+        :return: a list of data objects metadata in given bucket and prefix, ordered by key.
+        """
+
+        prefix = prefix or ''
+
+        if not fan_out:
+            contents, _ = self._list_objects(bucket, prefix)
+        else:
+            if prefix and not prefix.endswith('/'):
+                prefix += '/'
+            contents, sub_prefixes = self._list_objects(bucket, prefix, delimiter='/')
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for sub_contents, _ in executor.map(lambda sub_prefix: self._list_objects(bucket, sub_prefix),
+                                                    sub_prefixes):
+                    contents.extend(sub_contents)
+            contents.sort(key=lambda item: item['Key'])
+
+        return [
+            S3ObjectInfo(key=item['Key'], size=item.get('Size', 0), etag=item.get('ETag', ''))
+            for item in contents if is_data_file(item['Key'])
+        ]
+
+    def list_objects(self, bucket: str, prefix: str) -> List[S3ObjectInfo]:
+        """
+        Retrieves all objects in a bucket for given prefix, whatever their format,
+        together with their size and ETag.
+
+        :param bucket: the bucket name
+        :param prefix: the file prefix used to filter the resulting entries.
+
+        :return: a list of objects metadata in given bucket and prefix, ordered by key.
+        """
+
+        contents, _ = self._list_objects(bucket, prefix)
+        return [
+            S3ObjectInfo(key=item['Key'], size=item.get('Size', 0), etag=item.get('ETag', ''))
+            for item in contents
+        ]
+
+    def export_s3_to_df(
+        self,
+        bucket: str,
+        file_keys: List[str],
+        columns: Optional[Dict[str, Optional[str]]] = None,
+        filters: Optional[Filters] = None,
+        sizes: Optional[Dict[str, int]] = None
+    ) -> pd.DataFrame:
         """
         Writes S3 object to pandas dataframe. 
         If few objects provided concat them all in single dataframe.
+        When client is created with more than one worker, objects are fetched and parsed
+        concurrently, the result still follows file_keys order.
+        Format of every object is picked by its key extension, csv when extension is unknown.
 
         :param bucket: The name of the S3 bucket.
         :param file_keys: The list of full destination path for s3 objects to load.
+        :param columns: The columns to load with their dtypes (None to infer dtype).
+            If not provided all columns are loaded with default dtypes.
+        :param filters: row filters pushed down to parquet reader, row groups which can not
+            match them are not fetched. Ignored for csv objects. Not passed by the handler,
+            transformations validate and deduplicate every row of the partition.
+        :param sizes: object sizes in bytes by key, as listed, so objects split into byte ranges
+            are not sized by a HEAD request.
+        :raises S3GetObjectError: When any of the objects failed to load
         :return: The pandas DataFrame with written data.
         """
 
-        df_list = []
-    
-        for key in file_keys:
-            obj = self.get_object(bucket=bucket, file_key=key)
-            df_list.append(pd.read_csv(obj['Body']))
+        sizes = sizes or {}
+        if self.max_workers > 1 and len(file_keys) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                df_list = list(executor.map(
+                    lambda key: self._read_object(bucket, key, columns, filters, sizes.get(key)), file_keys))
+        else:
+            df_list = [self._read_object(bucket, key, columns, filters, sizes.get(key)) for key in file_keys]
 
         return pd.concat(df_list, ignore_index=True, sort=False)
-    
+
+    def export_s3_to_table(
+        self,
+        bucket: str,
+        file_keys: List[str],
+        columns: Optional[Dict[str, Optional[str]]] = None
+    ) -> 'pyarrow.Table':
+        """
+        Writes S3 objects to a single arrow table for the arrow engine, see read_table.
+        Every csv object is parsed by the multithreaded arrow reader, so objects are read one by one,
+        byte ranges are not needed. Parquet objects are read through ranged requests.
+
+        :param bucket: The name of the S3 bucket.
+        :param file_keys: The list of full destination path for s3 objects to load.
+        :param columns: The columns to load with their dtypes (None to infer dtype).
+        :raises S3GetObjectError: When any of the objects failed to load
+        :return: The arrow Table with objects data, in file_keys order.
+        """
+
+        tables = []
+        for file_key in file_keys:
+            file_format = get_file_format(file_key)
+            if file_format == PARQUET:
+                with self.open_object(bucket, file_key) as file:
+                    tables.append(read_table(file, file_format, columns))
+            else:
+                obj = self.get_object(bucket=bucket, file_key=file_key)
+                tables.append(read_table(obj['Body'], file_format, columns, get_compression(file_key)))
+
+        return concat_tables(tables)
+
+    def _read_object(
+        self,
+        bucket: str,
+        file_key: str,
+        columns: Optional[Dict[str, Optional[str]]] = None,
+        filters: Optional[Filters] = None,
+        size: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Fetches single S3 object and parses it to pandas dataframe.
+        Parquet objects are read through ranged requests, so only footer
+        and chunks of the needed columns and row groups are fetched.
+        Compressed csv objects are decompressed while the Body is streamed to the parser.
+
+        :param bucket: The name of the S3 bucket.
+        :param file_key: Key of object to load
+        :param columns: The columns to load with their dtypes.
+        :param filters: row filters pushed down to parquet reader.
+        :param size: object size in bytes from the listing, requested by HEAD when not provided
+            and the object may be split into byte ranges.
+        :raises S3GetObjectError: When get_object failed
+        :return: The pandas DataFrame with object data.
+        """
+
+        if get_file_format(file_key) == PARQUET:
+            with self.open_object(bucket, file_key) as file:
+                return read_parquet(file, columns, filters)
+
+        if self._read_in_ranges(file_key):
+            size = size if size is not None else self._get_size(bucket, file_key)
+            byte_ranges = split_ranges(S3ObjectInfo(file_key, size, ''), self.range_size)
+            if len(byte_ranges) > 1:
+                return self._read_csv_ranges(bucket, file_key, size, byte_ranges, columns)
+
+        obj = self.get_object(bucket=bucket, file_key=file_key)
+        return pd.read_csv(obj['Body'], **read_csv_kwargs(columns, get_compression(file_key)))
+
+    def _read_in_ranges(self, file_key: str) -> bool:
+        """Checks if object is fetched and parsed in byte ranges, when it is large enough, see split_ranges"""
+        return bool(self.range_size) and is_splittable(file_key)
+
+    def _read_csv_ranges(
+        self,
+        bucket: str,
+        file_key: str,
+        size: int,
+        byte_ranges: List[Tuple[int, int]],
+        columns: Optional[Dict[str, Optional[str]]] = None
+    ) -> pd.DataFrame:
+        """
+        Fetches and parses byte ranges of single csv object concurrently and stitches them
+        together in ranges order, the result is the same as parsed at once.
+
+        :param bucket: The name of the S3 bucket.
+        :param file_key: Key of object to load
+        :param size: object size in bytes.
+        :param byte_ranges: first and last byte of every range, see split_ranges.
+        :param columns: The columns to load with their dtypes.
+        :raises S3GetObjectError: When get_object failed
+        :return: The pandas DataFrame with object data.
+        """
+
+        header = self.read_line(bucket, file_key, 0, size)
+        read_range = partial(self.read_csv_range, bucket, file_key, size=size, columns=columns, header=header)
+        if self.max_workers > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(byte_ranges))) as executor:
+                df_list = list(executor.map(read_range, byte_ranges))
+        else:
+            df_list = [read_range(byte_range) for byte_range in byte_ranges]
+
+        logger.info(f'Object {file_key} is read in {len(byte_ranges)} byte ranges')
+        # ranges without lines have no rows to infer dtypes from, they would turn columns to object
+        return pd.concat([df for df in df_list if len(df)] or df_list[:1], ignore_index=True, sort=False)
+
+    def read_csv_range(
+        self,
+        bucket: str,
+        file_key: str,
+        byte_range: Tuple[int, int],
+        size: int,
+        columns: Optional[Dict[str, Optional[str]]] = None,
+        header: Optional[bytes] = None
+    ) -> pd.DataFrame:
+        """
+        Fetches and parses the lines of plain csv object which start within the byte range,
+        so ranges splitting the object at any offsets parse every line exactly once.
+        The line crossing the end of the range is completed with further ranged requests,
+        the header line is never parsed as data. Quoted values must not contain line breaks.
+
+        :param bucket: The name of the S3 bucket.
+        :param file_key: Key of object to load
+        :param byte_range: first and last (inclusive) byte of the range.
+        :param size: object size in bytes.
+        :param columns: The columns to load with their dtypes.
+        :param header: header line of the object, fetched when not provided.
+        :raises S3GetObjectError: When get_object failed
+        :return: The pandas DataFrame with data of the range.
+        """
+
+        header = header if header is not None else self.read_line(bucket, file_key, 0, size)
+        first, last = max(byte_range[0], len(header)), min(byte_range[1], size - 1)
+        data = b''
+        if first <= last:
+            # byte before the range tells whether a line starts at its first byte
+            data = self.get_object(bucket, file_key, byte_range=(first - 1, last))['Body'].read()
+            newline = data.find(b'\n')
+            data = data[newline + 1:] if newline >= 0 else b''
+            if data and not data.endswith(b'\n'):
+                data += self.read_line(bucket, file_key, last + 1, size)
+
+        return pd.read_csv(BytesIO(header + data), **read_csv_kwargs(columns))
+
+    def read_line(self, bucket: str, file_key: str, position: int, size: int) -> bytes:
+        """
+        Reads object from the position up to the end of the line, by ranged requests
+        of LINE_PROBE_SIZE bytes.
+
+        :param bucket: The name of the S3 bucket.
+        :param file_key: Key of object to read
+        :param position: first byte to read.
+        :param size: object size in bytes.
+        :raises S3GetObjectError: When get_object failed
+        :return: bytes up to and including line break, up to the end of the object when there is none
+        """
+
+        chunks = []
+        while position < size:
+            end = min(position + LINE_PROBE_SIZE, size)
+            data = self.get_object(bucket, file_key, byte_range=(position, end - 1))['Body'].read()
+            newline = data.find(b'\n')
+            if newline >= 0 or not data:
+                chunks.append(data[:newline + 1] if newline >= 0 else data)
+                break
+            chunks.append(data)
+            position += len(data)
+        return b''.join(chunks)
+
+    def iter_s3_chunks(
+        self,
+        bucket: str,
+        file_keys: List[str],
+        chunksize: int,
+        columns: Optional[Dict[str, Optional[str]]] = None
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Reads S3 objects as a stream of pandas dataframe chunks.
+        Each object Body is parsed incrementally, so no more than chunksize rows
+        are held in memory at a time, compressed objects are decompressed as they
+        are read. Parquet objects are read batch by batch through ranged requests.
+
+        :param bucket: The name of the S3 bucket.
+        :param file_keys: The list of full destination path for s3 objects to load.
+        :param chunksize: The maximum number of rows in a single chunk.
+        :param columns: The columns to load with their dtypes, see export_s3_to_df.
+        :return: Iterator over pandas DataFrame chunks in file_keys order.
+        """
+
+        for key in file_keys:
+            if get_file_format(key) == PARQUET:
+                with self.open_object(bucket, key) as file:
+                    yield from iter_parquet(file, chunksize, columns)
+                continue
+
+            obj = self.get_object(bucket=bucket, file_key=key)
+            with pd.read_csv(obj['Body'], chunksize=chunksize,
+                             **read_csv_kwargs(columns, get_compression(key))) as reader:
+                yield from reader
 
     def export_df_to_s3(
         self,
@@ -77,6 +491,8 @@ class S3Client():
     ) -> None:
         """
         Writes a pandas DataFrame to a CSV file and stores it in an AWS S3 bucket.
+        Parquet file is written instead when file_key has .parquet extension,
+        csv is compressed when file_key has .gz or .zst extension.
 
         
         :param bucket: The name of the S3 bucket.
@@ -90,27 +506,156 @@ class S3Client():
             print('No data to upload to s3')
             return
 
-        buffer = BytesIO()
-        df.to_csv(buffer, index=False)
-        self.put_object(bucket=bucket, file_key=file_key, body=buffer.getvalue())
+        with self.open_writer(bucket, file_key) as writer:
+            write_df(df, writer, get_file_format(file_key), get_compression(file_key))
+
+
+class S3Client(StorageClient):
+    """
+    Wrapper client class which provides custom functional interactions with AWS S3 via the
+    Boto3 Client
+    """
+
+    def __init__(
+        self,
+        config: Dict[str, Dict[str, str]],
+        max_workers: int = 1,
+        cache: Optional[S3ObjectCache] = None,
+        range_size: Optional[int] = None
+    ):
+        """
+        :param config: dictionary with aws credentials and region.
+        :param max_workers: number of objects to fetch and parse concurrently.
+            The client connection pool is sized to serve all workers at once.
+        :param cache: on-disk cache of objects content, objects are downloaded again
+            only when their ETag has changed.
+        :param range_size: plain csv objects larger than this number of bytes are fetched
+            and parsed in byte ranges by max_workers threads, see read_csv_range.
+        """
+        super().__init__(max_workers=max_workers, range_size=range_size)
+        self.cache = cache
+        self.client = self._create_client(config)
 
-    
+    def _create_client(self, config: Dict[str, Dict[str, str]]) -> BaseClient:
+        """
+        Creates boto3 S3 client with the connection pool sized to serve max_workers threads at once.
 
-    def get_object(self, bucket: str, file_key: str) -> dict:
+        :param config: dictionary with aws credentials and region.
+        :return: boto3 S3 client
+        """
+        aws_config = config['aws']
+        return client('s3',
+                      aws_access_key_id=aws_config['access_key_id'],
+                      aws_secret_access_key=aws_config['secret_access_key'],
+                      region_name=aws_config['region'],
+                      config=Config(
+                          max_pool_connections=max(self.max_workers, DEFAULT_MAX_POOL_CONNECTIONS)
+                      )
+                      )
+
+    def bucket_exist(self, name: str) -> bool:
+        """
+        bucket_exist Validates if a given bucket exists.
+
+        :param name: Name of the bucket to validate
+        :return: True when the bucket exists
+                 False when the bucket (i) don't exists (ii) lack of permission or (iii) client
+                 error
+        """
+        try:
+            self.client.head_bucket(Bucket=name)
+            return True
+        except ClientError:
+            return False
+
+    def _list_objects(
+        self,
+        bucket: str,
+        prefix: str,
+        delimiter: Optional[str] = None
+    ) -> Tuple[List[dict], List[str]]:
+        """
+        Lists all pages of objects in a bucket for given prefix.
+
+        :param bucket: the bucket name
+        :param prefix: the file prefix used to filter the resulting entries.
+        :param delimiter: when provided, keys are grouped by it into common prefixes.
+
+        :return: a tuple of objects entries and common prefixes.
+        """
+
+        kwargs = {'Bucket': bucket, 'Prefix': prefix}
+        if delimiter:
+            kwargs['Delimiter'] = delimiter
+
+        contents, common_prefixes = [], []
+        while True:
+            res = self.client.list_objects_v2(**kwargs)
+            if 'Contents' in res:
+                contents.extend(res['Contents'])
+            if 'CommonPrefixes' in res:
+                common_prefixes.extend(item['Prefix'] for item in res['CommonPrefixes'])
+            if 'NextContinuationToken' not in res:
+                return contents, common_prefixes
+            kwargs['ContinuationToken'] = res['NextContinuationToken']
+
+    def get_object(self, bucket: str, file_key: str, byte_range: Optional[Tuple[int, int]] = None) -> dict:
         """
         Gets S3 file content.
 
+        :param bucket: Bucket to get from
+        :param file_key: Key of object to get
+        :param byte_range: first and last (inclusive) byte to get, whole object when not provided
+        :raises S3GetObjectError: When get_object failed
+        :return: S3 object as a dictionary
+        """
+
+        if self.cache is not None and byte_range is None:
+            return self._get_cached_object(bucket, file_key)
+
+        kwargs = {'Bucket': bucket, 'Key': file_key}
+        if byte_range is not None:
+            kwargs['Range'] = f'bytes={byte_range[0]}-{byte_range[1]}'
+
+        try:
+            obj = self.client.get_object(**kwargs)
+        except ClientError as e:
+            raise S3GetObjectError(bucket, file_key) from e
+        self.transfer.add_downloaded(obj.get('ContentLength', 0))
+        return obj
+
+    def _get_cached_object(self, bucket: str, file_key: str) -> dict:
+        """
+        Gets S3 file content through the cache. When object is cached, conditional GET
+        with its ETag is sent and S3 answers 304 Not Modified without content if it is
+        still the same. Otherwise downloaded content is streamed to the cache.
+        Body of the result is memory-mapped cached file.
+
         :param bucket: Bucket to get from
         :param file_key: Key of object to get
         :raises S3GetObjectError: When get_object failed
         :return: S3 object as a dictionary
         """
 
+        etag = self.cache.get_etag(bucket, file_key)
+        kwargs = {'Bucket': bucket, 'Key': file_key}
+        if etag is not None:
+            kwargs['IfNoneMatch'] = etag
+
         try:
-            return self.client.get_object(Bucket=bucket, Key=file_key)
+            obj = self.client.get_object(**kwargs)
         except ClientError as e:
+            if etag is not None and _is_not_modified(e):
+                return {'Body': self.cache.open(bucket, file_key), 'ETag': etag}
             raise S3GetObjectError(bucket, file_key) from e
 
+        self.transfer.add_downloaded(obj.get('ContentLength', 0))
+        if obj.get('ContentLength', 0) > self.cache.max_size:
+            logger.warning(f'Object {file_key} is larger than the cache, it is not cached')
+            return obj
+
+        self.cache.put(bucket, file_key, obj['ETag'], obj['Body'])
+        return {**obj, 'Body': self.cache.open(bucket, file_key)}
 
     def put_object(self, bucket: str, file_key: str, body: bytes) -> dict:
         """
@@ -123,9 +668,288 @@ class S3Client():
         :return: Client response
         """
         try:
-            return self.client.put_object(Bucket=bucket, Key=file_key, Body=body)
+            res = self.client.put_object(Bucket=bucket, Key=file_key, Body=body)
         except ClientError as e:
             raise S3PutObjectError(bucket, file_key) from e
+        self.transfer.add_uploaded(len(body))
+        return res
+
+    def _get_size(self, bucket: str, file_key: str) -> int:
+        """Object size in bytes from its metadata"""
+        try:
+            return self.client.head_object(Bucket=bucket, Key=file_key)['ContentLength']
+        except ClientError as e:
+            raise S3GetObjectError(bucket, file_key) from e
+
+    def open_object(self, bucket: str, file_key: str) -> 'S3ObjectReader':
+        """
+        Opens S3 object as seekable read-only binary file backed by ranged GET requests.
+        Reads are not buffered, callers like parquet reader already request whole footer
+        and column chunks at once. With the cache, the memory-mapped cached copy is returned
+        instead, unless the object is larger than the cache and is not cached.
+
+        :param bucket: The name of the S3 bucket.
+        :param file_key: Key of object to open
+        :raises S3GetObjectError: When object metadata failed to load
+        :return: binary file
+        """
+
+        if self.cache is not None:
+            obj = self.get_object(bucket, file_key)
+            if obj.get('ContentLength', 0) <= self.cache.max_size:
+                # cached copy is memory-mapped, it is seekable already
+                return obj['Body']
+            # Body of object not cached is a stream, it is not read and ranged requests are used instead
+            obj['Body'].close()
+            return S3ObjectReader(self, bucket, file_key, obj['ContentLength'])
+
+        return S3ObjectReader(self, bucket, file_key, self._get_size(bucket, file_key))
+
+    def open_writer(self, bucket: str, file_key: str, part_size: int = DEFAULT_PART_SIZE) -> 'S3MultipartWriter':
+        """
+        Opens S3 object for writing as binary file, see S3MultipartWriter.
+
+        :param bucket: The name of the S3 bucket.
+        :param file_key: Key of object to write.
+        :param part_size: size of multipart upload parts in bytes.
+        :return: binary file, object is stored when it is closed
+        """
+
+        return S3MultipartWriter(self, bucket, file_key, part_size=part_size, max_workers=self.max_workers)
+
+    def _read_in_ranges(self, file_key: str) -> bool:
+        """Cached objects are read whole from their memory-mapped copy"""
+        return self.cache is None and super()._read_in_ranges(file_key)
+
+
+def split_ranges(obj: S3ObjectInfo, range_size: Optional[int]) -> List[Optional[Tuple[int, int]]]:
+    """
+    Splits object into byte ranges of range_size bytes which are fetched and parsed
+    independently, see S3Client.read_csv_range. Only plain csv objects are split.
+
+    :param obj: object with its size.
+    :param range_size: size of byte ranges, None to read objects whole.
+    :return: list of first and last (inclusive) byte of every range, [None] when object is read whole
+    """
+
+    if not range_size or obj.size <= range_size or not is_splittable(obj.key):
+        return [None]
+    return [(start, min(start + range_size, obj.size) - 1) for start in range(0, obj.size, range_size)]
+
+
+def _is_not_modified(error: ClientError) -> bool:
+    """Checks if conditional GET failed because object has not changed"""
+    return error.response.get('Error', {}).get('Code') in ('304', 'NotModified') \
+        or error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') == 304
+
+
+class S3ObjectReader(RawIOBase):
+    """
+    Seekable read-only binary file over S3 object, every read is a ranged GET request.
+    Lets columnar readers fetch only the parts of object they need.
+    """
+
+    def __init__(self, s3_client: S3Client, bucket: str, file_key: str, size: int):
+        """
+        :param s3_client: s3 client to get object ranges with.
+        :param bucket: The name of the S3 bucket.
+        :param file_key: Key of object to read.
+        :param size: object size in bytes.
+        """
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.file_key = file_key
+        self.size = size
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = SEEK_SET) -> int:
+        if whence == SEEK_SET:
+            self.position = offset
+        elif whence == SEEK_CUR:
+            self.position += offset
+        elif whence == SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence {whence}')
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        end = min(self.position + len(buffer), self.size)
+        if end <= self.position:
+            return 0
+
+        data = self.s3_client.get_object(self.bucket, self.file_key, byte_range=(self.position, end - 1))['Body'].read()
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+class S3MultipartWriter(RawIOBase):
+    """
+    Write-only binary file storing data as S3 object with multipart upload.
+    Written data is cut into parts which are uploaded by max_workers threads while
+    the caller keeps writing, at most max_workers parts are held in memory at a time.
+    Data smaller than a single part is stored with a single put_object call.
+    Used as a context manager, upload is completed on exit or aborted on error,
+    so no incomplete upload is left behind.
+    """
+
+    def __init__(
+        self,
+        s3_client: S3Client,
+        bucket: str,
+        file_key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_workers: int = 1
+    ):
+        """
+        :param s3_client: s3 client to upload parts with.
+        :param bucket: The name of the S3 bucket.
+        :param file_key: Key of object to write.
+        :param part_size: size of upload parts in bytes, at least MIN_PART_SIZE.
+        :param max_workers: number of parts to upload concurrently.
+        """
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.file_key = file_key
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.upload_id: Optional[str] = None
+        self._buffer = bytearray()
+        self._parts: Deque[Future] = deque()
+        self._uploaded: List[dict] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        if part_size < MIN_PART_SIZE:
+            super().close()
+            raise ValueError(f'Part size should be at least {MIN_PART_SIZE} bytes, got {part_size}')
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def close(self) -> None:
+        """
+        Uploads the rest of written data and completes the upload.
+
+        :raises S3PutObjectError: When any part or completion failed, the upload is aborted
+        :return: N/A
+        """
+        if self.closed:
+            return
+
+        try:
+            if self.upload_id is None:
+                self.s3_client.put_object(self.bucket, self.file_key, bytes(self._buffer))
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                self._complete()
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._buffer = bytearray()
+            super().close()
+
+    def abort(self) -> None:
+        """
+        Aborts the upload, parts uploaded so far are deleted by S3.
+
+        :return: N/A
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self.upload_id is not None:
+            try:
+                self.s3_client.client.abort_multipart_upload(
+                    Bucket=self.bucket, Key=self.file_key, UploadId=self.upload_id)
+            except ClientError:
+                logger.exception(f'Failed to abort multipart upload of {self.file_key}')
+            self.upload_id = None
+        self._buffer = bytearray()
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def _upload_part(self, body: bytes) -> None:
+        """
+        Submits part upload, waits for the oldest part when max_workers parts are in flight.
+
+        :param body: part data.
+        :raises S3PutObjectError: When upload could not be created or a part failed
+        :return: N/A
+        """
+        if self.upload_id is None:
+            try:
+                res = self.s3_client.client.create_multipart_upload(Bucket=self.bucket, Key=self.file_key)
+            except ClientError as e:
+                raise S3PutObjectError(self.bucket, self.file_key) from e
+            self.upload_id = res['UploadId']
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        while len(self._parts) >= self.max_workers:
+            self._uploaded.append(self._parts.popleft().result())
+
+        part_number = len(self._uploaded) + len(self._parts) + 1
+        self._parts.append(self._executor.submit(self._put_part, part_number, body))
+
+    def _put_part(self, part_number: int, body: bytes) -> dict:
+        """
+        Uploads single part.
+
+        :param part_number: number of the part, starting from 1.
+        :param body: part data.
+        :raises S3PutObjectError: When upload_part failed
+        :return: part number and ETag to complete the upload with
+        """
+        try:
+            res = self.s3_client.client.upload_part(
+                Bucket=self.bucket, Key=self.file_key, UploadId=self.upload_id, PartNumber=part_number, Body=body)
+        except ClientError as e:
+            raise S3PutObjectError(self.bucket, self.file_key) from e
+        self.s3_client.transfer.add_uploaded(len(body))
+        return {'PartNumber': part_number, 'ETag': res['ETag']}
+
+    def _complete(self) -> None:
+        """
+        Waits for parts in flight and completes the upload.
+
+        :raises S3PutObjectError: When any part or completion failed
+        :return: N/A
+        """
+        while self._parts:
+            self._uploaded.append(self._parts.popleft().result())
+        self._executor.shutdown()
+        self._executor = None
+
+        try:
+            self.s3_client.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.file_key, UploadId=self.upload_id,
+                MultipartUpload={'Parts': self._uploaded})
+        except ClientError as e:
+            raise S3PutObjectError(self.bucket, self.file_key) from e
+        self.upload_id = None
 
 
 # ==== Exceptions ====
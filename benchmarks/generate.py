@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+from typing import List, NamedTuple
+
+# Impressions of a single day are spread over all hours of it
+DAY = pd.Timestamp('2022-04-15')
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class DatasetSpec(NamedTuple):
+    """Shape of generated impressions dataset"""
+
+    rows: int
+    files: int = 1
+    duplicate_rate: float = 0.1
+    campaigns: int = 100
+    seed: int = 0
+
+
+def generate_impressions(spec: DatasetSpec) -> List[pd.DataFrame]:
+    """
+    Generates raw impressions files for benchmarks, same spec always gives the same data.
+    Duplicates repeat IMPRESSION_ID and IMPRESSION_DATETIME of another impression, like
+    impressions delivered more than once, and can land in a different file than the original.
+    About 1% of campaign ids are null.
+
+    :param spec: dataset shape.
+    :return: list of pandas dataframes, one per file, with raw impressions columns
+    """
+
+    rng = np.random.default_rng(spec.seed)
+    duplicates = int(spec.rows * spec.duplicate_rate)
+    unique = spec.rows - duplicates
+
+    impression_ids = np.arange(1, unique + 1, dtype=np.int64)
+    seconds = rng.integers(0, SECONDS_PER_DAY, unique)
+    campaign_ids = rng.integers(1, spec.campaigns + 1, unique).astype('float64')
+    campaign_ids[rng.random(unique) < 0.01] = np.nan
+
+    # duplicates copy whole rows of random originals
+    originals = rng.integers(0, unique, duplicates)
+    order = rng.permutation(spec.rows)
+    impression_ids = np.concatenate([impression_ids, impression_ids[originals]])[order]
+    seconds = np.concatenate([seconds, seconds[originals]])[order]
+    campaign_ids = np.concatenate([campaign_ids, campaign_ids[originals]])[order]
+
+    df = pd.DataFrame({
+        'IMPRESSION_ID': impression_ids,
+        'AGENCY_ID': rng.integers(6000, 7000, spec.rows).astype('float64'),
+        'ADVERTISER_ID': rng.integers(6000, 7000, spec.rows).astype('float64'),
+        'ORDER_ID': rng.integers(6000, 7000, spec.rows).astype('float64'),
+        'CAMPAIGN_ID': campaign_ids,
+        'IMPRESSION_DATETIME': (DAY + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S.000')
+    })
+
+    bounds = np.linspace(0, spec.rows, spec.files + 1).astype(int)
+    return [df.iloc[start:end].reset_index(drop=True) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """
+    Serializes generated file same way upstream does.
+
+    :param df: pandas dataframe with raw impressions.
+    :return: csv content
+    """
+
+    return df.to_csv(index=False).encode()
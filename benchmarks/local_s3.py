@@ -0,0 +1,152 @@
+import hashlib
+import threading
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from aws.object_cache import S3ObjectCache
+from aws.s3_client import S3Client
+
+# maximum number of keys returned by a single list_objects_v2 call, same as S3
+PAGE_SIZE = 1000
+
+
+class LocalS3():
+    """
+    In-process stand-in for boto3 S3 client, objects are kept in memory.
+    Implements the calls S3Client makes, with S3 pagination, ranged and conditional GET
+    and multipart upload semantics, so benchmarks measure the client code and not the network.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[str, Dict[str, bytes]] = {}
+        self.etags: Dict[Tuple[str, str], str] = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._uploads: Dict[str, Dict[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def create_bucket(self, Bucket: str) -> None:
+        self.buckets.setdefault(Bucket, {})
+
+    def head_bucket(self, Bucket: str) -> dict:
+        self._bucket(Bucket, 'HeadBucket')
+        return {}
+
+    def list_objects_v2(
+        self,
+        Bucket: str,
+        Prefix: str = '',
+        Delimiter: Optional[str] = None,
+        ContinuationToken: Optional[str] = None
+    ) -> dict:
+        keys = sorted(key for key in self._bucket(Bucket, 'ListObjectsV2') if key.startswith(Prefix))
+        contents, prefixes = [], []
+        for key in keys:
+            rest = key[len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                prefix = Prefix + rest[:rest.index(Delimiter) + 1]
+                if prefix not in prefixes:
+                    prefixes.append(prefix)
+            else:
+                contents.append(key)
+
+        start = int(ContinuationToken or 0)
+        page = contents[start:start + PAGE_SIZE]
+        res = {
+            'Contents': [{'Key': key, 'Size': len(self.buckets[Bucket][key]), 'ETag': self._etag(Bucket, key)}
+                         for key in page],
+            'CommonPrefixes': [{'Prefix': prefix} for prefix in prefixes]
+        }
+        if start + PAGE_SIZE < len(contents):
+            res['NextContinuationToken'] = str(start + PAGE_SIZE)
+        return res
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        body = self._object(Bucket, Key, 'HeadObject')
+        return {'ContentLength': len(body), 'ETag': self._etag(Bucket, Key)}
+
+    def get_object(self, Bucket: str, Key: str, Range: Optional[str] = None, IfNoneMatch: Optional[str] = None) -> dict:
+        body = self._object(Bucket, Key, 'GetObject')
+        etag = self._etag(Bucket, Key)
+        if IfNoneMatch == etag:
+            raise ClientError({'Error': {'Code': '304', 'Message': 'Not Modified'},
+                               'ResponseMetadata': {'HTTPStatusCode': 304}}, 'GetObject')
+        if Range is not None:
+            start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+            body = body[start:end + 1]
+
+        with self._lock:
+            self.bytes_sent += len(body)
+        return {'Body': BytesIO(body), 'ETag': etag, 'ContentLength': len(body)}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> dict:
+        self._store(Bucket, Key, bytes(Body), 'PutObject')
+        with self._lock:
+            self.bytes_received += len(Body)
+        return {'ETag': self._etag(Bucket, Key)}
+
+    def create_multipart_upload(self, Bucket: str, Key: str) -> dict:
+        self._bucket(Bucket, 'CreateMultipartUpload')
+        upload_id = f'{Bucket}/{Key}/{len(self._uploads)}'
+        self._uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket: str, Key: str, UploadId: str, PartNumber: int, Body: bytes) -> dict:
+        with self._lock:
+            self._uploads[UploadId][PartNumber] = bytes(Body)
+            self.bytes_received += len(Body)
+        return {'ETag': f'"{hashlib.md5(Body).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket: str, Key: str, UploadId: str, MultipartUpload: dict) -> dict:
+        parts = self._uploads.pop(UploadId)
+        body = b''.join(parts[part['PartNumber']] for part in MultipartUpload['Parts'])
+        self._store(Bucket, Key, body, 'CompleteMultipartUpload')
+        return {'ETag': self._etag(Bucket, Key)}
+
+    def abort_multipart_upload(self, Bucket: str, Key: str, UploadId: str) -> dict:
+        self._uploads.pop(UploadId, None)
+        return {}
+
+    def _bucket(self, bucket: str, operation: str) -> Dict[str, bytes]:
+        if bucket not in self.buckets:
+            raise ClientError({'Error': {'Code': 'NoSuchBucket'}}, operation)
+        return self.buckets[bucket]
+
+    def _object(self, bucket: str, key: str, operation: str) -> bytes:
+        objects = self._bucket(bucket, operation)
+        if key not in objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, operation)
+        return objects[key]
+
+    def _store(self, bucket: str, key: str, body: bytes, operation: str) -> None:
+        self._bucket(bucket, operation)[key] = body
+        self.etags[(bucket, key)] = f'"{hashlib.md5(body).hexdigest()}"'
+
+    def _etag(self, bucket: str, key: str) -> str:
+        return self.etags[(bucket, key)]
+
+
+class LocalS3Client(S3Client):
+    """S3Client talking to LocalS3 instead of AWS, no credentials needed"""
+
+    def __init__(
+        self,
+        local_s3: LocalS3,
+        max_workers: int = 1,
+        cache: Optional[S3ObjectCache] = None,
+        range_size: Optional[int] = None
+    ):
+        """
+        :param local_s3: in-process S3 stand-in with the objects.
+        :param max_workers: number of objects to fetch and parse concurrently.
+        :param cache: on-disk cache of objects content.
+        :param range_size: plain csv objects larger than this number of bytes are read in byte ranges.
+        """
+        self.local_s3 = local_s3
+        super().__init__({}, max_workers=max_workers, cache=cache, range_size=range_size)
+
+    def _create_client(self, config: Dict[str, Dict[str, str]]) -> LocalS3:
+        """LocalS3 stands in for boto3 client"""
+        return self.local_s3
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from benchmarks.generate import DatasetSpec, generate_impressions, to_csv_bytes
+from benchmarks.local_s3 import LocalS3, LocalS3Client
+from arrow_transformations import aggregate_impressions as arrow_aggregate_impressions
+from handler import _map_columns, process_data
+from transformations import IMPRESSIONS_DEDUP_COLUMNS, _is_valid_df, count_campaign_impressions, counts_to_df
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+BUCKET = 'benchmark-bucket'
+DATE_PARTITION = '2022-04-15'
+PREFIX = '2022/04/15'
+SCHEMA_PATH = 'schemas/impressions.yaml'
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+TRANSFORMATION_TYPE = 'aggregate_impressions'
+
+# slowdowns below this many seconds are timer noise, not regressions
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def time_stage(func: Callable[[], object], repeat: int) -> Tuple[Dict[str, float], object]:
+    """
+    Runs stage repeat times.
+
+    :param func: stage to run.
+    :param repeat: number of runs.
+    :return: tuple of timings (min, median and all runs in seconds) and result of the last run
+    """
+
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - start)
+    return {'min': min(runs), 'median': statistics.median(runs), 'runs': runs}, result
+
+
+def run_size(spec: DatasetSpec, repeat: int, max_workers: int, chunksize: int, map_processes: int) -> List[Dict]:
+    """
+    Benchmarks every process_data stage separately and the whole run end to end
+    on generated dataset stored in local S3 stand-in, on pandas and arrow engines.
+
+    :param spec: dataset shape.
+    :param repeat: number of runs of every stage.
+    :param max_workers: number of objects to fetch and parse concurrently.
+    :param chunksize: number of rows in a chunk for streaming run.
+    :param map_processes: number of worker processes for map/reduce run, they inherit local S3 stand-in
+        when forked.
+    :return: list of stage results
+    """
+
+    local_s3 = LocalS3()
+    local_s3.create_bucket(BUCKET)
+    for i, df in enumerate(generate_impressions(spec)):
+        local_s3.put_object(Bucket=BUCKET, Key=f'{PREFIX}/impressions_{i:04d}.csv', Body=to_csv_bytes(df))
+    input_bytes = local_s3.bytes_received
+    s3_client = LocalS3Client(local_s3, max_workers=max_workers)
+    columns = _map_columns(TRANSFORMATION_TYPE)
+
+    results = []
+
+    def record(stage: str, func: Callable[[], object]) -> object:
+        timings, result = time_stage(func, repeat)
+        results.append({'rows': spec.rows, 'stage': stage, **timings})
+        logger.info(f'{spec.rows} rows, {stage}: {timings["median"]:.4f}s')
+        return result
+
+    objects = record('list', lambda: s3_client.list_data_objects(BUCKET, PREFIX))
+    keys = [obj.key for obj in objects]
+    df = record('load', lambda: s3_client.export_s3_to_df(BUCKET, keys, columns=columns))
+    record('validate', lambda: _is_valid_df(df, SCHEMA_PATH))
+    deduped = record('dedup', lambda: df.drop_duplicates(subset=IMPRESSIONS_DEDUP_COLUMNS))
+    result = record('count', lambda: counts_to_df(count_campaign_impressions(deduped)))
+    record('upload', lambda: s3_client.export_df_to_s3(BUCKET, f'results/{PREFIX}/benchmark.csv', result))
+    table = record('load_arrow', lambda: s3_client.export_s3_to_table(BUCKET, keys, columns=columns))
+    record('transform_arrow', lambda: arrow_aggregate_impressions(table, SCHEMA_PATH))
+    record('process_data', lambda: process_data(
+        DATE_PARTITION, BUCKET, 'benchmark', TRANSFORMATION_TYPE, s3_client=s3_client))
+    record('process_data_arrow', lambda: process_data(
+        DATE_PARTITION, BUCKET, 'benchmark', TRANSFORMATION_TYPE, s3_client=s3_client, engine='arrow'))
+    record('process_data_streaming', lambda: process_data(
+        DATE_PARTITION, BUCKET, 'benchmark', TRANSFORMATION_TYPE, chunksize=chunksize, s3_client=s3_client))
+    record('process_data_map_reduce', lambda: process_data(
+        DATE_PARTITION, BUCKET, 'benchmark', TRANSFORMATION_TYPE, map_processes=map_processes, s3_client=s3_client))
+
+    for stage_result in results:
+        stage_result.update({'files': spec.files, 'input_bytes': input_bytes})
+    return results
+
+
+def run_startup(repeat: int) -> List[Dict]:
+    """
+    Benchmarks cold start of the client, `main.py --help` in a new interpreter,
+    which should not import pandas, boto3 or transformations.
+
+    :param repeat: number of runs.
+    :return: list with startup result
+    """
+
+    timings, _ = time_stage(
+        lambda: subprocess.run([sys.executable, MAIN_PATH, '--help'], stdout=subprocess.DEVNULL, check=True), repeat)
+    logger.info(f'cli startup: {timings["median"]:.4f}s')
+    return [{'rows': 0, 'stage': 'cli_startup', **timings}]
+
+
+def environment_changes(baseline: Dict[str, str], current: Dict[str, str]) -> List[str]:
+    """
+    Lists differences of environments which make timings not comparable, e.g. other machine or versions.
+
+    :param baseline: environment of the baseline.
+    :param current: environment of the current run.
+    :return: list of differences, empty when timings are comparable
+    """
+
+    return [f'{key} {baseline.get(key)} -> {value}' for key, value in current.items()
+            if key != 'timestamp' and baseline.get(key) != value]
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[Dict]:
+    """
+    Compares median timings of every stage with baseline.
+
+    :param results: current stage results.
+    :param baseline: baseline stage results.
+    :param tolerance: allowed relative slowdown, e.g. 0.2 for 20%.
+    :return: list of regressions with stage, rows, baseline and current median and their ratio
+    """
+
+    baseline_medians = {(result['rows'], result['stage']): result['median'] for result in baseline}
+    regressions = []
+    for result in results:
+        key = (result['rows'], result['stage'])
+        if key not in baseline_medians:
+            continue
+        before, after = baseline_medians[key], result['median']
+        ratio = after / before if before > 0 else float('inf')
+        logger.info(f'{result["rows"]} rows, {result["stage"]}: {before:.4f}s -> {after:.4f}s ({ratio:.2f}x)')
+        if ratio > 1 + tolerance and after - before > MIN_REGRESSION_SECONDS:
+            regressions.append({'rows': result['rows'], 'stage': result['stage'],
+                                'baseline': before, 'current': after, 'ratio': ratio})
+    return regressions
+
+
+def environment() -> Dict[str, str]:
+    """Describes where benchmark was run, timings are comparable only on the same environment"""
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpus': str(os.cpu_count()),
+        'pandas': pd.__version__,
+        'pyarrow': pa.__version__,
+        'numpy': np.__version__
+    }
+
+
+def main(
+        sizes: List[int],
+        files: int,
+        duplicate_rate: float,
+        campaigns: int,
+        seed: int,
+        repeat: int,
+        max_workers: int,
+        chunksize: int,
+        map_processes: int,
+        output: str,
+        baseline: Optional[str],
+        tolerance: float,
+        update_baseline: bool
+    ) -> bool:
+
+    results = run_startup(repeat)
+    for rows in sizes:
+        spec = DatasetSpec(rows=rows, files=files, duplicate_rate=duplicate_rate, campaigns=campaigns, seed=seed)
+        results.extend(run_size(spec, repeat, max_workers, chunksize, map_processes))
+
+    report = {
+        'environment': environment(),
+        'parameters': {'sizes': sizes, 'files': files, 'duplicate_rate': duplicate_rate, 'campaigns': campaigns,
+                       'seed': seed, 'repeat': repeat, 'max_workers': max_workers, 'chunksize': chunksize,
+                       'map_processes': map_processes},
+        'results': results
+    }
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    logger.info(f'Results are saved to {output}')
+
+    if baseline and update_baseline:
+        with open(baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        logger.info(f'Baseline {baseline} is updated')
+        return True
+
+    if baseline and os.path.exists(baseline):
+        with open(baseline) as file:
+            baseline_report = json.load(file)
+        changes = environment_changes(baseline_report['environment'], report['environment'])
+        if changes:
+            logger.warning(f'Baseline {baseline} was recorded in another environment, timings may differ '
+                           f'for reasons other than the code, re-record it with --update_baseline: {", ".join(changes)}')
+        regressions = compare(results, baseline_report['results'], tolerance)
+        for regression in regressions:
+            logger.error(f'Regression: {regression["rows"]} rows, {regression["stage"]} '
+                         f'{regression["baseline"]:.4f}s -> {regression["current"]:.4f}s ({regression["ratio"]:.2f}x)')
+        return not regressions
+
+    logger.warning('No baseline to compare with, save one with --update_baseline')
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of process_data stages on generated impressions.')
+
+    parser.add_argument('--sizes',
+                        type=str,
+                        default='100000,1000000',
+                        help='Comma separated numbers of impressions rows to benchmark.')
+
+    parser.add_argument('--files',
+                        type=int,
+                        default=4,
+                        help='Number of files the impressions are split into.')
+
+    parser.add_argument('--duplicate_rate',
+                        type=float,
+                        default=0.1,
+                        help='Share of rows which duplicate another impression.')
+
+    parser.add_argument('--campaigns',
+                        type=int,
+                        default=100,
+                        help='Number of distinct campaign ids.')
+
+    parser.add_argument('--seed',
+                        type=int,
+                        default=0,
+                        help='Random seed, same seed generates the same data.')
+
+    parser.add_argument('--repeat',
+                        type=int,
+                        default=3,
+                        help='Number of runs of every stage, median is compared.')
+
+    parser.add_argument('--max_workers',
+                        type=int,
+                        default=1,
+                        help='Number of files to fetch and parse concurrently.')
+
+    parser.add_argument('--chunksize',
+                        type=int,
+                        default=100000,
+                        help='Number of rows in a chunk for the streaming run.')
+
+    parser.add_argument('--map_processes',
+                        type=int,
+                        default=os.cpu_count(),
+                        help='Number of worker processes for the map/reduce run, number of cores by default.')
+
+    parser.add_argument('--output',
+                        type=str,
+                        default='benchmarks/results/latest.json',
+                        help='File to save results to.')
+
+    parser.add_argument('--baseline',
+                        type=str,
+                        default='benchmarks/baseline.json',
+                        help='Results to compare with, the run fails when any stage is slower than tolerance.')
+
+    parser.add_argument('--tolerance',
+                        type=float,
+                        default=0.2,
+                        help='Allowed relative slowdown of a stage, 0.2 by default.')
+
+    parser.add_argument('--update_baseline',
+                        action='store_true',
+                        help='Save results as the new baseline instead of comparing with it.')
+
+    args = parser.parse_args()
+    try:
+        sizes = [int(size) for size in args.sizes.split(',')]
+    except ValueError:
+        parser.error(f'--sizes argument should be comma separated numbers, got {args.sizes}')
+    if not 0 <= args.duplicate_rate < 1:
+        parser.error(f'--duplicate_rate argument should be in [0, 1) range, got {args.duplicate_rate}')
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    # stage messages of process_data would flood the report
+    for name in ('handler', 'transformations', 'arrow_transformations', 'metrics'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    succeeded = main(sizes, args.files, args.duplicate_rate, args.campaigns, args.seed, args.repeat,
+                     args.max_workers, args.chunksize, args.map_processes, args.output, args.baseline, args.tolerance,
+                     args.update_baseline)
+    if not succeeded:
+        sys.exit(1)
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Set, Tuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+class FingerprintDeduplicator():
+    """
+    Memory-bounded deduplication of rows arriving file by file or chunk by chunk.
+    Key columns of every row are hashed into 64-bit fingerprint, seen fingerprints are kept
+    in sorted numpy arrays (8 bytes per distinct key) instead of python objects.
+    Sorted runs are merged when they reach similar size, so inserts stay amortized O(n log n)
+    and lookups are binary searches over a logarithmic number of runs.
+    """
+
+    def __init__(self, columns: Tuple[str, ...], verify: bool = False):
+        """
+        :param columns: columns to deduplicate by.
+        :param verify: keep original key values and compare them for rows whose fingerprints
+            match, so fingerprint collisions never drop distinct rows. Costs memory
+            proportional to the number of distinct keys.
+        """
+        self.columns = list(columns)
+        self.verify = verify
+        self.collisions = 0
+        self._runs: List[np.ndarray] = []
+        self._keys: Dict[int, Set[tuple]] = {}
+
+    @property
+    def size(self) -> int:
+        """Number of distinct fingerprints seen"""
+        return sum(len(run) for run in self._runs)
+
+    @property
+    def collision_probability(self) -> float:
+        """
+        Probability that at least two of the distinct keys seen so far share a fingerprint
+        (birthday bound for 64-bit hashes)
+        """
+        size = self.size
+        return float(-np.expm1(-size * (size - 1) / 2.0 ** 65))
+
+    def to_array(self) -> np.ndarray:
+        """
+        Exports the seen-set, so it can be stored and loaded back with add.
+
+        :return: sorted numpy uint64 array with all fingerprints seen
+        """
+        if not self._runs:
+            return np.empty(0, dtype=np.uint64)
+
+        fingerprints = np.concatenate(self._runs)
+        fingerprints.sort()
+        return fingerprints
+
+    def fingerprint(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Hashes key columns of every row into 64-bit fingerprint.
+
+        :param df: pandas dataframe with key columns.
+        :return: numpy uint64 array with fingerprint of every row
+        """
+        return pd.util.hash_pandas_object(df[self.columns], index=False).to_numpy()
+
+    def contains(self, fingerprints: np.ndarray) -> np.ndarray:
+        """
+        Checks which fingerprints were already seen.
+
+        :param fingerprints: numpy uint64 array with fingerprints to check.
+        :return: numpy bool array, True when fingerprint was seen
+        """
+        found = np.zeros(len(fingerprints), dtype=bool)
+        for run in self._runs:
+            idx = np.searchsorted(run, fingerprints)
+            found |= run[np.minimum(idx, len(run) - 1)] == fingerprints
+        return found
+
+    def add(self, fingerprints: np.ndarray) -> None:
+        """
+        Adds fingerprints to the seen-set.
+
+        :param fingerprints: numpy uint64 array with unique fingerprints not seen before.
+        :return: N/A
+        """
+        if len(fingerprints) == 0:
+            return
+
+        self._runs.append(np.sort(fingerprints))
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            last = self._runs.pop()
+            merged = np.concatenate([self._runs.pop(), last])
+            # stable sort of two sorted runs is a linear merge
+            merged.sort(kind='stable')
+            self._runs.append(merged)
+
+    def filter(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Filters out rows with keys already seen in this or previous dataframes,
+        first occurrence of every key is kept. Keys of kept rows are added to the seen-set.
+
+        :param df: pandas dataframe to deduplicate.
+        :return: pandas dataframe with new rows only
+        """
+        fingerprints = self.fingerprint(df)
+
+        # first occurrence of every fingerprint within the dataframe which was not seen before
+        unique, first = np.unique(fingerprints, return_index=True)
+        seen = self.contains(unique)
+        is_new = np.zeros(len(df), dtype=bool)
+        is_new[first[~seen]] = True
+
+        if self.verify:
+            is_new = self._verify(df, fingerprints, is_new)
+
+        self.add(unique[~seen])
+        return df[is_new]
+
+    def _verify(self, df: pd.DataFrame, fingerprints: np.ndarray, is_new: np.ndarray) -> np.ndarray:
+        """
+        Compares original keys of rows whose fingerprints matched already seen ones,
+        rows with different keys are fingerprint collisions and are kept.
+
+        :param df: pandas dataframe to deduplicate.
+        :param fingerprints: numpy uint64 array with fingerprint of every row.
+        :param is_new: numpy bool array, True for rows with new fingerprints.
+        :return: numpy bool array, True for rows to keep
+        """
+        keys = list(zip(*(df[col].astype(object).where(df[col].notna(), None) for col in self.columns)))
+        is_new = is_new.copy()
+
+        for i in np.flatnonzero(is_new):
+            self._keys[int(fingerprints[i])] = {keys[i]}
+
+        for i in np.flatnonzero(~is_new):
+            seen_keys = self._keys[int(fingerprints[i])]
+            if keys[i] not in seen_keys:
+                logger.warning(f'Fingerprint collision for keys {keys[i]} and {next(iter(seen_keys))}')
+                seen_keys.add(keys[i])
+                is_new[i] = True
+                self.collisions += 1
+
+        return is_new
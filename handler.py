@@ -1,35 +1,343 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
 import pandas as pd
 
-from aws.s3_client import S3Client
-from transformations import parse_yaml, aggregate_impressions, other_transformation
+from aws.local_storage import LocalStorageClient
+from aws.s3_client import S3Client, S3ObjectInfo, StorageClient, split_ranges
+from aws.file_formats import CSV, get_file_extension
+from aws.object_cache import DEFAULT_CACHE_SIZE, S3ObjectCache
+from dedup import FingerprintDeduplicator
+from manifest import Manifest
+from metrics import RunMetrics, StageMetrics
+from planner import (
+    IN_MEMORY, MAP_REDUCE, STREAMING, ExecutionPlan, describe_execution, get_available_memory, plan_execution
+)
+from registry import (
+    PANDAS, check_modes, get_transformation, load_count_function, load_function, load_map_reduce
+)
+from shards import SHARD_BY, SHARD_BY_CAMPAIGN, SHARD_BY_KEY, SHARD_CHUNKSIZE, Shard, load_partials, save_partial
+from transformations import (
+    IMPRESSIONS_DEDUP_COLUMNS,
+    aggregate_reports,
+    aggregate_reports_stream,
+    parse_yaml,
+    count_impressions_stream,
+    counts_to_df,
+    get_schema_dtypes
+)
+
+# arrow tables are passed through to the arrow engine, pyarrow is needed for annotations only
+if TYPE_CHECKING:
+    import pyarrow
 
-import coloredlogs, logging
+import logging
 
-# Configure the logging
-coloredlogs.install()
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def _map_transformation(transformation_type: str, df: pd.DataFrame) -> pd.DataFrame:
+# s3 client shared by all partitions or files processed in the same worker process
+_worker_s3_client: Optional[StorageClient] = None
+
+
+class PartitionResult(NamedTuple):
+    """Outcome of processing single date partition in a backfill"""
+
+    date_partition: str
+    succeeded: bool
+    seconds: float
+    error: Optional[str] = None
+
+def _map_columns(transformation_type: str) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Get columns with their dtypes required by transformation type,
+    so only them are parsed when loading the data
+
+    :param transformation_type: transformation type to map with schema
+    :return: dictionary with columns and dtypes, None when all columns are needed
+
     """
-    Apply data transformation depending on transformation type
+    schema_path = get_transformation(transformation_type).schema_path
+    if schema_path is None:
+        return None
+    return get_schema_dtypes(schema_path)
+
+def _map_transformation(
+        transformation_type: str,
+        df: Union[pd.DataFrame, 'pyarrow.Table'],
+        metrics: Optional[RunMetrics] = None,
+        options: Optional[Dict[str, object]] = None,
+        engine: str = PANDAS
+    ) -> pd.DataFrame:
+    """
+    Apply data transformation depending on transformation type,
+    its module is imported on first use, see registry
 
     :param transformation_type: transformation type to map with function
+    :param df: pandas dataframe with raw data, arrow table for arrow engine
+    :param metrics: run metrics to record transformation stages in
+    :param options: keyword options of the transformation
+    :param engine: engine to run the transformation on, pandas or arrow
+    :return: pandas dataframe with transformed data
+
+    """
+    transform = load_function(transformation_type, options=options, engine=engine)
+    return transform(df, schema_path=get_transformation(transformation_type).schema_path, metrics=metrics)
+
+def _map_streaming_transformation(
+        transformation_type: str,
+        chunks: Iterable[pd.DataFrame],
+        verify_dedup: bool = False,
+        metrics: Optional[RunMetrics] = None,
+        options: Optional[Dict[str, object]] = None
+    ) -> pd.DataFrame:
+    """
+    Apply streaming data transformation depending on transformation type
+
+    :param transformation_type: transformation type to map with function
+    :param chunks: iterable of pandas dataframes with raw data
+    :param verify_dedup: verify dedup keys of rows with colliding fingerprints
+    :param metrics: run metrics to record transformation stages in
+    :param options: keyword options of the transformation
+    :return: pandas dataframe with transformed data
+
+    """
+    transform = load_function(transformation_type, streaming=True, options=options)
+    return transform(chunks, schema_path=get_transformation(transformation_type).schema_path,
+                     verify_dedup=verify_dedup, metrics=metrics)
+
+def _map_shared_columns(transformation_types: List[str]) -> Optional[Dict[str, Optional[str]]]:
+    """
+    Get union of columns with their dtypes required by transformation types sharing a scan
+
+    :param transformation_types: transformation types to map with schemas
+    :return: dictionary with columns and dtypes, None when all columns are needed
+
+    """
+    columns = {}
+    for transformation_type in transformation_types:
+        transformation_columns = _map_columns(transformation_type)
+        if transformation_columns is None:
+            return None
+        columns.update(transformation_columns)
+    return columns
+
+def _map_shared_transformations(
+        transformation_types: List[str],
+        data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+        streaming: bool = False,
+        verify_dedup: bool = False,
+        metrics: Optional[RunMetrics] = None
+    ) -> Dict[str, pd.DataFrame]:
+    """
+    Apply several transformations in a single scan: data are validated against schemas
+    of all of them and deduplicated once, then counted by every transformation, see aggregate_reports
+
+    :param transformation_types: transformation types, all of them need count function
+    :param data: pandas dataframe with raw data or iterable of its chunks in streaming mode
+    :param streaming: data is an iterable of chunks
+    :param verify_dedup: verify dedup keys of rows with colliding fingerprints in streaming mode
+    :param metrics: run metrics to record transformation stages in
+    :return: pandas dataframe with transformed data by transformation type
+
+    """
+    count_functions = {transformation_type: load_count_function(transformation_type)
+                       for transformation_type in transformation_types}
+    schema_paths = tuple(get_transformation(transformation_type).schema_path
+                         for transformation_type in transformation_types)
+    if streaming:
+        return aggregate_reports_stream(data, schema_paths, count_functions, verify_dedup=verify_dedup,
+                                        metrics=metrics)
+    return aggregate_reports(data, schema_paths, count_functions, metrics=metrics)
+
+def _map_reduce_transformation(
+        transformation_type: str,
+        bucket_name: str,
+        objects: List[S3ObjectInfo],
+        columns: Optional[Dict[str, Optional[str]]],
+        map_processes: int,
+        max_workers: int = 1,
+        cache_dir: Optional[str] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        s3_client: Optional[StorageClient] = None,
+        metrics: Optional[RunMetrics] = None,
+        options: Optional[Dict[str, object]] = None,
+        range_size: Optional[int] = None,
+        storage_root: Optional[str] = None
+    ) -> pd.DataFrame:
+    """
+    Apply map/reduce transformation depending on transformation type.
+    Every object is downloaded, parsed and mapped on a pool of worker processes,
+    so parsing and transformation use all cores. Objects larger than range_size
+    are split into byte ranges mapped by different workers as separate partial results.
+    Map results are reduced here in objects order as they arrive, while workers map next objects.
+
+    :param transformation_type: transformation type to map with functions
+    :param bucket_name: the s3 bucket name with files to process
+    :param objects: objects to process
+    :param columns: columns required by transformation with their dtypes
+    :param map_processes: number of worker processes
+    :param max_workers: number of threads of s3 client in every worker process
+    :param cache_dir: directory to cache downloaded objects in, shared by all workers
+    :param cache_size: maximum total size of cached objects in bytes
+    :param s3_client: s3 client for workers to reuse, it is inherited by forked workers,
+        by default every worker creates its own
+    :param metrics: run metrics to merge workers stages and record reduce stage in
+    :param options: keyword options of the map function
+    :param range_size: split plain csv objects larger than this number of bytes into byte ranges
+    :param storage_root: local directory for workers to use instead of S3
     :return: pandas dataframe with transformed data
 
     """
-    if transformation_type == 'aggregate_impressions':
-        return aggregate_impressions(df, schema_path='schemas/impressions.yaml')
-    elif transformation_type == 'other':
-        return other_transformation()
+    metrics = metrics if metrics is not None else RunMetrics()
+    _, reduce_function = load_map_reduce(transformation_type)
+    map_object = partial(_map_object, bucket_name=bucket_name, transformation_type=transformation_type,
+                         columns=columns, options=options)
+    tasks = [(obj, byte_range) for obj in objects for byte_range in split_ranges(obj, range_size)]
+    if len(tasks) > len(objects):
+        metrics.labels.update(map_tasks=len(tasks))
+
+    with ProcessPoolExecutor(max_workers=min(map_processes, len(tasks)),
+                             initializer=_init_worker,
+                             initargs=(max_workers, cache_dir, cache_size, s3_client, None, storage_root)) as executor:
+        def map_results():
+            for result, stages in executor.map(map_object, *zip(*tasks)):
+                metrics.merge(stages)
+                yield result
+
+        try:
+            return reduce_function(map_results(), metrics=metrics)
+        except BaseException:
+            # do not wait for the objects not mapped yet
+            executor.shutdown(cancel_futures=True)
+            raise
+
+def _map_object(
+        obj: S3ObjectInfo,
+        byte_range: Optional[Tuple[int, int]],
+        bucket_name: str,
+        transformation_type: str,
+        columns: Optional[Dict[str, Optional[str]]],
+        options: Optional[Dict[str, object]] = None
+    ) -> Tuple[object, Dict[str, StageMetrics]]:
+    """
+    Map step run in worker process: download and parse single object or its byte range
+    with the worker s3 client and apply map function of the transformation
+
+    :param obj: object to map.
+    :param byte_range: first and last byte of the object range to map, None to map whole object.
+    :param bucket_name: the s3 bucket name with the object.
+    :param transformation_type: transformation type to map with function.
+    :param columns: columns required by transformation with their dtypes.
+    :param options: keyword options of the map function.
+    :return: tuple of map result and metrics of the worker stages
+
+    """
+    metrics = RunMetrics()
+    downloaded = _worker_s3_client.transfer.downloaded
+    with metrics.stage('load') as stage:
+        if byte_range is None:
+            df = _worker_s3_client.export_s3_to_df(bucket_name, [obj.key], columns=columns, sizes={obj.key: obj.size})
+        else:
+            df = _worker_s3_client.read_csv_range(bucket_name, obj.key, byte_range, obj.size, columns=columns)
+        stage.rows_out += len(df)
+        stage.bytes += _worker_s3_client.transfer.downloaded - downloaded
+
+    map_function, _ = load_map_reduce(transformation_type, options)
+    result = map_function(df, schema_path=get_transformation(transformation_type).schema_path, metrics=metrics)
+    return result, metrics.stages
+
+def _aggregate_incremental(
+        transformation_type: str,
+        s3_client: StorageClient,
+        bucket_name: str,
+        objects: List[S3ObjectInfo],
+        result_key: str,
+        columns: Dict[str, Optional[str]],
+        chunksize: Optional[int] = None,
+        metrics: Optional[RunMetrics] = None
+    ) -> Optional[Tuple[pd.DataFrame, Manifest, np.ndarray]]:
+    """
+    Aggregate impressions of objects not processed yet and merge them into the existing result.
+    Uses the manifest stored next to the result: new objects are deduplicated against
+    fingerprints of already processed ones and their counts are added to the recorded ones.
+    When any processed object was changed or removed, all objects are processed again,
+    because its contribution can not be subtracted from the deduplicated result.
+
+    :param transformation_type: transformation type, has to support incremental mode.
+    :param s3_client: s3 client to load data with.
+    :param bucket_name: the s3 bucket name with files to process.
+    :param objects: objects listed for the date partition.
+    :param result_key: key of the result object.
+    :param columns: columns required by transformation with their dtypes.
+    :param chunksize: when provided, files are streamed in chunks of this number of rows.
+    :param metrics: run metrics to record load and transformation stages in.
+    :return: tuple of transformed dataframe, updated manifest and fingerprints of all
+        dedup keys seen, None when nothing has changed since the last run
+
+    """
+    schema_path = get_transformation(transformation_type).schema_path
+    deduplicator = FingerprintDeduplicator(IMPRESSIONS_DEDUP_COLUMNS)
+    metrics = metrics if metrics is not None else RunMetrics()
+
+    manifest = Manifest.load(s3_client, bucket_name, result_key)
+    if manifest is None:
+        manifest, new_objects = Manifest(), objects
     else:
-        raise ValueError(f'Wrong transformation_type {transformation_type}')
+        new_objects, stale_keys = manifest.diff(objects)
+        if not new_objects and not stale_keys:
+            return None
+        if stale_keys:
+            logger.warning(f'Files changed or removed since last run: {stale_keys}, processing all files again')
+            manifest, new_objects = Manifest(), objects
+        else:
+            deduplicator.add(manifest.load_fingerprints(s3_client, bucket_name, result_key))
+
+    logger.info(f'Files to aggregate incrementally: {[obj.key for obj in new_objects]}')
+    for obj in new_objects:
+        if chunksize:
+            chunks = s3_client.iter_s3_chunks(bucket_name, [obj.key], chunksize, columns=columns)
+        else:
+            # loaded lazily, so loading is timed as load stage
+            chunks = (s3_client.export_s3_to_df(bucket_name, [key], columns=columns, sizes={key: obj.size})
+                      for key in [obj.key])
+        chunks = metrics.iter_stage('load', chunks)
+        manifest.add_object(obj, count_impressions_stream(chunks, schema_path, deduplicator, metrics=metrics))
+
+    transformed_df = counts_to_df(manifest.counts(columns.get('CAMPAIGN_ID')))
+    return transformed_df, manifest, deduplicator.to_array()
 
 def process_data(
         date_partition: str,
         bucket_name: str,
         initials: str,
-        transformation_type: str
+        transformation_type: Union[str, Sequence[str]],
+        chunksize: Optional[int] = None,
+        max_workers: int = 1,
+        list_fan_out: bool = False,
+        verify_dedup: bool = False,
+        s3_client: Optional[StorageClient] = None,
+        incremental: bool = False,
+        output_format: str = CSV,
+        output_compression: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        metrics_file: Optional[str] = None,
+        statsd_address: Optional[str] = None,
+        map_processes: Optional[int] = None,
+        shard: Optional[Shard] = None,
+        shard_by: str = SHARD_BY_KEY,
+        merge: bool = False,
+        hll_precision: Optional[int] = None,
+        range_size: Optional[int] = None,
+        storage_root: Optional[str] = None,
+        engine: str = PANDAS,
+        auto: bool = False,
+        dry_run: bool = False,
+        memory_limit: Optional[int] = None
     ) -> None:
     """
     Load s3 object for given partition date to pandas dataframe.
@@ -39,38 +347,519 @@ def process_data(
     :param date_partition: the date partition use to process file or files.
     :param bucket_name: the s3 bucket name with files to process.
     :param initials: initials to use in result filename.
+    :param transformation_type: transformation type to apply on data, or several of them
+        to compute from a single scan of the data, each of them stored as a separate result.
+    :param chunksize: when provided, files are streamed and transformed in chunks
+        of this number of rows instead of being loaded in memory at once.
+    :param max_workers: number of s3 objects to download and parse concurrently.
+    :param list_fan_out: list sub-prefixes of the date partition in parallel.
+    :param verify_dedup: in streaming mode, compare original dedup keys of rows
+        with colliding fingerprints instead of trusting 64-bit hashes.
+    :param s3_client: already created s3 client to reuse, by default a new one is created.
+    :param incremental: aggregate only files not processed by previous runs and merge them
+        into existing result, using the manifest stored next to it.
+    :param output_format: format of the result file, csv or parquet.
+    :param output_compression: compression of csv result file, gzip or zstd.
+    :param cache_dir: directory to cache downloaded objects in, see S3ObjectCache.
+    :param cache_size: maximum total size of cached objects in bytes.
+    :param metrics_file: file to append json metrics record of the run to.
+    :param statsd_address: host:port of StatsD UDP sink to push metrics of the run to.
+    :param map_processes: when provided, every object is downloaded, parsed and mapped to partial
+        results in a pool of this number of worker processes and the results are reduced
+        in this process, see map_impressions and reduce_impressions.
+    :param shard: when provided, only the objects or rows assigned to this shard are mapped
+        and partial results are stored next to the result instead of the result itself, see shards.
+    :param shard_by: assign objects to shards by hash of their key, or rows by hash of CAMPAIGN_ID.
+    :param merge: reduce partial results stored by all shards into the result.
+    :param hll_precision: precision of HyperLogLog sketches of approximate transformations.
+    :param range_size: plain csv objects larger than this number of bytes are split into byte ranges
+        downloaded and parsed concurrently by max_workers threads and stitched together,
+        in map/reduce mode the ranges are mapped by worker processes as separate partial results.
+    :param storage_root: read and write objects in this local directory instead of S3,
+        with a sub-directory per bucket, see LocalStorageClient.
+    :param engine: engine to parse and transform the data on, pandas or arrow. Arrow engine parses csv
+        with multithreaded arrow reader and transforms the table with acero plans, in in-memory mode only,
+        see arrow_transformations.
+    :param auto: choose in-memory, streaming or map/reduce mode, number of workers and chunk size
+        from object sizes of the listing and available memory, see planner.plan_execution.
+    :param dry_run: list the objects and log execution plan with its estimated memory,
+        without downloading anything.
+    :param memory_limit: memory in bytes the plan may use, detected from the system when not provided.
+
+    """
+
+    transformation_types = [transformation_type] if isinstance(transformation_type, str) \
+        else list(dict.fromkeys(transformation_type))
+    if shard_by not in SHARD_BY:
+        raise ValueError(f'Shard_by should be one of {SHARD_BY}, got {shard_by}')
+    options = {'precision': hll_precision} if hll_precision is not None else {}
+    check_modes(transformation_types, chunksize=chunksize, incremental=incremental, map_processes=map_processes,
+                shard=shard is not None, merge=merge, engine=engine, auto=auto, dry_run=dry_run, options=options)
+
+    # wall time, bytes, rows and memory of every stage, emitted at the end of the run whatever its outcome
+    mode = 'incremental' if incremental else 'streaming' if chunksize else 'map_reduce' if map_processes \
+        else 'shard' if shard is not None else 'merge' if merge else 'auto' if auto else 'in_memory'
+    metrics = RunMetrics(date_partition=date_partition, bucket_name=bucket_name,
+                         transformation_type=','.join(transformation_types), mode=mode)
+    if shard is not None:
+        metrics.labels.update(shard=f'{shard.index}/{shard.count}', shard_by=shard_by)
+    if engine != PANDAS:
+        metrics.labels.update(engine=engine)
+    if dry_run:
+        metrics.labels.update(dry_run=True)
+    succeeded = False
+    try:
+        _process_data(date_partition, bucket_name, initials, transformation_types, metrics, chunksize, max_workers,
+                      list_fan_out, verify_dedup, s3_client, incremental, output_format, output_compression,
+                      cache_dir, cache_size, map_processes, shard, shard_by, merge, options, range_size,
+                      storage_root, engine, auto, dry_run, memory_limit)
+        succeeded = True
+    finally:
+        metrics.emit(succeeded, metrics_file=metrics_file, statsd_address=statsd_address)
 
+def _process_data(
+        date_partition: str,
+        bucket_name: str,
+        initials: str,
+        transformation_types: List[str],
+        metrics: RunMetrics,
+        chunksize: Optional[int] = None,
+        max_workers: int = 1,
+        list_fan_out: bool = False,
+        verify_dedup: bool = False,
+        s3_client: Optional[StorageClient] = None,
+        incremental: bool = False,
+        output_format: str = CSV,
+        output_compression: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        map_processes: Optional[int] = None,
+        shard: Optional[Shard] = None,
+        shard_by: str = SHARD_BY_KEY,
+        merge: bool = False,
+        options: Optional[Dict[str, object]] = None,
+        range_size: Optional[int] = None,
+        storage_root: Optional[str] = None,
+        engine: str = PANDAS,
+        auto: bool = False,
+        dry_run: bool = False,
+        memory_limit: Optional[int] = None
+    ) -> None:
     """
+    Runs process_data stages and records them in run metrics, see process_data
+
+    :param transformation_types: transformation types to apply on data, several ones share a single scan.
+    :param metrics: run metrics to record stages in.
+    :param options: keyword options of the transformation.
+    :param range_size: split plain csv objects larger than this number of bytes into byte ranges.
+    :param storage_root: local directory to use instead of S3.
+    :param engine: engine to parse and transform the data on, pandas or arrow.
+    :param auto: choose execution mode and its settings from the listing.
+    :param dry_run: log execution plan and stop before downloading.
+    :param memory_limit: memory in bytes the plan may use.
+
+    """
+
+    # map/reduce workers reuse s3 client only when it was given, otherwise they create their own
+    workers_s3_client = s3_client
 
     # set up s3 client
-    s3_client = S3Client(parse_yaml('config.yaml'))
+    if s3_client is None:
+        s3_client = _create_s3_client(max_workers, cache_dir, cache_size, range_size, storage_root)
 
     # check if bucket name is valid
     if not s3_client.bucket_exist(bucket_name):
         logger.error(f'No bucket exist with name {bucket_name}')
         raise ValueError(f'No bucket exist with name {bucket_name}')
     
-    # get file keys for given date
     prefix = '/'.join(date_partition.split('-'))
-    object_keys = s3_client.get_csv_file_list(bucket_name, prefix)
-    if len(object_keys) == 0:
-        logger.error(f'No files to process with prefix {prefix}')
-        raise ValueError(f'No files to process with prefix {prefix}')
+    transformation_type = transformation_types[0]
+    shared = len(transformation_types) > 1
 
-    logger.info(f'Files to process: {object_keys}')
+    # parse only the columns transformations need
+    columns = _map_shared_columns(transformation_types) if shared else _map_columns(transformation_type)
 
-    # export objects content to single dataframe
-    df = s3_client.export_s3_to_df(bucket_name, object_keys)
-    
-    #transform data
-    transformed_df = _map_transformation(transformation_type, df)
-    if transformed_df.empty:
-        logger.warning('No data to upload to s3')
+    export_object_keys = {
+        name: 'results/{prefix}/{result_name}_{date}_{initials}.{extension}'.format(
+            prefix = prefix, result_name = get_transformation(name).result_name,
+            date = ''.join(date_partition.split('-')), initials = initials,
+            extension = get_file_extension(output_format, output_compression))
+        for name in transformation_types
+    }
+    export_object_key = export_object_keys[transformation_type]
+
+    if merge:
+        # shards already listed and mapped the objects, reduce their partial results only
+        _, reduce_function = load_map_reduce(transformation_type)
+        with metrics.stage('load') as stage:
+            downloaded = s3_client.transfer.downloaded
+            partials = load_partials(s3_client, bucket_name, export_object_key, (columns or {}).get('CAMPAIGN_ID'))
+            stage.bytes += s3_client.transfer.downloaded - downloaded
+        metrics.labels.update(shards=len(partials))
+    else:
+        # get file keys for given date
+        with metrics.stage('list'):
+            objects = s3_client.list_data_objects(bucket_name, prefix, fan_out=list_fan_out)
+        metrics.labels.update(objects=len(objects), objects_bytes=sum(obj.size for obj in objects))
+        if len(objects) == 0:
+            logger.error(f'No files to process with prefix {prefix}')
+            raise ValueError(f'No files to process with prefix {prefix}')
+
+        if shard is not None and shard_by == SHARD_BY_KEY:
+            objects = shard.select_objects(objects)
+            metrics.labels.update(shard_objects=len(objects))
+
+        object_keys = [obj.key for obj in objects]
+        # listed sizes spare a HEAD request per object split into byte ranges
+        sizes = {obj.key: obj.size for obj in objects}
+        logger.info(f'Files to process: {object_keys}, total size {sum(obj.size for obj in objects)} bytes')
+
+        if auto or dry_run:
+            plan = _plan_execution(transformation_types, objects, auto, chunksize, max_workers, map_processes,
+                                   incremental, engine, range_size, memory_limit)
+            metrics.labels.update(estimated_memory=plan.estimated_memory)
+            if auto:
+                # explicitly set number of workers takes precedence, a given client keeps its own
+                # as its connection pool is sized already
+                chunksize, map_processes = plan.chunksize, plan.map_processes
+                if workers_s3_client is not None:
+                    max_workers = s3_client.max_workers
+                elif max_workers == 1:
+                    max_workers = plan.max_workers
+                metrics.labels.update(mode='incremental' if incremental else plan.mode, planned_mode=plan.mode)
+            if dry_run:
+                logger.info(f'Dry run, execution plan: {plan.describe()}')
+                return
+            logger.info(f'Execution plan: {plan.describe()}')
+            if max_workers != s3_client.max_workers:
+                # connection pool is sized when the client is created, the listing client is replaced
+                # by one serving the planned number of workers
+                s3_client = _create_s3_client(max_workers, cache_dir, cache_size, range_size, storage_root)
+
+    # download and parsing are one stage, objects content is streamed into the parser
+    downloaded = s3_client.transfer.downloaded
+    if merge:
+        transformed_df = reduce_function(partials, metrics=metrics)
+    elif shard is not None:
+        # map objects or rows of the shard and store partial counts for merge run
+        _map_shard(transformation_type, shard, shard_by, bucket_name, object_keys, columns, export_object_key,
+                   s3_client, metrics, options, sizes)
         return
+    elif shared:
+        # download and parse once, transformations share validation, dedup and the data
+        if chunksize:
+            data = metrics.iter_stage('load', s3_client.iter_s3_chunks(bucket_name, object_keys, chunksize,
+                                                                       columns=columns))
+        else:
+            with metrics.stage('load') as stage:
+                data = s3_client.export_s3_to_df(bucket_name, object_keys, columns=columns, sizes=sizes)
+                stage.rows_out += len(data)
+        results = _map_shared_transformations(transformation_types, data, streaming=bool(chunksize),
+                                              verify_dedup=verify_dedup, metrics=metrics)
+        metrics.get_stage('load').bytes += s3_client.transfer.downloaded - downloaded
+    elif incremental:
+        if not get_transformation(transformation_type).incremental:
+            raise ValueError(f'Transformation_type {transformation_type} does not support incremental mode')
+
+        # merge files not processed yet into the existing result
+        update = _aggregate_incremental(transformation_type, s3_client, bucket_name, objects, export_object_key,
+                                        columns, chunksize, metrics=metrics)
+        metrics.get_stage('load').bytes += s3_client.transfer.downloaded - downloaded
+        if update is None:
+            logger.info(f'No new or changed files since last run, {export_object_key} is up to date')
+            return
+        transformed_df, manifest, fingerprints = update
+    elif chunksize:
+        # stream objects content in chunks and transform them on the fly
+        chunks = s3_client.iter_s3_chunks(bucket_name, object_keys, chunksize, columns=columns)
+        transformed_df = _map_streaming_transformation(transformation_type, metrics.iter_stage('load', chunks),
+                                                       verify_dedup=verify_dedup, metrics=metrics, options=options)
+        metrics.get_stage('load').bytes += s3_client.transfer.downloaded - downloaded
+    elif map_processes:
+        # download, parse and map every object in worker processes, reduce results here
+        transformed_df = _map_reduce_transformation(transformation_type, bucket_name, objects, columns,
+                                                    map_processes, max_workers, cache_dir, cache_size,
+                                                    workers_s3_client, metrics, options, range_size, storage_root)
+    else:
+        # export objects content to single dataframe, or arrow table for arrow engine
+        with metrics.stage('load') as stage:
+            if engine == PANDAS:
+                df = s3_client.export_s3_to_df(bucket_name, object_keys, columns=columns, sizes=sizes)
+            else:
+                df = s3_client.export_s3_to_table(bucket_name, object_keys, columns=columns)
+            stage.rows_out += len(df)
+            stage.bytes += s3_client.transfer.downloaded - downloaded
+
+        #transform data
+        transformed_df = _map_transformation(transformation_type, df, metrics=metrics, options=options, engine=engine)
+
+    if not shared:
+        results = {transformation_type: transformed_df}
+
+    for name, transformed_df in results.items():
+        if transformed_df.empty:
+            logger.warning('No data to upload to s3' + (f' for {name}' if shared else ''))
+            if incremental:
+                # processed files are recorded even without impressions, so they are not loaded again
+                manifest.save(s3_client, bucket_name, export_object_key, fingerprints)
+            continue
+
+        # save transformed data to s3
+        with metrics.stage('upload') as stage:
+            uploaded = s3_client.transfer.uploaded
+            s3_client.export_df_to_s3(bucket_name, export_object_keys[name], transformed_df)
+            if incremental:
+                manifest.save(s3_client, bucket_name, export_object_key, fingerprints)
+            stage.rows_in += len(transformed_df)
+            stage.bytes += s3_client.transfer.uploaded - uploaded
+
+        logger.info(f'Data is SUCCESSFULLY processed and saved in s3 with prefix {export_object_keys[name]}')
+
+def _map_shard(
+        transformation_type: str,
+        shard: Shard,
+        shard_by: str,
+        bucket_name: str,
+        object_keys: List[str],
+        columns: Optional[Dict[str, Optional[str]]],
+        result_key: str,
+        s3_client: StorageClient,
+        metrics: RunMetrics,
+        options: Optional[Dict[str, object]] = None,
+        sizes: Optional[Dict[str, int]] = None
+    ) -> None:
+    """
+    Maps objects or rows assigned to the shard to partial results and stores them next to the result,
+    a shard without objects or rows stores empty partial, so merge run knows it is done.
+    When sharded by CAMPAIGN_ID, objects are streamed in chunks and only rows of the shard are kept.
+
+    :param transformation_type: transformation type, has to support map/reduce mode.
+    :param shard: shard to map.
+    :param shard_by: objects are assigned to shards by key, or rows by CAMPAIGN_ID.
+    :param bucket_name: the s3 bucket name with files to process.
+    :param object_keys: keys of the objects of the shard, all objects when sharded by CAMPAIGN_ID.
+    :param columns: columns with their dtypes to parse.
+    :param result_key: key of the result object partials are stored next to.
+    :param s3_client: s3 client to load objects and store partial with.
+    :param metrics: run metrics to record stages in.
+    :param options: keyword options of the map function.
+    :param sizes: listed sizes of the objects by key.
+
+    """
+    map_function, _ = load_map_reduce(transformation_type, options)
+
+    partial_result = None
+    if object_keys:
+        with metrics.stage('load') as stage:
+            downloaded = s3_client.transfer.downloaded
+            if shard_by == SHARD_BY_CAMPAIGN:
+                # every shard reads all objects, rows of other shards are dropped as soon as they are parsed
+                chunks = s3_client.iter_s3_chunks(bucket_name, object_keys, SHARD_CHUNKSIZE, columns=columns)
+                slices = [shard.filter_rows(chunk) for chunk in chunks]
+                df = pd.concat(slices, ignore_index=True) if slices else None
+            else:
+                df = s3_client.export_s3_to_df(bucket_name, object_keys, columns=columns, sizes=sizes)
+            stage.rows_out += len(df) if df is not None else 0
+            stage.bytes += s3_client.transfer.downloaded - downloaded
+        if df is not None:
+            partial_result = map_function(df, schema_path=get_transformation(transformation_type).schema_path,
+                                          metrics=metrics)
+
+    with metrics.stage('upload') as stage:
+        uploaded = s3_client.transfer.uploaded
+        key = save_partial(s3_client, bucket_name, result_key, shard, shard_by, partial_result)
+        stage.bytes += s3_client.transfer.uploaded - uploaded
+
+    logger.info(f'Shard {shard.index}/{shard.count} is SUCCESSFULLY mapped and saved in s3 with prefix {key}')
+
+def _plan_execution(
+        transformation_types: List[str],
+        objects: List[S3ObjectInfo],
+        auto: bool,
+        chunksize: Optional[int],
+        max_workers: int,
+        map_processes: Optional[int],
+        incremental: bool,
+        engine: str,
+        range_size: Optional[int] = None,
+        memory_limit: Optional[int] = None
+    ) -> ExecutionPlan:
+    """
+    Plans execution over listed objects among the modes transformations support, or estimates memory
+    of the mode set explicitly. Incremental runs are planned over all objects, including already processed ones.
+
+    :param transformation_types: transformation types to apply on data.
+    :param objects: objects of the date partition.
+    :param auto: choose the mode, otherwise describe the explicit one.
+    :param chunksize: explicit chunk size of streaming mode.
+    :param max_workers: explicit number of objects to download and parse concurrently.
+    :param map_processes: explicit number of map/reduce worker processes.
+    :param incremental: incremental run, in-memory or streaming.
+    :param engine: engine to parse and transform the data on, arrow one runs in in-memory mode only.
+    :param range_size: split plain csv objects larger than this number of bytes into byte ranges.
+    :param memory_limit: memory in bytes the plan may use, detected when not provided.
+    :return: execution plan
+
+    """
+    available_memory = memory_limit if memory_limit is not None else get_available_memory()
+    if not auto:
+        mode = STREAMING if chunksize else MAP_REDUCE if map_processes else IN_MEMORY
+        return describe_execution(objects, mode, max_workers, chunksize=chunksize, map_processes=map_processes,
+                                  available_memory=available_memory, range_size=range_size)
+
+    modes = [IN_MEMORY]
+    if engine == PANDAS:
+        transformation = get_transformation(transformation_types[0])
+        if len(transformation_types) > 1 or transformation.streaming_function is not None:
+            modes.append(STREAMING)
+        if len(transformation_types) == 1 and not incremental and transformation.map_function is not None:
+            modes.append(MAP_REDUCE)
+    return plan_execution(objects, modes, available_memory=available_memory, range_size=range_size)
+
+def _create_s3_client(
+        max_workers: int,
+        cache_dir: Optional[str] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        range_size: Optional[int] = None,
+        storage_root: Optional[str] = None
+    ) -> StorageClient:
+    """
+    Creates s3 client with credentials from config.yaml, or client of local directory
+    when storage root is given, which needs no credentials
+
+    :param max_workers: number of s3 objects to download and parse concurrently.
+    :param cache_dir: directory to cache downloaded objects in, no cache when not provided.
+    :param cache_size: maximum total size of cached objects in bytes.
+    :param range_size: split plain csv objects larger than this number of bytes into byte ranges.
+    :param storage_root: local directory with a sub-directory per bucket to use instead of S3.
+    :return: s3 client
+
+    """
+    if storage_root is not None:
+        # local files are memory-mapped already, there is nothing to cache
+        return LocalStorageClient(storage_root, max_workers=max_workers, range_size=range_size)
+    cache = S3ObjectCache(cache_dir, cache_size) if cache_dir else None
+    return S3Client(parse_yaml('config.yaml'), max_workers=max_workers, cache=cache, range_size=range_size)
+
+def _init_worker(
+        max_workers: int,
+        cache_dir: Optional[str] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        s3_client: Optional[StorageClient] = None,
+        range_size: Optional[int] = None,
+        storage_root: Optional[str] = None
+    ) -> None:
+    """
+    Creates s3 client once per backfill or map/reduce worker process,
+    so it is reused for all partitions or files the worker processes
+
+    :param max_workers: number of s3 objects to download and parse concurrently.
+    :param cache_dir: directory to cache downloaded objects in, shared by all workers.
+    :param cache_size: maximum total size of cached objects in bytes.
+    :param s3_client: already created s3 client to reuse instead of creating one.
+    :param range_size: split plain csv objects larger than this number of bytes into byte ranges.
+    :param storage_root: local directory to use instead of S3.
+
+    """
+    global _worker_s3_client
+    _worker_s3_client = s3_client if s3_client is not None \
+        else _create_s3_client(max_workers, cache_dir, cache_size, range_size, storage_root)
+
+def _process_partition(date_partition: str, **kwargs) -> PartitionResult:
+    """
+    Process single date partition of a backfill, failure is logged and returned
+    in the result so it does not stop other partitions
+
+    :param date_partition: the date partition use to process file or files.
+    :param kwargs: other process_data arguments.
+    :return: partition processing result
+
+    """
+    start = time.perf_counter()
+    try:
+        process_data(date_partition=date_partition, s3_client=_worker_s3_client, **kwargs)
+        return PartitionResult(date_partition, True, time.perf_counter() - start)
+    except Exception as e:
+        logger.exception(f'Failed to process date partition {date_partition}')
+        return PartitionResult(date_partition, False, time.perf_counter() - start, repr(e))
+
+def _date_range(start_date: str, end_date: str) -> List[str]:
+    """
+    List all dates between start and end dates inclusive
+
+    :param start_date: first date in YYYY-MM-DD format.
+    :param end_date: last date in YYYY-MM-DD format.
+    :return: list of dates in YYYY-MM-DD format
+
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    if start > end:
+        raise ValueError(f'Start date {start_date} is after end date {end_date}')
+
+    return [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range((end - start).days + 1)]
+
+def process_date_range(
+        start_date: str,
+        end_date: str,
+        bucket_name: str,
+        initials: str,
+        transformation_type: Union[str, Sequence[str]],
+        processes: int = 1,
+        max_workers: int = 1,
+        cache_dir: Optional[str] = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        range_size: Optional[int] = None,
+        storage_root: Optional[str] = None,
+        **kwargs
+    ) -> List[PartitionResult]:
+    """
+    Backfill all date partitions between start and end dates inclusive.
+    Partitions are processed on a pool of worker processes, each of them creates s3 client
+    once and reuses it. Failure of one partition does not stop the others,
+    the summary with outcome and timing of every partition is logged at the end.
+
+    :param start_date: first date partition in YYYY-MM-DD format.
+    :param end_date: last date partition in YYYY-MM-DD format.
+    :param bucket_name: the s3 bucket name with files to process.
+    :param initials: initials to use in result filename.
+    :param transformation_type: transformation type to apply on data, or several of them sharing a scan.
+    :param processes: number of partitions to process in parallel.
+    :param max_workers: number of s3 objects to download and parse concurrently in every process.
+    :param cache_dir: directory to cache downloaded objects in, shared by all processes.
+    :param cache_size: maximum total size of cached objects in bytes.
+    :param range_size: split plain csv objects larger than this number of bytes into byte ranges.
+    :param storage_root: local directory to use instead of S3.
+    :param kwargs: other process_data arguments.
+    :return: list of partition results in date order
+
+    """
+    dates = _date_range(start_date, end_date)
+    process = partial(
+        _process_partition,
+        bucket_name=bucket_name,
+        initials=initials,
+        transformation_type=transformation_type,
+        max_workers=max_workers,
+        range_size=range_size,
+        storage_root=storage_root,
+        **kwargs
+    )
+
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=min(processes, len(dates)),
+                                 initializer=_init_worker,
+                                 initargs=(max_workers, cache_dir, cache_size, None, range_size,
+                                           storage_root)) as executor:
+            results = list(executor.map(process, dates))
+    else:
+        _init_worker(max_workers, cache_dir, cache_size, range_size=range_size, storage_root=storage_root)
+        results = [process(date_partition) for date_partition in dates]
 
-    # save transformed data to s3
-    export_object_key = 'results/{prefix}/daily_agg_{date}_{initials}.csv'\
-        .format(prefix = prefix, date = ''.join(date_partition.split('-')), initials = initials)
-    s3_client.export_df_to_s3(bucket_name, export_object_key, transformed_df)
+    failed = [result for result in results if not result.succeeded]
+    logger.info(f'Backfill summary: {len(results) - len(failed)} succeeded, {len(failed)} failed')
+    for result in results:
+        status = 'SUCCEEDED' if result.succeeded else f'FAILED {result.error}'
+        logger.info(f'{result.date_partition}: {status} in {result.seconds:.2f}s')
 
-    logger.info(f'Data is SUCCESSFULLY processed and saved in s3 with prefix {export_object_key}')
\ No newline at end of file
+    return results
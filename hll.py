@@ -0,0 +1,216 @@
+import base64
+import zlib
+import numpy as np
+import pandas as pd
+from typing import Iterable, List, Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# number of registers is 2 ** precision, relative standard error of estimates is 1.04 / sqrt(2 ** precision)
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+DEFAULT_PRECISION = 12
+
+HASH_BITS = 64
+
+class HyperLogLogSketches():
+    """
+    HyperLogLog sketches of distinct 64-bit hashes, one per key, e.g. per (CAMPAIGN_ID, HOUR).
+    Sketch of a key takes 2 ** precision bytes whatever the number of hashes added, so memory
+    does not grow with the volume of the day. Sketches of the same keys built from different
+    data, e.g. files, shards or days, are merged by taking maximum of their registers,
+    which is the same sketch as built from all data at once.
+    """
+
+    def __init__(self, index: pd.Index, registers: np.ndarray, precision: int = DEFAULT_PRECISION):
+        """
+        :param index: keys of the sketches, pandas index, e.g. MultiIndex of (CAMPAIGN_ID, HOUR).
+        :param registers: numpy uint8 array of shape (len(index), 2 ** precision).
+        :param precision: number of hash bits selecting the register.
+        """
+        check_precision(precision)
+        if registers.shape != (len(index), 1 << precision):
+            raise ValueError(f'Registers of shape {registers.shape} do not match {len(index)} keys '
+                             f'and precision {precision}')
+        self.index = index
+        self.registers = registers
+        self.precision = precision
+
+    @classmethod
+    def from_hashes(
+        cls,
+        index: pd.Index,
+        groups: np.ndarray,
+        hashes: np.ndarray,
+        precision: int = DEFAULT_PRECISION
+    ) -> 'HyperLogLogSketches':
+        """
+        Builds sketches of the keys from hashes of their items.
+
+        :param index: keys of the sketches.
+        :param groups: numpy int array with position in index of the key of every hash, -1 to skip the hash.
+        :param hashes: numpy uint64 array with well mixed hashes, e.g. dedup fingerprints.
+        :param precision: number of hash bits selecting the register.
+        :return: sketches
+        """
+        check_precision(precision)
+        registers = np.zeros((len(index), 1 << precision), dtype=np.uint8)
+        keep = groups >= 0
+        groups, hashes = groups[keep], hashes[keep].astype(np.uint64)
+        if len(hashes):
+            # top bits select the register, the rank is position of the lowest set bit of the rest
+            register = (hashes >> np.uint64(HASH_BITS - precision)).astype(np.int64)
+            rest = hashes & np.uint64((1 << (HASH_BITS - precision)) - 1)
+            rank = np.full(len(rest), HASH_BITS - precision + 1, dtype=np.uint8)
+            nonzero = rest != 0
+            # isolated lowest set bit is a power of two, exact as float
+            lowest = rest[nonzero] & (~rest[nonzero] + np.uint64(1))
+            rank[nonzero] = np.log2(lowest.astype(np.float64)).astype(np.uint8) + 1
+
+            # maximum rank per register, grouped by hash table instead of slow ufunc.at
+            flat = groups.astype(np.int64) * (1 << precision) + register
+            maximum = pd.Series(rank).groupby(flat).max()
+            registers.reshape(-1)[maximum.index.to_numpy()] = maximum.to_numpy()
+
+        return cls(index, registers, precision)
+
+    def merge(self, *others: 'HyperLogLogSketches') -> 'HyperLogLogSketches':
+        """
+        Merges sketches with others, keys missing in some of them are kept.
+
+        :param others: sketches of the same precision.
+        :raises ValueError: When precision of sketches differ
+        :return: merged sketches with union of keys, sorted
+        """
+        sketches = [self, *others]
+        precisions = sorted({sketch.precision for sketch in sketches})
+        if len(precisions) > 1:
+            raise ValueError(f'Sketches of different precisions {precisions} can not be merged')
+
+        index = self.index.append([sketch.index for sketch in others]) if others else self.index
+        registers = np.concatenate([sketch.registers for sketch in sketches])
+        # unique and factorize of MultiIndex lose nullable dtypes of its levels
+        keys = index.drop_duplicates().sort_values()
+        return self.group(keys, keys.get_indexer(index), registers)
+
+    def group(
+        self,
+        index: pd.Index,
+        groups: np.ndarray,
+        registers: Optional[np.ndarray] = None
+    ) -> 'HyperLogLogSketches':
+        """
+        Merges sketches of the same group into one, e.g. sketches of all hours of a campaign
+        into a sketch of the whole day.
+
+        :param index: keys of the groups.
+        :param groups: numpy int array with position in index of the group of every sketch, -1 to skip it.
+        :param registers: registers to group instead of own ones, one row per group position.
+        :return: sketches of the groups
+        """
+        registers = self.registers if registers is None else registers
+        keep = np.flatnonzero(groups >= 0)
+        order = keep[np.argsort(groups[keep], kind='stable')]
+        result = np.zeros((len(index), registers.shape[1]), dtype=np.uint8)
+        if len(order):
+            sorted_groups = groups[order]
+            starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+            result[sorted_groups[starts]] = np.maximum.reduceat(registers[order], starts, axis=0)
+        return HyperLogLogSketches(index, result, self.precision)
+
+    def estimate(self) -> np.ndarray:
+        """
+        Estimates number of distinct hashes added to every sketch with the improved estimator
+        of Ertl, "New cardinality estimation algorithms for HyperLogLog sketches", 2017,
+        which is unbiased over the whole range without empirical bias correction tables.
+
+        :return: numpy int64 array with estimate of every key
+        """
+        m = 1 << self.precision
+        q = HASH_BITS - self.precision
+        n = len(self.registers)
+        # histogram of register values of every sketch
+        flat = (np.arange(n, dtype=np.int64) * (q + 2))[:, None] + self.registers
+        histogram = np.bincount(flat.reshape(-1), minlength=n * (q + 2)).reshape(n, q + 2).astype(np.float64)
+
+        z = m * _tau(1 - histogram[:, q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + histogram[:, k])
+        with np.errstate(divide='ignore'):
+            z = z + m * _sigma(histogram[:, 0] / m)
+            estimate = m * m / (2 * np.log(2)) / z
+        return np.rint(estimate).astype(np.int64)
+
+    def to_strings(self) -> List[str]:
+        """
+        Serializes every sketch to a compact ascii string, zlib compressed registers in base64,
+        sparse sketches of small keys take few bytes.
+
+        :return: list of strings in index order
+        """
+        return [base64.b64encode(zlib.compress(row.tobytes())).decode('ascii') for row in self.registers]
+
+    @classmethod
+    def from_strings(cls, index: pd.Index, values: Iterable[str]) -> 'HyperLogLogSketches':
+        """
+        Deserializes sketches serialized with to_strings, precision is given by the number of registers.
+
+        :param index: keys of the sketches.
+        :param values: serialized sketches in index order.
+        :raises ValueError: When sketches are malformed or of different precisions
+        :return: sketches
+        """
+        rows = [np.frombuffer(zlib.decompress(base64.b64decode(value)), dtype=np.uint8) for value in values]
+        sizes = {len(row) for row in rows}
+        if len(sizes) > 1:
+            raise ValueError(f'Sketches of different sizes {sorted(sizes)} can not be loaded together')
+        size = sizes.pop() if sizes else 1 << DEFAULT_PRECISION
+        precision = size.bit_length() - 1
+        if size != 1 << precision:
+            raise ValueError(f'Sketch size {size} is not a power of two')
+        registers = np.stack(rows) if rows else np.zeros((0, size), dtype=np.uint8)
+        return cls(index, registers, precision)
+
+def check_precision(precision: int) -> None:
+    """
+    Checks precision is in supported range.
+
+    :param precision: number of hash bits selecting the register.
+    :raises ValueError: When precision is out of range
+    :return: N/A
+    """
+    if not MIN_PRECISION <= precision <= MAX_PRECISION:
+        raise ValueError(f'Precision should be between {MIN_PRECISION} and {MAX_PRECISION}, got {precision}')
+
+def _sigma(x: np.ndarray) -> np.ndarray:
+    """Series x + sum(x ** (2 ** k) * 2 ** (k - 1)) of the estimator, infinite for empty sketches"""
+    x = x.copy()
+    result = x.copy()
+    y = 1.0
+    for _ in range(HASH_BITS):
+        x = x * x
+        previous = result
+        result = result + x * y
+        y *= 2
+        if np.array_equal(result, previous):
+            break
+    result[x >= 1] = np.inf
+    return result
+
+def _tau(x: np.ndarray) -> np.ndarray:
+    """Series (1 - x - sum((1 - x ** (2 ** -k)) ** 2 * 2 ** -k)) / 3 of the estimator"""
+    x = x.copy()
+    result = 1 - x
+    y = 1.0
+    for _ in range(HASH_BITS):
+        x = np.sqrt(x)
+        previous = result
+        y *= 0.5
+        result = result - (1 - x) ** 2 * y
+        if np.array_equal(result, previous):
+            break
+    result = result / 3
+    result[(x == 0) | (x == 1)] = 0
+    return result
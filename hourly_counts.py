@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+HOURS = 24
+
+
+class HourlyCounts():
+    """
+    Impressions counts of every key, e.g. CAMPAIGN_ID, at each hour of the day kept as a dense
+    keys x 24 numpy matrix. Keys are factorized once per added batch and rows are counted with
+    a single np.bincount over flat (key, hour) cells, instead of a hash groupby over two columns.
+    Counts can be added batch by batch, from raw rows or from partial counts, so streaming
+    and map/reduce paths sum into the same matrix.
+    Rows with null key or hour are not counted, same as groupby([key, 'HOUR']).size().
+    """
+
+    def __init__(self, name: str = 'CAMPAIGN_ID'):
+        """
+        :param name: name of the key column, the first level of the counts index.
+        """
+        self.name = name
+        self.keys: Optional[pd.Index] = None
+        self.hour_dtype = np.dtype(np.int64)
+        self._counts = np.zeros((0, HOURS), dtype=np.int64)
+
+    def __len__(self) -> int:
+        """Number of (key, hour) pairs with impressions"""
+        return int(np.count_nonzero(self._counts))
+
+    def add(self, keys: pd.Series, hours: pd.Series) -> np.ndarray:
+        """
+        Counts rows into the cell of their key and hour.
+
+        :param keys: pandas series with key of every row, e.g. CAMPAIGN_ID.
+        :param hours: pandas series with hour of every row, between 0 and 23.
+        :return: numpy array with cell of every row, -1 for rows not counted, see positions
+        """
+        if self.keys is None:
+            self.hour_dtype = hours.dtype
+
+        codes, uniques = pd.factorize(keys)
+        counted = (codes >= 0) & hours.notna().to_numpy()
+        rows = self._key_rows(uniques)
+        cells = np.full(len(codes), -1, dtype=np.int64)
+        cells[counted] = rows[codes[counted]] * HOURS + hours.to_numpy()[counted].astype(np.int64)
+
+        self._counts += np.bincount(cells[counted], minlength=self._counts.size).reshape(-1, HOURS)
+        return cells
+
+    def add_counts(self, counts: pd.Series) -> None:
+        """
+        Adds partial counts, e.g. of another file or chunk.
+
+        :param counts: pandas series with impressions count indexed by (key, HOUR).
+        :return: N/A
+        """
+        if self.keys is None:
+            self.hour_dtype = counts.index.get_level_values(1).dtype
+
+        codes, uniques = pd.factorize(counts.index.get_level_values(0))
+        hours = counts.index.get_level_values(1)
+        counted = (codes >= 0) & hours.notna()
+        rows = self._key_rows(uniques)
+        cells = rows[codes[counted]] * HOURS + hours.to_numpy()[counted].astype(np.int64)
+
+        np.add.at(self._counts.reshape(-1), cells, counts.to_numpy(dtype=np.int64)[counted])
+
+    def positions(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Positions of cells returned by add in the counts series, same as groupby ngroup.
+
+        :param cells: numpy array with cells of rows.
+        :return: numpy array with position of every row in to_series, -1 for rows not counted
+        """
+        order = self._order()
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        counted = cells >= 0
+        sorted_cells = rank[cells[counted] // HOURS] * HOURS + cells[counted] % HOURS
+        positions = np.full(len(cells), -1, dtype=np.int64)
+        positions[counted] = np.searchsorted(np.flatnonzero(self._counts[order]), sorted_cells)
+        return positions
+
+    def to_series(self) -> pd.Series:
+        """
+        Exports non-zero counts ordered by key and hour.
+
+        :return: pandas series with impressions count indexed by (key, HOUR),
+            same as groupby([key, 'HOUR']).size()
+        """
+        order = self._order()
+        counts = self._counts[order]
+        rows, hours = np.nonzero(counts)
+        keys = self.keys if self.keys is not None else pd.Index([], dtype=np.float64)
+        index = pd.MultiIndex.from_arrays([keys.take(order[rows]), pd.Index(hours, dtype=self.hour_dtype)],
+                                          names=[self.name, 'HOUR'])
+        return pd.Series(counts[rows, hours], index=index)
+
+    def _key_rows(self, uniques: pd.Index) -> np.ndarray:
+        """Matrix rows of keys, keys seen for the first time get new zero rows"""
+        if self.keys is None:
+            self.keys = uniques[:0]
+
+        rows = self.keys.get_indexer(uniques)
+        new = rows < 0
+        if new.any():
+            rows[new] = np.arange(len(self.keys), len(self.keys) + new.sum())
+            self.keys = self.keys.append(uniques[new])
+            self._counts = np.vstack([self._counts, np.zeros((new.sum(), HOURS), dtype=np.int64)])
+        return rows
+
+    def _order(self) -> np.ndarray:
+        """Matrix rows in order of their keys"""
+        if self.keys is None:
+            return np.empty(0, dtype=np.int64)
+        return self.keys.argsort()
@@ -2,47 +2,189 @@
 
 import sys
 import argparse
-from handler import process_data
-from typing import List
+from metrics import parse_address
+from registry import ENGINES, PANDAS, TRANSFORMATIONS, check_modes
 from datetime import datetime
 
 import logging
 
-# Configure the logging
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def main(bucket_name: str, date_partition: str, initials: str, transformation_type: str):
+def configure_logging() -> None:
+    """
+    Configure colored logging, only when the client actually runs,
+    so --help and argument errors do not pay for importing it
+    """
+    import coloredlogs
+    coloredlogs.install(level=logging.INFO)
+
+def main(args: argparse.Namespace) -> bool:
+    """
+    Runs the client with parsed and checked arguments
+
+    :param args: command line arguments, see the parser below.
+    :return: False when some date partition of a backfill failed
+
+    """
+    # pandas, boto3 and the rest of the pipeline are imported only once arguments are valid
+    from handler import process_data, process_date_range
+    from shards import Shard
+
     # Your main processing logic goes here
-    logger.info(f'Bucket name: {bucket_name}')
-    logger.info(f'Date partition: {date_partition}')
-    logger.info(f'Initials: {initials}')
-    logger.info(f'Transformation type: {transformation_type}')
+    logger.info(f'Bucket name: {args.bucket_name}')
+    if args.storage == 'local':
+        logger.info(f'Local storage: {args.root}')
+    if args.watch:
+        logger.info('Watch mode' + (f', poll interval: {args.poll_interval}s' if args.poll_interval else '')
+                    + (f', queue file: {args.queue_file}' if args.queue_file else ''))
+    elif args.start_date:
+        logger.info(f'Date range: {args.start_date} - {args.end_date}, processes: {args.processes}')
+    else:
+        logger.info(f'Date partition: {args.date_partition}')
+    logger.info(f'Initials: {args.initials}')
+    logger.info(f'Transformation type: {", ".join(args.transformation_type)}')
+    if args.chunksize:
+        logger.info(f'Streaming mode, chunk size: {args.chunksize} rows')
+    if args.map_processes:
+        logger.info(f'Map/reduce mode, processes: {args.map_processes}')
+    if args.shard:
+        logger.info(f'Shard mode, shard: {args.shard} by {args.shard_by}')
+    if args.merge:
+        logger.info('Merge mode')
+    if args.hll_precision is not None:
+        logger.info(f'HyperLogLog precision: {args.hll_precision}')
+    if args.engine != PANDAS:
+        logger.info(f'Engine: {args.engine}')
+    if args.auto:
+        logger.info('Auto mode, execution mode is planned from the listing')
+    if args.dry_run:
+        logger.info('Dry run, nothing is downloaded')
+    if args.memory_limit_mb:
+        logger.info(f'Memory limit: {args.memory_limit_mb} MB')
+    logger.info(f'Max workers: {args.max_workers}')
+    if args.list_fan_out:
+        logger.info('Listing sub-prefixes in parallel')
+    if args.incremental:
+        logger.info('Incremental mode')
+    logger.info(f'Output format: {args.output_format}')
+    if args.output_compression:
+        logger.info(f'Output compression: {args.output_compression}')
+    if args.cache_dir:
+        logger.info(f'Objects cache: {args.cache_dir}, up to {args.cache_size_mb} MB')
+    if args.range_size_mb:
+        logger.info(f'Byte ranges of large csv files: {args.range_size_mb} MB')
+    if args.metrics_file:
+        logger.info(f'Metrics file: {args.metrics_file}')
+    if args.statsd:
+        logger.info(f'StatsD sink: {args.statsd}')
+
+    # arguments shared by every mode, sizes in MB are passed in bytes
+    kwargs = dict(
+        initials=args.initials,
+        chunksize=args.chunksize,
+        max_workers=args.max_workers,
+        list_fan_out=args.list_fan_out,
+        verify_dedup=args.verify_dedup,
+        output_format=args.output_format,
+        output_compression=args.output_compression,
+        metrics_file=args.metrics_file,
+        statsd_address=args.statsd,
+        map_processes=args.map_processes,
+        hll_precision=args.hll_precision,
+        range_size=args.range_size_mb * 1024 * 1024 if args.range_size_mb else None,
+        storage_root=args.root if args.storage == 'local' else None,
+        engine=args.engine,
+        auto=args.auto,
+        memory_limit=args.memory_limit_mb * 1024 * 1024 if args.memory_limit_mb else None
+    )
 
-    # Example processing code
-    # Process files in input_dir, filter or manipulate based on date_partition, and save results to output_file.
-    # ...
+    if args.watch:
+        from handler import _create_s3_client
+        from watcher import DEFAULT_POLL_INTERVAL, PartitionWatcher
+
+        # client and its connection pool are created once and reused by every run of the watcher
+        s3_client = _create_s3_client(args.max_workers, args.cache_dir, args.cache_size_mb * 1024 * 1024,
+                                      kwargs['range_size'], kwargs['storage_root'])
+        watcher = PartitionWatcher(
+            bucket_name=args.bucket_name,
+            transformation_types=args.transformation_type,
+            s3_client=s3_client,
+            poll_interval=args.poll_interval or DEFAULT_POLL_INTERVAL,
+            queue_file=args.queue_file,
+            **kwargs
+            )
+        watcher.run()
+        return True
+
+    kwargs.update(
+        transformation_type=args.transformation_type,
+        incremental=args.incremental,
+        cache_dir=args.cache_dir,
+        cache_size=args.cache_size_mb * 1024 * 1024,
+        shard=Shard.parse(args.shard) if args.shard else None,
+        shard_by=args.shard_by,
+        merge=args.merge,
+        dry_run=args.dry_run
+    )
+    if args.start_date:
+        results = process_date_range(
+            start_date=args.start_date,
+            end_date=args.end_date,
+            bucket_name=args.bucket_name,
+            processes=args.processes,
+            **kwargs
+            )
+        return all(result.succeeded for result in results)
 
     process_data(
-        bucket_name=bucket_name, 
-        date_partition=date_partition, 
-        initials=initials, 
-        transformation_type=transformation_type
+        bucket_name=args.bucket_name,
+        date_partition=args.date_partition,
+        **kwargs
         )
+    return True
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='CLI tool for processing files based on a date partition.')
-    transformation_options = ['aggregate_impressions', 'other']
+    transformation_options = list(TRANSFORMATIONS)
     
     parser.add_argument('--bucket_name', 
                         type=str, 
                         required=True, 
                         help='Bucket name to process.')
 
-    parser.add_argument('--date_partition', 
+    parser.add_argument('--storage', 
+                        type=str, 
+                        required=False, 
+                        default='s3',
+                        choices=['s3', 'local'],
+                        help='Storage to read files from and write results to, s3 by default. Local storage \
+                            reads bucket directory under --root with the same YYYY/MM/DD layout, no credentials needed.')
+
+    parser.add_argument('--root', 
+                        type=str, 
+                        required=False, 
+                        default=None,
+                        help='Directory with a sub-directory per bucket (required by local storage).')
+
+    dates_group = parser.add_mutually_exclusive_group()
+    dates_group.add_argument('--date_partition', 
                         type=str, 
-                        required=True, 
                         help='Date partition to filter or process the files, in YYYY-MM-DD format.')
+
+    dates_group.add_argument('--start_date', 
+                        type=str, 
+                        help='First date partition to backfill, in YYYY-MM-DD format. Requires --end_date.')
+
+    parser.add_argument('--end_date', 
+                        type=str, 
+                        required=False, 
+                        help='Last date partition to backfill (inclusive), in YYYY-MM-DD format.')
+
+    parser.add_argument('--processes', 
+                        type=int, 
+                        required=False, 
+                        default=1,
+                        help='Number of date partitions to backfill in parallel worker processes.')
     
     parser.add_argument('--initials', 
                         type=str, 
@@ -53,17 +195,241 @@ if __name__ == '__main__':
     parser.add_argument('--transformation_type', 
                         type=str, 
                         required=True, 
+                        nargs='+',
                         choices=transformation_options,
-                        help=f'Transformation type to apply on data. \
+                        help=f'Transformation type to apply on data, several of them are computed from a single scan \
+                            of the data, each one saved as a separate result. \
                             Need to choose from available options: {transformation_options}')
     
+    parser.add_argument('--chunksize', 
+                        type=int, 
+                        required=False, 
+                        default=None,
+                        help='Number of rows to read at a time. When provided, files are streamed \
+                            in chunks of this size instead of being loaded in memory at once.')
+
+    parser.add_argument('--max_workers', 
+                        type=int, 
+                        required=False, 
+                        default=1,
+                        help='Number of files to download and parse concurrently. \
+                            By default files are processed one by one.')
+
+    parser.add_argument('--list_fan_out', 
+                        action='store_true',
+                        help='List sub-prefixes of the date partition (e.g. hourly folders) in parallel.')
+
+    parser.add_argument('--verify_dedup', 
+                        action='store_true',
+                        help='In streaming mode, compare original dedup keys of rows with colliding \
+                            fingerprints instead of trusting 64-bit hashes. Uses more memory.')
+
+    parser.add_argument('--incremental', 
+                        action='store_true',
+                        help='Aggregate only files not processed by previous runs and merge them into \
+                            the existing result, using the manifest stored next to it.')
+
+    parser.add_argument('--output_format', 
+                        type=str, 
+                        required=False, 
+                        default='csv',
+                        choices=['csv', 'parquet'],
+                        help='Format of the result file. Input files format is picked by their extension.')
+
+    parser.add_argument('--output_compression', 
+                        type=str, 
+                        required=False, 
+                        default=None,
+                        choices=['gzip', 'zstd'],
+                        help='Compression of csv result file. Compressed input files are picked \
+                            by their .gz or .zst extension.')
+
+    parser.add_argument('--cache_dir', 
+                        type=str, 
+                        required=False, 
+                        default=None,
+                        help='Directory to cache downloaded files in. Cached files are downloaded again \
+                            only when they have changed.')
+
+    parser.add_argument('--cache_size_mb', 
+                        type=int, 
+                        required=False, 
+                        default=10240,
+                        help='Maximum size of the cache directory in MB, least recently used files are \
+                            evicted first.')
+
+    parser.add_argument('--range_size_mb', 
+                        type=int, 
+                        required=False, 
+                        default=None,
+                        help='Split plain csv files larger than this size in MB into byte ranges downloaded \
+                            and parsed concurrently by --max_workers threads, or mapped by --map_processes \
+                            processes as separate partial results.')
+
+    parser.add_argument('--metrics_file', 
+                        type=str, 
+                        required=False, 
+                        default=None,
+                        help='File to append json metrics record of every processed date partition to.')
+
+    parser.add_argument('--statsd', 
+                        type=str, 
+                        required=False, 
+                        default=None,
+                        metavar='HOST:PORT',
+                        help='StatsD UDP sink to push metrics of every processed date partition to.')
+
+    parser.add_argument('--map_processes', 
+                        type=int, 
+                        required=False, 
+                        default=None,
+                        help='Number of worker processes to download, parse and aggregate files in parallel, \
+                            partial results are merged at the end (supported by aggregate_impressions only).')
+
+    parser.add_argument('--shard', 
+                        type=str, 
+                        required=False, 
+                        default=None,
+                        metavar='i/N',
+                        help='Aggregate only shard i of N (0 <= i < N) of the date partition and store partial \
+                            result next to the daily result, so shards can run on different machines \
+                            (supported by aggregate_impressions only).')
+
+    parser.add_argument('--shard_by', 
+                        type=str, 
+                        required=False, 
+                        default='key',
+                        choices=['key', 'campaign'],
+                        help='Split files between shards by hash of their key, or rows by hash of CAMPAIGN_ID, \
+                            in which case every shard reads all files.')
+
+    parser.add_argument('--merge', 
+                        action='store_true',
+                        help='Merge partial results stored by all shards into the daily result.')
+
+    parser.add_argument('--hll_precision', 
+                        type=int, 
+                        required=False, 
+                        default=None,
+                        help='Precision of HyperLogLog sketches between 4 and 16, 12 by default, relative error \
+                            of counts is 1.04 / sqrt(2 ** precision) (supported by approx_aggregate_impressions only).')
+
+    parser.add_argument('--engine', 
+                        type=str, 
+                        required=False, 
+                        default=PANDAS,
+                        choices=ENGINES,
+                        help='Engine to parse and transform the data on, pandas by default. Arrow engine parses \
+                            csv files with multithreaded arrow reader and runs dedup and count as arrow query plans, \
+                            in in-memory mode only (supported by aggregate_impressions and other aggregate_*_impressions).')
+
+    parser.add_argument('--auto', 
+                        action='store_true',
+                        help='Choose in-memory, streaming or map/reduce mode, number of workers and chunk size \
+                            from sizes of the listed files and available memory, instead of --chunksize \
+                            and --map_processes.')
+
+    parser.add_argument('--dry_run', 
+                        action='store_true',
+                        help='List the files and log execution plan with its estimated memory, \
+                            without downloading anything.')
+
+    parser.add_argument('--memory_limit_mb', 
+                        type=int, 
+                        required=False, 
+                        default=None,
+                        help='Memory the run may use for --auto and --dry_run, in MB, \
+                            detected from the system and container limit by default.')
+
+    parser.add_argument('--watch', 
+                        action='store_true',
+                        help='Run as a service keeping results of the current date partition up to date as files \
+                            land, instead of --date_partition or --start_date. S3 client and compiled schemas \
+                            are kept between runs.')
+
+    parser.add_argument('--poll_interval', 
+                        type=float, 
+                        required=False, 
+                        default=None,
+                        help='Seconds between two polls of the listing or the queue file in watch mode, 5 by default.')
+
+    parser.add_argument('--queue_file', 
+                        type=str, 
+                        required=False, 
+                        default=None,
+                        help='File a notifier appends keys of landed files to, one per line, watch mode reads it \
+                            instead of polling the listing.')
+
     args, leftovers = parser.parse_known_args()
+    if args.watch and (args.date_partition or args.start_date or args.end_date):
+        parser.error('--watch argument can not be combined with --date_partition, --start_date or --end_date')
+    if not args.watch and not (args.date_partition or args.start_date):
+        parser.error('one of the arguments --date_partition --start_date --watch is required')
+    if args.watch and (args.incremental or args.shard or args.merge or args.dry_run):
+        parser.error('--watch argument can not be combined with --incremental, --shard, --merge or --dry_run, '
+                     'results are updated incrementally when the transformation supports it')
+    if (args.poll_interval is not None or args.queue_file) and not args.watch:
+        parser.error('--poll_interval and --queue_file arguments apply to --watch only')
+    if args.poll_interval is not None and args.poll_interval <= 0:
+        parser.error(f'--poll_interval argument should be a positive number, got {args.poll_interval}')
+    if args.start_date and not args.end_date:
+        parser.error('--start_date argument requires --end_date')
+    if args.end_date and not args.start_date:
+        parser.error('--end_date argument requires --start_date')
+    for name in ('date_partition', 'start_date', 'end_date'):
+        value = getattr(args, name)
+        try:
+            if value is not None:
+                datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            parser.error(f'--{name} argument has incorrect format {value}, should be YYYY-MM-DD')
+    if args.start_date and args.start_date > args.end_date:
+        parser.error(f'--start_date {args.start_date} should not be after --end_date {args.end_date}')
+    if args.max_workers < 1:
+        parser.error(f'--max_workers argument should be a positive number, got {args.max_workers}')
+    if args.processes < 1:
+        parser.error(f'--processes argument should be a positive number, got {args.processes}')
+    if args.map_processes is not None and args.map_processes < 1:
+        parser.error(f'--map_processes argument should be a positive number, got {args.map_processes}')
+    if args.shard is not None:
+        index, _, count = args.shard.partition('/')
+        if not index.isdigit() or not count.isdigit() or not int(index) < int(count):
+            parser.error(f'--shard argument should be in i/N format with 0 <= i < N, got {args.shard}')
+    if args.hll_precision is not None and not 4 <= args.hll_precision <= 16:
+        parser.error(f'--hll_precision argument should be between 4 and 16, got {args.hll_precision}')
+    if args.memory_limit_mb is not None and args.memory_limit_mb < 1:
+        parser.error(f'--memory_limit_mb argument should be a positive number, got {args.memory_limit_mb}')
+    if args.memory_limit_mb is not None and not (args.auto or args.dry_run):
+        parser.error('--memory_limit_mb argument applies to --auto and --dry_run only')
+    if args.storage == 'local' and not args.root:
+        parser.error('--storage local argument requires --root')
+    if args.root and args.storage != 'local':
+        parser.error('--root argument applies to local storage only')
+    if args.storage == 'local' and args.cache_dir:
+        parser.error('--cache_dir argument can not be combined with local storage, files are read in place')
+    if args.range_size_mb is not None and args.range_size_mb < 1:
+        parser.error(f'--range_size_mb argument should be a positive number, got {args.range_size_mb}')
+    if args.cache_size_mb < 1:
+        parser.error(f'--cache_size_mb argument should be a positive number, got {args.cache_size_mb}')
+    if args.statsd:
+        try:
+            parse_address(args.statsd)
+        except ValueError:
+            parser.error(f'--statsd argument should be in HOST:PORT format, got {args.statsd}')
+    if args.output_compression and args.output_format != 'csv':
+        parser.error(f'--output_compression argument applies to csv only, {args.output_format} is compressed internally')
+
+    # combinations of modes are checked by the same rules as process_data applies
     try:
-        datetime.strptime(args.date_partition, '%Y-%m-%d')
-    except ValueError:
-        parser.error(f'--date_partition argument has incorrect format {args.date_partition}, should be YYYY-MM-DD')
+        check_modes(list(dict.fromkeys(args.transformation_type)), chunksize=args.chunksize,
+                    incremental=args.incremental, map_processes=args.map_processes, shard=args.shard is not None,
+                    merge=args.merge, engine=args.engine, auto=args.auto, dry_run=args.dry_run,
+                    options={'precision': args.hll_precision} if args.hll_precision is not None else {})
+    except ValueError as e:
+        parser.error(str(e))
 
     args = parser.parse_args()
+    configure_logging()
 
-    # Call the main function with parsed arguments
-    main(args.bucket_name, args.date_partition, args.initials, args.transformation_type)
\ No newline at end of file
+    if not main(args):
+        sys.exit(1)
@@ -0,0 +1,136 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from aws.file_formats import strip_compression
+from aws.s3_client import S3GetObjectError, S3ObjectInfo, StorageClient
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+class Manifest():
+    """
+    Record of the objects already aggregated into a daily result, stored next to it.
+    Keeps ETag and partial per (CAMPAIGN_ID, HOUR) counts of every processed object,
+    and separately the fingerprints of all dedup keys seen, so files landing late
+    can be merged into the existing result without re-processing the whole day.
+    """
+
+    def __init__(self, objects: Optional[Dict[str, Dict]] = None):
+        """
+        :param objects: processed objects by key, with their etag, size and counts.
+        """
+        self.objects = objects or {}
+
+    @staticmethod
+    def manifest_key(result_key: str) -> str:
+        """Key of the manifest stored next to result object"""
+        return f'{os.path.splitext(strip_compression(result_key))[0]}.manifest.json'
+
+    @staticmethod
+    def fingerprints_key(result_key: str) -> str:
+        """Key of the dedup fingerprints stored next to result object"""
+        return f'{os.path.splitext(strip_compression(result_key))[0]}.fingerprints'
+
+    @classmethod
+    def load(cls, s3_client: StorageClient, bucket: str, result_key: str) -> Optional['Manifest']:
+        """
+        Loads manifest of the result object.
+
+        :param s3_client: s3 client to load manifest with.
+        :param bucket: the s3 bucket name with result object.
+        :param result_key: key of the result object.
+        :return: manifest, None when there is no manifest or it has another version
+        """
+        try:
+            content = json.loads(s3_client.get_object(bucket, cls.manifest_key(result_key))['Body'].read())
+        except S3GetObjectError:
+            logger.info(f'No manifest found for {result_key}')
+            return None
+
+        if content.get('version') != MANIFEST_VERSION:
+            logger.warning(f'Manifest version {content.get("version")} is not supported, ignoring it')
+            return None
+
+        return cls(content['objects'])
+
+    def load_fingerprints(self, s3_client: StorageClient, bucket: str, result_key: str) -> np.ndarray:
+        """
+        Loads fingerprints of all dedup keys seen in processed objects.
+
+        :param s3_client: s3 client to load fingerprints with.
+        :param bucket: the s3 bucket name with result object.
+        :param result_key: key of the result object.
+        :return: sorted numpy uint64 array with fingerprints
+        """
+        body = s3_client.get_object(bucket, self.fingerprints_key(result_key))['Body'].read()
+        return np.frombuffer(body, dtype='<u8').astype(np.uint64)
+
+    def save(self, s3_client: StorageClient, bucket: str, result_key: str, fingerprints: np.ndarray) -> None:
+        """
+        Stores manifest and fingerprints next to the result object.
+        Fingerprints are written first, so manifest never refers to missing ones.
+
+        :param s3_client: s3 client to store manifest with.
+        :param bucket: the s3 bucket name with result object.
+        :param result_key: key of the result object.
+        :param fingerprints: numpy uint64 array with fingerprints of all dedup keys seen.
+        :return: N/A
+        """
+        s3_client.put_object(bucket, self.fingerprints_key(result_key), fingerprints.astype('<u8').tobytes())
+        content = {'version': MANIFEST_VERSION, 'result_key': result_key, 'objects': self.objects}
+        s3_client.put_object(bucket, self.manifest_key(result_key), json.dumps(content).encode())
+
+    def diff(self, objects: List[S3ObjectInfo]) -> Tuple[List[S3ObjectInfo], List[str]]:
+        """
+        Compares listed objects with processed ones.
+
+        :param objects: objects currently listed for the date partition.
+        :return: a tuple of new objects and keys of processed objects which were changed
+            (ETag differs) or removed since
+        """
+        listed = {obj.key: obj for obj in objects}
+        new_objects = [obj for obj in objects if obj.key not in self.objects]
+        stale_keys = [
+            key for key, value in self.objects.items()
+            if key not in listed or listed[key].etag != value['etag']
+        ]
+        return new_objects, stale_keys
+
+    def add_object(self, obj: S3ObjectInfo, counts: Optional[pd.Series]) -> None:
+        """
+        Records processed object with its partial counts.
+
+        :param obj: processed object metadata.
+        :param counts: pandas series with impressions count of the object indexed by
+            (CAMPAIGN_ID, HOUR), None when object had no data.
+        :return: N/A
+        """
+        records = [] if counts is None else [
+            [_to_json_value(campaign_id), int(hour), int(count)] for (campaign_id, hour), count in counts.items()
+        ]
+        self.objects[obj.key] = {'etag': obj.etag, 'size': obj.size, 'counts': records}
+
+    def counts(self, campaign_dtype: Optional[str] = None) -> pd.Series:
+        """
+        Sums partial counts of all processed objects.
+
+        :param campaign_dtype: dtype of CAMPAIGN_ID, same as used for loading the data.
+        :return: pandas series with impressions count indexed by (CAMPAIGN_ID, HOUR)
+        """
+        records = [record for value in self.objects.values() for record in value['counts']]
+        df = pd.DataFrame(records, columns=['CAMPAIGN_ID', 'HOUR', 'IMPRESSIONS_COUNT'])
+        df = df.astype({'HOUR': 'int64', 'IMPRESSIONS_COUNT': 'int64'})
+        if campaign_dtype is not None:
+            df = df.astype({'CAMPAIGN_ID': campaign_dtype})
+
+        return df.groupby(['CAMPAIGN_ID', 'HOUR'])['IMPRESSIONS_COUNT'].sum()
+
+def _to_json_value(value):
+    """Converts numpy scalar to python one, so it can be serialized to json"""
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,247 @@
+import json
+import socket
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# the CLI imports this module before arguments are parsed, pandas is needed for annotations only
+if TYPE_CHECKING:
+    import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATSD_PREFIX = 'impressions_aggregator'
+
+
+class StageMetrics():
+    """Metrics of a single stage, accumulated over all its calls, e.g. over all chunks"""
+
+    def __init__(self, name: str):
+        """
+        :param name: name of the stage.
+        """
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.rows_dropped = 0
+        self.peak_memory_bytes = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'seconds': round(self.seconds, 6),
+            'bytes': self.bytes,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rows_dropped': self.rows_dropped,
+            'peak_memory_bytes': self.peak_memory_bytes
+        }
+
+
+class RunMetrics():
+    """
+    Collects per stage metrics of a single process_data run: wall time, bytes transferred,
+    input and output rows, rows dropped by dedup and process peak memory at the end of the stage.
+    Stages called many times, e.g. once per chunk in streaming mode, are accumulated.
+    At the end of the run the metrics are emitted as a single json record.
+    """
+
+    def __init__(self, **labels: str):
+        """
+        :param labels: labels of the run, e.g. date partition and bucket, added to the record.
+        """
+        self.labels = labels
+        self.stages: Dict[str, StageMetrics] = {}
+        self._start = time.perf_counter()
+
+    def get_stage(self, name: str) -> StageMetrics:
+        """
+        Gets metrics of the stage, stages are kept in order of their first call.
+
+        :param name: name of the stage.
+        :return: stage metrics
+        """
+        if name not in self.stages:
+            self.stages[name] = StageMetrics(name)
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageMetrics]:
+        """
+        Times the block as a call of the stage, rows and bytes are set by the block
+        on the yielded stage metrics.
+
+        :param name: name of the stage.
+        :return: stage metrics
+        """
+        stage = self.get_stage(name)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds += time.perf_counter() - start
+            stage.calls += 1
+            stage.peak_memory_bytes = peak_memory()
+
+    def iter_stage(self, name: str, chunks: Iterable['pd.DataFrame']) -> Iterator['pd.DataFrame']:
+        """
+        Times fetching every chunk from iterable as a call of the stage, e.g. download
+        and parsing of streamed data, and counts rows of the chunks.
+
+        :param name: name of the stage.
+        :param chunks: iterable of pandas dataframes.
+        :return: iterator of the same chunks
+        """
+        chunks = iter(chunks)
+        while True:
+            with self.stage(name) as stage:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    stage.rows_out += len(chunk)
+            if chunk is None:
+                return
+            yield chunk
+
+    def merge(self, stages: Dict[str, StageMetrics]) -> None:
+        """
+        Adds metrics of stages run elsewhere, e.g. in a worker process, to the run.
+        Times of stages run in parallel are summed, so they can exceed wall time of the run.
+
+        :param stages: stage metrics by stage name.
+        :return: N/A
+        """
+        for name, other in stages.items():
+            stage = self.get_stage(name)
+            stage.calls += other.calls
+            stage.seconds += other.seconds
+            stage.bytes += other.bytes
+            stage.rows_in += other.rows_in
+            stage.rows_out += other.rows_out
+            stage.rows_dropped += other.rows_dropped
+            stage.peak_memory_bytes = max(stage.peak_memory_bytes, other.peak_memory_bytes)
+
+    def to_dict(self, succeeded: bool = True) -> Dict:
+        """
+        Builds metrics record of the run.
+
+        :param succeeded: whether the run succeeded.
+        :return: dictionary with labels, outcome, total time, peak memory and metrics of every stage
+        """
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            **self.labels,
+            'succeeded': succeeded,
+            'seconds': round(time.perf_counter() - self._start, 6),
+            'peak_memory_bytes': peak_memory(),
+            'stages': {name: stage.to_dict() for name, stage in self.stages.items()}
+        }
+
+    def emit(
+        self,
+        succeeded: bool = True,
+        metrics_file: Optional[str] = None,
+        statsd_address: Optional[str] = None
+    ) -> Dict:
+        """
+        Logs metrics record of the run as json and optionally pushes it to metrics file
+        and StatsD sink. Failure to push is logged and does not fail the run.
+
+        :param succeeded: whether the run succeeded.
+        :param metrics_file: file to append the record to as a single json line.
+        :param statsd_address: host:port of StatsD UDP sink.
+        :return: metrics record
+        """
+        record = self.to_dict(succeeded)
+        line = json.dumps(record)
+        logger.info(f'Metrics: {line}')
+
+        if metrics_file:
+            try:
+                # a single write of a whole line, so processes appending to the same file do not interleave
+                with open(metrics_file, 'a') as file:
+                    file.write(line + '\n')
+            except OSError:
+                logger.exception(f'Failed to write metrics to {metrics_file}')
+
+        if statsd_address:
+            try:
+                push_statsd(record, statsd_address)
+            except (OSError, ValueError):
+                logger.exception(f'Failed to push metrics to StatsD {statsd_address}')
+
+        return record
+
+
+def statsd_lines(record: Dict, prefix: str = STATSD_PREFIX) -> List[str]:
+    """
+    Converts metrics record to StatsD lines: timers in milliseconds for wall time,
+    counters for bytes and rows and gauges for peak memory.
+
+    :param record: metrics record, see RunMetrics.to_dict.
+    :param prefix: prefix of metric names.
+    :return: list of StatsD lines
+    """
+    lines = [
+        f'{prefix}.seconds:{record["seconds"] * 1000:.3f}|ms',
+        f'{prefix}.peak_memory_bytes:{record["peak_memory_bytes"]}|g',
+        f'{prefix}.{"succeeded" if record["succeeded"] else "failed"}:1|c'
+    ]
+    for name, stage in record['stages'].items():
+        lines.append(f'{prefix}.{name}.seconds:{stage["seconds"] * 1000:.3f}|ms')
+        for field in ('bytes', 'rows_in', 'rows_out', 'rows_dropped'):
+            lines.append(f'{prefix}.{name}.{field}:{stage[field]}|c')
+    return lines
+
+
+def push_statsd(record: Dict, address: str) -> None:
+    """
+    Sends metrics record to StatsD sink over UDP, one datagram per metric.
+
+    :param record: metrics record, see RunMetrics.to_dict.
+    :param address: host:port of StatsD sink.
+    :raises ValueError: When address is not in host:port format
+    :return: N/A
+    """
+    host, port = parse_address(address)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for line in statsd_lines(record):
+            sock.sendto(line.encode(), (host, port))
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    """
+    Parses host:port address.
+
+    :param address: address in host:port format.
+    :raises ValueError: When address is not in host:port format
+    :return: tuple of host and port
+    """
+    host, _, port = address.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f'Address should be in host:port format, got {address}')
+    return host, int(port)
+
+
+def peak_memory() -> int:
+    """
+    Gets peak resident memory of the process so far.
+
+    :return: peak memory in bytes, 0 when it can not be measured
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
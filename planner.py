@@ -0,0 +1,234 @@
+import os
+from typing import List, NamedTuple, Optional, Sequence
+
+from aws.file_formats import PARQUET, get_compression, get_file_format
+from aws.s3_client import S3ObjectInfo, split_ranges
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# execution modes the planner chooses from
+IN_MEMORY = 'in_memory'
+STREAMING = 'streaming'
+MAP_REDUCE = 'map_reduce'
+
+# Estimates measured on impressions csv files with the schema columns parsed: a row takes ~56 bytes
+# of csv text, compressed csv and parquet files expand ~4 times into csv text.
+# Peak memory of the in-memory run (parse, validate, dedup, count) was measured at ~2.29 times the csv size,
+# the factor is rounded up to 3 to leave headroom for other data
+CSV_ROW_SIZE = 56
+PARSED_MEMORY_FACTOR = 3
+EXPANSION_FACTORS = {PARQUET: 4, 'gzip': 4, 'zstd': 4}
+# dedup keeps a 64-bit fingerprint of every distinct row, sorted runs are merged with a copy
+FINGERPRINT_SIZE = 16
+# memory of an interpreter with pandas imported, paid by every map/reduce worker process
+PROCESS_MEMORY = 150 * 1024 * 1024
+
+# share of available memory the run may use, the rest is left to the system and estimate errors
+MEMORY_BUDGET = 0.5
+# partitions smaller than this are not worth starting worker processes for
+MIN_MAP_REDUCE_SIZE = 256 * 1024 * 1024
+MIN_CHUNKSIZE = 10000
+MAX_CHUNKSIZE = 1000000
+# objects fetched and parsed concurrently per core in in-memory mode, parsing releases the GIL,
+# at most as many as connections of s3 client pool
+IO_WORKERS_PER_CPU = 2
+MAX_IO_WORKERS = 8
+
+
+class ExecutionPlan(NamedTuple):
+    """
+    How process_data runs over a date partition, chosen from object sizes of the listing
+    before anything is downloaded, with estimated peak memory of the run
+    """
+
+    mode: str
+    max_workers: int
+    chunksize: Optional[int]
+    map_processes: Optional[int]
+    objects: int
+    input_bytes: int
+    estimated_bytes: int
+    estimated_memory: int
+    available_memory: Optional[int]
+
+    @property
+    def fits(self) -> bool:
+        """Whether estimated memory fits the memory budget, always when available memory is unknown"""
+        return self.available_memory is None or self.estimated_memory <= self.available_memory * MEMORY_BUDGET
+
+    def describe(self) -> str:
+        """Plan as a single line, e.g. for dry run"""
+        settings = f'max_workers {self.max_workers}'
+        if self.chunksize:
+            settings += f', chunksize {self.chunksize} rows'
+        if self.map_processes:
+            settings += f', map_processes {self.map_processes}'
+        available = f'{_mb(self.available_memory)} available' if self.available_memory is not None \
+            else 'available memory unknown'
+        return (f'{self.mode} mode with {settings}: {self.objects} objects, {_mb(self.input_bytes)} listed, '
+                f'~{_mb(self.estimated_bytes)} of csv text, ~{_mb(self.estimated_memory)} peak memory, {available}')
+
+
+def plan_execution(
+    objects: List[S3ObjectInfo],
+    modes: Sequence[str] = (IN_MEMORY, STREAMING, MAP_REDUCE),
+    available_memory: Optional[int] = None,
+    cpus: Optional[int] = None,
+    range_size: Optional[int] = None
+) -> ExecutionPlan:
+    """
+    Chooses execution mode, worker count and chunk size for the partition.
+    Partitions fitting in memory are loaded at once, large ones which fit are mapped by worker processes
+    when there are several cores. Partitions over the memory budget are mapped by as many processes
+    as fit, or streamed in chunks sized to fit, dedup fingerprints of all rows are kept in both cases.
+    When nothing fits, the mode with the smallest estimate is chosen and a warning is logged.
+
+    :param objects: objects of the date partition from the listing.
+    :param modes: modes the transformation supports, in-memory one is always supported.
+    :param available_memory: memory the run may use in bytes, detected when not provided.
+    :param cpus: number of cores, detected when not provided.
+    :param range_size: plain csv objects larger than this are mapped in byte ranges of this size.
+    :return: execution plan
+    """
+    available_memory = available_memory if available_memory is not None else get_available_memory()
+    cpus = cpus or get_cpu_count()
+    budget = available_memory * MEMORY_BUDGET if available_memory is not None else None
+    dedup_memory = _dedup_memory(sum(_estimated_size(obj) for obj in objects))
+
+    in_memory = describe_execution(objects, IN_MEMORY, _io_workers(objects, cpus), available_memory=available_memory)
+    if in_memory.fits and (MAP_REDUCE not in modes or cpus < 2 or in_memory.estimated_bytes < MIN_MAP_REDUCE_SIZE):
+        return in_memory
+
+    candidates = [in_memory]
+    if MAP_REDUCE in modes and cpus > 1:
+        tasks = [(obj, byte_range) for obj in objects for byte_range in split_ranges(obj, range_size)]
+        task_memory = max(_task_size(obj, byte_range) for obj, byte_range in tasks) * PARSED_MEMORY_FACTOR \
+            + PROCESS_MEMORY
+        fitting = int((budget - dedup_memory) // task_memory) if budget is not None else cpus
+        processes = max(1, min(cpus, len(tasks), fitting))
+        plan = describe_execution(objects, MAP_REDUCE, 1, map_processes=processes, available_memory=available_memory,
+                                  range_size=range_size)
+        if plan.fits and processes > 1:
+            return plan
+        candidates.append(plan)
+
+    if in_memory.fits:
+        return in_memory
+
+    if STREAMING in modes:
+        chunksize = int((budget - dedup_memory) // (CSV_ROW_SIZE * PARSED_MEMORY_FACTOR))
+        chunksize = min(max(chunksize, MIN_CHUNKSIZE), MAX_CHUNKSIZE)
+        plan = describe_execution(objects, STREAMING, 1, chunksize=chunksize, available_memory=available_memory)
+        if plan.fits:
+            return plan
+        candidates.append(plan)
+
+    plan = min(candidates, key=lambda candidate: candidate.estimated_memory)
+    logger.warning(f'Estimated memory of the run does not fit the budget, planned {plan.describe()}')
+    return plan
+
+
+def describe_execution(
+    objects: List[S3ObjectInfo],
+    mode: str,
+    max_workers: int,
+    chunksize: Optional[int] = None,
+    map_processes: Optional[int] = None,
+    available_memory: Optional[int] = None,
+    range_size: Optional[int] = None
+) -> ExecutionPlan:
+    """
+    Estimates peak memory of the run in the given mode and settings, e.g. set by command line arguments.
+
+    :param objects: objects of the date partition from the listing.
+    :param mode: execution mode, in_memory, streaming or map_reduce.
+    :param max_workers: number of objects to fetch and parse concurrently.
+    :param chunksize: number of rows in a chunk in streaming mode.
+    :param map_processes: number of worker processes in map/reduce mode.
+    :param available_memory: memory the run may use in bytes, None when unknown.
+    :param range_size: plain csv objects larger than this are mapped in byte ranges of this size.
+    :return: execution plan
+    """
+    estimated_bytes = sum(_estimated_size(obj) for obj in objects)
+    if mode == STREAMING:
+        memory = chunksize * CSV_ROW_SIZE * PARSED_MEMORY_FACTOR + _dedup_memory(estimated_bytes)
+    elif mode == MAP_REDUCE:
+        task_size = max((_task_size(obj, byte_range) for obj in objects
+                         for byte_range in split_ranges(obj, range_size)), default=0)
+        memory = map_processes * (task_size * PARSED_MEMORY_FACTOR + PROCESS_MEMORY) + _dedup_memory(estimated_bytes)
+    else:
+        memory = estimated_bytes * PARSED_MEMORY_FACTOR
+
+    return ExecutionPlan(mode, max_workers, chunksize if mode == STREAMING else None,
+                         map_processes if mode == MAP_REDUCE else None, len(objects),
+                         sum(obj.size for obj in objects), estimated_bytes, int(memory), available_memory)
+
+
+def get_available_memory() -> Optional[int]:
+    """
+    Memory available to the process in bytes: available system memory, lowered by cgroup limit
+    of the container when there is one.
+
+    :return: available memory in bytes, None when it can not be detected
+    """
+    available = None
+    try:
+        with open('/proc/meminfo') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    available = int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        try:
+            available = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as file:
+                limit = int(file.read().strip())
+        except (OSError, ValueError):
+            continue
+        available = min(available, limit) if available is not None else limit
+        break
+
+    return available
+
+
+def get_cpu_count() -> int:
+    """Number of cores the process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _estimated_size(obj: S3ObjectInfo) -> int:
+    """Estimated size of object content as csv text"""
+    file_format = get_file_format(obj.key)
+    factor = EXPANSION_FACTORS.get(PARQUET if file_format == PARQUET else get_compression(obj.key), 1)
+    return obj.size * factor
+
+
+def _task_size(obj: S3ObjectInfo, byte_range) -> int:
+    """Estimated size of map task content as csv text, the whole object or its byte range"""
+    if byte_range is None:
+        return _estimated_size(obj)
+    return byte_range[1] - byte_range[0] + 1
+
+
+def _dedup_memory(estimated_bytes: int) -> int:
+    """Estimated memory of dedup fingerprints of all rows"""
+    return estimated_bytes // CSV_ROW_SIZE * FINGERPRINT_SIZE
+
+
+def _io_workers(objects: List[S3ObjectInfo], cpus: int) -> int:
+    """Number of objects to fetch and parse concurrently in in-memory mode"""
+    return max(1, min(len(objects), cpus * IO_WORKERS_PER_CPU, MAX_IO_WORKERS))
+
+
+def _mb(size: int) -> str:
+    """Size in MB for messages"""
+    return f'{size / 1024 / 1024:.1f} MB'
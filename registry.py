@@ -0,0 +1,273 @@
+from functools import partial
+from importlib import import_module
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+# This module is imported by the CLI before arguments are parsed, keep it free of heavy imports:
+# transformation modules, and pandas with them, are imported only when a transformation is selected
+
+# engines transformations can run on, pandas one runs every transformation in every mode,
+# arrow one runs transformations having arrow function in in-memory mode
+PANDAS = 'pandas'
+ARROW = 'arrow'
+ENGINES = (PANDAS, ARROW)
+
+# module with functions of the arrow engine, importing it imports pyarrow
+ARROW_MODULE = 'arrow_transformations'
+
+
+class Transformation(NamedTuple):
+    """
+    Registered transformation. Functions are referenced by module and name and imported on first use.
+    In-memory function is called with the raw dataframe, streaming one with an iterable of chunks,
+    both with schema_path and metrics keyword arguments, and return the transformed dataframe.
+    Map function is called in a worker process with the dataframe of a single file and the same
+    keyword arguments, reduce function with an iterable of map results in files order and metrics.
+    Options are additional keyword arguments in-memory, streaming and map functions accept, e.g. precision.
+    Count function counts already validated and deduplicated impressions into a pandas series,
+    transformations having one can share a single scan of the data, see aggregate_reports.
+    Arrow function of ARROW_MODULE is called with the raw arrow table instead of the dataframe
+    and returns the same dataframe as in-memory function.
+    Result of the transformation is stored as <result_name>_<date>_<initials>.
+    """
+
+    name: str
+    module: str
+    function: str
+    streaming_function: Optional[str] = None
+    schema_path: Optional[str] = None
+    incremental: bool = False
+    map_function: Optional[str] = None
+    reduce_function: Optional[str] = None
+    options: Tuple[str, ...] = ()
+    count_function: Optional[str] = None
+    result_name: str = 'daily_agg'
+    arrow_function: Optional[str] = None
+
+
+TRANSFORMATIONS: Dict[str, Transformation] = {
+    transformation.name: transformation for transformation in (
+        Transformation(
+            name='aggregate_impressions',
+            module='transformations',
+            function='aggregate_impressions',
+            streaming_function='aggregate_impressions_stream',
+            schema_path='schemas/impressions.yaml',
+            incremental=True,
+            map_function='map_impressions',
+            reduce_function='reduce_impressions',
+            count_function='count_campaign_impressions',
+            arrow_function='aggregate_impressions'
+        ),
+        Transformation(
+            name='aggregate_advertiser_impressions',
+            module='transformations',
+            function='aggregate_advertiser_impressions',
+            streaming_function='aggregate_advertiser_impressions_stream',
+            schema_path='schemas/advertiser_impressions.yaml',
+            count_function='count_advertiser_impressions',
+            result_name='daily_advertiser_agg',
+            arrow_function='aggregate_advertiser_impressions'
+        ),
+        Transformation(
+            name='aggregate_order_impressions',
+            module='transformations',
+            function='aggregate_order_impressions',
+            streaming_function='aggregate_order_impressions_stream',
+            schema_path='schemas/order_impressions.yaml',
+            count_function='count_order_impressions',
+            result_name='daily_order_agg',
+            arrow_function='aggregate_order_impressions'
+        ),
+        Transformation(
+            name='aggregate_agency_impressions',
+            module='transformations',
+            function='aggregate_agency_impressions',
+            streaming_function='aggregate_agency_impressions_stream',
+            schema_path='schemas/agency_impressions.yaml',
+            count_function='count_agency_impressions',
+            result_name='daily_agency_agg',
+            arrow_function='aggregate_agency_impressions'
+        ),
+        Transformation(
+            name='approx_aggregate_impressions',
+            module='transformations',
+            function='approx_aggregate_impressions',
+            streaming_function='approx_aggregate_impressions_stream',
+            schema_path='schemas/impressions.yaml',
+            map_function='map_approx_impressions',
+            reduce_function='reduce_approx_impressions',
+            options=('precision',),
+            result_name='daily_approx_agg'
+        ),
+        Transformation(
+            name='other',
+            module='transformations',
+            function='other_transformation'
+        )
+    )
+}
+
+
+def get_transformation(transformation_type: str) -> Transformation:
+    """
+    Gets registered transformation by its type
+
+    :param transformation_type: transformation type.
+    :raises ValueError: When transformation type is not registered
+    :return: registered transformation
+
+    """
+    if transformation_type not in TRANSFORMATIONS:
+        raise ValueError(f'Wrong transformation_type {transformation_type}')
+    return TRANSFORMATIONS[transformation_type]
+
+
+def check_options(transformation_type: str, options: Optional[Dict[str, object]] = None) -> None:
+    """
+    Checks transformation accepts the options
+
+    :param transformation_type: transformation type.
+    :param options: keyword options of the transformation.
+    :raises ValueError: When transformation type is not registered or does not accept some of the options
+
+    """
+    unsupported = sorted(set(options or {}) - set(get_transformation(transformation_type).options))
+    if unsupported:
+        raise ValueError(f'Transformation_type {transformation_type} does not support options {unsupported}')
+
+
+def check_modes(
+    transformation_types: Sequence[str],
+    chunksize: Optional[int] = None,
+    incremental: bool = False,
+    map_processes: Optional[int] = None,
+    shard: bool = False,
+    merge: bool = False,
+    engine: str = PANDAS,
+    auto: bool = False,
+    dry_run: bool = False,
+    options: Optional[Dict[str, object]] = None
+) -> None:
+    """
+    Checks transformations can run together in the selected mode, before anything is listed or downloaded.
+    Nothing is imported, so the CLI checks its arguments with the same rules as process_data.
+
+    :param transformation_types: transformation types sharing a scan, without duplicates.
+    :param chunksize: streaming mode chunk size.
+    :param incremental: incremental mode.
+    :param map_processes: map/reduce mode worker processes.
+    :param shard: shard mode.
+    :param merge: merge mode.
+    :param engine: engine to parse and transform the data on.
+    :param auto: auto mode, which chooses chunksize and map_processes.
+    :param dry_run: dry run, which only plans the execution.
+    :param options: keyword options of the transformations.
+    :raises ValueError: When transformation type is not registered, does not support the engine or the options,
+        or the modes can not be combined
+
+    """
+    if not transformation_types:
+        raise ValueError('At least one transformation_type is required')
+    if len(transformation_types) > 1 and (incremental or map_processes or shard or merge):
+        raise ValueError('Several transformation types can be applied in in-memory or streaming mode only')
+    if map_processes and (incremental or chunksize):
+        raise ValueError('Map/reduce mode can not be combined with incremental or streaming mode')
+    if (shard or merge) and (incremental or chunksize or map_processes):
+        raise ValueError('Shard and merge modes can not be combined with incremental, streaming or map/reduce mode')
+    if shard and merge:
+        raise ValueError('Shard and merge modes can not be combined')
+    if engine not in ENGINES:
+        raise ValueError(f'Engine should be one of {ENGINES}, got {engine}')
+    if engine != PANDAS and (len(transformation_types) > 1 or chunksize or incremental or map_processes
+                             or shard or merge):
+        raise ValueError(f'Engine {engine} can be applied in in-memory mode only')
+    if auto and (chunksize or map_processes):
+        raise ValueError('Auto mode chooses chunksize and map_processes, they can not be set explicitly')
+    if (auto or dry_run) and (shard or merge):
+        raise ValueError('Auto mode and dry run can not be combined with shard or merge mode')
+
+    for transformation_type in transformation_types:
+        transformation = get_transformation(transformation_type)
+        check_options(transformation_type, options)
+        if engine != PANDAS and transformation.arrow_function is None:
+            raise ValueError(f'Transformation_type {transformation_type} does not support arrow engine')
+        if len(transformation_types) > 1 and transformation.count_function is None:
+            raise ValueError(f'Transformation_type {transformation_type} can not share a scan with other transformations')
+    result_names = [get_transformation(name).result_name for name in transformation_types]
+    duplicates = sorted({name for name in result_names if result_names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f'Transformation types {list(transformation_types)} would save several results as {duplicates}')
+
+
+def load_function(
+    transformation_type: str,
+    streaming: bool = False,
+    options: Optional[Dict[str, object]] = None,
+    engine: str = PANDAS
+) -> Callable:
+    """
+    Imports module of the transformation and gets its function
+
+    :param transformation_type: transformation type.
+    :param streaming: get the streaming function instead of in-memory one.
+    :param options: keyword options to bind to the function.
+    :param engine: engine to get in-memory function of, pandas or arrow.
+    :raises ValueError: When transformation type is not registered, does not support streaming mode,
+        the engine or the options
+    :return: transformation function
+
+    """
+    transformation = get_transformation(transformation_type)
+    if engine not in ENGINES:
+        raise ValueError(f'Engine should be one of {ENGINES}, got {engine}')
+    if engine == ARROW:
+        if streaming or transformation.arrow_function is None:
+            raise ValueError(f'Transformation_type {transformation_type} does not support arrow engine'
+                             + (' in streaming mode' if streaming else ''))
+        module, name = ARROW_MODULE, transformation.arrow_function
+    else:
+        module = transformation.module
+        name = transformation.streaming_function if streaming else transformation.function
+    if name is None:
+        raise ValueError(f'Transformation_type {transformation_type} does not support streaming mode')
+    check_options(transformation_type, options)
+    function = getattr(import_module(module), name)
+    return partial(function, **options) if options else function
+
+
+def load_count_function(transformation_type: str) -> Callable:
+    """
+    Imports module of the transformation and gets its count function
+
+    :param transformation_type: transformation type.
+    :raises ValueError: When transformation type is not registered or can not share a scan with others
+    :return: count function
+
+    """
+    transformation = get_transformation(transformation_type)
+    if transformation.count_function is None:
+        raise ValueError(f'Transformation_type {transformation_type} can not share a scan with other transformations')
+    return getattr(import_module(transformation.module), transformation.count_function)
+
+
+def load_map_reduce(
+    transformation_type: str,
+    options: Optional[Dict[str, object]] = None
+) -> Tuple[Callable, Callable]:
+    """
+    Imports module of the transformation and gets its map and reduce functions
+
+    :param transformation_type: transformation type.
+    :param options: keyword options to bind to the map function.
+    :raises ValueError: When transformation type is not registered, does not support map/reduce mode
+        or the options
+    :return: tuple of map and reduce functions
+
+    """
+    transformation = get_transformation(transformation_type)
+    if transformation.map_function is None or transformation.reduce_function is None:
+        raise ValueError(f'Transformation_type {transformation_type} does not support map/reduce mode')
+    check_options(transformation_type, options)
+    module = import_module(transformation.module)
+    map_function = getattr(module, transformation.map_function)
+    return partial(map_function, **options) if options else map_function, getattr(module, transformation.reduce_function)
@@ -0,0 +1,242 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# strftime directives of fixed width digits, formats made of them and literals
+# are checked byte by byte against a template instead of being parsed
+FIXED_WIDTH_DIRECTIVES = {'%Y': b'dddd', '%m': b'dd', '%d': b'dd', '%H': b'dd', '%M': b'dd', '%S': b'dd'}
+# to_datetime accepts fractional seconds after %S, milliseconds are checked against a template as well
+FRACTION_TEMPLATE = b'.ddd'
+
+
+class ColumnRule(NamedTuple):
+    """Validation rules of a single schema column"""
+
+    name: str
+    nullable: bool
+    dtype: Optional[str]
+    format: Optional[str]
+
+
+class SchemaValidator():
+    """
+    Validator compiled once from yaml schema columns definitions and reused for every
+    dataframe or chunk. Checks presence of all columns, nulls in not nullable columns
+    in a single vectorized pass, declared dtypes and formats of string columns.
+    """
+
+    def __init__(self, columns: Dict[str, Dict]):
+        """
+        :param columns: dictionary with column name as a key and its definition as a value,
+            definition has nullable flag and optional dtype and format.
+        """
+        self.rules = [
+            ColumnRule(name, bool(value.get('nullable', True)), value.get('dtype'), value.get('format'))
+            for name, value in columns.items()
+        ]
+        self.columns = [rule.name for rule in self.rules]
+        self.not_nullable = [rule.name for rule in self.rules if not rule.nullable]
+        self.templates = {
+            rule.name: compile_templates(rule.format) for rule in self.rules if rule.format is not None
+        }
+
+    def validate(self, df: pd.DataFrame) -> List[str]:
+        """
+        Validates dataframe or a single chunk of streamed data.
+        Every column is scanned once: not nullable columns without format are checked for nulls
+        together in one vectorized pass, string columns with fixed width format are compared with
+        their template and only the few values not matching it are checked for nulls and parsed.
+
+        :param df: pandas dataframe with data to validate.
+        :return: list of errors, empty when data match schema
+        """
+        missing = [col for col in self.columns if col not in df]
+        if missing:
+            return [f'Required column {col} is missing in dataset' for col in missing]
+
+        errors = []
+        dtype_errors = {
+            rule.name for rule in self.rules
+            if rule.dtype is not None and not _is_dtype_compatible(df[rule.name], rule.dtype, rule.format)
+        }
+        unmatched = {
+            rule.name: self._unmatched_values(df[rule.name], rule) for rule in self.rules
+            if rule.format is not None and rule.name not in dtype_errors
+        }
+
+        not_nullable = [col for col in self.not_nullable if unmatched.get(col) is None]
+        if not_nullable:
+            has_null = dict(zip(not_nullable, df[not_nullable].isna().to_numpy().any(axis=0)))
+        else:
+            has_null = {}
+        for col, values in unmatched.items():
+            if col in self.not_nullable and values is not None:
+                has_null[col] = values.isna().any()
+
+        for rule in self.rules:
+            if has_null.get(rule.name):
+                errors.append(f'Column {rule.name} has none values but should NOT be nullable')
+            if rule.name in dtype_errors:
+                errors.append(f'Column {rule.name} has dtype {df[rule.name].dtype}, expected {rule.dtype}')
+            elif rule.format is not None and not self._matches_format(unmatched[rule.name], df[rule.name], rule):
+                errors.append(f'Column {rule.name} has values not matching format {rule.format}')
+
+        return errors
+
+    def is_valid(self, df: pd.DataFrame) -> bool:
+        """
+        Checks if dataframe or a single chunk of streamed data match schema.
+
+        :param df: pandas dataframe with data to validate.
+        :return: True when data match schema
+        """
+        return not self.validate(df)
+
+    def _unmatched_values(self, values: pd.Series, rule: ColumnRule) -> Optional[pd.Series]:
+        """
+        Compares string values with fixed width templates of column format, values not matching
+        the first template are compared with the next one.
+
+        :param values: pandas series with column values.
+        :param rule: column rule with format.
+        :return: pandas series with values not matching any template, nulls included,
+            None when format has no template or values are not strings
+        """
+        templates = self.templates[rule.name]
+        if not templates or values.dtype.kind != 'O':
+            return None
+
+        for template in templates:
+            if values.empty:
+                break
+            matched = match_template(values, template)
+            if matched is None:
+                return None
+            values = values[~matched[1]]
+        return values
+
+    def _matches_format(self, unmatched: Optional[pd.Series], values: pd.Series, rule: ColumnRule) -> bool:
+        """
+        Checks that all not null values match column format, values not matching
+        template are parsed with pandas.
+
+        :param unmatched: values not matching template, None when template was not checked.
+        :param values: pandas series with all column values.
+        :param rule: column rule with format.
+        :return: True when all values match format
+        """
+        if values.dtype.kind == 'M':
+            return True
+
+        values = values if unmatched is None else unmatched
+        values = values[values.notna()]
+        if values.empty:
+            return True
+
+        parsed = pd.to_datetime(values, format=rule.format, errors='coerce')
+        return not parsed.isna().any()
+
+
+def compile_template(date_format: str) -> Optional[bytes]:
+    """
+    Compiles strftime format into fixed width template, 'd' marks digits positions
+    and other characters should match literally, e.g. '%Y-%m-%d' into b'dddd-dd-dd'.
+
+    :param date_format: strftime format.
+    :return: template, None when format has directives of variable width
+    """
+    template = b''
+    for token in re.split(r'(%.)', date_format):
+        if token in FIXED_WIDTH_DIRECTIVES:
+            template += FIXED_WIDTH_DIRECTIVES[token]
+        elif token.startswith('%') or 'd' in token:
+            return None
+        else:
+            try:
+                template += token.encode('ascii')
+            except UnicodeEncodeError:
+                return None
+    return template
+
+
+def compile_templates(date_format: str) -> Tuple[bytes, ...]:
+    """
+    Compiles strftime format into fixed width templates of its values, formats ending with seconds
+    get the template with milliseconds first, e.g. '%H:%M:%S' into (b'dd:dd:dd.ddd', b'dd:dd:dd').
+
+    :param date_format: strftime format.
+    :return: templates in order they are checked, empty when format has directives of variable width
+    """
+    template = compile_template(date_format)
+    if template is None:
+        return ()
+    if date_format.endswith('%S'):
+        return template + FRACTION_TEMPLATE, template
+    return (template,)
+
+
+def match_template(values: pd.Series, template: bytes) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Checks string values against fixed width template in a single vectorized pass.
+    Values are converted to fixed-width bytes once, rows are padded to 8 bytes words,
+    so the comparison is done on uint64 words.
+
+    :param values: pandas series with string values.
+    :param template: fixed width template, see compile_template.
+    :return: tuple of uint8 matrix with characters of every row and bool array,
+        True for rows matching template; None when values are not ascii strings
+    """
+    # one extra byte catches values longer than template
+    width = -(-(len(template) + 1) // 8) * 8
+    try:
+        encoded = values.to_numpy().astype(f'S{width}')
+    except (UnicodeEncodeError, TypeError, ValueError):
+        return None
+    chars = encoded.view(np.uint8).reshape(len(encoded), width)
+
+    # every character should fall in [low, low + span] range: 0-9 for digits, exact match for literals
+    template = np.frombuffer(template.ljust(width, b'\0'), dtype=np.uint8)
+    is_digit = template == ord('d')
+    low = np.where(is_digit, np.uint8(ord('0')), template)
+    span = np.where(is_digit, np.uint8(9), np.uint8(0))
+    mismatch = ((chars - low) > span).view(np.uint64)
+    matched = mismatch[:, 0] == 0
+    for word in range(1, mismatch.shape[1]):
+        matched &= mismatch[:, word] == 0
+
+    return chars, matched
+
+
+def _is_dtype_compatible(values: pd.Series, dtype: str, date_format: Optional[str] = None) -> bool:
+    """
+    Checks if column dtype is compatible with declared one. Data loaded without declared dtypes
+    is accepted too, e.g. integer ids with nulls parsed as floats. String columns with format
+    can hold already parsed timestamps.
+
+    :param values: pandas series with column values.
+    :param dtype: declared dtype.
+    :param date_format: declared format of string column.
+    :return: True when column dtype is compatible
+    """
+    actual = values.dtype
+    if dtype == 'category' or isinstance(actual, pd.CategoricalDtype):
+        return True
+    if dtype in ('str', 'object', 'string'):
+        return pd.api.types.is_object_dtype(actual) or pd.api.types.is_string_dtype(actual) \
+            or (date_format is not None and pd.api.types.is_datetime64_any_dtype(actual))
+
+    expected = pd.api.types.pandas_dtype(dtype)
+    if pd.api.types.is_integer_dtype(expected):
+        if pd.api.types.is_integer_dtype(actual):
+            return True
+        if pd.api.types.is_float_dtype(actual):
+            floats = values.to_numpy(dtype='float64', na_value=np.nan)
+            floats = floats[~np.isnan(floats)]
+            return bool(np.all(floats == np.floor(floats)))
+        return False
+    if pd.api.types.is_float_dtype(expected):
+        return pd.api.types.is_numeric_dtype(actual) and not pd.api.types.is_bool_dtype(actual)
+    if pd.api.types.is_bool_dtype(expected):
+        return pd.api.types.is_bool_dtype(actual)
+    return actual == expected
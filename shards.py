@@ -0,0 +1,208 @@
+import os
+import re
+import zlib
+from io import BytesIO
+from typing import List, NamedTuple, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from aws.file_formats import strip_compression
+from aws.s3_client import S3ObjectInfo, StorageClient
+from hll import HyperLogLogSketches
+from transformations import PartialCounts
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# keys are assigned to shards by hash of the object key, every file is read by a single shard
+SHARD_BY_KEY = 'key'
+# rows are assigned to shards by hash of CAMPAIGN_ID, every shard reads all files
+SHARD_BY_CAMPAIGN = 'campaign'
+SHARD_BY = (SHARD_BY_KEY, SHARD_BY_CAMPAIGN)
+
+# when sharded by CAMPAIGN_ID files are read in chunks of this many rows, rows of other shards
+# are dropped chunk by chunk, so only the slice of the shard is held in memory
+SHARD_CHUNKSIZE = 100_000
+
+PARTIAL_KEY_PATTERN = re.compile(r'\.shard-(\d+)-of-(\d+)\.npz$')
+
+# kinds of stored partials, shard without files stores empty one
+PARTIAL_COUNTS = 'counts'
+PARTIAL_SKETCHES = 'sketches'
+PARTIAL_EMPTY = 'empty'
+
+Partial = Union[PartialCounts, HyperLogLogSketches]
+
+
+class Shard(NamedTuple):
+    """
+    One of count shards a date partition is split into, so it can be aggregated on several machines.
+    Assignment of keys and rows to shards is deterministic, it depends on hashes only,
+    so every shard of the same run can be computed independently.
+    """
+
+    index: int
+    count: int
+
+    @classmethod
+    def parse(cls, value: str) -> 'Shard':
+        """
+        Parses shard in i/N format, shards are numbered from 0 to N-1.
+
+        :param value: shard in i/N format.
+        :raises ValueError: When value is not in i/N format or index is out of range
+        :return: shard
+        """
+        index, _, count = value.partition('/')
+        if not index.isdigit() or not count.isdigit() or not 0 <= int(index) < int(count):
+            raise ValueError(f'Shard should be in i/N format with 0 <= i < N, got {value}')
+        return cls(int(index), int(count))
+
+    def owns_key(self, key: str) -> bool:
+        """Whether the object key is assigned to the shard, crc32 is stable across processes unlike hash()"""
+        return zlib.crc32(key.encode()) % self.count == self.index
+
+    def select_objects(self, objects: List[S3ObjectInfo]) -> List[S3ObjectInfo]:
+        """
+        Selects objects assigned to the shard by hash of their key.
+
+        :param objects: all objects of the date partition.
+        :return: objects of the shard, in the same order
+        """
+        return [obj for obj in objects if self.owns_key(obj.key)]
+
+    def filter_rows(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Selects rows assigned to the shard by hash of CAMPAIGN_ID, so duplicates,
+        which have the same campaign id, always end up in the same shard.
+
+        :param df: pandas dataframe with CAMPAIGN_ID column.
+        :return: pandas dataframe with rows of the shard
+        """
+        hashes = pd.util.hash_pandas_object(df.CAMPAIGN_ID, index=False).to_numpy()
+        return df[hashes % np.uint64(self.count) == np.uint64(self.index)]
+
+    def partial_key(self, result_key: str) -> str:
+        """Key of the shard partial stored next to result object"""
+        return f'{_result_base(result_key)}.shard-{self.index:04d}-of-{self.count:04d}.npz'
+
+
+def save_partial(
+    s3_client: StorageClient,
+    bucket: str,
+    result_key: str,
+    shard: Shard,
+    shard_by: str,
+    partial: Optional[Partial]
+) -> str:
+    """
+    Stores partial result of the shard next to the result object, as numpy arrays of campaign ids
+    and hours with either counts, fingerprints and groups of counted rows, or sketch registers.
+
+    :param s3_client: s3 client to store partial with.
+    :param bucket: the s3 bucket name with result object.
+    :param result_key: key of the result object.
+    :param shard: shard the partial result belongs to.
+    :param shard_by: how keys or rows were assigned to shards, key or campaign.
+    :param partial: partial counts or sketches of the shard, None when shard had no files.
+    :return: key of stored partial
+    """
+    if partial is None:
+        kind, arrays = PARTIAL_EMPTY, {}
+    elif isinstance(partial, HyperLogLogSketches):
+        kind, arrays = PARTIAL_SKETCHES, {'registers': partial.registers}
+        arrays.update(_index_arrays(partial.index))
+    else:
+        kind = PARTIAL_COUNTS
+        arrays = {'counts': partial.counts.to_numpy(dtype=np.int64), 'fingerprints': partial.fingerprints,
+                  'groups': partial.groups}
+        arrays.update(_index_arrays(partial.counts.index))
+
+    buffer = BytesIO()
+    np.savez(buffer, shard=np.array([shard.index, shard.count]), shard_by=np.array(shard_by), kind=np.array(kind),
+             **arrays)
+    key = shard.partial_key(result_key)
+    s3_client.put_object(bucket, key, buffer.getvalue())
+    return key
+
+
+def load_partials(
+    s3_client: StorageClient,
+    bucket: str,
+    result_key: str,
+    campaign_dtype: Optional[str] = None
+) -> List[Partial]:
+    """
+    Loads partial results of all shards stored next to the result object, in shard order,
+    empty partials of shards without files are skipped.
+    All shards of the same split have to be present, so the merged result is complete.
+
+    :param s3_client: s3 client to load partials with.
+    :param bucket: the s3 bucket name with result object.
+    :param result_key: key of the result object.
+    :param campaign_dtype: dtype of CAMPAIGN_ID, same as used for loading the data.
+    :raises ValueError: When there are no partials, some shards are missing,
+        or partials of different splits or kinds are mixed
+    :return: list of partial counts or sketches
+    """
+    base = _result_base(result_key)
+    shards = {}
+    for obj in s3_client.list_objects(bucket, f'{base}.shard-'):
+        match = PARTIAL_KEY_PATTERN.search(obj.key)
+        if match:
+            shards[Shard(int(match.group(1)), int(match.group(2)))] = obj.key
+
+    if not shards:
+        raise ValueError(f'No shard partials found for {result_key}')
+    counts = {shard.count for shard in shards}
+    if len(counts) > 1:
+        raise ValueError(f'Shard partials of different shard counts {sorted(counts)} found for {result_key}')
+    count = counts.pop()
+    missing = [f'{index}/{count}' for index in range(count) if Shard(index, count) not in shards]
+    if missing:
+        raise ValueError(f'Shard partials {missing} are missing for {result_key}')
+
+    partials, shard_by, kinds = [], set(), set()
+    for index in range(count):
+        key = shards[Shard(index, count)]
+        with np.load(BytesIO(s3_client.get_object(bucket, key)['Body'].read()), allow_pickle=False) as arrays:
+            shard_by.add(str(arrays['shard_by']))
+            kind = str(arrays['kind'])
+            if kind != PARTIAL_EMPTY:
+                kinds.add(kind)
+                partials.append(_to_partial(kind, arrays, campaign_dtype))
+        logger.info(f'Loaded shard partial {key}')
+
+    if len(shard_by) > 1:
+        raise ValueError(f'Shard partials split by different {sorted(shard_by)} found for {result_key}')
+    if len(kinds) > 1:
+        raise ValueError(f'Shard partials of different kinds {sorted(kinds)} found for {result_key}')
+    return partials
+
+
+def _index_arrays(index: pd.MultiIndex) -> dict:
+    """Campaign ids and hours of (CAMPAIGN_ID, HOUR) index as numpy arrays"""
+    # float keeps missing values of nullable integers, dtype is restored by load_partials
+    campaign = pd.Series(index.get_level_values('CAMPAIGN_ID')).to_numpy(dtype=np.float64, na_value=np.nan)
+    return {'campaign': campaign, 'hours': index.get_level_values('HOUR').to_numpy(dtype=np.int64)}
+
+
+def _to_partial(kind: str, arrays, campaign_dtype: Optional[str] = None) -> Partial:
+    """Builds partial result from stored arrays, rows keep their order, groups refer to it"""
+    campaign = pd.Series(arrays['campaign'])
+    if campaign_dtype is not None:
+        campaign = campaign.astype(campaign_dtype)
+    index = pd.MultiIndex.from_arrays([campaign, arrays['hours']], names=['CAMPAIGN_ID', 'HOUR'])
+    if kind == PARTIAL_SKETCHES:
+        registers = arrays['registers']
+        return HyperLogLogSketches(index, registers, registers.shape[1].bit_length() - 1)
+
+    counts = pd.Series(arrays['counts'], index=index, name='IMPRESSIONS_COUNT')
+    return PartialCounts(counts, arrays['fingerprints'].astype(np.uint64), arrays['groups'].astype(np.int64))
+
+
+def _result_base(result_key: str) -> str:
+    """Result key without extension and compression suffix"""
+    return os.path.splitext(strip_compression(result_key))[0]
@@ -0,0 +1,138 @@
+import gzip
+from io import BytesIO
+import pyarrow as pa
+import pytest
+from aws.file_formats import (
+    CSV,
+    PARQUET,
+    get_compression,
+    get_file_extension,
+    get_file_format,
+    is_data_file,
+    read_csv_kwargs,
+    read_table
+)
+import pandas as pd
+
+# ==== get_file_format ====
+
+def test_get_file_format():
+    """
+    test_get_file_format validates format is picked by extension, also behind compression one
+    """
+
+    # Given
+
+    # When
+    # Then
+    assert get_file_format('2022/04/15/file.csv') == 'csv'
+    assert get_file_format('2022/04/15/file.csv.gz') == 'csv'
+    assert get_file_format('2022/04/15/file.csv.zst') == 'csv'
+    assert get_file_format('2022/04/15/file.parquet') == 'parquet'
+    assert get_file_format('2022/04/15/file') == 'csv'
+
+def test_get_compression():
+    """
+    test_get_compression validates compression is picked by extension
+    """
+
+    # Given
+
+    # When
+    # Then
+    assert get_compression('file.csv.gz') == 'gzip'
+    assert get_compression('file.csv.zst') == 'zstd'
+    assert get_compression('file.csv') is None
+
+# ==== is_data_file ====
+
+def test_is_data_file():
+    """
+    test_is_data_file validates that csv can be compressed and other files are skipped
+    """
+
+    # Given
+
+    # When
+    # Then
+    assert is_data_file('file.csv')
+    assert is_data_file('file.csv.gz')
+    assert is_data_file('file.csv.zst')
+    assert is_data_file('file.parquet')
+    assert not is_data_file('file.parquet.gz')
+    assert not is_data_file('file.json.gz')
+    assert not is_data_file('file.json')
+
+# ==== get_file_extension ====
+
+def test_get_file_extension():
+    """
+    test_get_file_extension validates compression extension is added to csv only
+    """
+
+    # Given
+
+    # When
+    # Then
+    assert get_file_extension('csv') == 'csv'
+    assert get_file_extension('csv', 'gzip') == 'csv.gz'
+    assert get_file_extension('csv', 'zstd') == 'csv.zst'
+    assert get_file_extension('parquet', 'gzip') == 'parquet'
+
+# ==== read_csv_kwargs ====
+
+def test_read_csv_kwargs():
+    """
+    test_read_csv_kwargs validates projected columns, dtypes and compression are passed to parser
+    """
+
+    # Given
+    columns = {'IMPRESSION_ID': 'Int32', 'IMPRESSION_DATETIME': None}
+
+    # When
+    res = read_csv_kwargs(columns, 'gzip')
+
+    # Then
+    assert read_csv_kwargs(None) == {}
+    assert res == {
+        'compression': 'gzip',
+        'usecols': ['IMPRESSION_ID', 'IMPRESSION_DATETIME'],
+        'dtype': {'IMPRESSION_ID': 'Int32'}
+    }
+
+# ==== read_table ====
+
+def test_read_table():
+    """
+    test_read_table validates csv is read with arrow types of declared dtypes, integers written as floats
+    and empty strings are read as pandas reads them, compressed csv and parquet are read too
+    """
+
+    # Given
+    data = b'IMPRESSION_ID,CAMPAIGN_ID,IMPRESSION_DATETIME,OTHER\n1,1111.0,2021-01-30 14:34:32.000,x\n2,,,y\n'
+    columns = {'IMPRESSION_ID': 'Int32', 'CAMPAIGN_ID': 'Int32', 'IMPRESSION_DATETIME': 'str'}
+    parquet = BytesIO()
+    pd.read_csv(BytesIO(data), usecols=list(columns), dtype=columns).to_parquet(parquet, index=False)
+
+    # When
+    res = read_table(BytesIO(data), CSV, columns)
+    res_compressed = read_table(BytesIO(gzip.compress(data)), CSV, columns, 'gzip')
+    res_parquet = read_table(parquet, PARQUET, columns)
+
+    # Then
+    assert res.schema == pa.schema([('IMPRESSION_ID', pa.int32()), ('CAMPAIGN_ID', pa.int32()),
+                                    ('IMPRESSION_DATETIME', pa.string())])
+    assert res.to_pydict() == {'IMPRESSION_ID': [1, 2], 'CAMPAIGN_ID': [1111, None],
+                               'IMPRESSION_DATETIME': ['2021-01-30 14:34:32.000', None]}
+    assert res_compressed.equals(res)
+    assert res_parquet.equals(res)
+
+def test_read_table_fractional():
+    """
+    test_read_table_fractional validates fractional value of integer column fails as in pandas
+    """
+
+    # When
+    # Then
+    with pytest.raises(pa.ArrowInvalid):
+        read_table(BytesIO(b'IMPRESSION_ID\n1.5\n'), CSV, {'IMPRESSION_ID': 'Int32'})
@@ -0,0 +1,170 @@
+import gzip
+import mmap
+import os
+import pytest
+from aws.local_storage import LocalStorageClient
+from aws.s3_client import S3Client, S3GetObjectError, S3ObjectInfo, StorageClient
+import pandas as pd
+
+# ==== Fixtures ====
+
+@pytest.fixture
+def storage_fixture(tmp_path):
+    """Bucket directory with a day of csv files, an hourly sub-directory and a file being written"""
+    partition = tmp_path / 'test-bucket' / '2022' / '04' / '15'
+    (partition / '01').mkdir(parents=True)
+    with open('tests/unit/fixtures/df_fixture.csv', 'rb') as file:
+        (partition / 'impressions.csv').write_bytes(file.read())
+    (partition / '01' / 'impressions.csv').write_bytes(b'IMPRESSION_ID\n1\n')
+    (partition / '.impressions.csv.tmp').write_bytes(b'partial')
+    (tmp_path / 'test-bucket' / '2022' / '04' / '16').mkdir()
+    return LocalStorageClient(str(tmp_path))
+
+# ==== init ====
+
+def test_local_storage_client_init(tmp_path):
+    """
+    test_local_storage_client_init validates local storage client is a storage client next to S3Client,
+    without boto3 client or cache
+    """
+
+    # When
+    storage_client = LocalStorageClient(str(tmp_path), max_workers=4, range_size=100)
+
+    # Then
+    assert isinstance(storage_client, StorageClient)
+    assert not isinstance(storage_client, S3Client)
+    assert (storage_client.max_workers, storage_client.range_size) == (4, 100)
+    assert not hasattr(storage_client, 'client')
+
+# ==== listing ====
+
+def test_list_data_objects(storage_fixture):
+    """
+    test_list_data_objects validates files of the date partition are listed with their size by key,
+    hidden files and other partitions are skipped, with or without fan out
+    """
+
+    # When
+    res = storage_fixture.list_data_objects('test-bucket', '2022/04/15')
+    res_fan_out = storage_fixture.list_data_objects('test-bucket', '2022/04/15', fan_out=True)
+
+    # Then
+    assert [(obj.key, obj.size) for obj in res] == [('2022/04/15/01/impressions.csv', 16),
+                                                    ('2022/04/15/impressions.csv', 526)]
+    assert res_fan_out == res
+    assert storage_fixture.bucket_exist('test-bucket')
+    assert not storage_fixture.bucket_exist('other-bucket')
+    assert storage_fixture.list_data_objects('other-bucket', '2022/04/15') == []
+
+# ==== get_object ====
+
+def test_get_object(storage_fixture):
+    """
+    test_get_object validates file is read through memory map, byte ranges are read as requested
+    and read bytes are counted
+    """
+
+    # When
+    res = storage_fixture.get_object('test-bucket', '2022/04/15/01/impressions.csv')
+    res_range = storage_fixture.get_object('test-bucket', '2022/04/15/01/impressions.csv', byte_range=(14, 20))
+
+    # Then
+    assert isinstance(res['Body'], mmap.mmap)
+    assert res['Body'].read() == b'IMPRESSION_ID\n1\n'
+    assert res_range['Body'].read() == b'1\n'
+    assert storage_fixture.transfer.downloaded == 18
+
+def test_get_object_error(storage_fixture):
+    """
+    test_get_object_error validates missing file and key outside of the bucket raise S3GetObjectError
+    """
+
+    # When
+    # Then
+    with pytest.raises(S3GetObjectError):
+        storage_fixture.get_object('test-bucket', '2022/04/15/missing.csv')
+    with pytest.raises(S3GetObjectError):
+        storage_fixture.get_object('test-bucket', '../other-bucket/impressions.csv')
+
+def test_export_s3_to_df(storage_fixture):
+    """
+    test_export_s3_to_df validates files are parsed same as read directly, also in byte ranges
+    """
+
+    # Given
+    expected_df = pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+    storage_fixture.max_workers = 2
+
+    # When
+    res = storage_fixture.export_s3_to_df('test-bucket', ['2022/04/15/impressions.csv'])
+    storage_fixture.range_size = 40
+    res_ranges = storage_fixture.export_s3_to_df('test-bucket', ['2022/04/15/impressions.csv'])
+
+    # Then
+    assert res.equals(expected_df)
+    assert res_ranges.equals(expected_df)
+
+def test_export_s3_to_df_compressed(storage_fixture, tmp_path):
+    """
+    test_export_s3_to_df_compressed validates compressed files are decompressed while they are parsed
+    """
+
+    # Given
+    expected_df = pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+    partition = tmp_path / 'test-bucket' / '2022' / '04' / '15'
+    (partition / 'impressions.csv.gz').write_bytes(gzip.compress((partition / 'impressions.csv').read_bytes()))
+
+    # When
+    res = storage_fixture.export_s3_to_df('test-bucket', ['2022/04/15/impressions.csv.gz'])
+
+    # Then
+    assert res.equals(expected_df)
+
+# ==== writing ====
+
+def test_export_df_to_s3(storage_fixture, tmp_path):
+    """
+    test_export_df_to_s3 validates result is written to the bucket directory, missing directories
+    are created and the file is listed with written size
+    """
+
+    # Given
+    df = pd.DataFrame({'CAMPAIGN_ID': [1111, 2222], 'IMPRESSIONS_COUNT': [2, 1]})
+
+    # When
+    storage_fixture.export_df_to_s3('test-bucket', 'results/2022/04/15/daily_agg_20220415_TI.parquet', df)
+
+    # Then
+    res = storage_fixture.list_objects('test-bucket', 'results/')
+    assert [obj.key for obj in res] == ['results/2022/04/15/daily_agg_20220415_TI.parquet']
+    assert res[0].size == storage_fixture.transfer.uploaded
+    assert pd.read_parquet(tmp_path / 'test-bucket' / res[0].key).equals(df)
+
+def test_open_writer_error(storage_fixture, tmp_path):
+    """
+    test_open_writer_error validates failed write leaves neither partial nor temporary file behind
+    """
+
+    # When
+    with pytest.raises(RuntimeError):
+        with storage_fixture.open_writer('test-bucket', 'results/result.csv') as writer:
+            writer.write(b'partial')
+            raise RuntimeError('failed')
+
+    # Then
+    assert os.listdir(tmp_path / 'test-bucket' / 'results') == []
+
+def test_put_object(storage_fixture):
+    """
+    test_put_object validates object is replaced and its ETag changes with the content
+    """
+
+    # When
+    first = storage_fixture.put_object('test-bucket', 'results/manifest.json', b'{}')
+    second = storage_fixture.put_object('test-bucket', 'results/manifest.json', b'{"a": 1}')
+
+    # Then
+    assert first['ETag'] != second['ETag']
+    assert storage_fixture.list_objects('test-bucket', 'results/') == \
+        [S3ObjectInfo('results/manifest.json', 8, second['ETag'])]
@@ -0,0 +1,109 @@
+import gzip
+import mmap
+import os
+from io import BytesIO
+from aws.object_cache import S3ObjectCache
+import pandas as pd
+
+# ==== get_etag / open ====
+
+def test_put_open(tmp_path):
+    """
+    test_put_open validates stored object is read back memory-mapped with its ETag
+    """
+
+    # Given
+    cache = S3ObjectCache(str(tmp_path))
+
+    # When
+    cache.put('test-bucket', '2022/04/15/file.csv', '"etag1"', BytesIO(b'col1,col2\n1,3\n'))
+
+    # Then
+    assert cache.get_etag('test-bucket', '2022/04/15/file.csv') == '"etag1"'
+    with cache.open('test-bucket', '2022/04/15/file.csv') as file:
+        assert isinstance(file, mmap.mmap)
+        assert file.read() == b'col1,col2\n1,3\n'
+
+def test_open_compressed(tmp_path):
+    """
+    test_open_compressed validates compressed object read from cache is decompressed by pandas
+    """
+
+    # Given
+    cache = S3ObjectCache(str(tmp_path))
+    cache.put('test-bucket', 'file.csv.gz', '"etag1"', BytesIO(gzip.compress(b'col1,col2\n1,3\n')))
+
+    # When
+    res = pd.read_csv(cache.open('test-bucket', 'file.csv.gz'), compression='gzip')
+
+    # Then
+    assert res.equals(pd.DataFrame({'col1': [1], 'col2': [3]}))
+
+def test_get_etag_missing(tmp_path):
+    """
+    test_get_etag_missing validates None is returned for objects not cached
+    """
+
+    # Given
+    cache = S3ObjectCache(str(tmp_path))
+    cache.put('test-bucket', 'file.csv', '"etag1"', BytesIO(b'data'))
+
+    # When
+    # Then
+    assert cache.get_etag('test-bucket', 'other.csv') is None
+    assert cache.get_etag('other-bucket', 'file.csv') is None
+
+def test_put_replaces(tmp_path):
+    """
+    test_put_replaces validates changed object replaces the cached one
+    """
+
+    # Given
+    cache = S3ObjectCache(str(tmp_path))
+    cache.put('test-bucket', 'file.csv', '"etag1"', BytesIO(b'old'))
+
+    # When
+    cache.put('test-bucket', 'file.csv', '"etag2"', BytesIO(b'new'))
+
+    # Then
+    assert cache.get_etag('test-bucket', 'file.csv') == '"etag2"'
+    assert cache.open('test-bucket', 'file.csv').read() == b'new'
+    assert len(os.listdir(tmp_path)) == 2
+
+# ==== evict ====
+
+def test_evict_least_recently_used(tmp_path):
+    """
+    test_evict_least_recently_used validates entries used least recently are evicted first
+    when cache is over its size, and the entry just stored is kept
+    """
+
+    # Given
+    cache = S3ObjectCache(str(tmp_path), max_size=25)
+    cache.put('test-bucket', 'file1.csv', '"etag1"', BytesIO(bytes(10)))
+    cache.put('test-bucket', 'file2.csv', '"etag2"', BytesIO(bytes(10)))
+    os.utime(cache._data_path('test-bucket', 'file1.csv'), (1000, 1000))
+    os.utime(cache._data_path('test-bucket', 'file2.csv'), (2000, 2000))
+
+    # When
+    cache.open('test-bucket', 'file1.csv')
+    cache.put('test-bucket', 'file3.csv', '"etag3"', BytesIO(bytes(10)))
+
+    # Then
+    assert cache.get_etag('test-bucket', 'file1.csv') == '"etag1"'
+    assert cache.get_etag('test-bucket', 'file2.csv') is None
+    assert cache.get_etag('test-bucket', 'file3.csv') == '"etag3"'
+
+def test_evict_keeps_new_entry(tmp_path):
+    """
+    test_evict_keeps_new_entry validates that entry larger than the cache is not evicted by its own put
+    """
+
+    # Given
+    cache = S3ObjectCache(str(tmp_path), max_size=5)
+
+    # When
+    cache.put('test-bucket', 'file1.csv', '"etag1"', BytesIO(bytes(10)))
+
+    # Then
+    assert cache.open('test-bucket', 'file1.csv').read() == bytes(10)
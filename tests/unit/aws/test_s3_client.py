@@ -1,8 +1,17 @@
+import gzip
+import os
 import pytest
+import zstandard
+from io import BytesIO
+from aws.object_cache import S3ObjectCache
 from aws.s3_client import (
+    MIN_PART_SIZE,
     S3Client,
+    S3MultipartWriter,
+    S3ObjectInfo,
     S3GetObjectError,
-    S3PutObjectError
+    S3PutObjectError,
+    split_ranges
 )
 from botocore.exceptions import ClientError
 import pandas as pd
@@ -27,6 +36,10 @@ def boto3_s3_client_fixture(mocker, boto3_client_fixture):
     boto3_client_fixture.return_value = s3_mock
     return s3_mock
 
+@pytest.fixture
+def boto3_config_fixture(mocker):
+    return mocker.patch('aws.s3_client.Config')
+
 @pytest.fixture
 def pd_fixture(mocker):
     return mocker.patch('aws.s3_client.pd')
@@ -35,9 +48,52 @@ def pd_fixture(mocker):
 def get_object_fixture(mocker):
     return mocker.patch('aws.s3_client.S3Client.get_object')
 
+@pytest.fixture
+def parquet_object_fixture(boto3_s3_client_fixture):
+    """Parquet object with 4 row groups served by boto3 mock, honoring Range requests"""
+    df = pd.DataFrame({
+        'IMPRESSION_ID': range(8),
+        'CAMPAIGN_ID': [1111, 1111, 2222, 2222, 3333, 3333, 4444, 4444],
+        'IMPRESSION_DATETIME': ['2021-01-30 14:34:32.000'] * 8,
+        'PAYLOAD': [os.urandom(50000).hex() for _ in range(8)]
+    })
+    buffer = BytesIO()
+    df.to_parquet(buffer, index=False, row_group_size=2)
+    content = buffer.getvalue()
+    ranges = []
+
+    def get_object(Bucket, Key, Range=None):
+        if Range is None:
+            return {'Body': BytesIO(content), 'ETag': '"etag"', 'ContentLength': len(content)}
+        start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+        ranges.append((start, end))
+        return {'Body': BytesIO(content[start:end + 1])}
+
+    boto3_s3_client_fixture.head_object.return_value = {'ContentLength': len(content)}
+    boto3_s3_client_fixture.get_object.side_effect = get_object
+    return df, content, ranges
+
+@pytest.fixture
+def csv_object_fixture(boto3_s3_client_fixture):
+    """Plain csv object served by boto3 mock, honoring Range requests"""
+    with open('tests/unit/fixtures/df_fixture.csv', 'rb') as file:
+        content = file.read()
+    ranges = []
+
+    def get_object(Bucket, Key, Range=None):
+        if Range is None:
+            return {'Body': BytesIO(content), 'ContentLength': len(content)}
+        start, end = (int(value) for value in Range[len('bytes='):].split('-'))
+        ranges.append((start, end))
+        return {'Body': BytesIO(content[start:end + 1]), 'ContentLength': len(content[start:end + 1])}
+
+    boto3_s3_client_fixture.head_object.return_value = {'ContentLength': len(content)}
+    boto3_s3_client_fixture.get_object.side_effect = get_object
+    return content, ranges
+
 # ==== init ====
 
-def test_s3_client_init(boto3_client_fixture):
+def test_s3_client_init(boto3_client_fixture, boto3_config_fixture):
     """
     test_s3_client_init validates correct s3 client initialisation
     """
@@ -48,12 +104,27 @@ def test_s3_client_init(boto3_client_fixture):
 
     # Then
 
+    boto3_config_fixture.assert_called_once_with(max_pool_connections=10)
     boto3_client_fixture.assert_called_once_with('s3', 
                             aws_access_key_id='access_key_id',
                             aws_secret_access_key='secret_access_key',
-                            region_name='region'
+                            region_name='region',
+                            config=boto3_config_fixture.return_value
                             )
 
+def test_s3_client_init_max_workers(boto3_client_fixture, boto3_config_fixture):
+    """
+    test_s3_client_init_max_workers validates connection pool is sized for all workers
+    """
+    # Given
+
+    # When
+    res = S3Client(mock_config, max_workers=32)
+
+    # Then
+    assert res.max_workers == 32
+    boto3_config_fixture.assert_called_once_with(max_pool_connections=32)
+
 
 # ==== bucket_exist ====
 
@@ -146,6 +217,143 @@ def test_get_csv_file_list_empty(boto3_s3_client_fixture):
     assert res == []
 
 
+def test_get_csv_file_list_paginated(boto3_s3_client_fixture, mocker):
+    """
+    test_get_csv_file_list_paginated validates that all pages of the listing are
+    followed with ContinuationToken
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    prefix = 'test-prefix'
+
+    boto3_s3_client_fixture.list_objects_v2.side_effect = [
+        {'Contents': [{'Key': 'object1.csv'}], 'IsTruncated': True, 'NextContinuationToken': 'token1'},
+        {'Contents': [{'Key': 'object2.csv'}], 'IsTruncated': True, 'NextContinuationToken': 'token2'},
+        {'Contents': [{'Key': 'object3.csv'}], 'IsTruncated': False}
+    ]
+
+    # When
+    res = S3Client(mock_config).get_csv_file_list(bucket, prefix)
+
+    # Then
+    boto3_s3_client_fixture.list_objects_v2.assert_has_calls([
+        mocker.call(Bucket=bucket, Prefix=prefix),
+        mocker.call(Bucket=bucket, Prefix=prefix, ContinuationToken='token1'),
+        mocker.call(Bucket=bucket, Prefix=prefix, ContinuationToken='token2')
+    ])
+    assert res == ['object1.csv', 'object2.csv', 'object3.csv']
+
+def test_list_csv_objects(boto3_s3_client_fixture):
+    """
+    test_list_csv_objects validates that csv objects are returned with size and ETag
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    prefix = 'test-prefix'
+
+    boto3_s3_client_fixture.list_objects_v2.return_value = {'Contents': [
+        {'Key': 'object1.csv', 'Size': 10, 'ETag': '"etag1"'},
+        {'Key': 'object2', 'Size': 20, 'ETag': '"etag2"'}
+    ]}
+
+    # When
+    res = S3Client(mock_config).list_csv_objects(bucket, prefix)
+
+    # Then
+    assert res == [S3ObjectInfo(key='object1.csv', size=10, etag='"etag1"')]
+
+def test_list_csv_objects_fan_out(boto3_s3_client_fixture, mocker):
+    """
+    test_list_csv_objects_fan_out validates that sub-prefixes are listed separately
+    and the result is ordered by key
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    prefix = '2022/04/15'
+
+    listings = {
+        ('2022/04/15/', '/'): {
+            'Contents': [{'Key': '2022/04/15/daily.csv', 'Size': 1, 'ETag': '"e0"'}],
+            'CommonPrefixes': [{'Prefix': '2022/04/15/01/'}, {'Prefix': '2022/04/15/00/'}]
+        },
+        ('2022/04/15/00/', None): {'Contents': [{'Key': '2022/04/15/00/a.csv', 'Size': 2, 'ETag': '"e1"'}]},
+        ('2022/04/15/01/', None): {'Contents': [{'Key': '2022/04/15/01/b.csv', 'Size': 3, 'ETag': '"e2"'}]}
+    }
+    boto3_s3_client_fixture.list_objects_v2.side_effect = \
+        lambda Bucket, Prefix, Delimiter=None: listings[(Prefix, Delimiter)]
+
+    # When
+    res = S3Client(mock_config, max_workers=2).list_csv_objects(bucket, prefix, fan_out=True)
+
+    # Then
+    boto3_s3_client_fixture.list_objects_v2.assert_any_call(Bucket=bucket, Prefix='2022/04/15/', Delimiter='/')
+    assert res == [
+        S3ObjectInfo('2022/04/15/00/a.csv', 2, '"e1"'),
+        S3ObjectInfo('2022/04/15/01/b.csv', 3, '"e2"'),
+        S3ObjectInfo('2022/04/15/daily.csv', 1, '"e0"')
+    ]
+
+def test_list_data_objects(boto3_s3_client_fixture):
+    """
+    test_list_data_objects validates that csv and parquet objects are listed
+    and list_csv_objects keeps csv ones only
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    prefix = 'test-prefix'
+
+    boto3_s3_client_fixture.list_objects_v2.return_value = {'Contents': [
+        {'Key': 'object1.csv', 'Size': 10, 'ETag': '"etag1"'},
+        {'Key': 'object2.parquet', 'Size': 20, 'ETag': '"etag2"'},
+        {'Key': 'object3.json', 'Size': 30, 'ETag': '"etag3"'},
+        {'Key': 'object4.csv.gz', 'Size': 40, 'ETag': '"etag4"'},
+        {'Key': 'object5.csv.zst', 'Size': 50, 'ETag': '"etag5"'},
+        {'Key': 'object6.json.gz', 'Size': 60, 'ETag': '"etag6"'}
+    ]}
+
+    # When
+    res = S3Client(mock_config).list_data_objects(bucket, prefix)
+    res_csv = S3Client(mock_config).list_csv_objects(bucket, prefix)
+
+    # Then
+    assert res == [
+        S3ObjectInfo('object1.csv', 10, '"etag1"'),
+        S3ObjectInfo('object2.parquet', 20, '"etag2"'),
+        S3ObjectInfo('object4.csv.gz', 40, '"etag4"'),
+        S3ObjectInfo('object5.csv.zst', 50, '"etag5"')
+    ]
+    assert res_csv == [
+        S3ObjectInfo('object1.csv', 10, '"etag1"'),
+        S3ObjectInfo('object4.csv.gz', 40, '"etag4"'),
+        S3ObjectInfo('object5.csv.zst', 50, '"etag5"')
+    ]
+
+def test_list_objects(boto3_s3_client_fixture):
+    """
+    test_list_objects validates that objects of any format are listed
+    """
+
+    # Given
+    boto3_s3_client_fixture.list_objects_v2.return_value = {'Contents': [
+        {'Key': 'result.csv', 'Size': 10, 'ETag': '"etag1"'},
+        {'Key': 'result.shard-0000-of-0001.npz', 'Size': 20, 'ETag': '"etag2"'}
+    ]}
+
+    # When
+    res = S3Client(mock_config).list_objects('test-bucket', 'result')
+
+    # Then
+    boto3_s3_client_fixture.list_objects_v2.assert_called_once_with(Bucket='test-bucket', Prefix='result')
+    assert res == [
+        S3ObjectInfo('result.csv', 10, '"etag1"'),
+        S3ObjectInfo('result.shard-0000-of-0001.npz', 20, '"etag2"')
+    ]
+
+
 # ==== get_object ====
 
 
@@ -167,6 +375,22 @@ def test_get_object(boto3_s3_client_fixture):
     boto3_s3_client_fixture.get_object.assert_called_once_with(Bucket=bucket, Key=key)
 
 
+def test_get_object_range(boto3_s3_client_fixture):
+    """
+    test_get_object_range validates that byte range is requested with Range header
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    key = 'test-key'
+
+    # When
+    S3Client(mock_config).get_object(bucket=bucket, file_key=key, byte_range=(10, 19))
+
+    # Then
+    boto3_s3_client_fixture.get_object.assert_called_once_with(Bucket=bucket, Key=key, Range='bytes=10-19')
+
+
 def test_get_object_error(boto3_s3_client_fixture):
     """
     test_get_object_error validates that when an error arises from retrieving an
@@ -274,6 +498,257 @@ def test_export_s3_to_df(boto3_s3_client_fixture, pd_fixture, mocker):
     pd_fixture.concat.assert_called_with(['df1', 'df2'], ignore_index=True, sort=False)
 
 
+def test_export_s3_to_df_columns(boto3_s3_client_fixture):
+    """
+    test_export_s3_to_df_columns validates only given columns are parsed with declared dtypes
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    with open('tests/unit/fixtures/df_fixture.csv', 'rb') as file:
+        boto3_s3_client_fixture.get_object.return_value = {'Body': BytesIO(file.read())}
+    columns = {'IMPRESSION_ID': 'Int32', 'CAMPAIGN_ID': 'Int32', 'IMPRESSION_DATETIME': 'str'}
+
+    # When
+    res = S3Client(mock_config).export_s3_to_df(bucket, ['test_key'], columns=columns)
+
+    # Then
+    assert res.columns.tolist() == ['IMPRESSION_ID', 'CAMPAIGN_ID', 'IMPRESSION_DATETIME']
+    assert res.dtypes.astype(str).tolist() == ['Int32', 'Int32', 'object']
+    assert res['CAMPAIGN_ID'].tolist() == [1111, 1111, 1111, 1111, 2222, 2222, 3333, 3333]
+
+def test_export_s3_to_df_concurrent(boto3_s3_client_fixture):
+    """
+    test_export_s3_to_df_concurrent validates objects fetched concurrently
+    are concatenated in the file keys order
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    file_keys = [f'test_key_{i}' for i in range(8)]
+
+    boto3_s3_client_fixture.get_object.side_effect = \
+        lambda Bucket, Key: {'Body': BytesIO(f'KEY\n{Key}\n'.encode())}
+
+    # When
+    res = S3Client(mock_config, max_workers=4).export_s3_to_df(bucket, file_keys)
+
+    # Then
+    assert res['KEY'].tolist() == file_keys
+    assert boto3_s3_client_fixture.get_object.call_count == len(file_keys)
+
+def test_export_s3_to_df_concurrent_error(boto3_s3_client_fixture):
+    """
+    test_export_s3_to_df_concurrent_error validates that when any of objects fetched
+    concurrently fails, the S3GetObjectError exception is raised.
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    file_keys = ['test_key_1', 'test_key_2', 'test_key_3']
+
+    def get_object(Bucket, Key):
+        if Key == 'test_key_2':
+            raise ClientError(error_response={}, operation_name='get_object')
+        return {'Body': BytesIO(b'KEY\nvalue\n')}
+
+    boto3_s3_client_fixture.get_object.side_effect = get_object
+
+    # When
+    with pytest.raises(S3GetObjectError) as e:
+        S3Client(mock_config, max_workers=3).export_s3_to_df(bucket, file_keys)
+
+    # Then
+    assert e.value.key == 'test_key_2'
+    assert e.value.bucket == bucket
+
+
+def test_export_s3_to_df_ranges(csv_object_fixture):
+    """
+    test_export_s3_to_df_ranges validates large csv object is fetched and parsed in byte ranges
+    concurrently and stitched into the same dataframe as parsed at once, lines crossing
+    range boundaries and the header are parsed once
+    """
+
+    # Given
+    content, ranges = csv_object_fixture
+    columns = {'IMPRESSION_ID': 'Int32', 'CAMPAIGN_ID': 'Int32', 'IMPRESSION_DATETIME': 'str'}
+    expected_df = pd.read_csv(BytesIO(content), usecols=list(columns), dtype=columns)
+
+    # When
+    res = S3Client(mock_config, max_workers=3, range_size=100).export_s3_to_df('test-bucket', ['test_key.csv'],
+                                                                               columns=columns)
+    res_small = S3Client(mock_config, range_size=len(content)).export_s3_to_df('test-bucket', ['test_key.csv'],
+                                                                               columns=columns)
+
+    # Then
+    assert res.equals(expected_df)
+    assert res_small.equals(expected_df)
+    # every range but the first one is requested from the byte before it
+    assert sorted(start for start, _ in ranges if start % 100 == 99) == list(range(99, len(content) - 1, 100))
+
+def test_export_s3_to_df_ranges_listed_size(csv_object_fixture, boto3_s3_client_fixture):
+    """
+    test_export_s3_to_df_ranges_listed_size validates object is split by its listed size without HEAD request,
+    objects without listed size are sized by HEAD request
+    """
+
+    # Given
+    content, _ = csv_object_fixture
+    s3_client = S3Client(mock_config, range_size=100)
+
+    # When
+    res = s3_client.export_s3_to_df('test-bucket', ['test_key.csv'], sizes={'test_key.csv': len(content)})
+    head_calls = boto3_s3_client_fixture.head_object.call_count
+    res_unlisted = s3_client.export_s3_to_df('test-bucket', ['test_key.csv'], sizes={'other_key.csv': 1})
+
+    # Then
+    assert res.equals(pd.read_csv(BytesIO(content)))
+    assert res_unlisted.equals(res)
+    assert head_calls == 0
+    boto3_s3_client_fixture.head_object.assert_called_once_with(Bucket='test-bucket', Key='test_key.csv')
+
+def test_read_csv_range(csv_object_fixture):
+    """
+    test_read_csv_range validates every line is parsed by the range it starts in, whatever the offsets
+    """
+
+    # Given
+    content, _ = csv_object_fixture
+    s3_client = S3Client(mock_config)
+    expected_ids = pd.read_csv(BytesIO(content))['IMPRESSION_ID'].tolist()
+
+    # When
+    res = [s3_client.read_csv_range('test-bucket', 'test_key.csv', (start, start + 36), len(content))
+           for start in range(0, len(content), 37)]
+
+    # Then
+    assert pd.concat(res)['IMPRESSION_ID'].tolist() == expected_ids
+    assert list(res[0].columns) == ['IMPRESSION_ID', 'AGENCY_ID', 'ADVERTISER_ID', 'ORDER_ID', 'CAMPAIGN_ID',
+                                    'IMPRESSION_DATETIME']
+
+def test_split_ranges():
+    """
+    test_split_ranges validates only plain csv objects larger than range size are split
+    """
+
+    # When
+    res = split_ranges(S3ObjectInfo('key.csv', 250, ''), 100)
+
+    # Then
+    assert res == [(0, 99), (100, 199), (200, 249)]
+    assert split_ranges(S3ObjectInfo('key.csv', 100, ''), 100) == [None]
+    assert split_ranges(S3ObjectInfo('key.csv.gz', 250, ''), 100) == [None]
+    assert split_ranges(S3ObjectInfo('key.parquet', 250, ''), 100) == [None]
+    assert split_ranges(S3ObjectInfo('key.csv', 250, ''), None) == [None]
+
+
+# ==== iter_s3_chunks ====
+
+def test_iter_s3_chunks(boto3_s3_client_fixture, mocker):
+    """
+    test_iter_s3_chunks validates s3 objects are streamed as pandas dataframe chunks
+    in the file keys order
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    file_keys = ['test_key_1', 'test_key_2']
+
+    with open('tests/unit/fixtures/df_fixture.csv', 'rb') as file:
+        content = file.read()
+    boto3_s3_client_fixture.get_object.side_effect = [
+        {'Body': BytesIO(content)},
+        {'Body': BytesIO(content)}
+    ]
+
+    # When
+    res = list(S3Client(mock_config).iter_s3_chunks(bucket, file_keys, chunksize=3))
+
+    # Then
+    boto3_s3_client_fixture.get_object.assert_has_calls(
+        [mocker.call(Bucket=bucket, Key=key) for key in file_keys]
+    )
+    assert [len(chunk) for chunk in res] == [3, 3, 2, 3, 3, 2]
+    assert pd.concat(res, ignore_index=True).equals(
+        pd.concat([pd.read_csv('tests/unit/fixtures/df_fixture.csv')] * 2, ignore_index=True)
+    )
+
+
+def test_iter_s3_chunks_parquet(parquet_object_fixture):
+    """
+    test_iter_s3_chunks_parquet validates parquet object is streamed in batches
+    of projected columns with declared dtypes
+    """
+
+    # Given
+    df, _, _ = parquet_object_fixture
+    columns = {'IMPRESSION_ID': 'Int32', 'CAMPAIGN_ID': 'Int32'}
+
+    # When
+    res = list(S3Client(mock_config).iter_s3_chunks('test-bucket', ['test_key.parquet'], chunksize=3, columns=columns))
+
+    # Then
+    assert sum(len(chunk) for chunk in res) == 8
+    assert all(len(chunk) <= 3 for chunk in res)
+    assert list(res[0].columns) == ['IMPRESSION_ID', 'CAMPAIGN_ID']
+    assert res[0].dtypes.tolist() == ['Int32', 'Int32']
+    assert pd.concat(res)['CAMPAIGN_ID'].tolist() == df['CAMPAIGN_ID'].tolist()
+
+
+def test_iter_s3_chunks_compressed(boto3_s3_client_fixture):
+    """
+    test_iter_s3_chunks_compressed validates gzip and zstd objects are decompressed
+    while they are streamed in chunks
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    file_keys = ['test_key_1.csv.gz', 'test_key_2.csv.zst']
+
+    with open('tests/unit/fixtures/df_fixture.csv', 'rb') as file:
+        content = file.read()
+    boto3_s3_client_fixture.get_object.side_effect = [
+        {'Body': BytesIO(gzip.compress(content))},
+        {'Body': BytesIO(zstandard.ZstdCompressor().compress(content))}
+    ]
+
+    # When
+    res = list(S3Client(mock_config).iter_s3_chunks(bucket, file_keys, chunksize=3))
+
+    # Then
+    assert [len(chunk) for chunk in res] == [3, 3, 2, 3, 3, 2]
+    assert pd.concat(res, ignore_index=True).equals(
+        pd.concat([pd.read_csv('tests/unit/fixtures/df_fixture.csv')] * 2, ignore_index=True)
+    )
+
+
+# ==== export_s3_to_df parquet ====
+
+def test_export_s3_to_df_parquet(parquet_object_fixture):
+    """
+    test_export_s3_to_df_parquet validates that only projected columns of row groups
+    matching filters are fetched with ranged requests
+    """
+
+    # Given
+    df, content, ranges = parquet_object_fixture
+    columns = {'CAMPAIGN_ID': 'Int32', 'IMPRESSION_DATETIME': 'str'}
+    filters = [('CAMPAIGN_ID', '=', 2222)]
+
+    # When
+    res = S3Client(mock_config).export_s3_to_df('test-bucket', ['test_key.parquet'], columns=columns, filters=filters)
+
+    # Then
+    assert res.to_dict('list') == {
+        'CAMPAIGN_ID': [2222, 2222],
+        'IMPRESSION_DATETIME': ['2021-01-30 14:34:32.000'] * 2
+    }
+    assert res['CAMPAIGN_ID'].dtype == 'Int32'
+    assert all(end < len(content) for _, end in ranges)
+    assert sum(end - start + 1 for start, end in ranges) < len(content)
+
+
     # ==== export_df_to_s3 ====
 
 def test_export_df_to_s3(boto3_s3_client_fixture, pd_fixture, mocker):
@@ -296,6 +771,45 @@ def test_export_df_to_s3(boto3_s3_client_fixture, pd_fixture, mocker):
         Bucket=bucket, Key=file_key, Body=expected_object
     )
 
+def test_export_df_to_s3_parquet(boto3_s3_client_fixture):
+    """
+    test_export_df_to_s3_parquet validates that parquet file is uploaded for .parquet key
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    file_key = 'result_key.parquet'
+    dummy_df = pd.DataFrame({'col1': [1,2], 'col2': [3,4]})
+
+    # When
+    S3Client(mock_config).export_df_to_s3(bucket, file_key, dummy_df)
+
+    # Then
+    body = boto3_s3_client_fixture.put_object.call_args.kwargs['Body']
+    assert body.startswith(b'PAR1')
+    assert pd.read_parquet(BytesIO(body)).equals(dummy_df)
+
+def test_export_df_to_s3_compressed(boto3_s3_client_fixture):
+    """
+    test_export_df_to_s3_compressed validates that csv is compressed for .csv.gz and .csv.zst keys
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    dummy_df = pd.DataFrame({'col1': [1,2], 'col2': [3,4]})
+
+    expected_object = b'col1,col2\n1,3\n2,4\n'
+
+    # When
+    S3Client(mock_config).export_df_to_s3(bucket, 'result_key.csv.gz', dummy_df)
+    gzip_body = boto3_s3_client_fixture.put_object.call_args.kwargs['Body']
+    S3Client(mock_config).export_df_to_s3(bucket, 'result_key.csv.zst', dummy_df)
+    zstd_body = boto3_s3_client_fixture.put_object.call_args.kwargs['Body']
+
+    # Then
+    assert gzip.decompress(gzip_body) == expected_object
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(zstd_body) == expected_object
+
 def test_export_df_to_s3_empty(boto3_s3_client_fixture, pd_fixture, mocker, capsys):
     """
     test_export_df_to_s3 validates response when empty pandas dataframe uploaded to s3 bucket
@@ -316,4 +830,301 @@ def test_export_df_to_s3_empty(boto3_s3_client_fixture, pd_fixture, mocker, caps
     boto3_s3_client_fixture.put_object.assert_not_called()
 
 
+# ==== S3MultipartWriter ====
+
+@pytest.fixture
+def multipart_fixture(boto3_s3_client_fixture):
+    """boto3 mock collecting uploaded parts"""
+    parts = {}
+
+    def upload_part(Bucket, Key, UploadId, PartNumber, Body):
+        parts[PartNumber] = Body
+        return {'ETag': f'"etag{PartNumber}"'}
+
+    boto3_s3_client_fixture.create_multipart_upload.return_value = {'UploadId': 'upload-id'}
+    boto3_s3_client_fixture.upload_part.side_effect = upload_part
+    return parts
+
+def test_multipart_writer(boto3_s3_client_fixture, multipart_fixture, mocker):
+    """
+    test_multipart_writer validates written data is uploaded in parts of given size
+    and the upload is completed with parts in order
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    key = 'result_key'
+    data = os.urandom(2 * MIN_PART_SIZE + 100)
+
+    # When
+    with S3Client(mock_config, max_workers=2).open_writer(bucket, key, part_size=MIN_PART_SIZE) as writer:
+        for start in range(0, len(data), 1000000):
+            writer.write(data[start:start + 1000000])
+
+    # Then
+    boto3_s3_client_fixture.create_multipart_upload.assert_called_once_with(Bucket=bucket, Key=key)
+    assert [len(multipart_fixture[number]) for number in (1, 2, 3)] == [MIN_PART_SIZE, MIN_PART_SIZE, 100]
+    assert b''.join(multipart_fixture[number] for number in (1, 2, 3)) == data
+    boto3_s3_client_fixture.complete_multipart_upload.assert_called_once_with(
+        Bucket=bucket, Key=key, UploadId='upload-id', MultipartUpload={'Parts': [
+            {'PartNumber': 1, 'ETag': '"etag1"'},
+            {'PartNumber': 2, 'ETag': '"etag2"'},
+            {'PartNumber': 3, 'ETag': '"etag3"'}
+        ]})
+    boto3_s3_client_fixture.put_object.assert_not_called()
+    boto3_s3_client_fixture.abort_multipart_upload.assert_not_called()
+
+def test_multipart_writer_small(boto3_s3_client_fixture, multipart_fixture):
+    """
+    test_multipart_writer_small validates data smaller than a part is stored with single put_object
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    key = 'result_key'
+
+    # When
+    with S3Client(mock_config).open_writer(bucket, key) as writer:
+        writer.write(b'col1,col2\n')
+        writer.write(b'1,3\n')
+
+    # Then
+    boto3_s3_client_fixture.put_object.assert_called_once_with(Bucket=bucket, Key=key, Body=b'col1,col2\n1,3\n')
+    boto3_s3_client_fixture.create_multipart_upload.assert_not_called()
+
+def test_multipart_writer_part_error(boto3_s3_client_fixture, multipart_fixture):
+    """
+    test_multipart_writer_part_error validates that failed part aborts the upload
+    and S3PutObjectError is raised
+    """
 
+    # Given
+    bucket = 'test-bucket'
+    key = 'result_key'
+    boto3_s3_client_fixture.upload_part.side_effect = ClientError(error_response={}, operation_name='upload_part')
+
+    # When
+    with pytest.raises(S3PutObjectError) as e:
+        with S3Client(mock_config).open_writer(bucket, key, part_size=MIN_PART_SIZE) as writer:
+            writer.write(bytes(2 * MIN_PART_SIZE + 1))
+
+    # Then
+    assert e.value.key == key
+    assert e.value.bucket == bucket
+    assert e.value.message == 'Failed to put object'
+    boto3_s3_client_fixture.abort_multipart_upload.assert_called_once_with(
+        Bucket=bucket, Key=key, UploadId='upload-id')
+    boto3_s3_client_fixture.complete_multipart_upload.assert_not_called()
+
+def test_multipart_writer_caller_error(boto3_s3_client_fixture, multipart_fixture):
+    """
+    test_multipart_writer_caller_error validates that error raised while writing
+    aborts the upload instead of completing it
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    key = 'result_key'
+
+    # When
+    with pytest.raises(RuntimeError):
+        with S3Client(mock_config).open_writer(bucket, key, part_size=MIN_PART_SIZE) as writer:
+            writer.write(bytes(MIN_PART_SIZE))
+            raise RuntimeError('serialization failed')
+
+    # Then
+    boto3_s3_client_fixture.abort_multipart_upload.assert_called_once_with(
+        Bucket=bucket, Key=key, UploadId='upload-id')
+    boto3_s3_client_fixture.complete_multipart_upload.assert_not_called()
+    boto3_s3_client_fixture.put_object.assert_not_called()
+
+def test_multipart_writer_part_size():
+    """
+    test_multipart_writer_part_size validates parts smaller than S3 minimum are rejected
+    """
+
+    # Given
+
+    # When
+    with pytest.raises(ValueError):
+        S3MultipartWriter(None, 'test-bucket', 'result_key', part_size=MIN_PART_SIZE - 1)
+
+    # Then
+
+def test_export_df_to_s3_multipart(boto3_s3_client_fixture, multipart_fixture):
+    """
+    test_export_df_to_s3_multipart validates that result larger than a part
+    is serialized straight into multipart upload
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    file_key = 'result_key.csv'
+    df = pd.DataFrame({'col1': range(1000000), 'col2': range(1000000)})
+
+    # When
+    S3Client(mock_config, max_workers=2).export_df_to_s3(bucket, file_key, df)
+
+    # Then
+    body = b''.join(multipart_fixture[number] for number in sorted(multipart_fixture))
+    assert len(multipart_fixture) > 1
+    assert body == df.to_csv(index=False).encode()
+    boto3_s3_client_fixture.complete_multipart_upload.assert_called_once()
+    boto3_s3_client_fixture.put_object.assert_not_called()
+
+
+# ==== cache ====
+
+def _not_modified():
+    return ClientError(
+        error_response={'Error': {'Code': '304', 'Message': 'Not Modified'}, 'ResponseMetadata': {'HTTPStatusCode': 304}},
+        operation_name='GetObject'
+    )
+
+def test_get_object_cache_miss(boto3_s3_client_fixture, tmp_path):
+    """
+    test_get_object_cache_miss validates downloaded object is stored in cache
+    and returned memory-mapped
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    key = 'test-key.csv'
+    cache = S3ObjectCache(str(tmp_path))
+    boto3_s3_client_fixture.get_object.return_value = {
+        'Body': BytesIO(b'col1,col2\n1,3\n'), 'ETag': '"etag1"', 'ContentLength': 14
+    }
+
+    # When
+    res = S3Client(mock_config, cache=cache).get_object(bucket, key)
+
+    # Then
+    boto3_s3_client_fixture.get_object.assert_called_once_with(Bucket=bucket, Key=key)
+    assert res['Body'].read() == b'col1,col2\n1,3\n'
+    assert cache.get_etag(bucket, key) == '"etag1"'
+
+def test_get_object_cache_hit(boto3_s3_client_fixture, tmp_path):
+    """
+    test_get_object_cache_hit validates conditional GET is sent for cached object
+    and cached content is returned when S3 answers 304 Not Modified
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    key = 'test-key.csv'
+    cache = S3ObjectCache(str(tmp_path))
+    cache.put(bucket, key, '"etag1"', BytesIO(b'col1,col2\n1,3\n'))
+    boto3_s3_client_fixture.get_object.side_effect = _not_modified()
+
+    # When
+    res = S3Client(mock_config, cache=cache).export_s3_to_df(bucket, [key])
+
+    # Then
+    boto3_s3_client_fixture.get_object.assert_called_once_with(Bucket=bucket, Key=key, IfNoneMatch='"etag1"')
+    assert res.to_dict('list') == {'col1': [1], 'col2': [3]}
+
+def test_get_object_cache_stale(boto3_s3_client_fixture, tmp_path):
+    """
+    test_get_object_cache_stale validates changed object is downloaded and replaces cached one
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    key = 'test-key.csv'
+    cache = S3ObjectCache(str(tmp_path))
+    cache.put(bucket, key, '"etag1"', BytesIO(b'old'))
+    boto3_s3_client_fixture.get_object.return_value = {'Body': BytesIO(b'new'), 'ETag': '"etag2"', 'ContentLength': 3}
+
+    # When
+    res = S3Client(mock_config, cache=cache).get_object(bucket, key)
+
+    # Then
+    boto3_s3_client_fixture.get_object.assert_called_once_with(Bucket=bucket, Key=key, IfNoneMatch='"etag1"')
+    assert res['Body'].read() == b'new'
+    assert cache.get_etag(bucket, key) == '"etag2"'
+
+def test_get_object_cache_error(boto3_s3_client_fixture, tmp_path):
+    """
+    test_get_object_cache_error validates errors other than 304 raise S3GetObjectError
+    """
+
+    # Given
+    cache = S3ObjectCache(str(tmp_path))
+    cache.put('test-bucket', 'test-key', '"etag1"', BytesIO(b'old'))
+    boto3_s3_client_fixture.get_object.side_effect = ClientError(
+        error_response={'Error': {'Code': 'AccessDenied'}}, operation_name='GetObject'
+    )
+
+    # When
+    with pytest.raises(S3GetObjectError):
+        S3Client(mock_config, cache=cache).get_object('test-bucket', 'test-key')
+
+    # Then
+
+def test_export_s3_to_df_parquet_cached(parquet_object_fixture, boto3_s3_client_fixture, tmp_path):
+    """
+    test_export_s3_to_df_parquet_cached validates parquet object is read from the cached copy
+    without ranged requests
+    """
+
+    # Given
+    df, _, ranges = parquet_object_fixture
+    cache = S3ObjectCache(str(tmp_path))
+
+    # When
+    res = S3Client(mock_config, cache=cache).export_s3_to_df(
+        'test-bucket', ['test_key.parquet'], columns={'CAMPAIGN_ID': 'Int32'})
+
+    # Then
+    assert res['CAMPAIGN_ID'].tolist() == df['CAMPAIGN_ID'].tolist()
+    assert ranges == []
+    boto3_s3_client_fixture.head_object.assert_not_called()
+
+def test_export_s3_to_df_parquet_not_cached(parquet_object_fixture, boto3_s3_client_fixture, tmp_path):
+    """
+    test_export_s3_to_df_parquet_not_cached validates parquet object larger than the cache
+    is not cached and is read through ranged requests
+    """
+
+    # Given
+    df, content, ranges = parquet_object_fixture
+    cache = S3ObjectCache(str(tmp_path), max_size=len(content) - 1)
+
+    # When
+    res = S3Client(mock_config, cache=cache).export_s3_to_df(
+        'test-bucket', ['test_key.parquet'], columns={'CAMPAIGN_ID': 'Int32'})
+
+    # Then
+    assert res['CAMPAIGN_ID'].tolist() == df['CAMPAIGN_ID'].tolist()
+    assert cache.get_etag('test-bucket', 'test_key.parquet') is None
+    assert ranges != []
+    assert sum(end - start + 1 for start, end in ranges) < len(content)
+
+# ==== transfer ====
+
+def test_transfer(boto3_s3_client_fixture, multipart_fixture, tmp_path):
+    """
+    test_transfer validates bytes downloaded and uploaded are counted,
+    cached objects not modified are not counted as downloaded
+    """
+
+    # Given
+    bucket = 'test-bucket'
+    cache = S3ObjectCache(str(tmp_path))
+    cache.put(bucket, 'cached-key', '"etag1"', BytesIO(b'col1\n1\n'))
+    boto3_s3_client_fixture.get_object.side_effect = [
+        {'Body': BytesIO(b'data'), 'ContentLength': 4},
+        _not_modified()
+    ]
+    s3_client = S3Client(mock_config, max_workers=2, cache=cache)
+
+    # When
+    s3_client.get_object(bucket, 'test-key', byte_range=(0, 3))
+    s3_client.get_object(bucket, 'cached-key')
+    with s3_client.open_writer(bucket, 'result-key', part_size=MIN_PART_SIZE) as writer:
+        writer.write(b'0' * (MIN_PART_SIZE + 100))
+    s3_client.put_object(bucket, 'other-key', b'12345')
+
+    # Then
+    assert s3_client.transfer.downloaded == 4
+    assert s3_client.transfer.uploaded == MIN_PART_SIZE + 105
@@ -0,0 +1,42 @@
+import pandas as pd
+from benchmarks.generate import DatasetSpec, generate_impressions
+
+# ==== generate_impressions ====
+
+def test_generate_impressions():
+
+    """
+    test_generate_impressions validates generated files follow the spec
+    """
+
+    # Given
+    spec = DatasetSpec(rows=1000, files=3, duplicate_rate=0.2, campaigns=10, seed=1)
+
+    # When
+    res = generate_impressions(spec)
+
+    # Then
+    df = pd.concat(res, ignore_index=True)
+    assert len(res) == 3
+    assert len(df) == 1000
+    assert len(df) - len(df.drop_duplicates(subset=['IMPRESSION_ID', 'IMPRESSION_DATETIME'])) == 200
+    assert df['CAMPAIGN_ID'].nunique() <= 10
+    assert df['IMPRESSION_DATETIME'].str.match(r'^2022-04-15 \d\d:\d\d:\d\d\.000$').all()
+
+def test_generate_impressions_reproducible():
+
+    """
+    test_generate_impressions_reproducible validates same spec always gives the same data
+    """
+
+    # Given
+    spec = DatasetSpec(rows=1000, files=2, seed=7)
+
+    # When
+    first = generate_impressions(spec)
+    second = generate_impressions(spec)
+    other = generate_impressions(spec._replace(seed=8))
+
+    # Then
+    assert all(a.equals(b) for a, b in zip(first, second))
+    assert not first[0].equals(other[0])
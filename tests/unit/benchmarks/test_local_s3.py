@@ -0,0 +1,58 @@
+import pandas as pd
+from benchmarks.local_s3 import LocalS3, LocalS3Client
+from aws.object_cache import S3ObjectCache
+from aws.s3_client import MIN_PART_SIZE, S3ObjectInfo
+
+# ==== LocalS3Client ====
+
+def test_local_s3_client():
+
+    """
+    test_local_s3_client validates S3Client lists paginated objects, reads and writes them
+    through the local stand-in
+    """
+
+    # Given
+    local_s3 = LocalS3()
+    local_s3.create_bucket('test_bucket')
+    for i in range(1500):
+        local_s3.put_object(Bucket='test_bucket', Key=f'2022/04/15/file_{i:04d}.csv', Body=b'col1\n1\n')
+    s3_client = LocalS3Client(local_s3, max_workers=2)
+    df = pd.DataFrame({'col1': [1, 2]})
+
+    # When
+    objects = s3_client.list_data_objects('test_bucket', '2022/04/15')
+    s3_client.export_df_to_s3('test_bucket', 'results/result.csv', df)
+    res = s3_client.export_s3_to_df('test_bucket', ['results/result.csv'])
+
+    # Then
+    assert len(objects) == 1500
+    assert objects[0] == S3ObjectInfo('2022/04/15/file_0000.csv', 7, local_s3.etags[('test_bucket', objects[0].key)])
+    assert res.equals(df)
+    assert s3_client.bucket_exist('test_bucket')
+    assert not s3_client.bucket_exist('other_bucket')
+
+def test_local_s3_client_cached(tmp_path):
+
+    """
+    test_local_s3_client_cached validates objects are read through the cache with conditional GET
+    and written by multipart upload, the same as with boto3 client
+    """
+
+    # Given
+    local_s3 = LocalS3()
+    local_s3.create_bucket('test_bucket')
+    s3_client = LocalS3Client(local_s3, cache=S3ObjectCache(str(tmp_path)))
+    df = pd.DataFrame({'col1': range(1000)})
+
+    # When
+    with s3_client.open_writer('test_bucket', 'results/result.csv', part_size=MIN_PART_SIZE) as writer:
+        writer.write(df.to_csv(index=False).encode())
+    res = s3_client.export_s3_to_df('test_bucket', ['results/result.csv'])
+    sent = local_s3.bytes_sent
+    res_cached = s3_client.export_s3_to_df('test_bucket', ['results/result.csv'])
+
+    # Then
+    assert res.equals(df)
+    assert res_cached.equals(df)
+    assert local_s3.bytes_sent == sent
@@ -0,0 +1,68 @@
+from benchmarks.generate import DatasetSpec
+from benchmarks.run import compare, environment_changes, run_size
+
+# ==== run_size ====
+
+def test_run_size():
+
+    """
+    test_run_size validates every stage of process_data is timed, on both engines
+    """
+
+    # Given
+    spec = DatasetSpec(rows=1000, files=2)
+
+    # When
+    res = run_size(spec, repeat=1, max_workers=1, chunksize=300, map_processes=2)
+
+    # Then
+    assert [result['stage'] for result in res] == [
+        'list', 'load', 'validate', 'dedup', 'count', 'upload', 'load_arrow', 'transform_arrow', 'process_data',
+        'process_data_arrow', 'process_data_streaming', 'process_data_map_reduce'
+    ]
+    assert all(result['rows'] == 1000 and result['median'] >= 0 for result in res)
+
+# ==== compare ====
+
+def test_compare():
+
+    """
+    test_compare validates only stages slower than tolerance are reported as regressions
+    """
+
+    # Given
+    baseline = [
+        {'rows': 1000, 'stage': 'load', 'median': 1.0},
+        {'rows': 1000, 'stage': 'count', 'median': 1.0},
+        {'rows': 1000, 'stage': 'list', 'median': 0.001}
+    ]
+    results = [
+        {'rows': 1000, 'stage': 'load', 'median': 1.1},
+        {'rows': 1000, 'stage': 'count', 'median': 1.5},
+        {'rows': 1000, 'stage': 'list', 'median': 0.003},
+        {'rows': 1000, 'stage': 'upload', 'median': 1.0}
+    ]
+
+    # When
+    res = compare(results, baseline, tolerance=0.2)
+
+    # Then
+    assert res == [{'rows': 1000, 'stage': 'count', 'baseline': 1.0, 'current': 1.5, 'ratio': 1.5}]
+
+def test_environment_changes():
+
+    """
+    test_environment_changes validates differences of environment are listed, except the run timestamp
+    """
+
+    # Given
+    baseline = {'timestamp': '2026-10-17T00:00:00', 'python': '3.11.4', 'cpus': '1', 'pandas': '1.5.3'}
+    current = {'timestamp': '2026-10-18T00:00:00', 'python': '3.11.4', 'cpus': '8', 'pandas': '1.5.3'}
+
+    # When
+    res = environment_changes(baseline, current)
+
+    # Then
+    assert res == ['cpus 1 -> 8']
+    assert environment_changes(baseline, dict(baseline, timestamp='2026-10-18T00:00:00')) == []
+
@@ -0,0 +1,169 @@
+import pytest
+from io import BytesIO
+from arrow_transformations import (
+    _extract_hours,
+    aggregate_agency_impressions,
+    aggregate_impressions,
+    aggregate_order_impressions,
+    validate_table
+)
+from aws.file_formats import CSV, read_table
+from metrics import RunMetrics
+import transformations
+import pandas as pd
+import pyarrow as pa
+
+# ==== Fixtures ====
+
+impressions_columns = {'IMPRESSION_ID': 'Int32', 'CAMPAIGN_ID': 'Int32', 'IMPRESSION_DATETIME': 'str'}
+
+@pytest.fixture
+def csv_fixture():
+    """Impressions with duplicates, one of them of other campaign, null campaign ids and an hour without leading zero"""
+    with open('tests/unit/fixtures/df_fixture.csv', 'rb') as file:
+        data = file.read()
+    return data.rstrip(b'\n') + b'\n111,1.0,1.0,1.0,1111.0,2021-01-30 14:34:32.000\n' \
+        b'111,1.0,1.0,1.0,2222.0,2021-01-30 14:34:32.000\n' \
+        b'99,,,,,2021-01-30 10:00:00.000\n98,1.0,1.0,1.0,3333.0,2021-01-30 4:05:06.000\n'
+
+def _read(data: bytes, columns: dict):
+    """Same data read by both engines"""
+    df = pd.read_csv(BytesIO(data), usecols=list(columns), dtype=columns)
+    return df, read_table(BytesIO(data), CSV, columns)
+
+# ==== parity with pandas engine ====
+
+def test_aggregate_impressions(csv_fixture):
+
+    """
+    test_aggregate_impressions validates result is the same as of pandas engine, including dtypes,
+    and the same stages are recorded
+    """
+
+    # Given
+    df, table = _read(csv_fixture, impressions_columns)
+    expected_metrics, metrics = RunMetrics(), RunMetrics()
+    expected_df = transformations.aggregate_impressions(df, 'schemas/impressions.yaml', metrics=expected_metrics)
+
+    # When
+    res = aggregate_impressions(table, 'schemas/impressions.yaml', metrics=metrics)
+
+    # Then
+    pd.testing.assert_frame_equal(res, expected_df)
+    for name, stage in expected_metrics.stages.items():
+        assert (metrics.stages[name].rows_in, metrics.stages[name].rows_out, metrics.stages[name].rows_dropped) == \
+            (stage.rows_in, stage.rows_out, stage.rows_dropped)
+
+def test_aggregate_day_reports(csv_fixture):
+
+    """
+    test_aggregate_day_reports validates reports over the day are the same as of pandas engine
+    """
+
+    # Given
+    columns = {'IMPRESSION_ID': 'Int32', 'ORDER_ID': 'Int32', 'IMPRESSION_DATETIME': 'str'}
+    df, table = _read(csv_fixture, columns)
+    expected_df = transformations.aggregate_order_impressions(df, 'schemas/order_impressions.yaml')
+
+    # When
+    res = aggregate_order_impressions(table, 'schemas/order_impressions.yaml')
+
+    # Then
+    pd.testing.assert_frame_equal(res, expected_df)
+
+def test_aggregate_empty():
+
+    """
+    test_aggregate_empty validates result of data without rows is the same as of pandas engine
+    """
+
+    # Given
+    columns = {'IMPRESSION_ID': 'Int32', 'AGENCY_ID': 'Int32', 'IMPRESSION_DATETIME': 'str'}
+    df, table = _read(b'IMPRESSION_ID,AGENCY_ID,IMPRESSION_DATETIME\n', columns)
+    expected_df = transformations.aggregate_agency_impressions(df, 'schemas/agency_impressions.yaml')
+
+    # When
+    res = aggregate_agency_impressions(table, 'schemas/agency_impressions.yaml')
+
+    # Then
+    pd.testing.assert_frame_equal(res, expected_df)
+
+# ==== validate_table ====
+
+def test_validate_table():
+
+    """
+    test_validate_table validates errors are the same as of pandas engine
+    """
+
+    # Given
+    validator = transformations.get_schema_validator('schemas/impressions.yaml')
+    invalid = [
+        b'IMPRESSION_ID,CAMPAIGN_ID,IMPRESSION_DATETIME\n1,2,2021-01-30 14:34:32.000\n,3,\n',
+        b'IMPRESSION_ID,CAMPAIGN_ID,IMPRESSION_DATETIME\n1,2,30/01/2021 14:34:32\n2,3,2021-01-30 4:34:32.000\n',
+        b'IMPRESSION_ID,IMPRESSION_DATETIME\n1,2021-01-30 14:34:32.000\n'
+    ]
+
+    # When
+    # Then
+    for data in invalid:
+        columns = {col: dtype for col, dtype in impressions_columns.items() if col.encode() in data}
+        df, table = _read(data, columns)
+        errors = validate_table(table, 'schemas/impressions.yaml')
+        assert errors
+        assert errors == validator.validate(df)
+
+def test_aggregate_impressions_invalid():
+
+    """
+    test_aggregate_impressions_invalid validates table not matching schema is rejected
+    """
+
+    # Given
+    _, table = _read(b'IMPRESSION_ID,CAMPAIGN_ID,IMPRESSION_DATETIME\n1,2,\n', impressions_columns)
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Impressions dataset does not match schema schemas/impressions.yaml'):
+        aggregate_impressions(table, 'schemas/impressions.yaml')
+
+# ==== _extract_hours ====
+
+def test__extract_hours_strptime(mocker):
+
+    """
+    test__extract_hours_strptime validates timestamps with or without fraction of a second
+    and on any day are parsed by arrow, without the pandas fallback
+    """
+
+    # Given
+    timestamps = pa.chunked_array([['2020-02-29 10:00:00.000', '2021-01-31 23:59:59', None],
+                                   ['2021-12-30 07:15:00.5']])
+    fallback = mocker.patch('arrow_transformations._extract_hour')
+
+    # When
+    res = _extract_hours(timestamps)
+
+    # Then
+    assert res.to_pylist() == [10, 23, None, 7]
+    fallback.assert_not_called()
+
+def test__extract_hours_month_end():
+
+    """
+    test__extract_hours_month_end validates days past the end of the month and second 60, which arrow rolls over,
+    are parsed by the pandas fallback, so they are rejected the same as by pandas engine
+    """
+
+    # Given
+    timestamps = pa.chunked_array([['2020-02-29 10:00:00.000', '2021-01-31 23:59:59.000', '2021-01-15 07:00:00.000']])
+
+    # When
+    res = _extract_hours(timestamps)
+
+    # Then
+    assert res.to_pylist() == [10, 23, 7]
+    with pytest.raises(ValueError):
+        _extract_hours(pa.chunked_array([['2021-01-15 07:00:00.000', '2021-02-30 10:00:00.000']]))
+    with pytest.raises(ValueError):
+        _extract_hours(pa.chunked_array([['2021-01-15 07:00:00', '2021-01-31 23:59:60']]))
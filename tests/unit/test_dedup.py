@@ -0,0 +1,120 @@
+import pytest
+from dedup import FingerprintDeduplicator
+import numpy as np
+import pandas as pd
+
+# ==== Fixtures ====
+
+columns_to_dedup = ('IMPRESSION_ID', 'IMPRESSION_DATETIME')
+
+@pytest.fixture
+def df_fixture():
+    return pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+
+# ==== filter ====
+
+def test_filter(df_fixture):
+
+    """
+    test_filter validates rows are deduplicated same as with pandas drop_duplicates
+    """
+
+    # Given
+    deduplicator = FingerprintDeduplicator(columns_to_dedup)
+
+    # When
+    res = deduplicator.filter(df_fixture)
+
+    # Then
+    assert res.equals(df_fixture.drop_duplicates(subset=columns_to_dedup))
+    assert deduplicator.size == 7
+
+def test_filter_across_chunks(df_fixture):
+
+    """
+    test_filter_across_chunks validates duplicates of keys seen in previous chunks are dropped
+    """
+
+    # Given
+    deduplicator = FingerprintDeduplicator(columns_to_dedup)
+    chunks = [df_fixture.iloc[i:i + 3] for i in range(0, len(df_fixture), 3)]
+
+    # When
+    res = pd.concat([deduplicator.filter(chunk) for chunk in chunks + chunks])
+
+    # Then
+    assert res.equals(df_fixture.drop_duplicates(subset=columns_to_dedup))
+
+def test_filter_empty(df_fixture):
+
+    """
+    test_filter_empty validates empty dataframe is returned unchanged
+    """
+
+    # Given
+    deduplicator = FingerprintDeduplicator(columns_to_dedup)
+
+    # When
+    res = deduplicator.filter(df_fixture.iloc[:0])
+
+    # Then
+    assert res.empty
+    assert deduplicator.size == 0
+
+def test_filter_verify_collision(df_fixture, mocker):
+
+    """
+    test_filter_verify_collision validates rows with colliding fingerprints but different keys
+    are kept and counted when verify is enabled
+    """
+
+    # Given
+    deduplicator = FingerprintDeduplicator(columns_to_dedup, verify=True)
+    mocker.patch.object(deduplicator, 'fingerprint',
+                        side_effect=lambda df: np.zeros(len(df), dtype=np.uint64))
+
+    # When
+    res = deduplicator.filter(df_fixture)
+
+    # Then
+    assert res.equals(df_fixture.drop_duplicates(subset=columns_to_dedup))
+    assert deduplicator.collisions == 6
+
+# ==== add / contains ====
+
+def test_add_contains():
+
+    """
+    test_add_contains validates fingerprints added in many runs are all found
+    """
+
+    # Given
+    deduplicator = FingerprintDeduplicator(columns_to_dedup)
+    fingerprints = np.random.default_rng(0).permutation(1000).astype(np.uint64) * 7
+
+    # When
+    for i in range(0, 1000, 30):
+        deduplicator.add(fingerprints[i:i + 30])
+
+    # Then
+    assert deduplicator.size == 1000
+    assert deduplicator.contains(fingerprints).all()
+    assert not deduplicator.contains(fingerprints + 1).any()
+    assert len(deduplicator._runs) < 10
+
+# ==== collision_probability ====
+
+def test_collision_probability():
+
+    """
+    test_collision_probability validates birthday bound for 64-bit fingerprints
+    """
+
+    # Given
+    deduplicator = FingerprintDeduplicator(columns_to_dedup)
+
+    # When
+    deduplicator.add(np.arange(2 ** 20, dtype=np.uint64))
+
+    # Then
+    assert deduplicator.collision_probability == pytest.approx(2 ** 20 * (2 ** 20 - 1) / 2 ** 65)
@@ -1,21 +1,49 @@
+import io
+import json
 import pytest
-from handler import process_data, _map_transformation
-from transformations import aggregate_impressions, other_transformation
+import weakref
+from unittest.mock import ANY
+from concurrent.futures import ThreadPoolExecutor
+from handler import (
+    PartitionResult,
+    process_data,
+    process_date_range,
+    _map_columns,
+    _map_transformation,
+    _map_streaming_transformation
+)
+import transformations
+from registry import TRANSFORMATIONS, Transformation
+from shards import SHARD_CHUNKSIZE, Shard
+from transformations import aggregate_impressions, count_impressions_stream, other_transformation
 import pandas as pd
+from aws.s3_client import S3ObjectInfo, TransferStats
 
 # ==== Fixtures ====
 
+impressions_columns = {'IMPRESSION_ID': 'Int32', 'CAMPAIGN_ID': 'Int32', 'IMPRESSION_DATETIME': 'str'}
+
+@pytest.fixture
+def s3_client_fixture(mocker):
+    s3_client = mocker.patch('handler.S3Client')
+    s3_client.return_value.transfer = TransferStats()
+    return s3_client
+
 @pytest.fixture
-def s3_instance_fixture(mocker):
-    return mocker.patch('handler.S3Client').return_value
+def s3_instance_fixture(s3_client_fixture):
+    return s3_client_fixture.return_value
 
 @pytest.fixture
 def aggregate_impressions_fixture(mocker):
-    return mocker.patch('handler.aggregate_impressions')
+    return mocker.patch('transformations.aggregate_impressions')
 
 @pytest.fixture
 def other_transformation_fixture(mocker):
-    return mocker.patch('handler.other_transformation')
+    return mocker.patch('transformations.other_transformation')
+
+@pytest.fixture
+def aggregate_impressions_stream_fixture(mocker):
+    return mocker.patch('transformations.aggregate_impressions_stream')
 
 
 # ==== process_data ====
@@ -34,11 +62,12 @@ def test_process_data(s3_instance_fixture, aggregate_impressions_fixture):
     transformation_type = 'aggregate_impressions'
 
     mock_object_keys = ['key1', 'key2']
+    mock_objects = [S3ObjectInfo(key, 10, f'"{key}"') for key in mock_object_keys]
     dummy_df = pd.DataFrame({'col1': [1,2], 'col2': [3,4]})
     
     expected_export_object_key = 'results/2022/04/15/daily_agg_20220415_TI.csv'
 
-    s3_instance_fixture.get_csv_file_list.return_value = mock_object_keys
+    s3_instance_fixture.list_data_objects.return_value = mock_objects
     s3_instance_fixture.export_s3_to_df.return_value = dummy_df
     aggregate_impressions_fixture.return_value = dummy_df
 
@@ -46,15 +75,298 @@ def test_process_data(s3_instance_fixture, aggregate_impressions_fixture):
     process_data(date_partition, bucket_name, initials, transformation_type)
 
     # Then
-    s3_instance_fixture.get_csv_file_list.assert_called_once_with(
-        bucket_name, '2022/04/15')
+    s3_instance_fixture.list_data_objects.assert_called_once_with(
+        bucket_name, '2022/04/15', fan_out=False)
     s3_instance_fixture.export_s3_to_df.assert_called_once_with(
-        bucket_name, mock_object_keys)
+        bucket_name, mock_object_keys, columns=impressions_columns, sizes={key: 10 for key in mock_object_keys})
+    s3_instance_fixture.export_df_to_s3.assert_called_once_with(
+        bucket_name, expected_export_object_key, dummy_df
+    )
+
+
+def test_process_data_arrow(s3_instance_fixture, mocker):
+
+    """
+    test_process_data_arrow validates
+    the handler loads the raw files to arrow table and transforms it with arrow engine
+    """
+
+    # Given
+    mock_objects = [S3ObjectInfo(key, 10, f'"{key}"') for key in ['key1', 'key2']]
+    dummy_table = mocker.MagicMock()
+    dummy_df = pd.DataFrame({'col1': [1,2], 'col2': [3,4]})
+    s3_instance_fixture.list_data_objects.return_value = mock_objects
+    s3_instance_fixture.export_s3_to_table.return_value = dummy_table
+    arrow_fixture = mocker.patch('arrow_transformations.aggregate_impressions', return_value=dummy_df)
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', engine='arrow')
+
+    # Then
+    s3_instance_fixture.export_s3_to_table.assert_called_once_with(
+        'test_bucket', ['key1', 'key2'], columns=impressions_columns)
+    s3_instance_fixture.export_s3_to_df.assert_not_called()
+    assert arrow_fixture.call_args.args[0] is dummy_table
+    s3_instance_fixture.export_df_to_s3.assert_called_once_with(
+        'test_bucket', 'results/2022/04/15/daily_agg_20220415_TI.csv', dummy_df)
+
+def test_process_data_arrow_not_in_memory(s3_instance_fixture):
+
+    """
+    test_process_data_arrow_not_in_memory validates arrow engine is rejected in other modes
+    """
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Engine arrow can be applied in in-memory mode only'):
+        process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', chunksize=10, engine='arrow')
+    s3_instance_fixture.list_data_objects.assert_not_called()
+
+
+def test_process_data_auto(s3_instance_fixture, aggregate_impressions_stream_fixture, mocker):
+
+    """
+    test_process_data_auto validates
+    the handler streams partition not fitting in memory in chunks of planned size
+    """
+
+    # Given
+    mocker.patch('planner.get_cpu_count', return_value=1)
+    mock_objects = [S3ObjectInfo(key, 1024 ** 3, f'"{key}"') for key in ['key1.csv', 'key2.csv']]
+    dummy_df = pd.DataFrame({'col1': [1,2], 'col2': [3,4]})
+    s3_instance_fixture.list_data_objects.return_value = mock_objects
+    s3_instance_fixture.iter_s3_chunks.return_value = [dummy_df]
+    aggregate_impressions_stream_fixture.return_value = dummy_df
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', auto=True, memory_limit=4 * 1024 ** 3)
+
+    # Then
+    s3_instance_fixture.iter_s3_chunks.assert_called_once_with(
+        'test_bucket', ['key1.csv', 'key2.csv'], 1000000, columns=impressions_columns)
+    s3_instance_fixture.export_s3_to_df.assert_not_called()
+    s3_instance_fixture.export_df_to_s3.assert_called_once_with(
+        'test_bucket', 'results/2022/04/15/daily_agg_20220415_TI.csv', dummy_df)
+
+def test_process_data_dry_run(s3_instance_fixture, caplog):
+
+    """
+    test_process_data_dry_run validates
+    the handler logs execution plan of the listed objects without downloading or uploading anything
+    """
+
+    # Given
+    mock_objects = [S3ObjectInfo(key, 10, f'"{key}"') for key in ['key1', 'key2']]
+    s3_instance_fixture.list_data_objects.return_value = mock_objects
+
+    # When
+    with caplog.at_level('INFO', logger='handler'):
+        process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', auto=True, dry_run=True,
+                     memory_limit=1024 ** 3)
+
+    # Then
+    assert 'Dry run, execution plan: in_memory mode with max_workers 2: 2 objects' in caplog.text
+    s3_instance_fixture.export_s3_to_df.assert_not_called()
+    s3_instance_fixture.iter_s3_chunks.assert_not_called()
+    s3_instance_fixture.export_df_to_s3.assert_not_called()
+
+def test_process_data_auto_explicit_mode(s3_instance_fixture):
+
+    """
+    test_process_data_auto_explicit_mode validates auto mode is rejected with explicit chunksize
+    """
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Auto mode chooses chunksize and map_processes'):
+        process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', chunksize=10, auto=True)
+    s3_instance_fixture.list_data_objects.assert_not_called()
+
+
+def test_process_data_streaming(s3_instance_fixture, aggregate_impressions_stream_fixture):
+
+    """
+    test_process_data_streaming validates
+    the handler streams the raw files in chunks when chunksize is provided
+    """
+
+    # Given
+    date_partition = '2022-04-15'
+    bucket_name = 'test_bucket'
+    initials = 'TI'
+    transformation_type = 'aggregate_impressions'
+
+    mock_object_keys = ['key1', 'key2']
+    mock_objects = [S3ObjectInfo(key, 10, f'"{key}"') for key in mock_object_keys]
+    dummy_df = pd.DataFrame({'col1': [1,2], 'col2': [3,4]})
+
+    expected_export_object_key = 'results/2022/04/15/daily_agg_20220415_TI.csv'
+
+    s3_instance_fixture.list_data_objects.return_value = mock_objects
+    s3_instance_fixture.iter_s3_chunks.return_value = [dummy_df]
+    aggregate_impressions_stream_fixture.return_value = dummy_df
+
+    # When
+    process_data(date_partition, bucket_name, initials, transformation_type, chunksize=1000)
+
+    # Then
+    s3_instance_fixture.iter_s3_chunks.assert_called_once_with(
+        bucket_name, mock_object_keys, 1000, columns=impressions_columns)
+    aggregate_impressions_stream_fixture.assert_called_once_with(
+        ANY, schema_path='schemas/impressions.yaml', verify_dedup=False, metrics=ANY
+    )
+    assert list(aggregate_impressions_stream_fixture.call_args.args[0]) == [dummy_df]
+    s3_instance_fixture.export_s3_to_df.assert_not_called()
     s3_instance_fixture.export_df_to_s3.assert_called_once_with(
         bucket_name, expected_export_object_key, dummy_df
     )
 
 
+def test_process_data_output_format(s3_instance_fixture, aggregate_impressions_fixture):
+
+    """
+    test_process_data_output_format validates
+    the result key extension follows the output format, so the client writes parquet
+    """
+
+    # Given
+    dummy_df = pd.DataFrame({'col1': [1,2], 'col2': [3,4]})
+
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo('key1.parquet', 10, '"key1"')]
+    s3_instance_fixture.export_s3_to_df.return_value = dummy_df
+    aggregate_impressions_fixture.return_value = dummy_df
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', output_format='parquet')
+
+    # Then
+    s3_instance_fixture.export_s3_to_df.assert_called_once_with(
+        'test_bucket', ['key1.parquet'], columns=impressions_columns, sizes={'key1.parquet': 10})
+    s3_instance_fixture.export_df_to_s3.assert_called_once_with(
+        'test_bucket', 'results/2022/04/15/daily_agg_20220415_TI.parquet', dummy_df
+    )
+
+
+def test_process_data_output_compression(s3_instance_fixture, aggregate_impressions_fixture):
+
+    """
+    test_process_data_output_compression validates
+    the result key gets compression extension, so the client compresses the csv
+    """
+
+    # Given
+    dummy_df = pd.DataFrame({'col1': [1,2], 'col2': [3,4]})
+
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo('key1.csv.gz', 10, '"key1"')]
+    s3_instance_fixture.export_s3_to_df.return_value = dummy_df
+    aggregate_impressions_fixture.return_value = dummy_df
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', output_compression='zstd')
+
+    # Then
+    s3_instance_fixture.export_df_to_s3.assert_called_once_with(
+        'test_bucket', 'results/2022/04/15/daily_agg_20220415_TI.csv.zst', dummy_df
+    )
+
+
+def test_process_data_max_workers(s3_client_fixture, aggregate_impressions_fixture, mocker):
+
+    """
+    test_process_data_max_workers
+    validates the s3 client is created with given number of workers
+    """
+
+    # Given
+    parse_yaml_fixture = mocker.patch('handler.parse_yaml')
+    s3_client_fixture.return_value.list_data_objects.return_value = [S3ObjectInfo('key1', 10, '"key1"')]
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', max_workers=8)
+
+    # Then
+    parse_yaml_fixture.assert_called_once_with('config.yaml')
+    s3_client_fixture.assert_called_once_with(parse_yaml_fixture.return_value, max_workers=8, cache=None,
+                                              range_size=None)
+
+def test_process_data_auto_max_workers(s3_client_fixture, aggregate_impressions_fixture, mocker):
+
+    """
+    test_process_data_auto_max_workers validates the s3 client is created again with the planned
+    number of workers, so its connection pool serves them all, and a given client is kept as it is
+    """
+
+    # Given
+    parse_yaml_fixture = mocker.patch('handler.parse_yaml')
+    mocker.patch('planner.get_cpu_count', return_value=4)
+    s3_client_fixture.return_value.max_workers = 1
+    s3_client_fixture.return_value.list_data_objects.return_value = \
+        [S3ObjectInfo(f'key{i}', 10, f'"key{i}"') for i in range(3)]
+    given_client = mocker.MagicMock(max_workers=2, transfer=TransferStats())
+    given_client.list_data_objects.return_value = [S3ObjectInfo(f'key{i}', 10, f'"key{i}"') for i in range(3)]
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', auto=True, memory_limit=1024 ** 3)
+    calls = s3_client_fixture.call_args_list
+    s3_client_fixture.reset_mock()
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', auto=True, memory_limit=1024 ** 3,
+                 s3_client=given_client)
+
+    # Then
+    assert [call.kwargs['max_workers'] for call in calls] == [1, 3]
+    assert all(call.args[0] is parse_yaml_fixture.return_value for call in calls)
+    s3_client_fixture.assert_not_called()
+    assert given_client.max_workers == 2
+    given_client.export_s3_to_df.assert_called_once()
+
+
+def test_process_data_cache(s3_client_fixture, aggregate_impressions_fixture, mocker):
+
+    """
+    test_process_data_cache
+    validates the s3 client is created with objects cache when cache directory is given
+    """
+
+    # Given
+    parse_yaml_fixture = mocker.patch('handler.parse_yaml')
+    cache_fixture = mocker.patch('handler.S3ObjectCache')
+    s3_client_fixture.return_value.list_data_objects.return_value = [S3ObjectInfo('key1', 10, '"key1"')]
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', cache_dir='/tmp/cache', cache_size=1024)
+
+    # Then
+    cache_fixture.assert_called_once_with('/tmp/cache', 1024)
+    s3_client_fixture.assert_called_once_with(
+        parse_yaml_fixture.return_value, max_workers=1, cache=cache_fixture.return_value, range_size=None)
+
+
+def test_process_data_storage_root(s3_client_fixture, tmp_path, mocker):
+
+    """
+    test_process_data_storage_root
+    validates objects are read from and results written to local directory, without s3 credentials
+    """
+
+    # Given
+    parse_yaml_fixture = mocker.patch('handler.parse_yaml')
+    partition = tmp_path / 'test_bucket' / '2022' / '04' / '15'
+    partition.mkdir(parents=True)
+    with open('tests/unit/fixtures/df_fixture.csv', 'rb') as file:
+        (partition / 'impressions.csv').write_bytes(file.read())
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv', usecols=list(impressions_columns), dtype=impressions_columns)
+    expected_df = aggregate_impressions(df, 'schemas/impressions.yaml')
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', storage_root=str(tmp_path))
+
+    # Then
+    parse_yaml_fixture.assert_not_called()
+    s3_client_fixture.assert_not_called()
+    res = pd.read_csv(tmp_path / 'test_bucket' / 'results' / '2022' / '04' / '15' / 'daily_agg_20220415_TI.csv')
+    assert res.equals(expected_df.astype('int64'))
+
+
 def test_process_data_bucket_not_exist(s3_instance_fixture):
 
     """
@@ -79,7 +391,7 @@ def test_process_data_bucket_not_exist(s3_instance_fixture):
     
     s3_instance_fixture.bucket_exist.assert_called_once_with(
         bucket_name)
-    s3_instance_fixture.get_csv_file_list.assert_not_called()
+    s3_instance_fixture.list_data_objects.assert_not_called()
     s3_instance_fixture.export_s3_to_df.assert_not_called()
     s3_instance_fixture.export_df_to_s3.assert_not_called()
     
@@ -99,15 +411,15 @@ def test_process_data_no_files(s3_instance_fixture, capsys):
     
     expected_export_object_key = 'results/2022/04/15/daily_agg_20220415_TI.csv'
 
-    s3_instance_fixture.get_csv_file_list.return_value = []
+    s3_instance_fixture.list_data_objects.return_value = []
 
     # When
     # Then
     with pytest.raises(ValueError, match='No files to process with prefix 2022/04/15'):
         assert process_data(date_partition, bucket_name, initials, transformation_type)
 
-    s3_instance_fixture.get_csv_file_list.assert_called_once_with(
-        bucket_name, '2022/04/15')
+    s3_instance_fixture.list_data_objects.assert_called_once_with(
+        bucket_name, '2022/04/15', fan_out=False)
     s3_instance_fixture.export_s3_to_df.assert_not_called()
     s3_instance_fixture.export_df_to_s3.assert_not_called()
 
@@ -127,7 +439,7 @@ def test_process_data_empty_df(s3_instance_fixture, aggregate_impressions_fixtur
     
     expected_export_object_key = 'results/2022/04/15/daily_agg_20220415_TI.csv'
 
-    s3_instance_fixture.get_csv_file_list.return_value = ['key1']
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo('key1', 10, '"key1"')]
     s3_instance_fixture.export_s3_to_df.return_value
     aggregate_impressions_fixture.return_value = pd.DataFrame()
 
@@ -135,12 +447,323 @@ def test_process_data_empty_df(s3_instance_fixture, aggregate_impressions_fixtur
     process_data(date_partition, bucket_name, initials, transformation_type)
 
     # Then
-    s3_instance_fixture.get_csv_file_list.assert_called_once_with(
-        bucket_name, '2022/04/15')
+    s3_instance_fixture.list_data_objects.assert_called_once_with(
+        bucket_name, '2022/04/15', fan_out=False)
     s3_instance_fixture.export_s3_to_df.assert_called_once_with(
-        bucket_name, ['key1'])
+        bucket_name, ['key1'], columns=impressions_columns, sizes={'key1': 10})
+    s3_instance_fixture.export_df_to_s3.assert_not_called()
+
+
+def test_process_data_map_reduce(s3_instance_fixture, mocker, tmp_path):
+
+    """
+    test_process_data_map_reduce validates every object is mapped on the pool of worker processes
+    and reduced into the same result as in memory, worker metrics are merged into the run metrics
+    """
+
+    # Given
+    metrics_file = tmp_path / 'metrics.jsonl'
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv', usecols=list(impressions_columns), dtype=impressions_columns)
+    files = {'key1': df.iloc[:5].copy(), 'key2': df.iloc[1:].copy()}
+    expected_df = aggregate_impressions(pd.concat(files.values()), 'schemas/impressions.yaml')
+    pool_fixture = mocker.patch('handler.ProcessPoolExecutor', side_effect=ThreadPoolExecutor)
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo(key, 10, f'"{key}"') for key in files]
+    s3_instance_fixture.export_s3_to_df.side_effect = lambda bucket, keys, columns, sizes: files[keys[0]].copy()
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', map_processes=4,
+                 s3_client=s3_instance_fixture, metrics_file=str(metrics_file))
+
+    # Then
+    assert pool_fixture.call_args.kwargs['max_workers'] == 2
+    assert s3_instance_fixture.export_s3_to_df.call_count == 2
+    res = s3_instance_fixture.export_df_to_s3.call_args.args[2]
+    assert res.equals(expected_df)
+    metrics = json.loads(metrics_file.read_text())
+    assert metrics['mode'] == 'map_reduce'
+    assert metrics['stages']['load']['calls'] == 2
+    assert metrics['stages']['load']['rows_out'] == 12
+    assert metrics['stages']['dedup']['rows_out'] == len(pd.concat(files.values()).drop_duplicates(
+        subset=['IMPRESSION_ID', 'IMPRESSION_DATETIME']))
+
+def test_process_data_map_reduce_ranges(s3_instance_fixture, mocker):
+
+    """
+    test_process_data_map_reduce_ranges validates large plain csv object is split into byte ranges
+    mapped as separate partial results, reduced into the same result as in memory
+    """
+
+    # Given
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv', usecols=list(impressions_columns), dtype=impressions_columns)
+    expected_df = aggregate_impressions(pd.concat([df, df.iloc[:3]]), 'schemas/impressions.yaml')
+    mocker.patch('handler.ProcessPoolExecutor', side_effect=ThreadPoolExecutor)
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo('key1.csv', 250, '"key1"'),
+                                                          S3ObjectInfo('key2.csv.gz', 250, '"key2"')]
+    ranges = {0: df.iloc[:3], 100: df.iloc[3:6], 200: df.iloc[6:]}
+    s3_instance_fixture.read_csv_range.side_effect = \
+        lambda bucket, key, byte_range, size, columns: ranges[byte_range[0]].copy()
+    s3_instance_fixture.export_s3_to_df.side_effect = lambda bucket, keys, columns, sizes: df.iloc[:3].copy()
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', map_processes=2,
+                 s3_client=s3_instance_fixture, range_size=100)
+
+    # Then
+    assert [call.args[2] for call in s3_instance_fixture.read_csv_range.call_args_list] == \
+        [(0, 99), (100, 199), (200, 249)]
+    s3_instance_fixture.export_s3_to_df.assert_called_once_with('test_bucket', ['key2.csv.gz'],
+                                                                columns=impressions_columns, sizes={'key2.csv.gz': 250})
+    res = s3_instance_fixture.export_df_to_s3.call_args.args[2]
+    assert res.equals(expected_df)
+
+def test_process_data_map_reduce_streaming(s3_instance_fixture):
+
+    """
+    test_process_data_map_reduce_streaming validates map/reduce mode can not be combined with streaming mode
+    """
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Map/reduce mode can not be combined with incremental or streaming mode'):
+        process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', chunksize=10, map_processes=2)
+    s3_instance_fixture.list_data_objects.assert_not_called()
+
+def test_process_data_shard_merge(s3_instance_fixture):
+
+    """
+    test_process_data_shard_merge validates every shard stores partial counts of its objects
+    instead of the result and merge run reduces them into the same result as in memory
+    """
+
+    # Given
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv', usecols=list(impressions_columns), dtype=impressions_columns)
+    files = {'key1': df.iloc[:5].copy(), 'key2': df.iloc[1:].copy(), 'key4': df.iloc[3:8].copy()}
+    expected_df = aggregate_impressions(pd.concat(files.values()), 'schemas/impressions.yaml')
+    stored = {}
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo(key, 10, f'"{key}"') for key in files]
+    s3_instance_fixture.export_s3_to_df.side_effect = \
+        lambda bucket, keys, columns, sizes: pd.concat([files[key] for key in keys])
+    s3_instance_fixture.put_object.side_effect = lambda bucket, key, body: stored.update({key: body})
+    s3_instance_fixture.list_objects.side_effect = \
+        lambda bucket, prefix: [S3ObjectInfo(key, 10, '') for key in sorted(stored) if key.startswith(prefix)]
+    s3_instance_fixture.get_object.side_effect = lambda bucket, key: {'Body': io.BytesIO(stored[key])}
+
+    # When
+    for index in range(2):
+        process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', s3_client=s3_instance_fixture,
+                     shard=Shard(index, 2))
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', s3_client=s3_instance_fixture,
+                 merge=True)
+
+    # Then
+    assert sorted(stored) == ['results/2022/04/15/daily_agg_20220415_TI.shard-0000-of-0002.npz',
+                              'results/2022/04/15/daily_agg_20220415_TI.shard-0001-of-0002.npz']
+    loaded = [call.args[1] for call in s3_instance_fixture.export_s3_to_df.call_args_list]
+    assert loaded == [['key1', 'key2'], ['key4']]
+    s3_instance_fixture.export_df_to_s3.assert_called_once()
+    assert s3_instance_fixture.export_df_to_s3.call_args.args[1] == 'results/2022/04/15/daily_agg_20220415_TI.csv'
+    res = s3_instance_fixture.export_df_to_s3.call_args.args[2]
+    assert res.equals(expected_df)
+
+def test_process_data_shard_by_campaign(s3_instance_fixture, mocker):
+
+    """
+    test_process_data_shard_by_campaign validates shard by CAMPAIGN_ID streams all objects in chunks
+    and holds only its rows, chunk with rows of other shards is released before the next one is read
+    """
+
+    # Given
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv', usecols=list(impressions_columns), dtype=impressions_columns)
+    shard = Shard(0, 2)
+    expected_df = shard.filter_rows(df)
+    chunk_refs = []
+    alive = []
+
+    def iter_s3_chunks(bucket, keys, chunksize, columns):
+        for start in range(0, len(df), 3):
+            alive.append(sum(ref() is not None for ref in chunk_refs))
+            chunk = df.iloc[start:start + 3].copy()
+            chunk_refs.append(weakref.ref(chunk))
+            yield chunk
+            del chunk
+
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo(key, 10, f'"{key}"') for key in ['key1', 'key2']]
+    s3_instance_fixture.iter_s3_chunks.side_effect = iter_s3_chunks
+    map_spy = mocker.spy(transformations, 'map_impressions')
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', s3_client=s3_instance_fixture,
+                 shard=shard, shard_by='campaign')
+
+    # Then
+    s3_instance_fixture.export_s3_to_df.assert_not_called()
+    s3_instance_fixture.iter_s3_chunks.assert_called_once_with(
+        'test_bucket', ['key1', 'key2'], SHARD_CHUNKSIZE, columns=impressions_columns)
+    assert max(alive) <= 1
+    assert map_spy.call_args.args[0].equals(expected_df.reset_index(drop=True))
+    s3_instance_fixture.put_object.assert_called_once()
     s3_instance_fixture.export_df_to_s3.assert_not_called()
 
+def test_process_data_merge_missing_shard(s3_instance_fixture):
+
+    """
+    test_process_data_merge_missing_shard validates merge fails and uploads nothing
+    until partials of all shards are stored
+    """
+
+    # Given
+    s3_instance_fixture.list_objects.return_value = [
+        S3ObjectInfo('results/2022/04/15/daily_agg_20220415_TI.shard-0001-of-0003.npz', 10, '')]
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match=r"Shard partials \['0/3', '2/3'\] are missing"):
+        process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', s3_client=s3_instance_fixture,
+                     merge=True)
+    s3_instance_fixture.list_data_objects.assert_not_called()
+    s3_instance_fixture.export_df_to_s3.assert_not_called()
+
+def test_process_data_shard_streaming(s3_instance_fixture):
+
+    """
+    test_process_data_shard_streaming validates shard mode can not be combined with streaming mode
+    """
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Shard and merge modes can not be combined with incremental'):
+        process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', chunksize=10, shard=Shard(0, 2))
+    s3_instance_fixture.list_data_objects.assert_not_called()
+
+def test_process_data_shared_scan(s3_instance_fixture):
+
+    """
+    test_process_data_shared_scan validates several transformations are computed from a single
+    listing and load of the data, in memory and in streaming mode, each one saved as a separate result
+    same as processed one by one
+    """
+
+    # Given
+    transformation_types = ['aggregate_impressions', 'aggregate_advertiser_impressions',
+                            'aggregate_order_impressions', 'aggregate_agency_impressions']
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo('key1', 10, '"key1"')]
+    s3_instance_fixture.export_s3_to_df.side_effect = \
+        lambda bucket, keys, columns, sizes: df[list(columns)].astype(columns)
+    s3_instance_fixture.iter_s3_chunks.side_effect = \
+        lambda bucket, keys, chunksize, columns: iter([df.iloc[:4][list(columns)].astype(columns),
+                                                       df.iloc[2:][list(columns)].astype(columns)])
+    for transformation_type in transformation_types:
+        process_data('2022-04-15', 'test_bucket', 'TI', transformation_type)
+    expected = {call.args[1]: call.args[2] for call in s3_instance_fixture.export_df_to_s3.call_args_list}
+    s3_instance_fixture.reset_mock()
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', transformation_types)
+    res = {call.args[1]: call.args[2] for call in s3_instance_fixture.export_df_to_s3.call_args_list}
+    s3_instance_fixture.export_df_to_s3.reset_mock()
+    process_data('2022-04-15', 'test_bucket', 'TI', transformation_types, chunksize=3)
+    res_stream = {call.args[1]: call.args[2] for call in s3_instance_fixture.export_df_to_s3.call_args_list}
+
+    # Then
+    assert list(expected) == ['results/2022/04/15/daily_agg_20220415_TI.csv',
+                              'results/2022/04/15/daily_advertiser_agg_20220415_TI.csv',
+                              'results/2022/04/15/daily_order_agg_20220415_TI.csv',
+                              'results/2022/04/15/daily_agency_agg_20220415_TI.csv']
+    assert s3_instance_fixture.list_data_objects.call_count == 2
+    s3_instance_fixture.export_s3_to_df.assert_called_once_with(
+        'test_bucket', ['key1'], columns={**impressions_columns, 'ADVERTISER_ID': 'Int32', 'ORDER_ID': 'Int32',
+                                          'AGENCY_ID': 'Int32'}, sizes={'key1': 10})
+    s3_instance_fixture.iter_s3_chunks.assert_called_once()
+    assert list(res) == list(res_stream) == list(expected)
+    for key, expected_df in expected.items():
+        assert res[key].equals(expected_df)
+        assert res_stream[key].equals(expected_df)
+
+def test_process_data_shared_scan_incremental(s3_instance_fixture):
+
+    """
+    test_process_data_shared_scan_incremental validates several transformations can not be combined
+    with incremental mode nor include one without count function, before anything is listed
+    """
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Several transformation types can be applied in in-memory or streaming mode only'):
+        process_data('2022-04-15', 'test_bucket', 'TI', ['aggregate_impressions', 'aggregate_order_impressions'],
+                     incremental=True)
+    with pytest.raises(ValueError, match='Transformation_type other can not share a scan'):
+        process_data('2022-04-15', 'test_bucket', 'TI', ['aggregate_impressions', 'other'])
+    s3_instance_fixture.list_data_objects.assert_not_called()
+
+def test_process_data_shared_scan_same_result(s3_instance_fixture, mocker):
+
+    """
+    test_process_data_shared_scan_same_result validates transformations saved under the same
+    result name are rejected before anything is listed, so one result does not replace another
+    """
+
+    # Given
+    mocker.patch.dict('registry.TRANSFORMATIONS', {'aggregate_campaign_impressions': Transformation(
+        name='aggregate_campaign_impressions',
+        module='transformations',
+        function='aggregate_impressions',
+        schema_path='schemas/impressions.yaml',
+        count_function='count_campaign_impressions'
+    )})
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match=r"would save several results as \['daily_agg'\]"):
+        process_data('2022-04-15', 'test_bucket', 'TI', ['aggregate_impressions', 'aggregate_campaign_impressions'])
+    s3_instance_fixture.list_data_objects.assert_not_called()
+
+def test_process_data_hll_precision_not_supported(s3_instance_fixture):
+
+    """
+    test_process_data_hll_precision_not_supported validates sketch precision is rejected
+    for exact transformation before anything is listed
+    """
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Transformation_type aggregate_impressions does not support options'):
+        process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', hll_precision=10)
+    s3_instance_fixture.list_data_objects.assert_not_called()
+
+
+    # ==== _map_columns ====
+
+def test__map_columns_aggregate_impressions():
+
+    """
+    test__map_columns_aggregate_impressions
+    validates only columns from impressions schema are loaded with declared dtypes
+    """
+
+    # Given
+
+    # When
+    res = _map_columns('aggregate_impressions')
+
+    # Then
+    assert res == impressions_columns
+
+def test__map_columns_other():
+
+    """
+    test__map_columns_other
+    validates all columns are loaded for transformation without schema
+    """
+
+    # Given
+
+    # When
+    res = _map_columns('other')
+
+    # Then
+    assert res is None
+
 
     # ==== _map_transformation ====
 
@@ -162,7 +785,7 @@ def test__map_transformation_aggregate_impressions(aggregate_impressions_fixture
 
     # Then
     aggregate_impressions_fixture.assert_called_once_with(
-        dummy_df, schema_path='schemas/impressions.yaml'
+        dummy_df, schema_path='schemas/impressions.yaml', metrics=None
     )
 
 def test__map_transformation_other(other_transformation_fixture, aggregate_impressions_fixture):
@@ -181,3 +804,312 @@ def test__map_transformation_other(other_transformation_fixture, aggregate_impre
     other_transformation_fixture.assert_called_once()
     aggregate_impressions_fixture.assert_not_called()
 
+
+
+def test__map_streaming_transformation_other(aggregate_impressions_stream_fixture):
+
+    """
+    test__map_streaming_transformation_other
+    validates transformation without streaming support raises ValueError
+    """
+
+    # Given
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Transformation_type other does not support streaming mode'):
+        _map_streaming_transformation('other', iter([]))
+    aggregate_impressions_stream_fixture.assert_not_called()
+
+
+    # ==== process_data incremental ====
+
+def test_process_data_incremental_up_to_date(s3_instance_fixture, mocker):
+
+    """
+    test_process_data_incremental_up_to_date
+    validates nothing is downloaded or uploaded when no files changed since last run
+    """
+
+    # Given
+    mock_objects = [S3ObjectInfo('key1', 10, '"etag1"')]
+    s3_instance_fixture.list_data_objects.return_value = mock_objects
+    manifest_fixture = mocker.patch('handler.Manifest')
+    manifest_fixture.load.return_value.diff.return_value = ([], [])
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', incremental=True)
+
+    # Then
+    manifest_fixture.load.assert_called_once_with(
+        s3_instance_fixture, 'test_bucket', 'results/2022/04/15/daily_agg_20220415_TI.csv')
+    s3_instance_fixture.export_s3_to_df.assert_not_called()
+    s3_instance_fixture.export_df_to_s3.assert_not_called()
+    manifest_fixture.load.return_value.save.assert_not_called()
+
+def test_process_data_incremental_new_files(s3_instance_fixture, mocker):
+
+    """
+    test_process_data_incremental_new_files
+    validates only new files are downloaded and merged into the existing result
+    """
+
+    # Given
+    bucket_name = 'test_bucket'
+    result_key = 'results/2022/04/15/daily_agg_20220415_TI.csv'
+    fixture_df = pd.read_csv('tests/unit/fixtures/df_fixture.csv', dtype=impressions_columns)
+    old_object, new_object = S3ObjectInfo('key1', 10, '"etag1"'), S3ObjectInfo('key2', 10, '"etag2"')
+
+    s3_instance_fixture.list_data_objects.return_value = [old_object, new_object]
+    s3_instance_fixture.export_s3_to_df.return_value = fixture_df.iloc[3:]
+    manifest_fixture = mocker.patch('handler.Manifest')
+    manifest = manifest_fixture.load.return_value
+    manifest.diff.return_value = ([new_object], [])
+    manifest.load_fingerprints.return_value = pd.util.hash_pandas_object(
+        fixture_df.iloc[:4][['IMPRESSION_ID', 'IMPRESSION_DATETIME']].drop_duplicates(), index=False).to_numpy()
+    manifest.counts.return_value = pd.Series(
+        [2, 1], index=pd.MultiIndex.from_tuples([(1111, 14), (1111, 15)], names=['CAMPAIGN_ID', 'HOUR']))
+
+    # When
+    process_data('2022-04-15', bucket_name, 'TI', 'aggregate_impressions', incremental=True)
+
+    # Then
+    s3_instance_fixture.export_s3_to_df.assert_called_once_with(
+        bucket_name, ['key2'], columns=impressions_columns, sizes={'key2': 10})
+    new_counts = manifest.add_object.call_args[0][1]
+    assert new_counts.reset_index().values.tolist() == [[2222, 12, 1], [2222, 20, 1], [3333, 12, 2]]
+    manifest.counts.assert_called_once_with('Int32')
+    s3_instance_fixture.export_df_to_s3.assert_called_once_with(
+        bucket_name, result_key, mocker.ANY)
+    manifest.save.assert_called_once_with(s3_instance_fixture, bucket_name, result_key, mocker.ANY)
+    assert len(manifest.save.call_args[0][3]) == 7
+
+def test_process_data_incremental_schema_path(s3_instance_fixture, mocker):
+
+    """
+    test_process_data_incremental_schema_path
+    validates new files are validated against the schema registered for the transformation
+    """
+
+    # Given
+    schema_path = 'schemas/advertiser_impressions.yaml'
+    mocker.patch.dict('registry.TRANSFORMATIONS', {'aggregate_impressions': TRANSFORMATIONS['aggregate_impressions']
+                      ._replace(schema_path=schema_path)})
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo('key1', 10, '"etag1"')]
+    s3_instance_fixture.export_s3_to_df.return_value = pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+    mocker.patch('handler.Manifest').load.return_value = None
+    count_fixture = mocker.patch('handler.count_impressions_stream', wraps=count_impressions_stream)
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', incremental=True)
+
+    # Then
+    count_fixture.assert_called_once_with(ANY, schema_path, ANY, metrics=ANY)
+
+def test_process_data_incremental_changed_files(s3_instance_fixture, mocker):
+
+    """
+    test_process_data_incremental_changed_files
+    validates all files are processed again when any processed file was changed
+    """
+
+    # Given
+    bucket_name = 'test_bucket'
+    objects = [S3ObjectInfo('key1', 10, '"etag1"'), S3ObjectInfo('key2', 10, '"etag2"')]
+    s3_instance_fixture.list_data_objects.return_value = objects
+    s3_instance_fixture.export_s3_to_df.return_value = \
+        pd.read_csv('tests/unit/fixtures/df_fixture.csv', dtype=impressions_columns)
+    manifest_fixture = mocker.patch('handler.Manifest')
+    manifest_fixture.load.return_value.diff.return_value = ([], ['key1'])
+    manifest_fixture.return_value.counts.return_value = pd.Series(
+        [2], index=pd.MultiIndex.from_tuples([(1111, 14)], names=['CAMPAIGN_ID', 'HOUR']))
+
+    # When
+    process_data('2022-04-15', bucket_name, 'TI', 'aggregate_impressions', incremental=True)
+
+    # Then
+    s3_instance_fixture.export_s3_to_df.assert_has_calls([
+        mocker.call(bucket_name, ['key1'], columns=impressions_columns, sizes={'key1': 10}),
+        mocker.call(bucket_name, ['key2'], columns=impressions_columns, sizes={'key2': 10})
+    ])
+    manifest_fixture.load.return_value.load_fingerprints.assert_not_called()
+    manifest_fixture.return_value.save.assert_called_once()
+
+def test_process_data_incremental_empty(s3_instance_fixture, mocker):
+
+    """
+    test_process_data_incremental_empty
+    validates processed files are recorded in the manifest even when they have no impressions,
+    so they are not loaded again by the next run
+    """
+
+    # Given
+    bucket_name = 'test_bucket'
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo('key1', 10, '"etag1"')]
+    s3_instance_fixture.export_s3_to_df.return_value = pd.DataFrame(
+        {column: pd.Series(dtype=dtype) for column, dtype in impressions_columns.items()})
+    manifest_fixture = mocker.patch('handler.Manifest')
+    manifest_fixture.load.return_value = None
+    manifest_fixture.return_value.counts.return_value = pd.Series(
+        [], dtype='int64', index=pd.MultiIndex.from_tuples([], names=['CAMPAIGN_ID', 'HOUR']))
+
+    # When
+    process_data('2022-04-15', bucket_name, 'TI', 'aggregate_impressions', incremental=True)
+
+    # Then
+    s3_instance_fixture.export_df_to_s3.assert_not_called()
+    manifest_fixture.return_value.save.assert_called_once_with(
+        s3_instance_fixture, bucket_name, 'results/2022/04/15/daily_agg_20220415_TI.csv', ANY)
+
+def test_process_data_incremental_other(s3_instance_fixture):
+
+    """
+    test_process_data_incremental_other
+    validates transformation without incremental support raises ValueError
+    """
+
+    # Given
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo('key1', 10, '"etag1"')]
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Transformation_type other does not support incremental mode'):
+        process_data('2022-04-15', 'test_bucket', 'TI', 'other', incremental=True)
+
+
+    # ==== process_date_range ====
+
+def test_process_date_range(s3_client_fixture, mocker):
+
+    """
+    test_process_date_range
+    validates every date in range is processed with the same s3 client
+    """
+
+    # Given
+    process_data_fixture = mocker.patch('handler.process_data')
+    mocker.patch('handler.parse_yaml')
+
+    # When
+    res = process_date_range('2022-02-27', '2022-03-01', 'test_bucket', 'TI', 'aggregate_impressions',
+                             max_workers=4, chunksize=100)
+
+    # Then
+    assert [result.date_partition for result in res] == ['2022-02-27', '2022-02-28', '2022-03-01']
+    assert all(result.succeeded for result in res)
+    s3_client_fixture.assert_called_once()
+    process_data_fixture.assert_has_calls([
+        mocker.call(date_partition=date_partition, s3_client=s3_client_fixture.return_value,
+                    bucket_name='test_bucket', initials='TI', transformation_type='aggregate_impressions',
+                    max_workers=4, range_size=None, storage_root=None, chunksize=100)
+        for date_partition in ['2022-02-27', '2022-02-28', '2022-03-01']
+    ])
+
+def test_process_date_range_failure_isolated(s3_client_fixture, mocker):
+
+    """
+    test_process_date_range_failure_isolated
+    validates failed date is reported and does not stop other dates
+    """
+
+    # Given
+    def process_data(date_partition, **kwargs):
+        if date_partition == '2022-04-16':
+            raise ValueError('No files to process with prefix 2022/04/16')
+
+    mocker.patch('handler.process_data', side_effect=process_data)
+    mocker.patch('handler.parse_yaml')
+
+    # When
+    res = process_date_range('2022-04-15', '2022-04-17', 'test_bucket', 'TI', 'aggregate_impressions')
+
+    # Then
+    assert [(result.date_partition, result.succeeded) for result in res] == [
+        ('2022-04-15', True), ('2022-04-16', False), ('2022-04-17', True)
+    ]
+    assert 'No files to process with prefix 2022/04/16' in res[1].error
+
+def test_process_date_range_processes(s3_client_fixture, mocker):
+
+    """
+    test_process_date_range_processes
+    validates dates are processed on the pool of given size keeping dates order
+    """
+
+    # Given
+    pool_fixture = mocker.patch('handler.ProcessPoolExecutor', side_effect=ThreadPoolExecutor)
+    mocker.patch('handler.process_data')
+    mocker.patch('handler.parse_yaml')
+
+    # When
+    res = process_date_range('2022-04-15', '2022-04-20', 'test_bucket', 'TI', 'aggregate_impressions',
+                             processes=3)
+
+    # Then
+    assert pool_fixture.call_args.kwargs['max_workers'] == 3
+    assert [result.date_partition for result in res] == [
+        '2022-04-15', '2022-04-16', '2022-04-17', '2022-04-18', '2022-04-19', '2022-04-20'
+    ]
+    assert all(isinstance(result, PartitionResult) and result.succeeded for result in res)
+
+def test_process_date_range_wrong_order():
+
+    """
+    test_process_date_range_wrong_order
+    validates ValueError is raised when start date is after end date
+    """
+
+    # Given
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Start date 2022-04-16 is after end date 2022-04-15'):
+        process_date_range('2022-04-16', '2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions')
+
+    # ==== process_data metrics ====
+
+def test_process_data_metrics(s3_instance_fixture, tmp_path):
+
+    """
+    test_process_data_metrics validates metrics record with every stage is appended to metrics file
+    """
+
+    # Given
+    metrics_file = tmp_path / 'metrics.jsonl'
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv', usecols=list(impressions_columns), dtype=impressions_columns)
+    rows, unique_rows = len(df), len(df.drop_duplicates(subset=['IMPRESSION_ID', 'IMPRESSION_DATETIME']))
+    s3_instance_fixture.list_data_objects.return_value = [S3ObjectInfo('key1', 10, '"key1"')]
+    s3_instance_fixture.export_s3_to_df.return_value = df
+
+    # When
+    process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', metrics_file=str(metrics_file))
+
+    # Then
+    res = json.loads(metrics_file.read_text())
+    assert res['succeeded']
+    assert (res['date_partition'], res['mode'], res['objects'], res['objects_bytes']) == ('2022-04-15', 'in_memory', 1, 10)
+    assert list(res['stages']) == ['list', 'load', 'validate', 'dedup', 'count', 'upload']
+    assert res['stages']['load']['rows_out'] == rows
+    assert res['stages']['dedup']['rows_in'] == rows
+    assert res['stages']['dedup']['rows_out'] == unique_rows
+    assert res['stages']['dedup']['rows_dropped'] == rows - unique_rows
+    assert res['stages']['count']['rows_in'] == unique_rows
+
+def test_process_data_metrics_failed(s3_instance_fixture, tmp_path):
+
+    """
+    test_process_data_metrics_failed validates metrics record is emitted when processing fails
+    """
+
+    # Given
+    metrics_file = tmp_path / 'metrics.jsonl'
+    s3_instance_fixture.list_data_objects.return_value = []
+
+    # When
+    with pytest.raises(ValueError):
+        process_data('2022-04-15', 'test_bucket', 'TI', 'aggregate_impressions', metrics_file=str(metrics_file))
+
+    # Then
+    res = json.loads(metrics_file.read_text())
+    assert not res['succeeded']
+    assert list(res['stages']) == ['list']
@@ -0,0 +1,124 @@
+import pytest
+from hll import HyperLogLogSketches, check_precision
+import numpy as np
+import pandas as pd
+
+# ==== Fixtures ====
+
+@pytest.fixture
+def hashes_fixture():
+    """Well mixed 64-bit hashes, as dedup fingerprints are"""
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 2 ** 64, 60000, dtype=np.uint64, endpoint=False)
+
+def _sketches(hashes, keys, precision=10):
+    index, groups = np.unique(keys, return_inverse=True)
+    return HyperLogLogSketches.from_hashes(pd.Index(index, name='KEY'), groups, hashes, precision)
+
+# ==== from_hashes and estimate ====
+
+def test_estimate(hashes_fixture):
+
+    """
+    test_estimate validates estimates are within a few standard errors over small and large cardinalities,
+    duplicates do not change them and skipped hashes are not counted
+    """
+
+    # Given
+    sizes = [1, 10, 100, 1000, 10000]
+    keys = np.concatenate([np.full(size, i) for i, size in enumerate(sizes)])
+    hashes = hashes_fixture[:len(keys)]
+    groups = np.r_[keys, keys, -1]
+
+    # When
+    res = HyperLogLogSketches.from_hashes(pd.RangeIndex(len(sizes)), groups,
+                                          np.r_[hashes, hashes, hashes_fixture[-1]], precision=12).estimate()
+
+    # Then
+    assert res[:2].tolist() == [1, 10]
+    assert np.all(np.abs(res / np.array(sizes) - 1) < 4 * 1.04 / 64)
+
+def test_check_precision():
+
+    """
+    test_check_precision validates precision out of range is rejected
+    """
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Precision should be between 4 and 16, got 17'):
+        check_precision(17)
+
+# ==== merge and group ====
+
+def test_merge(hashes_fixture):
+
+    """
+    test_merge validates sketches of overlapping parts merge into the same sketch as built from all data,
+    keys missing in one of them are kept
+    """
+
+    # Given
+    keys = hashes_fixture % np.uint64(5)
+    first = _sketches(hashes_fixture[:40000], keys[:40000] % np.uint64(4))
+    second = _sketches(hashes_fixture[20000:], keys[20000:])
+    expected = _sketches(np.r_[hashes_fixture[:40000], hashes_fixture[20000:]],
+                         np.r_[keys[:40000] % np.uint64(4), keys[20000:]])
+
+    # When
+    res = first.merge(second)
+
+    # Then
+    assert res.index.equals(expected.index)
+    assert np.array_equal(res.registers, expected.registers)
+
+def test_merge_different_precisions(hashes_fixture):
+
+    """
+    test_merge_different_precisions validates sketches of different precisions are not merged
+    """
+
+    # Given
+    keys = np.zeros(len(hashes_fixture))
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match=r'Sketches of different precisions \[8, 10\] can not be merged'):
+        _sketches(hashes_fixture, keys, 8).merge(_sketches(hashes_fixture, keys))
+
+def test_group(hashes_fixture):
+
+    """
+    test_group validates sketches of the same group are merged into one
+    """
+
+    # Given
+    keys = hashes_fixture % np.uint64(6)
+    sketches = _sketches(hashes_fixture, keys)
+    expected = _sketches(hashes_fixture, keys % np.uint64(2))
+
+    # When
+    res = sketches.group(expected.index, np.array([0, 1, 0, 1, 0, 1]))
+
+    # Then
+    assert np.array_equal(res.registers, expected.registers)
+
+# ==== to_strings and from_strings ====
+
+def test_strings(hashes_fixture):
+
+    """
+    test_strings validates sketches are serialized to ascii strings and loaded back with their precision
+    """
+
+    # Given
+    sketches = _sketches(hashes_fixture, hashes_fixture % np.uint64(3), precision=6)
+
+    # When
+    values = sketches.to_strings()
+    res = HyperLogLogSketches.from_strings(sketches.index, values)
+
+    # Then
+    assert all(value.isascii() for value in values)
+    assert res.precision == 6
+    assert np.array_equal(res.registers, sketches.registers)
@@ -0,0 +1,72 @@
+import pytest
+from hourly_counts import HourlyCounts
+import numpy as np
+import pandas as pd
+
+# ==== Fixtures ====
+
+@pytest.fixture
+def rows_fixture():
+    """Rows of campaigns in random order with null campaign ids"""
+    rng = np.random.default_rng(0)
+    campaigns = pd.array(rng.integers(0, 50, 2000), dtype='Int32')
+    campaigns[rng.random(2000) < 0.05] = pd.NA
+    return pd.DataFrame({'CAMPAIGN_ID': campaigns, 'HOUR': rng.integers(0, 24, 2000)})
+
+# ==== add and to_series ====
+
+def test_add(rows_fixture):
+
+    """
+    test_add validates counts are the same as of groupby, rows with null campaign id are not counted
+    and positions of counted rows are the same as groupby ngroup
+    """
+
+    # Given
+    grouped = rows_fixture.groupby(['CAMPAIGN_ID', 'HOUR'])
+    counts = HourlyCounts('CAMPAIGN_ID')
+
+    # When
+    cells = counts.add(rows_fixture.CAMPAIGN_ID, rows_fixture.HOUR)
+
+    # Then
+    pd.testing.assert_series_equal(counts.to_series(), grouped.size())
+    assert np.array_equal(counts.positions(cells), grouped.ngroup().fillna(-1).to_numpy(dtype=np.int64))
+    assert len(counts) == len(grouped.size())
+
+def test_add_incremental(rows_fixture):
+
+    """
+    test_add_incremental validates counts added batch by batch, from rows and from partial counts,
+    are the same as counted at once
+    """
+
+    # Given
+    expected = rows_fixture.groupby(['CAMPAIGN_ID', 'HOUR']).size()
+    first, second, third = rows_fixture.iloc[:700], rows_fixture.iloc[700:1500], rows_fixture.iloc[1500:]
+    counts = HourlyCounts('CAMPAIGN_ID')
+
+    # When
+    counts.add(first.CAMPAIGN_ID, first.HOUR)
+    counts.add_counts(second.groupby(['CAMPAIGN_ID', 'HOUR']).size())
+    counts.add(third.CAMPAIGN_ID, third.HOUR)
+
+    # Then
+    pd.testing.assert_series_equal(counts.to_series(), expected)
+
+def test_to_series_empty(rows_fixture):
+
+    """
+    test_to_series_empty validates counts of no rows are the same as of groupby
+    """
+
+    # Given
+    df = rows_fixture.iloc[:0]
+    counts = HourlyCounts('CAMPAIGN_ID')
+
+    # When
+    counts.add(df.CAMPAIGN_ID, df.HOUR)
+
+    # Then
+    pd.testing.assert_series_equal(counts.to_series(), df.groupby(['CAMPAIGN_ID', 'HOUR']).size())
+    assert len(counts) == 0
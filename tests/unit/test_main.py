@@ -0,0 +1,50 @@
+import subprocess
+import sys
+
+# ==== startup ====
+
+def test_main_startup_imports():
+
+    """
+    test_main_startup_imports validates the CLI parses arguments without importing
+    pandas, boto3, pyarrow, coloredlogs or the transformation modules, so --help stays fast
+    """
+
+    # Given
+    heavy_modules = ['pandas', 'numpy', 'boto3', 'pyarrow', 'coloredlogs', 'handler', 'transformations']
+    code = f'import sys, main; print([name for name in {heavy_modules} if name in sys.modules])'
+
+    # When
+    res = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+
+    # Then
+    assert res.stdout.strip() == '[]'
+
+def test_main_help():
+
+    """
+    test_main_help validates --help lists registered transformations
+    """
+
+    # When
+    res = subprocess.run([sys.executable, 'main.py', '--help'], capture_output=True, text=True, check=True)
+
+    # Then
+    assert "['aggregate_impressions', 'aggregate_advertiser_impressions', 'aggregate_order_impressions', " \
+        "'aggregate_agency_impressions', 'approx_aggregate_impressions', 'other']" in ' '.join(res.stdout.split())
+
+def test_main_modes_not_combined():
+
+    """
+    test_main_modes_not_combined validates combinations of modes are rejected by the same rules as process_data,
+    before anything is imported or downloaded
+    """
+
+    # When
+    res = subprocess.run([sys.executable, 'main.py', '--bucket_name', 'test_bucket', '--date_partition', '2022-04-15',
+                          '--transformation_type', 'aggregate_impressions', '--map_processes', '2', '--chunksize', '10'],
+                         capture_output=True, text=True)
+
+    # Then
+    assert res.returncode == 2
+    assert 'Map/reduce mode can not be combined with incremental or streaming mode' in res.stderr
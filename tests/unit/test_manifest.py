@@ -0,0 +1,148 @@
+import json
+import pytest
+from io import BytesIO
+from manifest import Manifest
+from aws.s3_client import S3GetObjectError, S3ObjectInfo
+import numpy as np
+import pandas as pd
+
+# ==== Fixtures ====
+
+result_key = 'results/2022/04/15/daily_agg_20220415_TI.csv'
+
+@pytest.fixture
+def s3_client_fixture(mocker):
+    """S3 client mock storing put objects in memory"""
+    store = {}
+    s3_client = mocker.MagicMock()
+
+    def get_object(bucket, file_key):
+        if file_key not in store:
+            raise S3GetObjectError(bucket, file_key)
+        return {'Body': BytesIO(store[file_key])}
+
+    s3_client.get_object.side_effect = get_object
+    s3_client.put_object.side_effect = lambda bucket, file_key, body: store.update({file_key: body})
+    s3_client.store = store
+    return s3_client
+
+def _counts(records):
+    df = pd.DataFrame(records, columns=['CAMPAIGN_ID', 'HOUR', 'IMPRESSIONS_COUNT'])
+    return df.set_index(['CAMPAIGN_ID', 'HOUR'])['IMPRESSIONS_COUNT']
+
+# ==== keys ====
+
+def test_manifest_keys():
+
+    """
+    test_manifest_keys validates manifest and fingerprints are stored next to result
+    """
+
+    # Given
+
+    # When
+    # Then
+    assert Manifest.manifest_key(result_key) == 'results/2022/04/15/daily_agg_20220415_TI.manifest.json'
+    assert Manifest.fingerprints_key(result_key) == 'results/2022/04/15/daily_agg_20220415_TI.fingerprints'
+    assert Manifest.manifest_key(f'{result_key}.gz') == 'results/2022/04/15/daily_agg_20220415_TI.manifest.json'
+
+# ==== save / load ====
+
+def test_save_load(s3_client_fixture):
+
+    """
+    test_save_load validates manifest and fingerprints are loaded back as saved
+    """
+
+    # Given
+    manifest = Manifest()
+    manifest.add_object(S3ObjectInfo('key1.csv', 10, '"etag1"'), _counts([[1111, 14, 2], [2222, 12, 1]]))
+    manifest.add_object(S3ObjectInfo('key2.csv', 20, '"etag2"'), None)
+    fingerprints = np.array([1, 5, 2 ** 63 + 7], dtype=np.uint64)
+
+    # When
+    manifest.save(s3_client_fixture, 'test_bucket', result_key, fingerprints)
+    res = Manifest.load(s3_client_fixture, 'test_bucket', result_key)
+
+    # Then
+    assert res.objects == {
+        'key1.csv': {'etag': '"etag1"', 'size': 10, 'counts': [[1111, 14, 2], [2222, 12, 1]]},
+        'key2.csv': {'etag': '"etag2"', 'size': 20, 'counts': []}
+    }
+    assert np.array_equal(res.load_fingerprints(s3_client_fixture, 'test_bucket', result_key), fingerprints)
+
+def test_load_missing(s3_client_fixture):
+
+    """
+    test_load_missing validates None is returned when there is no manifest yet
+    """
+
+    # Given
+
+    # When
+    res = Manifest.load(s3_client_fixture, 'test_bucket', result_key)
+
+    # Then
+    assert res is None
+
+def test_load_other_version(s3_client_fixture):
+
+    """
+    test_load_other_version validates manifest of unsupported version is ignored
+    """
+
+    # Given
+    s3_client_fixture.store[Manifest.manifest_key(result_key)] = json.dumps({'version': 0, 'objects': {}}).encode()
+
+    # When
+    res = Manifest.load(s3_client_fixture, 'test_bucket', result_key)
+
+    # Then
+    assert res is None
+
+# ==== diff ====
+
+def test_diff():
+
+    """
+    test_diff validates new objects and changed or removed ones are found
+    """
+
+    # Given
+    manifest = Manifest({
+        'same.csv': {'etag': '"1"', 'size': 1, 'counts': []},
+        'changed.csv': {'etag': '"2"', 'size': 1, 'counts': []},
+        'removed.csv': {'etag': '"3"', 'size': 1, 'counts': []}
+    })
+    objects = [
+        S3ObjectInfo('changed.csv', 1, '"22"'),
+        S3ObjectInfo('new.csv', 1, '"4"'),
+        S3ObjectInfo('same.csv', 1, '"1"')
+    ]
+
+    # When
+    new_objects, stale_keys = manifest.diff(objects)
+
+    # Then
+    assert new_objects == [S3ObjectInfo('new.csv', 1, '"4"')]
+    assert stale_keys == ['changed.csv', 'removed.csv']
+
+# ==== counts ====
+
+def test_counts():
+
+    """
+    test_counts validates partial counts of all objects are summed
+    """
+
+    # Given
+    manifest = Manifest()
+    manifest.add_object(S3ObjectInfo('key1.csv', 10, '"etag1"'), _counts([[1111, 14, 2], [2222, 12, 1]]))
+    manifest.add_object(S3ObjectInfo('key2.csv', 10, '"etag2"'), _counts([[1111, 14, 3], [1111, 15, 1]]))
+
+    # When
+    res = manifest.counts('Int32')
+
+    # Then
+    assert res.index.get_level_values('CAMPAIGN_ID').dtype == 'Int32'
+    assert res.reset_index().values.tolist() == [[1111, 14, 5], [1111, 15, 1], [2222, 12, 1]]
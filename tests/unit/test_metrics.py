@@ -0,0 +1,126 @@
+import json
+import socket
+import pytest
+from metrics import RunMetrics, parse_address, statsd_lines
+import pandas as pd
+
+# ==== Fixtures ====
+
+@pytest.fixture
+def udp_sink_fixture():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(1)
+    yield sock
+    sock.close()
+
+# ==== stage ====
+
+def test_stage():
+
+    """
+    test_stage validates calls of the same stage are accumulated and failed call is recorded
+    """
+
+    # Given
+    metrics = RunMetrics(date_partition='2022-04-15')
+
+    # When
+    for rows in (10, 20):
+        with metrics.stage('dedup') as stage:
+            stage.rows_in += rows
+            stage.rows_out += rows - 1
+            stage.rows_dropped += 1
+    with pytest.raises(ValueError):
+        with metrics.stage('upload'):
+            raise ValueError('Failed')
+    res = metrics.to_dict(succeeded=False)
+
+    # Then
+    assert res['date_partition'] == '2022-04-15'
+    assert not res['succeeded']
+    assert list(res['stages']) == ['dedup', 'upload']
+    assert res['stages']['dedup']['calls'] == 2
+    assert (res['stages']['dedup']['rows_in'], res['stages']['dedup']['rows_out'],
+            res['stages']['dedup']['rows_dropped']) == (30, 28, 2)
+    assert res['stages']['upload']['calls'] == 1
+    assert res['peak_memory_bytes'] > 0
+
+# ==== iter_stage ====
+
+def test_iter_stage():
+
+    """
+    test_iter_stage validates every chunk fetch is timed and chunks rows are counted
+    """
+
+    # Given
+    metrics = RunMetrics()
+    chunks = [pd.DataFrame({'col1': range(3)}), pd.DataFrame({'col1': range(2)})]
+
+    # When
+    res = list(metrics.iter_stage('load', chunks))
+
+    # Then
+    assert res == chunks
+    assert metrics.stages['load'].rows_out == 5
+    assert metrics.stages['load'].calls == 3
+
+# ==== emit ====
+
+def test_emit(tmp_path, udp_sink_fixture):
+
+    """
+    test_emit validates record is appended to metrics file as json line and pushed to StatsD sink
+    """
+
+    # Given
+    metrics_file = tmp_path / 'metrics.jsonl'
+    address = '{}:{}'.format(*udp_sink_fixture.getsockname())
+    metrics = RunMetrics(date_partition='2022-04-15')
+    with metrics.stage('upload') as stage:
+        stage.bytes += 100
+
+    # When
+    first = metrics.emit(metrics_file=str(metrics_file), statsd_address=address)
+    metrics.emit(metrics_file=str(metrics_file))
+
+    # Then
+    lines = metrics_file.read_text().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0]) == first
+    received = {udp_sink_fixture.recv(1024).decode() for _ in statsd_lines(first)}
+    assert received == set(statsd_lines(first))
+    assert 'impressions_aggregator.upload.bytes:100|c' in received
+    assert 'impressions_aggregator.succeeded:1|c' in received
+
+def test_emit_sink_error(tmp_path):
+
+    """
+    test_emit_sink_error validates failure to push metrics does not fail the run
+    """
+
+    # Given
+    metrics = RunMetrics()
+
+    # When
+    res = metrics.emit(metrics_file=str(tmp_path / 'missing' / 'metrics.jsonl'), statsd_address='no_port')
+
+    # Then
+    assert res['succeeded']
+
+# ==== parse_address ====
+
+def test_parse_address():
+
+    """
+    test_parse_address validates host:port address is parsed and wrong one raises ValueError
+    """
+
+    # When
+    res = parse_address('localhost:8125')
+
+    # Then
+    assert res == ('localhost', 8125)
+    with pytest.raises(ValueError, match='Address should be in host:port format'):
+        parse_address('localhost')
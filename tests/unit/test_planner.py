@@ -0,0 +1,105 @@
+import pytest
+from aws.s3_client import S3ObjectInfo
+from planner import (
+    IN_MEMORY,
+    MAP_REDUCE,
+    MAX_CHUNKSIZE,
+    MIN_CHUNKSIZE,
+    STREAMING,
+    describe_execution,
+    plan_execution
+)
+
+# ==== Fixtures ====
+
+@pytest.fixture
+def objects_fixture():
+    """Partition of 8 plain csv files of 256 MB, 2 GB in total"""
+    return [S3ObjectInfo(f'2022/04/15/impressions_{i}.csv', 256 * 1024 ** 2, f'"{i}"') for i in range(8)]
+
+# ==== plan_execution ====
+
+def test_plan_execution_in_memory():
+
+    """
+    test_plan_execution_in_memory validates small partition is loaded in memory at once
+    by a worker thread per object, even with several cores
+    """
+
+    # Given
+    objects = [S3ObjectInfo(f'impressions_{i}.csv', 1024 ** 2, f'"{i}"') for i in range(3)]
+
+    # When
+    plan = plan_execution(objects, available_memory=1024 ** 3, cpus=4)
+
+    # Then
+    assert (plan.mode, plan.max_workers, plan.chunksize, plan.map_processes) == (IN_MEMORY, 3, None, None)
+    assert plan.estimated_memory == 3 * 3 * 1024 ** 2
+    assert plan.fits
+
+def test_plan_execution_map_reduce(objects_fixture):
+
+    """
+    test_plan_execution_map_reduce validates large partition is mapped by a process per core
+    when it fits in memory, and streamed when the transformation does not support map/reduce
+    """
+
+    # When
+    plan = plan_execution(objects_fixture, available_memory=16 * 1024 ** 3, cpus=4)
+    in_memory_plan = plan_execution(objects_fixture, (IN_MEMORY, STREAMING), available_memory=16 * 1024 ** 3, cpus=4)
+
+    # Then
+    assert (plan.mode, plan.map_processes, plan.chunksize) == (MAP_REDUCE, 4, None)
+    assert plan.fits
+    assert in_memory_plan.mode == IN_MEMORY
+
+def test_plan_execution_streaming(objects_fixture):
+
+    """
+    test_plan_execution_streaming validates partition not fitting in memory is streamed in chunks
+    sized to the memory left after dedup fingerprints
+    """
+
+    # When
+    plan = plan_execution(objects_fixture, available_memory=2 * 1024 ** 3, cpus=4)
+    single_core_plan = plan_execution(objects_fixture, available_memory=3 * 1024 ** 3, cpus=1)
+
+    # Then
+    assert (plan.mode, plan.chunksize, plan.map_processes) == (STREAMING, MAX_CHUNKSIZE, None)
+    assert plan.fits
+    assert single_core_plan.mode == STREAMING
+
+def test_plan_execution_not_fitting(objects_fixture, caplog):
+
+    """
+    test_plan_execution_not_fitting validates the plan with the smallest estimate is chosen
+    with a warning when no plan fits
+    """
+
+    # When
+    plan = plan_execution(objects_fixture, available_memory=1024 ** 3, cpus=4)
+
+    # Then
+    assert (plan.mode, plan.chunksize) == (STREAMING, MIN_CHUNKSIZE)
+    assert not plan.fits
+    assert 'Estimated memory of the run does not fit the budget' in caplog.text
+
+# ==== describe_execution ====
+
+def test_describe_execution():
+
+    """
+    test_describe_execution validates compressed and parquet objects are estimated by their expanded size
+    """
+
+    # Given
+    objects = [S3ObjectInfo('impressions.csv', 100, '"1"'), S3ObjectInfo('impressions.csv.gz', 100, '"2"'),
+               S3ObjectInfo('impressions.parquet', 100, '"3"')]
+
+    # When
+    plan = describe_execution(objects, IN_MEMORY, 1)
+
+    # Then
+    assert (plan.objects, plan.input_bytes, plan.estimated_bytes, plan.estimated_memory) == (3, 300, 900, 2700)
+    assert plan.describe() == 'in_memory mode with max_workers 1: 3 objects, 0.0 MB listed, ~0.0 MB of csv text, ' \
+        '~0.0 MB peak memory, available memory unknown'
@@ -0,0 +1,161 @@
+import pytest
+from registry import (
+    TRANSFORMATIONS,
+    check_modes,
+    check_options,
+    get_transformation,
+    load_count_function,
+    load_function,
+    load_map_reduce
+)
+import arrow_transformations
+import transformations
+
+# ==== get_transformation ====
+
+def test_get_transformation():
+
+    """
+    test_get_transformation validates registered transformation is returned and unknown one raises ValueError
+    """
+
+    # When
+    res = get_transformation('aggregate_impressions')
+
+    # Then
+    assert res.schema_path == 'schemas/impressions.yaml'
+    assert res.incremental
+    assert list(TRANSFORMATIONS) == ['aggregate_impressions', 'aggregate_advertiser_impressions',
+                                     'aggregate_order_impressions', 'aggregate_agency_impressions',
+                                     'approx_aggregate_impressions', 'other']
+    with pytest.raises(ValueError, match='Wrong transformation_type unknown'):
+        get_transformation('unknown')
+
+# ==== load_function ====
+
+def test_load_function():
+
+    """
+    test_load_function validates in-memory and streaming functions are imported from transformation module
+    """
+
+    # When
+    res = load_function('aggregate_impressions')
+    res_streaming = load_function('aggregate_impressions', streaming=True)
+
+    # Then
+    assert res is transformations.aggregate_impressions
+    assert res_streaming is transformations.aggregate_impressions_stream
+    assert load_function('other') is transformations.other_transformation
+
+def test_load_function_streaming_not_supported():
+
+    """
+    test_load_function_streaming_not_supported validates ValueError is raised for transformation
+    without streaming function
+    """
+
+    # When / Then
+    with pytest.raises(ValueError, match='Transformation_type other does not support streaming mode'):
+        load_function('other', streaming=True)
+
+def test_load_function_arrow():
+
+    """
+    test_load_function_arrow validates arrow engine function is imported from arrow module
+    and transformation without one raises ValueError
+    """
+
+    # When
+    res = load_function('aggregate_impressions', engine='arrow')
+
+    # Then
+    assert res is arrow_transformations.aggregate_impressions
+    with pytest.raises(ValueError, match='Transformation_type approx_aggregate_impressions does not support arrow engine'):
+        load_function('approx_aggregate_impressions', engine='arrow')
+    with pytest.raises(ValueError, match=r"Engine should be one of \('pandas', 'arrow'\), got polars"):
+        load_function('aggregate_impressions', engine='polars')
+
+# ==== load_map_reduce ====
+
+def test_load_map_reduce():
+
+    """
+    test_load_map_reduce validates map and reduce functions are imported and ValueError is raised
+    for transformation without them
+    """
+
+    # When
+    res = load_map_reduce('aggregate_impressions')
+
+    # Then
+    assert res == (transformations.map_impressions, transformations.reduce_impressions)
+    with pytest.raises(ValueError, match='Transformation_type other does not support map/reduce mode'):
+        load_map_reduce('other')
+
+# ==== options ====
+
+def test_load_function_options():
+
+    """
+    test_load_function_options validates options are bound to the function of transformation accepting them
+    and rejected for the others
+    """
+
+    # When
+    res = load_function('approx_aggregate_impressions', options={'precision': 10})
+    res_map, _ = load_map_reduce('approx_aggregate_impressions', options={'precision': 10})
+
+    # Then
+    assert res.func is transformations.approx_aggregate_impressions
+    assert res.keywords == {'precision': 10}
+    assert res_map.func is transformations.map_approx_impressions
+    assert res_map.keywords == {'precision': 10}
+    with pytest.raises(ValueError, match=r"Transformation_type aggregate_impressions does not support options \['precision'\]"):
+        check_options('aggregate_impressions', {'precision': 10})
+
+# ==== load_count_function ====
+
+def test_load_count_function():
+
+    """
+    test_load_count_function validates count functions of transformations sharing a scan are imported
+    and transformation without one is rejected
+    """
+
+    # When
+    res = load_count_function('aggregate_impressions')
+    res_advertiser = load_count_function('aggregate_advertiser_impressions')
+
+    # Then
+    assert res is transformations.count_campaign_impressions
+    assert res_advertiser is transformations.count_advertiser_impressions
+    assert get_transformation('aggregate_advertiser_impressions').result_name == 'daily_advertiser_agg'
+    assert get_transformation('approx_aggregate_impressions').result_name == 'daily_approx_agg'
+    with pytest.raises(ValueError, match='Transformation_type other can not share a scan with other transformations'):
+        load_count_function('other')
+
+# ==== check_modes ====
+
+def test_check_modes():
+
+    """
+    test_check_modes validates supported combinations of modes pass and the others are rejected
+    """
+
+    # When
+    check_modes(['aggregate_impressions', 'aggregate_order_impressions'], chunksize=1000)
+    check_modes(['aggregate_impressions'], engine='arrow', auto=True, dry_run=True)
+    check_modes(['approx_aggregate_impressions'], map_processes=2, options={'precision': 10})
+
+    # Then
+    with pytest.raises(ValueError, match='Several transformation types can be applied in in-memory or streaming mode only'):
+        check_modes(['aggregate_impressions', 'aggregate_order_impressions'], incremental=True)
+    with pytest.raises(ValueError, match='Shard and merge modes can not be combined'):
+        check_modes(['aggregate_impressions'], shard=True, merge=True)
+    with pytest.raises(ValueError, match='Transformation_type approx_aggregate_impressions does not support arrow engine'):
+        check_modes(['approx_aggregate_impressions'], engine='arrow')
+    with pytest.raises(ValueError, match='Transformation_type other can not share a scan with other transformations'):
+        check_modes(['aggregate_impressions', 'other'])
+    with pytest.raises(ValueError, match=r"Transformation_type aggregate_impressions does not support options \['precision'\]"):
+        check_modes(['aggregate_impressions'], options={'precision': 10})
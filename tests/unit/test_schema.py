@@ -0,0 +1,132 @@
+import pandas as pd
+from schema import SchemaValidator, compile_template, compile_templates
+
+# ==== Fixtures ====
+
+impressions_columns = {
+    'IMPRESSION_ID': {'nullable': False, 'dtype': 'Int32'},
+    'CAMPAIGN_ID': {'nullable': True, 'dtype': 'Int32'},
+    'IMPRESSION_DATETIME': {'nullable': False, 'dtype': 'str', 'format': '%Y-%m-%d %H:%M:%S.000'}
+}
+
+# ==== compile_template ====
+
+def test_compile_template():
+
+    """
+    test_compile_template validates fixed width formats are compiled to templates
+    """
+
+    # Given
+
+    # When
+    # Then
+    assert compile_template('%Y-%m-%d %H:%M:%S.000') == b'dddd-dd-dd dd:dd:dd.000'
+    assert compile_template('%d/%m/%Y') == b'dd/dd/dddd'
+    assert compile_template('%Y-%m-%dT%H:%M:%S%z') is None
+    assert compile_template('%b %d') is None
+
+def test_compile_templates():
+
+    """
+    test_compile_templates validates formats ending with seconds are compiled with milliseconds template first
+    """
+
+    # Given
+
+    # When
+    # Then
+    assert compile_templates('%Y-%m-%d %H:%M:%S') == (b'dddd-dd-dd dd:dd:dd.ddd', b'dddd-dd-dd dd:dd:dd')
+    assert compile_templates('%d/%m/%Y') == (b'dd/dd/dddd',)
+    assert compile_templates('%b %d') == ()
+
+# ==== validate ====
+
+def test_validate():
+
+    """
+    test_validate validates data loaded with and without schema dtypes pass validation
+    """
+
+    # Given
+    validator = SchemaValidator(impressions_columns)
+    raw_df = pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+    typed_df = pd.read_csv('tests/unit/fixtures/df_fixture.csv', dtype={'IMPRESSION_ID': 'Int32', 'CAMPAIGN_ID': 'Int32'})
+
+    # When
+    # Then
+    assert validator.validate(raw_df) == []
+    assert validator.validate(typed_df) == []
+
+def test_validate_errors():
+
+    """
+    test_validate_errors validates all errors of a chunk are reported
+    """
+
+    # Given
+    validator = SchemaValidator(impressions_columns)
+    df = pd.DataFrame({
+        'IMPRESSION_ID': [1, None, 3],
+        'CAMPAIGN_ID': ['a', 'b', None],
+        'IMPRESSION_DATETIME': ['2021-01-30 14:34:32.000', None, '2021-01-30']
+    })
+
+    # When
+    res = validator.validate(df)
+
+    # Then
+    assert res == [
+        'Column IMPRESSION_ID has none values but should NOT be nullable',
+        'Column CAMPAIGN_ID has dtype object, expected Int32',
+        'Column IMPRESSION_DATETIME has none values but should NOT be nullable',
+        'Column IMPRESSION_DATETIME has values not matching format %Y-%m-%d %H:%M:%S.000'
+    ]
+
+def test_validate_parsed_timestamps():
+
+    """
+    test_validate_parsed_timestamps validates timestamps already parsed, e.g. read from parquet,
+    match string column with format
+    """
+
+    # Given
+    validator = SchemaValidator(impressions_columns)
+    df = pd.DataFrame({
+        'IMPRESSION_ID': [1, 2],
+        'CAMPAIGN_ID': [1111, None],
+        'IMPRESSION_DATETIME': pd.to_datetime(['2021-01-30 14:34:32', '2021-01-30 15:34:32'])
+    })
+
+    # When
+    res = validator.validate(df)
+
+    # Then
+    assert res == []
+
+def test_validate_fractional_seconds(mocker):
+
+    """
+    test_validate_fractional_seconds validates timestamps with and without milliseconds match format
+    ending with seconds, and only values not matching either template are parsed
+    """
+
+    # Given
+    columns = dict(impressions_columns, IMPRESSION_DATETIME={'nullable': False, 'dtype': 'str',
+                                                             'format': '%Y-%m-%d %H:%M:%S'})
+    validator = SchemaValidator(columns)
+    df = pd.DataFrame({
+        'IMPRESSION_ID': [1, 2, 3, 4],
+        'CAMPAIGN_ID': [1111, 1111, 2222, None],
+        'IMPRESSION_DATETIME': ['2021-01-30 14:34:32.000', '2021-01-30 14:34:32', '2021-01-30 14:34:32.123',
+                                '2021-01-30 4:05:06.5']
+    })
+    to_datetime_spy = mocker.spy(pd, 'to_datetime')
+
+    # When
+    res = validator.validate(df)
+
+    # Then
+    assert res == []
+    assert to_datetime_spy.call_args[0][0].tolist() == ['2021-01-30 4:05:06.5']
+
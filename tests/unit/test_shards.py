@@ -0,0 +1,173 @@
+import pytest
+from io import BytesIO
+from shards import Shard, load_partials, save_partial
+from transformations import map_approx_impressions, map_impressions
+from aws.s3_client import S3ObjectInfo
+import numpy as np
+import pandas as pd
+
+# ==== Fixtures ====
+
+result_key = 'results/2022/04/15/daily_agg_20220415_TI.csv'
+
+impressions_columns = {'IMPRESSION_ID': 'Int32', 'CAMPAIGN_ID': 'Int32', 'IMPRESSION_DATETIME': 'str'}
+
+@pytest.fixture
+def s3_client_fixture(mocker):
+    """S3 client mock storing put objects in memory"""
+    store = {}
+    s3_client = mocker.MagicMock()
+    s3_client.get_object.side_effect = lambda bucket, file_key: {'Body': BytesIO(store[file_key])}
+    s3_client.put_object.side_effect = lambda bucket, file_key, body: store.update({file_key: body})
+    s3_client.list_objects.side_effect = \
+        lambda bucket, prefix: [S3ObjectInfo(key, len(store[key]), '') for key in sorted(store) if key.startswith(prefix)]
+    s3_client.store = store
+    return s3_client
+
+@pytest.fixture
+def df_fixture():
+    return pd.read_csv('tests/unit/fixtures/df_fixture.csv', usecols=list(impressions_columns),
+                       dtype=impressions_columns)
+
+# ==== Shard ====
+
+def test_shard_parse():
+
+    """
+    test_shard_parse validates shard is parsed from i/N format and its partial is stored next to result
+    """
+
+    # When
+    shard = Shard.parse('2/16')
+
+    # Then
+    assert shard == Shard(2, 16)
+    assert shard.partial_key(result_key) == 'results/2022/04/15/daily_agg_20220415_TI.shard-0002-of-0016.npz'
+    assert shard.partial_key(result_key + '.gz') == shard.partial_key(result_key)
+
+def test_shard_parse_invalid():
+
+    """
+    test_shard_parse_invalid validates shard index out of range is rejected
+    """
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Shard should be in i/N format with 0 <= i < N, got 2/2'):
+        Shard.parse('2/2')
+
+def test_shard_select_objects():
+
+    """
+    test_shard_select_objects validates every object is assigned to exactly one shard, the same on every call
+    """
+
+    # Given
+    objects = [S3ObjectInfo(f'2022/04/15/impressions_{i:04d}.csv', 10, '') for i in range(20)]
+
+    # When
+    res = [Shard(index, 3).select_objects(objects) for index in range(3)]
+
+    # Then
+    assert sorted(obj.key for shard_objects in res for obj in shard_objects) == [obj.key for obj in objects]
+    assert all(shard_objects for shard_objects in res)
+    assert Shard(1, 3).select_objects(objects) == res[1]
+
+def test_shard_filter_rows(df_fixture):
+
+    """
+    test_shard_filter_rows validates every row is assigned to exactly one shard
+    and rows of the same campaign to the same one
+    """
+
+    # When
+    res = [Shard(index, 2).filter_rows(df_fixture) for index in range(2)]
+
+    # Then
+    assert sorted(index for shard_df in res for index in shard_df.index) == list(df_fixture.index)
+    campaigns = [set(shard_df.CAMPAIGN_ID.dropna()) for shard_df in res]
+    assert not campaigns[0] & campaigns[1]
+
+# ==== partials ====
+
+def test_save_load_partials(s3_client_fixture, df_fixture):
+
+    """
+    test_save_load_partials validates partial counts are loaded back as stored, in shard order,
+    and empty partial of a shard without files is skipped
+    """
+
+    # Given
+    partial = map_impressions(df_fixture, 'schemas/impressions.yaml')
+
+    # When
+    save_partial(s3_client_fixture, 'test_bucket', result_key, Shard(1, 2), 'key', None)
+    save_partial(s3_client_fixture, 'test_bucket', result_key, Shard(0, 2), 'key', partial)
+    res = load_partials(s3_client_fixture, 'test_bucket', result_key, 'Int32')
+
+    # Then
+    assert len(res) == 1
+    assert res[0].counts.equals(partial.counts)
+    assert res[0].counts.index.get_level_values('CAMPAIGN_ID').dtype == 'Int32'
+    assert np.array_equal(res[0].fingerprints, partial.fingerprints)
+    assert np.array_equal(res[0].groups, partial.groups)
+
+def test_save_load_partials_sketches(s3_client_fixture, df_fixture):
+
+    """
+    test_save_load_partials_sketches validates sketches of approximate aggregation are loaded back as stored
+    """
+
+    # Given
+    partial = map_approx_impressions(df_fixture, 'schemas/impressions.yaml', precision=6)
+
+    # When
+    save_partial(s3_client_fixture, 'test_bucket', result_key, Shard(0, 1), 'campaign', partial)
+    res = load_partials(s3_client_fixture, 'test_bucket', result_key, 'Int32')
+
+    # Then
+    assert res[0].index.equals(partial.index)
+    assert res[0].precision == 6
+    assert np.array_equal(res[0].registers, partial.registers)
+
+def test_load_partials_different_shard_counts(s3_client_fixture):
+
+    """
+    test_load_partials_different_shard_counts validates partials of another split left
+    by previous runs are not merged
+    """
+
+    # Given
+    for shard in (Shard(0, 1), Shard(0, 2), Shard(1, 2)):
+        save_partial(s3_client_fixture, 'test_bucket', result_key, shard, 'key', None)
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match=r'Shard partials of different shard counts \[1, 2\] found'):
+        load_partials(s3_client_fixture, 'test_bucket', result_key)
+
+def test_load_partials_different_shard_by(s3_client_fixture):
+
+    """
+    test_load_partials_different_shard_by validates partials split by key and by campaign are not merged
+    """
+
+    # Given
+    save_partial(s3_client_fixture, 'test_bucket', result_key, Shard(0, 2), 'key', None)
+    save_partial(s3_client_fixture, 'test_bucket', result_key, Shard(1, 2), 'campaign', None)
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Shard partials split by different'):
+        load_partials(s3_client_fixture, 'test_bucket', result_key)
+
+def test_load_partials_none(s3_client_fixture):
+
+    """
+    test_load_partials_none validates merge without any shard partial fails
+    """
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match=f'No shard partials found for {result_key}'):
+        load_partials(s3_client_fixture, 'test_bucket', result_key)
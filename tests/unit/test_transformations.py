@@ -1,5 +1,30 @@
 import pytest
-from transformations import aggregate_impressions, _is_valid_df, parse_yaml
+from transformations import (
+    SKETCH_COLUMN,
+    aggregate_advertiser_impressions,
+    aggregate_agency_impressions,
+    aggregate_impressions,
+    aggregate_impressions_stream,
+    aggregate_order_impressions,
+    aggregate_reports,
+    aggregate_reports_stream,
+    approx_aggregate_impressions,
+    approx_aggregate_impressions_stream,
+    count_advertiser_impressions,
+    count_agency_impressions,
+    count_campaign_impressions,
+    count_order_impressions,
+    merge_approx_results,
+    get_schema_dtypes,
+    get_schema_validator,
+    _extract_hour,
+    _is_valid_df,
+    map_impressions,
+    parse_yaml,
+    reduce_impressions
+)
+from metrics import RunMetrics
+import numpy as np
 import pandas as pd
 
 # ==== Fixtures ====
@@ -12,6 +37,13 @@ def is_validate_df_data_fixture(mocker):
 def parse_yaml_fixture(mocker):
     return mocker.patch('transformations.parse_yaml')
 
+@pytest.fixture(autouse=True)
+def schema_validator_cache_fixture():
+    """Compiled validators are cached per schema path, tests reuse the same fake paths"""
+    get_schema_validator.cache_clear()
+    yield
+    get_schema_validator.cache_clear()
+
 # ==== parse_yaml ====
 
 def test_parse_yaml():
@@ -35,6 +67,28 @@ def test_parse_yaml():
     # Then
     assert res == expected_obj
 
+# ==== get_schema_dtypes ====
+
+def test_get_schema_dtypes(parse_yaml_fixture):
+
+    """
+    test_get_schema_dtypes validates schema columns are returned with declared dtypes
+    """
+
+    # Given
+    parse_yaml_fixture.return_value = {
+        'columns': {
+            'COLUMN_1': {'nullable': False, 'dtype': 'Int32'},
+            '\ufeffCOLUMN_2 ': {'nullable': True}
+            }
+        }
+
+    # When
+    res = get_schema_dtypes('some_path')
+
+    # Then
+    assert res == {'COLUMN_1': 'Int32', 'COLUMN_2': None}
+
 # ==== _is_valid_df ====
 
 def test__is_valid_df_true(parse_yaml_fixture):
@@ -103,6 +157,75 @@ def test__is_valid_df_has_null(parse_yaml_fixture):
     # Then
     assert res == False
 
+def test__is_valid_df_compiled_once(parse_yaml_fixture):
+
+    """
+    test__is_valid_df_compiled_once checks schema is parsed once for all validated chunks
+    """
+
+    # Given
+    chunks = pd.read_csv('tests/unit/fixtures/df_fixture.csv', chunksize=3)
+
+    parse_yaml_fixture.return_value = {
+        'columns': {
+            'IMPRESSION_ID': {'nullable': False, 'dtype': 'Int32'},
+            'CAMPAIGN_ID': {'nullable': True, 'dtype': 'Int32'}
+            }
+        }
+
+    # When 
+    res = [_is_valid_df(chunk, 'some_path') for chunk in chunks]
+
+    # Then
+    assert res == [True, True, True]
+    parse_yaml_fixture.assert_called_once_with('some_path')
+
+def test__is_valid_df_wrong_dtype(parse_yaml_fixture):
+
+    """
+    test__is_valid_df_wrong_dtype checks if df with values not matching declared dtype fail validation
+    """
+
+    # Given
+    test_df = pd.DataFrame({'COLUMN_1': [1.0, 2.5], 'COLUMN_2': ['a', 'b']})
+
+    parse_yaml_fixture.return_value = {
+        'columns': {
+            'COLUMN_1': {'nullable': False, 'dtype': 'Int32'},
+            'COLUMN_2': {'nullable': True, 'dtype': 'str'}
+            }
+        }
+
+    # When 
+    res = _is_valid_df(test_df, 'some_path')
+
+    # Then
+    assert res == False
+
+def test__is_valid_df_format(parse_yaml_fixture):
+
+    """
+    test__is_valid_df_format checks if df with values not matching declared format fail validation
+    """
+
+    # Given
+    valid_df = pd.DataFrame({'COLUMN_1': ['2021-01-30 14:34:32.000', None]})
+    invalid_df = pd.DataFrame({'COLUMN_1': ['2021-01-30 14:34:32.000', '30/01/2021 14:34']})
+
+    parse_yaml_fixture.return_value = {
+        'columns': {
+            'COLUMN_1': {'nullable': True, 'dtype': 'str', 'format': '%Y-%m-%d %H:%M:%S.000'}
+            }
+        }
+
+    # When 
+    res_valid = _is_valid_df(valid_df, 'some_path')
+    res_invalid = _is_valid_df(invalid_df, 'some_path')
+
+    # Then
+    assert res_valid == True
+    assert res_invalid == False
+
 
 # ==== aggregate_impressions ====
 
@@ -132,6 +255,60 @@ def test_aggregate_impressions(is_validate_df_data_fixture):
     # Then
     assert res.equals(expected_df)
 
+def test_aggregate_impressions_compact_dtypes():
+
+    """
+    test_aggregate_impressions_compact_dtypes validates impressions data loaded
+    with schema dtypes is aggregated with integer campaign ids
+    """
+
+    # Given
+    schema_path = 'schemas/impressions.yaml'
+    columns = get_schema_dtypes(schema_path)
+    mock_df = pd.read_csv('tests/unit/fixtures/df_fixture.csv', usecols=list(columns), dtype=columns)
+    expected_df = pd.DataFrame(
+        {
+            'CAMPAIGN_ID': pd.array([1111, 1111, 2222, 2222, 3333], dtype='Int32'),
+            'HOUR': [14, 15, 12, 20, 12],
+            'IMPRESSIONS_COUNT': [2, 1, 1, 1, 2]
+        }
+    )
+
+    # When
+    res = aggregate_impressions(mock_df, schema_path)
+
+    # Then
+    assert res.equals(expected_df)
+
+def test_aggregate_impressions_fractional_seconds():
+
+    """
+    test_aggregate_impressions_fractional_seconds validates timestamps without milliseconds
+    or with milliseconds other than .000 pass schema validation and are counted by their hour
+    """
+
+    # Given
+    schema_path = 'schemas/impressions.yaml'
+    mock_df = pd.DataFrame({
+        'IMPRESSION_ID': pd.array([1, 2, 3, 4], dtype='Int32'),
+        'CAMPAIGN_ID': pd.array([1111, 1111, 1111, 2222], dtype='Int32'),
+        'IMPRESSION_DATETIME': ['2021-01-30 14:34:32', '2021-01-30 14:34:32.123', '2021-01-30 15:00:00.000',
+                                '2021-01-30 4:05:06.5']
+    })
+    expected_df = pd.DataFrame(
+        {
+            'CAMPAIGN_ID': pd.array([1111, 1111, 2222], dtype='Int32'),
+            'HOUR': [14, 15, 4],
+            'IMPRESSIONS_COUNT': [2, 1, 1]
+        }
+    )
+
+    # When
+    res = aggregate_impressions(mock_df, schema_path)
+
+    # Then
+    assert res.equals(expected_df)
+
 def test_aggregate_impressions_invalid_df(is_validate_df_data_fixture):
 
     """
@@ -147,4 +324,333 @@ def test_aggregate_impressions_invalid_df(is_validate_df_data_fixture):
     # When
     # Then
     with pytest.raises(ValueError, match='Impressions dataset does not match schema some_schema_path'):
-        assert aggregate_impressions(mock_df, schema_path)
\ No newline at end of file
+        assert aggregate_impressions(mock_df, schema_path)
+
+# ==== aggregate_impressions_stream ====
+
+
+def test_aggregate_impressions_stream(is_validate_df_data_fixture):
+
+    """
+    test_aggregate_impressions_stream validates impressions data streamed in chunks
+    is deduplicated across chunks and aggregated same as in memory
+    """
+
+    # Given
+    chunks = pd.read_csv('tests/unit/fixtures/df_fixture.csv', chunksize=3)
+    expected_df = aggregate_impressions(
+        pd.read_csv('tests/unit/fixtures/df_fixture.csv'), 'some_schema_path'
+    )
+    schema_path = 'some_schema_path'
+    is_validate_df_data_fixture.return_value = True
+
+    # When
+    res = aggregate_impressions_stream(chunks, schema_path)
+
+    # Then
+    assert res.equals(expected_df)
+
+def test_aggregate_impressions_stream_invalid_chunk(is_validate_df_data_fixture):
+
+    """
+    test_aggregate_impressions_stream_invalid_chunk validates error is raised
+    when any of the chunks does not match schema
+    """
+
+    # Given
+    chunks = pd.read_csv('tests/unit/fixtures/df_fixture.csv', chunksize=3)
+    schema_path = 'some_schema_path'
+    is_validate_df_data_fixture.side_effect = [True, False]
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Impressions dataset does not match schema some_schema_path'):
+        assert aggregate_impressions_stream(chunks, schema_path)
+
+
+# ==== map_impressions and reduce_impressions ====
+
+def test_map_reduce_impressions(is_validate_df_data_fixture):
+
+    """
+    test_map_reduce_impressions validates files mapped separately and reduced are deduplicated
+    across files and aggregated same as in memory, rows with null campaign id are not counted
+    """
+
+    # Given
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+    null_campaign = df.iloc[[4]].assign(CAMPAIGN_ID=np.nan, IMPRESSION_ID=555)
+    files = [df.iloc[:4], pd.concat([df.iloc[[1, 3]], null_campaign, df.iloc[4:], null_campaign])]
+    expected_df = aggregate_impressions(pd.concat(files), 'some_schema_path')
+    is_validate_df_data_fixture.return_value = True
+    metrics = RunMetrics()
+
+    # When
+    partials = [map_impressions(file, 'some_schema_path', metrics=metrics) for file in files]
+    res = reduce_impressions(partials, metrics=metrics)
+
+    # Then
+    assert res.equals(expected_df)
+    assert partials[1].groups.tolist()[:3] == [0, 1, -1]
+    assert metrics.stages['reduce'].rows_dropped == 2
+    assert metrics.stages['dedup'].rows_in == 12
+    assert metrics.stages['dedup'].rows_dropped == 4
+    assert metrics.stages['dedup'].rows_out == 8
+
+def test_map_impressions_invalid(is_validate_df_data_fixture):
+
+    """
+    test_map_impressions_invalid validates error is raised when file does not match schema
+    """
+
+    # Given
+    is_validate_df_data_fixture.return_value = False
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Impressions dataset does not match schema some_schema_path'):
+        map_impressions(pd.read_csv('tests/unit/fixtures/df_fixture.csv'), 'some_schema_path')
+
+def test_reduce_impressions_empty():
+
+    """
+    test_reduce_impressions_empty validates empty dataframe is returned when there were no files
+    """
+
+    # When
+    res = reduce_impressions([])
+
+    # Then
+    assert res.empty
+
+
+# ==== approx_aggregate_impressions ====
+
+def test_approx_aggregate_impressions(is_validate_df_data_fixture):
+
+    """
+    test_approx_aggregate_impressions validates distinct impressions are counted per campaign and hour,
+    small counts of the fixture are estimated exactly, and sketches are kept in the result
+    """
+
+    # Given
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+    expected_df = aggregate_impressions(df.copy(), 'some_schema_path')
+    is_validate_df_data_fixture.return_value = True
+    metrics = RunMetrics()
+
+    # When
+    res = approx_aggregate_impressions(df, 'some_schema_path', precision=8, metrics=metrics)
+
+    # Then
+    assert res[['CAMPAIGN_ID', 'HOUR', 'IMPRESSIONS_COUNT']].equals(expected_df)
+    assert list(res.columns) == ['CAMPAIGN_ID', 'HOUR', 'IMPRESSIONS_COUNT', SKETCH_COLUMN]
+    assert metrics.stages['sketch'].rows_in == len(df)
+    assert metrics.stages['sketch'].rows_out == len(expected_df)
+
+def test_approx_aggregate_impressions_stream(is_validate_df_data_fixture):
+
+    """
+    test_approx_aggregate_impressions_stream validates sketches merged chunk by chunk
+    are the same as built in memory, duplicates across chunks are counted once
+    """
+
+    # Given
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+    chunks = [df.iloc[:4], pd.concat([df.iloc[[1, 3]], df.iloc[4:]])]
+    expected_df = approx_aggregate_impressions(df, 'some_schema_path')
+    is_validate_df_data_fixture.return_value = True
+
+    # When
+    res = approx_aggregate_impressions_stream(iter(chunks), 'some_schema_path')
+
+    # Then
+    assert res.equals(expected_df)
+
+def test_approx_aggregate_impressions_stream_verify_dedup():
+
+    """
+    test_approx_aggregate_impressions_stream_verify_dedup validates exact dedup verification is rejected
+    """
+
+    # When
+    # Then
+    with pytest.raises(ValueError, match='Approximate aggregation keeps no dedup keys to verify'):
+        approx_aggregate_impressions_stream(iter([]), 'some_schema_path', verify_dedup=True)
+
+def test_merge_approx_results(is_validate_df_data_fixture):
+
+    """
+    test_merge_approx_results validates results of overlapping parts are merged without raw data,
+    by campaign and hour and into daily counts by campaign
+    """
+
+    # Given
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+    is_validate_df_data_fixture.return_value = True
+    expected_df = approx_aggregate_impressions(df, 'some_schema_path')
+    parts = [approx_aggregate_impressions(df.iloc[:5], 'some_schema_path'),
+             approx_aggregate_impressions(df.iloc[2:], 'some_schema_path')]
+
+    # When
+    res = merge_approx_results(parts)
+    res_daily = merge_approx_results(parts, by=('CAMPAIGN_ID',))
+
+    # Then
+    assert res.equals(expected_df)
+    expected_daily = expected_df.groupby('CAMPAIGN_ID')['IMPRESSIONS_COUNT'].sum()
+    assert res_daily.set_index('CAMPAIGN_ID')['IMPRESSIONS_COUNT'].equals(expected_daily)
+
+
+# ==== aggregate_reports ====
+
+def test_aggregate_advertiser_impressions(is_validate_df_data_fixture):
+
+    """
+    test_aggregate_advertiser_impressions validates impressions are deduplicated
+    and counted by advertiser and hour, by order and by agency
+    """
+
+    # Given
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+    is_validate_df_data_fixture.return_value = True
+    expected_advertisers = df.drop_duplicates(['IMPRESSION_ID', 'IMPRESSION_DATETIME']).assign(
+        HOUR=lambda x: pd.to_datetime(x.IMPRESSION_DATETIME).dt.hour).groupby(['ADVERTISER_ID', 'HOUR']).size()
+
+    # When
+    res_advertisers = aggregate_advertiser_impressions(df.copy(), 'some_schema_path')
+    res_orders = aggregate_order_impressions(df.copy(), 'some_schema_path')
+    res_agencies = aggregate_agency_impressions(df.copy(), 'some_schema_path')
+
+    # Then
+    assert list(res_advertisers.columns) == ['ADVERTISER_ID', 'HOUR', 'IMPRESSIONS_COUNT']
+    assert res_advertisers.set_index(['ADVERTISER_ID', 'HOUR'])['IMPRESSIONS_COUNT'].tolist() \
+        == expected_advertisers.tolist()
+    assert list(res_orders.columns) == ['ORDER_ID', 'IMPRESSIONS_COUNT']
+    assert list(res_agencies.columns) == ['AGENCY_ID', 'IMPRESSIONS_COUNT']
+    assert res_orders.IMPRESSIONS_COUNT.sum() == res_agencies.IMPRESSIONS_COUNT.sum() == expected_advertisers.sum()
+
+def test_aggregate_reports(is_validate_df_data_fixture):
+
+    """
+    test_aggregate_reports validates reports counted from a single deduplicated scan
+    are the same as aggregated one by one, in memory and in chunks
+    """
+
+    # Given
+    df = pd.read_csv('tests/unit/fixtures/df_fixture.csv')
+    is_validate_df_data_fixture.return_value = True
+    count_functions = {'campaign': count_campaign_impressions, 'advertiser': count_advertiser_impressions,
+                       'order': count_order_impressions, 'agency': count_agency_impressions}
+    expected = {'campaign': aggregate_impressions(df.copy(), 'some_schema_path'),
+                'advertiser': aggregate_advertiser_impressions(df.copy(), 'some_schema_path'),
+                'order': aggregate_order_impressions(df.copy(), 'some_schema_path'),
+                'agency': aggregate_agency_impressions(df.copy(), 'some_schema_path')}
+    metrics = RunMetrics()
+    is_validate_df_data_fixture.reset_mock()
+
+    # When
+    res = aggregate_reports(df.copy(), ('schema_a', 'schema_b', 'schema_a'), count_functions, metrics=metrics)
+    res_stream = aggregate_reports_stream(iter([df.iloc[:4], df.iloc[2:]]), ('schema_a',), count_functions)
+
+    # Then
+    assert list(res) == list(res_stream) == list(count_functions)
+    for name, expected_df in expected.items():
+        assert res[name].equals(expected_df)
+        assert res_stream[name].equals(expected_df)
+    # every distinct schema once in memory, once per chunk in streaming mode
+    assert is_validate_df_data_fixture.call_count == 4
+    assert metrics.get_stage('dedup').rows_in == len(df)
+
+def test_aggregate_reports_stream_empty():
+
+    """
+    test_aggregate_reports_stream_empty validates every report is empty when there are no chunks
+    """
+
+    # When
+    res = aggregate_reports_stream(iter([]), ('schema_a',), {'campaign': count_campaign_impressions,
+                                                             'order': count_order_impressions})
+
+    # Then
+    assert list(res) == ['campaign', 'order']
+    assert all(report.empty for report in res.values())
+
+
+# ==== _extract_hour ====
+
+
+def test__extract_hour():
+
+    """
+    test__extract_hour validates hour is read from well formed timestamps
+    """
+
+    # Given
+    timestamps = pd.Series(['2021-01-30 14:34:32.000', '2021-01-30 00:00:00.000', '2021-01-31 23:59:59.000'])
+
+    # When
+    res = _extract_hour(timestamps)
+
+    # Then
+    assert res.tolist() == [14, 0, 23]
+    assert res.dtype == 'int64'
+
+def test__extract_hour_fallback(mocker):
+
+    """
+    test__extract_hour_fallback validates only timestamps not matching the fixed-width
+    format are parsed with pandas and the result is same as with full parsing
+    """
+
+    # Given
+    timestamps = pd.Series([
+        '2021-01-15 14:34:32.000',
+        '2021-01-15 03:00:00',
+        '2021-01-15 05:00:00.500',
+        '2021-01-15 06:34:32.0000',
+        None
+    ])
+    expected = pd.to_datetime(timestamps, format='%Y-%m-%d %H:%M:%S').dt.hour
+    to_datetime_spy = mocker.spy(pd, 'to_datetime')
+
+    # When
+    res = _extract_hour(timestamps)
+
+    # Then
+    assert res.equals(expected)
+    assert to_datetime_spy.call_args[0][0].tolist() == timestamps.iloc[1:].tolist()
+
+def test__extract_hour_invalid():
+
+    """
+    test__extract_hour_invalid validates timestamps out of range fail same as with full parsing
+    """
+
+    # Given
+    timestamps = pd.Series(['2021-01-30 14:34:32.000', '2021-01-30 24:34:32.000'])
+
+    # When
+    # Then
+    with pytest.raises(ValueError):
+        _extract_hour(timestamps)
+
+def test__extract_hour_month_end():
+
+    """
+    test__extract_hour_month_end validates days which do not exist in the month fail same as with full parsing,
+    and the last days of months, leap day included, are read
+    """
+
+    # Given
+    timestamps = pd.Series(['2020-02-29 10:00:00.000', '2021-01-31 23:00:00.000', '2021-04-30 07:00:00.000'])
+
+    # When
+    res = _extract_hour(timestamps)
+
+    # Then
+    assert res.tolist() == [10, 23, 7]
+    with pytest.raises(ValueError):
+        _extract_hour(pd.Series(['2021-01-30 14:34:32.000', '2021-02-30 10:00:00.000']))
+    with pytest.raises(ValueError):
+        _extract_hour(pd.Series(['2021-04-31 10:00:00.000']))
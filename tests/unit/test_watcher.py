@@ -0,0 +1,112 @@
+import pytest
+from aws.local_storage import LocalStorageClient
+from handler import process_data
+from watcher import PartitionWatcher, _key_partition
+import pandas as pd
+
+# ==== Fixtures ====
+
+@pytest.fixture
+def partition_fixture(tmp_path, mocker):
+    """Local bucket with impressions of today's date partition, today is 2022-04-15"""
+    mocker.patch('watcher._today', return_value='2022-04-15')
+    partition = tmp_path / 'test_bucket' / '2022' / '04' / '15'
+    partition.mkdir(parents=True)
+    with open('tests/unit/fixtures/df_fixture.csv', 'rb') as file:
+        (partition / 'impressions_1.csv').write_bytes(file.read())
+    return partition
+
+def _result(tmp_path):
+    return pd.read_csv(tmp_path / 'test_bucket' / 'results' / '2022' / '04' / '15' / 'daily_agg_20220415_TI.csv')
+
+# ==== poll_once ====
+
+def test_poll_once(partition_fixture, tmp_path, mocker):
+
+    """
+    test_poll_once validates the partition is processed when files land and not when nothing changed,
+    new files are merged into the result incrementally with the same client
+    """
+
+    # Given
+    s3_client = LocalStorageClient(str(tmp_path))
+    watcher = PartitionWatcher('test_bucket', 'TI', ['aggregate_impressions'], s3_client)
+    process_data_spy = mocker.patch('watcher.process_data', wraps=process_data)
+    watcher.start()
+
+    # When
+    first = watcher.poll_once()
+    unchanged = watcher.poll_once()
+    (partition_fixture / 'impressions_2.csv').write_text(
+        'IMPRESSION_ID,AGENCY_ID,ADVERTISER_ID,ORDER_ID,CAMPAIGN_ID,IMPRESSION_DATETIME\n'
+        '555,1.0,1.0,1.0,1111.0,2021-01-30 14:00:00.000\n')
+    second = watcher.poll_once()
+
+    # Then
+    assert (first, unchanged, second) == (['2022-04-15'], [], ['2022-04-15'])
+    assert process_data_spy.call_count == 2
+    assert all(call.kwargs['s3_client'] is s3_client and call.kwargs['incremental']
+               for call in process_data_spy.call_args_list)
+    assert _result(tmp_path).to_dict('list') == {
+        'CAMPAIGN_ID': [1111, 1111, 2222, 2222, 3333], 'HOUR': [14, 15, 12, 20, 12],
+        'IMPRESSIONS_COUNT': [3, 1, 1, 1, 2]
+    }
+
+def test_poll_once_failed(partition_fixture, tmp_path, mocker):
+
+    """
+    test_poll_once_failed validates failed run is retried on the next poll
+    """
+
+    # Given
+    process_data_fixture = mocker.patch('watcher.process_data', side_effect=[ValueError('failed'), None])
+    watcher = PartitionWatcher('test_bucket', 'TI', ['aggregate_impressions'], LocalStorageClient(str(tmp_path)))
+
+    # When
+    first = watcher.poll_once()
+    second = watcher.poll_once()
+
+    # Then
+    assert (first, second) == ([], ['2022-04-15'])
+    assert process_data_fixture.call_count == 2
+
+def test_poll_once_queue_file(partition_fixture, tmp_path, mocker):
+
+    """
+    test_poll_once_queue_file validates partitions of keys appended to the queue file are processed,
+    without listing, and a line being written is read on the next poll
+    """
+
+    # Given
+    process_data_fixture = mocker.patch('watcher.process_data')
+    queue_file = tmp_path / 'queue.txt'
+    s3_client = mocker.MagicMock()
+    watcher = PartitionWatcher('test_bucket', 'TI', ['aggregate_impressions'], s3_client, queue_file=str(queue_file))
+
+    # When
+    queue_file.write_text('2022/04/14/impressions_1.csv\nresults/report.csv\n2022/04/15/impre')
+    first = watcher.poll_once()
+    with open(queue_file, 'a') as file:
+        file.write('ssions_2.csv\n')
+    second = watcher.poll_once()
+    third = watcher.poll_once()
+
+    # Then
+    assert (first, second, third) == (['2022-04-14'], ['2022-04-15'], [])
+    assert [call.args[0] for call in process_data_fixture.call_args_list] == ['2022-04-14', '2022-04-15']
+    s3_client.list_data_objects.assert_not_called()
+
+# ==== _key_partition ====
+
+def test__key_partition():
+
+    """
+    test__key_partition validates date partition is read from keys under YYYY/MM/DD prefix only
+    """
+
+    # When
+    # Then
+    assert _key_partition('2022/04/15/impressions.csv') == '2022-04-15'
+    assert _key_partition('2022/04/15/14/impressions.csv') == '2022-04-15'
+    assert _key_partition('results/2022/04/15/daily_agg.csv') is None
+    assert _key_partition('2022/13/15/impressions.csv') is None
@@ -1,14 +1,43 @@
+import numpy as np
 import pandas as pd
-from typing import Dict, Tuple
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple, Union
 import yaml
 
-import coloredlogs, logging
+from dedup import FingerprintDeduplicator
+from hll import DEFAULT_PRECISION, HyperLogLogSketches
+from hourly_counts import HourlyCounts
+from metrics import RunMetrics
+from schema import SchemaValidator, match_template
+
+import logging
 
-# Configure the logging
-coloredlogs.install()
-logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Raw impressions timestamps are fixed-width strings like '2021-01-30 14:34:32.000',
+# TIMESTAMP_TEMPLATE marks digits positions with 'd', other characters should match literally
+TIMESTAMP_TEMPLATE = b'dddd-dd-dd dd:dd:dd.000'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Impressions delivered more than once have the same id and timestamp
+IMPRESSIONS_DEDUP_COLUMNS = ('IMPRESSION_ID', 'IMPRESSION_DATETIME')
+
+# Serialized HyperLogLog sketch of every row of approximate results, see HyperLogLogSketches.to_strings
+SKETCH_COLUMN = 'HLL_SKETCH'
+
+
+class PartialCounts(NamedTuple):
+    """
+    Result of map step of map/reduce aggregation for a single file: impressions counts of rows
+    unique within the file, fingerprint of every such row and position of its (CAMPAIGN_ID, HOUR)
+    in the counts, -1 for rows not counted, e.g. with null campaign id
+    """
+
+    counts: pd.Series
+    fingerprints: np.ndarray
+    groups: np.ndarray
+
+
 def parse_yaml(file_path: str) -> Dict:
     """
     Parse config yaml file to dictionary
@@ -23,11 +52,57 @@ def parse_yaml(file_path: str) -> Dict:
 
     return config
 
+def _get_schema_columns(schema_path: str) -> Dict[str, Dict]:
+    """
+    Reads columns definitions from yaml schema file
+
+    :param schema_path: path to yaml schema file with required columns.
+    :return: dictionary with column name as a key and its definition as a value
+
+    """
+
+    schema = parse_yaml(schema_path)
+
+    columns = {}
+    for key, value in schema.get("columns", {}).items():
+        key = key.strip().replace("\n", "").replace("\ufeff", "")
+        columns[key.strip()] = value
+
+    return columns
+
+def get_schema_dtypes(schema_path: str) -> Dict[str, Optional[str]]:
+    """
+    Gets columns required by schema together with their declared dtypes.
+    Used to load only needed columns with compact dtypes, e.g. nullable Int32 for ids,
+    category for low-cardinality strings and str for fixed-width timestamps.
+
+    :param schema_path: path to yaml schema file with required columns.
+    :return: dictionary with column name as a key and dtype as a value,
+        None when column has no dtype declared
+
+    """
+
+    return {col: value.get('dtype') for col, value in _get_schema_columns(schema_path).items()}
+
+@lru_cache(maxsize=None)
+def get_schema_validator(schema_path: str) -> SchemaValidator:
+    """
+    Compiles yaml schema file into validator, once per schema path
+
+    :param schema_path: path to yaml schema file with required columns.
+    :return: schema validator
+
+    """
+
+    return SchemaValidator(_get_schema_columns(schema_path))
+
 def _is_valid_df(df: pd.DataFrame, schema_path: str) -> bool:
     """
     Validates dataframe with raw data against required fields before transformation
     Checks presense of required fields
     When mandatory checks if column is not null
+    Checks declared dtypes and formats
+    Can be called for every chunk of streamed data, schema is compiled only once
 
     :param df: pandas dataframe with data to validate.
     :param schema_path: path to yaml schema file with required columns.
@@ -35,27 +110,17 @@ def _is_valid_df(df: pd.DataFrame, schema_path: str) -> bool:
 
     """
 
-    schema = parse_yaml(schema_path)
-
-    columns_to_validate = {}
-    for key, value in schema.get("columns", {}).items():
-        key = key.strip().replace("\n", "").replace("\ufeff", "")
-        columns_to_validate[key.strip()] = value
-
-    for col, value in columns_to_validate.items():
-        if not col in df:
-            logger.error(f'Warning! Required column {col} is missing in dataset')
-            return False
-        if not value['nullable'] and pd.isnull(df[col]).any():
-            logger.error(f'Warning! Column {col} has none values but should NOT be nullable')
-            return False
+    errors = get_schema_validator(schema_path).validate(df)
+    for error in errors:
+        logger.error(f'Warning! {error}')
 
-    return True
+    return not errors
 
 def aggregate_impressions(
     df: pd.DataFrame, 
     schema_path: str,
-    columns_to_dedup: Tuple[str, ...] = ('IMPRESSION_ID', 'IMPRESSION_DATETIME')
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    metrics: Optional[RunMetrics] = None
 ) -> pd.DataFrame:
     """
     Validate data for the presense of required columns
@@ -65,27 +130,787 @@ def aggregate_impressions(
     :param df: pandas dataframe with data to transform.
     :param schema_path: path to yaml schema file with required columns.
     :param columns_to_dedup: list of columns to deduplicate by.
+    :param metrics: run metrics to record validate, dedup and count stages in.
     :return: pandas dataframe with transformed data
 
     """
 
+    metrics = metrics if metrics is not None else RunMetrics()
+
     # validate dataframe
-    if not _is_valid_df(df, schema_path):
-        raise ValueError(f'Impressions dataset does not match schema {schema_path}')
+    _validate(df, schema_path, metrics)
 
     # group deduplicates
-    df.drop_duplicates(subset=columns_to_dedup, inplace=True)
+    with metrics.stage('dedup') as stage:
+        rows_in = len(df)
+        df.drop_duplicates(subset=columns_to_dedup, inplace=True)
+        stage.rows_in += rows_in
+        stage.rows_out += len(df)
+        stage.rows_dropped += rows_in - len(df)
 
     # count impressions for each campaign id at each hour
-    df['IMPRESSION_DATETIME'] = pd.to_datetime(df.IMPRESSION_DATETIME, format='%Y-%m-%d %H:%M:%S')
-    df['HOUR'] = df['IMPRESSION_DATETIME'].dt.hour
-    grouped_df = df.groupby(['CAMPAIGN_ID','HOUR']).size().reset_index(name='IMPRESSIONS_COUNT')
-    return grouped_df
+    with metrics.stage('count') as stage:
+        stage.rows_in += len(df)
+        counts = count_campaign_impressions(df)
+        stage.rows_out = len(counts)
+
+    return counts_to_df(counts)
+
+def aggregate_impressions_stream(
+    chunks: Iterable[pd.DataFrame],
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    verify_dedup: bool = False,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Streaming version of aggregate_impressions for datasets that do not fit in memory.
+    Validates and deduplicates every chunk as it arrives, counts it into partial
+    per campaign id and hour counts and merges them into a single result.
+    Only the current chunk, 64-bit fingerprints of the dedup keys seen so far and
+    the partial counts are kept in memory.
+
+    :param chunks: iterable of pandas dataframes with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param verify_dedup: compare original dedup keys of rows with matching fingerprints,
+        see FingerprintDeduplicator.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with transformed data, same as aggregate_impressions
+
+    """
+
+    deduplicator = FingerprintDeduplicator(columns_to_dedup, verify=verify_dedup)
+    counts = count_impressions_stream(chunks, schema_path, deduplicator, metrics=metrics)
+
+    if counts is None:
+        logger.warning('No chunks to aggregate')
+        return pd.DataFrame()
+
+    logger.info(f'Deduplicated {deduplicator.size} impressions, '
+                f'fingerprint collision probability {deduplicator.collision_probability:.2e}, '
+                f'verified collisions {deduplicator.collisions}')
+
+    return counts_to_df(counts)
+
+def count_impressions_stream(
+    chunks: Iterable[pd.DataFrame],
+    schema_path: str,
+    deduplicator: FingerprintDeduplicator,
+    metrics: Optional[RunMetrics] = None
+) -> Optional[pd.Series]:
+    """
+    Validates, deduplicates and counts impressions chunks into partial counts.
+    The deduplicator can be shared between calls, so impressions already counted
+    in other files are not counted again.
+
+    :param chunks: iterable of pandas dataframes with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param deduplicator: deduplicator with dedup keys seen so far.
+    :param metrics: run metrics to record validate, dedup and count stages in,
+        accumulated over all chunks.
+    :return: pandas series with impressions count indexed by (CAMPAIGN_ID, HOUR),
+        None when there were no chunks
+
+    """
+
+    counts = count_reports_stream(chunks, (schema_path,), {'campaign': count_campaign_impressions}, deduplicator,
+                                  metrics)
+    return counts['campaign'] if counts is not None else None
+
+def count_reports_stream(
+    chunks: Iterable[pd.DataFrame],
+    schema_paths: Tuple[str, ...],
+    count_functions: Dict[str, Callable[[pd.DataFrame], pd.Series]],
+    deduplicator: FingerprintDeduplicator,
+    metrics: Optional[RunMetrics] = None
+) -> Optional[Dict[str, pd.Series]]:
+    """
+    Validates and deduplicates impressions chunks once and counts every chunk
+    into partial counts of several reports, see count_impressions_stream.
+
+    :param chunks: iterable of pandas dataframes with raw impressions data.
+    :param schema_paths: paths to yaml schema files of the reports.
+    :param count_functions: functions counting deduplicated impressions by report name.
+    :param deduplicator: deduplicator with dedup keys seen so far.
+    :param metrics: run metrics to record validate, dedup and count stages in,
+        accumulated over all chunks.
+    :return: pandas series with impressions count by report name, None when there were no chunks
+
+    """
+
+    metrics = metrics if metrics is not None else RunMetrics()
+    counts = None
+
+    for chunk in chunks:
+        # validate chunk
+        for schema_path in dict.fromkeys(schema_paths):
+            _validate(chunk, schema_path, metrics)
+
+        # drop duplicates inside the chunk and the ones seen in previous chunks
+        with metrics.stage('dedup') as stage:
+            rows_in = len(chunk)
+            chunk = deduplicator.filter(chunk)
+            stage.rows_in += rows_in
+            stage.rows_out += len(chunk)
+            stage.rows_dropped += rows_in - len(chunk)
+
+        # add chunk counts into the running totals
+        with metrics.stage('count') as stage:
+            stage.rows_in += len(chunk)
+            partials = {name: count(chunk) for name, count in count_functions.items()}
+            counts = {name: _add_counts(counts[name] if counts is not None else None, partial)
+                      for name, partial in partials.items()}
+            stage.rows_out = sum(len(report) for report in counts.values())
+
+    if counts is None:
+        return None
+    return {name: report.to_series() if isinstance(report, HourlyCounts) else report
+            for name, report in counts.items()}
+
+def aggregate_reports(
+    df: pd.DataFrame,
+    schema_paths: Tuple[str, ...],
+    count_functions: Dict[str, Callable[[pd.DataFrame], pd.Series]],
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    metrics: Optional[RunMetrics] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    Validates and deduplicates impressions once and counts them into several reports,
+    e.g. by campaign and by advertiser, so the scan of the day is shared by all of them.
+
+    :param df: pandas dataframe with raw impressions data, columns of all reports.
+    :param schema_paths: paths to yaml schema files of the reports.
+    :param count_functions: functions counting deduplicated impressions by report name.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with transformed data by report name
+
+    """
 
-def other_transformation() -> pd.DataFrame:
+    metrics = metrics if metrics is not None else RunMetrics()
+
+    # validate dataframe against schema of every report
+    for schema_path in dict.fromkeys(schema_paths):
+        _validate(df, schema_path, metrics)
+
+    # group deduplicates
+    with metrics.stage('dedup') as stage:
+        rows_in = len(df)
+        df.drop_duplicates(subset=columns_to_dedup, inplace=True)
+        stage.rows_in += rows_in
+        stage.rows_out += len(df)
+        stage.rows_dropped += rows_in - len(df)
+
+    # count impressions of every report
+    reports = {}
+    with metrics.stage('count') as stage:
+        stage.rows_in += len(df)
+        for name, count in count_functions.items():
+            reports[name] = counts_to_df(count(df))
+            stage.rows_out += len(reports[name])
+
+    return reports
+
+def aggregate_reports_stream(
+    chunks: Iterable[pd.DataFrame],
+    schema_paths: Tuple[str, ...],
+    count_functions: Dict[str, Callable[[pd.DataFrame], pd.Series]],
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    verify_dedup: bool = False,
+    metrics: Optional[RunMetrics] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    Streaming version of aggregate_reports, see aggregate_impressions_stream.
+
+    :param chunks: iterable of pandas dataframes with raw impressions data, columns of all reports.
+    :param schema_paths: paths to yaml schema files of the reports.
+    :param count_functions: functions counting deduplicated impressions by report name.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param verify_dedup: compare original dedup keys of rows with matching fingerprints,
+        see FingerprintDeduplicator.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with transformed data by report name, empty when there were no chunks
+
+    """
+
+    deduplicator = FingerprintDeduplicator(columns_to_dedup, verify=verify_dedup)
+    counts = count_reports_stream(chunks, schema_paths, count_functions, deduplicator, metrics=metrics)
+
+    if counts is None:
+        logger.warning('No chunks to aggregate')
+        return {name: pd.DataFrame() for name in count_functions}
+
+    return {name: counts_to_df(report) for name, report in counts.items()}
+
+def aggregate_advertiser_impressions(
+    df: pd.DataFrame,
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Validates, deduplicates and aggregates impressions data by hour and advertiser id,
+    see aggregate_reports
+
+    :param df: pandas dataframe with data to transform.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with ADVERTISER_ID, HOUR and IMPRESSIONS_COUNT columns
+
+    """
+
+    return aggregate_reports(df, (schema_path,), {'advertiser': count_advertiser_impressions},
+                             columns_to_dedup, metrics)['advertiser']
+
+def aggregate_advertiser_impressions_stream(
+    chunks: Iterable[pd.DataFrame],
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    verify_dedup: bool = False,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Streaming version of aggregate_advertiser_impressions, see aggregate_reports_stream
+
+    :param chunks: iterable of pandas dataframes with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param verify_dedup: compare original dedup keys of rows with matching fingerprints.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with ADVERTISER_ID, HOUR and IMPRESSIONS_COUNT columns
+
+    """
+
+    return aggregate_reports_stream(chunks, (schema_path,), {'advertiser': count_advertiser_impressions},
+                                    columns_to_dedup, verify_dedup, metrics)['advertiser']
+
+def aggregate_order_impressions(
+    df: pd.DataFrame,
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Validates, deduplicates and aggregates impressions data of the day by order id,
+    see aggregate_reports
+
+    :param df: pandas dataframe with data to transform.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with ORDER_ID and IMPRESSIONS_COUNT columns
+
+    """
+
+    return aggregate_reports(df, (schema_path,), {'order': count_order_impressions},
+                             columns_to_dedup, metrics)['order']
+
+def aggregate_order_impressions_stream(
+    chunks: Iterable[pd.DataFrame],
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    verify_dedup: bool = False,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Streaming version of aggregate_order_impressions, see aggregate_reports_stream
+
+    :param chunks: iterable of pandas dataframes with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param verify_dedup: compare original dedup keys of rows with matching fingerprints.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with ORDER_ID and IMPRESSIONS_COUNT columns
+
+    """
+
+    return aggregate_reports_stream(chunks, (schema_path,), {'order': count_order_impressions},
+                                    columns_to_dedup, verify_dedup, metrics)['order']
+
+def aggregate_agency_impressions(
+    df: pd.DataFrame,
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Validates, deduplicates and aggregates impressions data of the day by agency id,
+    see aggregate_reports
+
+    :param df: pandas dataframe with data to transform.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with AGENCY_ID and IMPRESSIONS_COUNT columns
+
+    """
+
+    return aggregate_reports(df, (schema_path,), {'agency': count_agency_impressions},
+                             columns_to_dedup, metrics)['agency']
+
+def aggregate_agency_impressions_stream(
+    chunks: Iterable[pd.DataFrame],
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    verify_dedup: bool = False,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
     """
-    Placeholder function for any other possible data transformation
+    Streaming version of aggregate_agency_impressions, see aggregate_reports_stream
 
+    :param chunks: iterable of pandas dataframes with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param verify_dedup: compare original dedup keys of rows with matching fingerprints.
+    :param metrics: run metrics to record validate, dedup and count stages in.
+    :return: pandas dataframe with AGENCY_ID and IMPRESSIONS_COUNT columns
+
+    """
+
+    return aggregate_reports_stream(chunks, (schema_path,), {'agency': count_agency_impressions},
+                                    columns_to_dedup, verify_dedup, metrics)['agency']
+
+def map_impressions(
+    df: pd.DataFrame,
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    metrics: Optional[RunMetrics] = None
+) -> PartialCounts:
+    """
+    Map step of map/reduce aggregation, run in a worker process for every file.
+    Validates the file, deduplicates it and counts impressions for each campaign id at each hour.
+    Fingerprints of counted rows are returned along with the counts, so duplicates
+    across files can be taken out of them by reduce_impressions.
+
+    :param df: pandas dataframe with raw impressions data of a single file.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns to deduplicate by.
+    :param metrics: run metrics of the worker to record validate, dedup and count stages in.
+    :return: partial counts of the file
+
+    """
+
+    metrics = metrics if metrics is not None else RunMetrics()
+
+    # validate file
+    _validate(df, schema_path, metrics)
+
+    # keep first occurrence of every dedup key within the file
+    with metrics.stage('dedup') as stage:
+        fingerprints = FingerprintDeduplicator(columns_to_dedup).fingerprint(df)
+        # hash based, keeps rows order unlike sorting with np.unique
+        first = np.flatnonzero(~pd.Series(fingerprints).duplicated().to_numpy())
+        stage.rows_in += len(df)
+        stage.rows_dropped += len(df) - len(first)
+        df, fingerprints = df.iloc[first], fingerprints[first]
+        stage.rows_out += len(df)
+
+    # count impressions and remember the group of every counted row
+    with metrics.stage('count') as stage:
+        hourly = HourlyCounts('CAMPAIGN_ID')
+        # rows not counted, e.g. with null campaign id, are numbered -1
+        groups = hourly.positions(hourly.add(df.CAMPAIGN_ID, _extract_hour(df.IMPRESSION_DATETIME)))
+        counts = hourly.to_series()
+        stage.rows_in += len(df)
+        stage.rows_out += len(counts)
+
+    return PartialCounts(counts, fingerprints, groups)
+
+def reduce_impressions(
+    partials: Iterable[PartialCounts],
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Reduce step of map/reduce aggregation, merges partial counts of files in files order.
+    Rows whose fingerprints were counted in previous files are subtracted from the counts
+    of their file, so the result is the same as of aggregate_impressions over all files.
+    Partials are consumed as they arrive, while workers are still mapping next files.
+
+    :param partials: iterable of partial counts of every file, in files order.
+    :param metrics: run metrics to record reduce stage and duplicates across files in.
+    :return: pandas dataframe with transformed data, same as aggregate_impressions
+
+    """
+
+    metrics = metrics if metrics is not None else RunMetrics()
+    deduplicator = FingerprintDeduplicator(IMPRESSIONS_DEDUP_COLUMNS)
+    counts = None
+
+    for partial in partials:
+        with metrics.stage('reduce') as stage:
+            seen = deduplicator.contains(partial.fingerprints)
+            partial_counts = partial.counts
+            if seen.any():
+                duplicates = partial.groups[seen]
+                duplicates = duplicates[duplicates >= 0]
+                partial_counts = partial_counts - np.bincount(duplicates, minlength=len(partial_counts))
+                partial_counts = partial_counts[partial_counts > 0]
+            deduplicator.add(partial.fingerprints[~seen])
+            counts = _add_counts(counts, partial_counts)
+
+            dropped = int(seen.sum())
+            stage.rows_in += len(seen)
+            stage.rows_out += len(seen) - dropped
+            stage.rows_dropped += dropped
+            # duplicates across files are dropped by dedup too
+            dedup = metrics.get_stage('dedup')
+            dedup.rows_out -= dropped
+            dedup.rows_dropped += dropped
+
+    if counts is None:
+        logger.warning('No files to aggregate')
+        return pd.DataFrame()
+
+    return counts_to_df(counts.to_series())
+
+def approx_aggregate_impressions(
+    df: pd.DataFrame,
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    precision: int = DEFAULT_PRECISION,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Validate data for the presense of required columns
+    Estimates number of distinct impressions for each campaign id at each hour
+    with HyperLogLog sketches instead of exact dedup, memory does not grow with the volume of the day.
+    Sketches are kept in the result, so results of shards or days can be merged with merge_approx_results.
+
+    :param df: pandas dataframe with data to transform.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns identifying distinct impressions.
+    :param precision: sketch precision, relative standard error of counts is 1.04 / sqrt(2 ** precision).
+    :param metrics: run metrics to record validate and sketch stages in.
+    :return: pandas dataframe with CAMPAIGN_ID, HOUR, estimated IMPRESSIONS_COUNT and HLL_SKETCH columns
+
+    """
+
+    return sketches_to_df(map_approx_impressions(df, schema_path, columns_to_dedup, precision, metrics))
+
+def approx_aggregate_impressions_stream(
+    chunks: Iterable[pd.DataFrame],
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    verify_dedup: bool = False,
+    precision: int = DEFAULT_PRECISION,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Streaming version of approx_aggregate_impressions, sketches of every chunk are merged
+    as chunks arrive, so memory depends on the chunk size and the number of keys only.
+
+    :param chunks: iterable of pandas dataframes with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns identifying distinct impressions.
+    :param verify_dedup: not supported, sketches keep no keys to compare.
+    :param precision: sketch precision, see approx_aggregate_impressions.
+    :param metrics: run metrics to record validate, sketch and reduce stages in.
+    :raises ValueError: When verify_dedup is requested
+    :return: pandas dataframe with transformed data, same as approx_aggregate_impressions
+
+    """
+
+    if verify_dedup:
+        raise ValueError('Approximate aggregation keeps no dedup keys to verify')
+
+    metrics = metrics if metrics is not None else RunMetrics()
+    partials = (map_approx_impressions(chunk, schema_path, columns_to_dedup, precision, metrics) for chunk in chunks)
+    return reduce_approx_impressions(partials, metrics)
+
+def map_approx_impressions(
+    df: pd.DataFrame,
+    schema_path: str,
+    columns_to_dedup: Tuple[str, ...] = IMPRESSIONS_DEDUP_COLUMNS,
+    precision: int = DEFAULT_PRECISION,
+    metrics: Optional[RunMetrics] = None
+) -> HyperLogLogSketches:
+    """
+    Map step of approximate aggregation, builds sketches of dedup fingerprints
+    for each campaign id at each hour of a single file or chunk.
+
+    :param df: pandas dataframe with raw impressions data.
+    :param schema_path: path to yaml schema file with required columns.
+    :param columns_to_dedup: list of columns identifying distinct impressions.
+    :param precision: sketch precision, see approx_aggregate_impressions.
+    :param metrics: run metrics to record validate and sketch stages in.
+    :return: sketches indexed by (CAMPAIGN_ID, HOUR)
+
+    """
+
+    metrics = metrics if metrics is not None else RunMetrics()
+
+    # validate file
+    _validate(df, schema_path, metrics)
+
+    # add fingerprints of dedup keys to the sketch of their campaign and hour
+    with metrics.stage('sketch') as stage:
+        fingerprints = FingerprintDeduplicator(columns_to_dedup).fingerprint(df)
+        hourly = HourlyCounts('CAMPAIGN_ID')
+        # rows not counted, e.g. with null campaign id, are numbered -1
+        groups = hourly.positions(hourly.add(df.CAMPAIGN_ID, _extract_hour(df.IMPRESSION_DATETIME)))
+        sketches = HyperLogLogSketches.from_hashes(hourly.to_series().index, groups, fingerprints, precision)
+        stage.rows_in += len(df)
+        stage.rows_out += len(sketches.index)
+
+    return sketches
+
+def reduce_approx_impressions(
+    partials: Iterable[HyperLogLogSketches],
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Reduce step of approximate aggregation, merges sketches of files, chunks or shards in any order.
+
+    :param partials: iterable of sketches indexed by (CAMPAIGN_ID, HOUR).
+    :param metrics: run metrics to record reduce stage in.
+    :return: pandas dataframe with transformed data, same as approx_aggregate_impressions
+
+    """
+
+    metrics = metrics if metrics is not None else RunMetrics()
+    sketches = None
+
+    for partial in partials:
+        with metrics.stage('reduce') as stage:
+            stage.rows_in += len(partial.index)
+            sketches = partial if sketches is None else sketches.merge(partial)
+
+    if sketches is None:
+        logger.warning('No files to aggregate')
+        return pd.DataFrame()
+
+    return sketches_to_df(sketches)
+
+def merge_approx_results(
+    dfs: Iterable[pd.DataFrame],
+    by: Tuple[str, ...] = ('CAMPAIGN_ID', 'HOUR')
+) -> pd.DataFrame:
+    """
+    Merges results of approx_aggregate_impressions without reprocessing raw data,
+    e.g. results of shards, or hours of a day into daily counts with by=('CAMPAIGN_ID',).
+    Impressions present in several results are counted once.
+
+    :param dfs: pandas dataframes with key columns and HLL_SKETCH column.
+    :param by: key columns to merge by.
+    :return: pandas dataframe with key columns, estimated IMPRESSIONS_COUNT and HLL_SKETCH columns
+
+    """
+
+    df = pd.concat(list(dfs), ignore_index=True)
+    sketches = sketches_from_df(df, by)
+    keys = sketches.index.drop_duplicates().sort_values()
+    return sketches_to_df(sketches.group(keys, keys.get_indexer(sketches.index)))
+
+def sketches_to_df(sketches: HyperLogLogSketches) -> pd.DataFrame:
+    """
+    Converts sketches to result dataframe with estimated counts and serialized sketches
+
+    :param sketches: sketches indexed by key columns.
+    :return: pandas dataframe with key columns, IMPRESSIONS_COUNT and HLL_SKETCH columns
+
+    """
+
+    df = sketches.index.to_frame(index=False)
+    df['IMPRESSIONS_COUNT'] = sketches.estimate()
+    df[SKETCH_COLUMN] = sketches.to_strings()
+    return df
+
+def sketches_from_df(df: pd.DataFrame, by: Tuple[str, ...] = ('CAMPAIGN_ID', 'HOUR')) -> HyperLogLogSketches:
+    """
+    Converts result dataframe back to sketches
+
+    :param df: pandas dataframe with key columns and HLL_SKETCH column.
+    :param by: key columns to index sketches by.
+    :return: sketches, one per row
+
+    """
+
+    index = pd.MultiIndex.from_frame(df[list(by)]) if len(by) > 1 else pd.Index(df[by[0]])
+    return HyperLogLogSketches.from_strings(index, df[SKETCH_COLUMN])
+
+def _validate(df: pd.DataFrame, schema_path: str, metrics: RunMetrics) -> None:
+    """
+    Validates dataframe or chunk as a call of validate stage
+
+    :param df: pandas dataframe with data to validate.
+    :param schema_path: path to yaml schema file with required columns.
+    :param metrics: run metrics to record validate stage in.
+    :raises ValueError: When data do not match schema
+
+    """
+
+    with metrics.stage('validate') as stage:
+        stage.rows_in += len(df)
+        if not _is_valid_df(df, schema_path):
+            raise ValueError(f'Impressions dataset does not match schema {schema_path}')
+        stage.rows_out += len(df)
+
+def count_campaign_impressions(df: pd.DataFrame) -> pd.Series:
+    """
+    Counts impressions for each campaign id at each hour
+
+    :param df: pandas dataframe with deduplicated impressions data.
+    :return: pandas series with impressions count indexed by (CAMPAIGN_ID, HOUR)
+
+    """
+
+    return _count_hourly(df, 'CAMPAIGN_ID')
+
+def count_advertiser_impressions(df: pd.DataFrame) -> pd.Series:
+    """
+    Counts impressions for each advertiser id at each hour
+
+    :param df: pandas dataframe with deduplicated impressions data.
+    :return: pandas series with impressions count indexed by (ADVERTISER_ID, HOUR)
+
+    """
+
+    return _count_hourly(df, 'ADVERTISER_ID')
+
+def count_order_impressions(df: pd.DataFrame) -> pd.Series:
+    """
+    Counts impressions for each order id over the day
+
+    :param df: pandas dataframe with deduplicated impressions data.
+    :return: pandas series with impressions count indexed by ORDER_ID
+
+    """
+
+    return df.groupby('ORDER_ID').size()
+
+def count_agency_impressions(df: pd.DataFrame) -> pd.Series:
+    """
+    Counts total impressions of each agency id over the day
+
+    :param df: pandas dataframe with deduplicated impressions data.
+    :return: pandas series with impressions count indexed by AGENCY_ID
+
+    """
+
+    return df.groupby('AGENCY_ID').size()
+
+def _count_hourly(df: pd.DataFrame, key: str) -> pd.Series:
+    """
+    Counts impressions for each key at each hour with dense HourlyCounts kernel
+
+    :param df: pandas dataframe with deduplicated impressions data.
+    :param key: key column, e.g. CAMPAIGN_ID.
+    :return: pandas series with impressions count indexed by (key, HOUR), same as groupby([key, 'HOUR']).size()
+
+    """
+
+    counts = HourlyCounts(key)
+    counts.add(df[key], _extract_hour(df.IMPRESSION_DATETIME))
+    return counts.to_series()
+
+def _extract_hour(timestamps: pd.Series) -> pd.Series:
+    """
+    Extracts hour from impressions timestamps without full datetime parsing.
+    Values are converted to fixed-width bytes once, checked against TIMESTAMP_TEMPLATE
+    and hour is read from its fixed position in a single vectorized pass.
+    Only values not matching the template are parsed with pandas to_datetime.
+
+    :param timestamps: pandas series with impressions timestamps.
+    :return: pandas series with hour of each timestamp, same as to_datetime(...).dt.hour
+
+    """
+
+    if timestamps.empty or timestamps.dtype.kind != 'O':
+        return pd.to_datetime(timestamps, format=TIMESTAMP_FORMAT).dt.hour
+
+    matched = match_template(timestamps, TIMESTAMP_TEMPLATE)
+    if matched is None:
+        return pd.to_datetime(timestamps, format=TIMESTAMP_FORMAT).dt.hour
+    chars, well_formed = matched
+
+    # two digits numbers fit uint8 for well formed rows, malformed ones are dropped anyway
+    zero = np.uint8(ord('0'))
+
+    def two_digits(position: int) -> np.ndarray:
+        return (chars[:, position] - zero) * np.uint8(10) + (chars[:, position + 1] - zero)
+
+    month, day, hour, minute, second = (two_digits(position) for position in (5, 8, 11, 14, 17))
+    # days 29-31 do not exist in every month, they are validated by the fallback
+    well_formed &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 28)
+    well_formed &= (hour < 24) & (minute < 60) & (second < 60)
+    hour = hour.astype(np.int64)
+
+    if not well_formed.all():
+        malformed = np.flatnonzero(~well_formed)
+        fallback = pd.to_datetime(timestamps.iloc[malformed], format=TIMESTAMP_FORMAT).dt.hour
+        hour = hour.astype(np.result_type(hour.dtype, fallback.dtype))
+        hour[malformed] = fallback.to_numpy()
+
+    return pd.Series(hour, index=timestamps.index, name=timestamps.name)
+
+def merge_counts(*counts: pd.Series) -> pd.Series:
+    """
+    Merges partial impressions counts indexed by the same keys, e.g. (CAMPAIGN_ID, HOUR)
+
+    :param counts: pandas series with partial impressions count.
+    :return: pandas series with summed impressions count
+
+    """
+
+    return pd.concat(counts).groupby(level=list(counts[0].index.names)).sum()
+
+def _add_counts(
+    totals: Optional[Union[HourlyCounts, pd.Series]],
+    counts: pd.Series
+) -> Union[HourlyCounts, pd.Series]:
+    """
+    Adds partial impressions counts into running totals, counts by hour are summed in place
+    in a dense HourlyCounts matrix, other counts are merged with merge_counts
+
+    :param totals: running totals, None for the first partial counts.
+    :param counts: pandas series with partial impressions count.
+    :return: running totals with the partial counts added
+
+    """
+
+    if totals is None and list(counts.index.names)[1:] == ['HOUR']:
+        totals = HourlyCounts(counts.index.names[0])
+    if isinstance(totals, HourlyCounts):
+        totals.add_counts(counts)
+        return totals
+    return counts if totals is None else merge_counts(totals, counts)
+
+def counts_to_df(counts: pd.Series) -> pd.DataFrame:
+    """
+    Converts impressions counts indexed by keys, e.g. (CAMPAIGN_ID, HOUR), to result dataframe
+
+    :param counts: pandas series with impressions count.
+    :return: pandas dataframe with key columns, e.g. CAMPAIGN_ID and HOUR, and IMPRESSIONS_COUNT column
+
+    """
+
+    return counts.reset_index(name='IMPRESSIONS_COUNT')
+
+def counts_from_df(df: pd.DataFrame) -> pd.Series:
+    """
+    Converts result dataframe back to impressions counts indexed by (CAMPAIGN_ID, HOUR)
+
+    :param df: pandas dataframe with CAMPAIGN_ID, HOUR and IMPRESSIONS_COUNT columns.
+    :return: pandas series with impressions count
+
+    """
+
+    return df.set_index(['CAMPAIGN_ID', 'HOUR'])['IMPRESSIONS_COUNT']
+
+def other_transformation(
+    df: Optional[pd.DataFrame] = None,
+    schema_path: Optional[str] = None,
+    metrics: Optional[RunMetrics] = None
+) -> pd.DataFrame:
+    """
+    Placeholder function for any other possible data transformation,
+    registered transformations are called with these arguments, see registry
+
+    :param df: pandas dataframe with data to transform.
+    :param schema_path: path to yaml schema file with required columns, None when there is no schema.
+    :param metrics: run metrics to record transformation stages in.
     :return: pandas dataframe with transformed data (empty while no logic populated)
 
     """
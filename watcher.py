@@ -0,0 +1,195 @@
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Set
+
+from aws.s3_client import StorageClient
+from handler import process_data
+from registry import PANDAS, get_transformation
+from transformations import get_schema_validator
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 5.0
+
+
+class PartitionWatcher():
+    """
+    Long-running service keeping results of the current date partition up to date as files land.
+    S3 client with its connection pool and compiled schema validators are created once and reused
+    by every run, instead of being set up by a new process on every cron run.
+    New and changed files are noticed by polling the listing of the partition, or from object keys
+    appended to a local queue file by a notifier, e.g. relaying S3 event notifications, in which case
+    nothing is listed until a key arrives. Transformations supporting incremental mode merge only
+    new files into the existing result, the others process the whole partition again.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        initials: str,
+        transformation_types: Sequence[str],
+        s3_client: StorageClient,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        queue_file: Optional[str] = None,
+        **kwargs
+    ):
+        """
+        :param bucket_name: the s3 bucket name with files to process.
+        :param initials: initials to use in result filename.
+        :param transformation_types: transformation types to apply on data.
+        :param s3_client: s3 client reused by every run.
+        :param poll_interval: seconds between two polls of the listing or the queue file.
+        :param queue_file: file with object keys of landed files, one per line, the listing
+            is polled when not provided.
+        :param kwargs: other process_data arguments, e.g. output_format.
+        """
+        self.bucket_name = bucket_name
+        self.initials = initials
+        self.transformation_types = list(transformation_types)
+        self.s3_client = s3_client
+        self.poll_interval = poll_interval
+        self.queue_file = queue_file
+        self.kwargs = kwargs
+        # incremental mode runs on pandas in memory or streaming only
+        self.incremental = len(self.transformation_types) == 1 \
+            and get_transformation(self.transformation_types[0]).incremental \
+            and not kwargs.get('map_processes') and kwargs.get('engine', PANDAS) == PANDAS
+
+        # ETags of objects of every watched partition at its last successful run
+        self._etags: Dict[str, Dict[str, str]] = {}
+        # partitions which got keys from the queue file but were not processed successfully yet
+        self._pending: Set[str] = set()
+        self._queue_offset = 0
+
+    def start(self) -> None:
+        """
+        Checks the bucket and compiles schema validators once, before the first poll.
+
+        :return: N/A
+        """
+        if not self.s3_client.bucket_exist(self.bucket_name):
+            logger.error(f'No bucket exist with name {self.bucket_name}')
+            raise ValueError(f'No bucket exist with name {self.bucket_name}')
+        for name in self.transformation_types:
+            schema_path = get_transformation(name).schema_path
+            if schema_path is not None:
+                get_schema_validator(schema_path)
+        if self.queue_file is not None and os.path.exists(self.queue_file):
+            # keys queued before the start are picked up by the first run of the current partition
+            self._queue_offset = os.path.getsize(self.queue_file)
+            self._pending.add(_today())
+
+    def run(self, max_polls: Optional[int] = None) -> None:
+        """
+        Polls for new files until interrupted, a failed run is logged and retried on the next poll.
+
+        :param max_polls: stop after this number of polls, runs forever when not provided.
+        :return: N/A
+        """
+        self.start()
+        logger.info(f'Watching bucket {self.bucket_name} every {self.poll_interval}s'
+                    + (f', keys from {self.queue_file}' if self.queue_file else ''))
+        polls = 0
+        try:
+            while max_polls is None or polls < max_polls:
+                self.poll_once()
+                polls += 1
+                if max_polls is None or polls < max_polls:
+                    time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            logger.info('Watcher is stopped')
+
+    def poll_once(self) -> List[str]:
+        """
+        Processes date partitions with new or changed files.
+
+        :return: list of date partitions processed successfully
+        """
+        partitions = self._queued_partitions() if self.queue_file is not None else self._changed_partitions()
+        processed = []
+        for date_partition, etags in partitions.items():
+            try:
+                process_data(date_partition, self.bucket_name, self.initials, self.transformation_types,
+                             s3_client=self.s3_client, incremental=self.incremental, **self.kwargs)
+            except Exception as e:
+                logger.error(f'Date partition {date_partition} failed, retried on the next poll: {e}')
+                continue
+            processed.append(date_partition)
+            self._pending.discard(date_partition)
+            if etags is not None:
+                self._etags[date_partition] = etags
+        return processed
+
+    def _changed_partitions(self) -> Dict[str, Optional[Dict[str, str]]]:
+        """
+        Lists the current date partition, and the previous ones until they are up to date after
+        the date changes, so files landed just before midnight are processed too.
+
+        :return: ETags of objects of every date partition whose objects changed since its last run
+        """
+        today = _today()
+        changed = {}
+        for date_partition in sorted(set(self._etags) | {today}):
+            objects = self.s3_client.list_data_objects(self.bucket_name, '/'.join(date_partition.split('-')))
+            etags = {obj.key: obj.etag for obj in objects}
+            if objects and etags != self._etags.get(date_partition):
+                changed[date_partition] = etags
+            elif date_partition != today:
+                # previous date partition is up to date, it is not watched anymore
+                del self._etags[date_partition]
+        return changed
+
+    def _queued_partitions(self) -> Dict[str, Optional[Dict[str, str]]]:
+        """
+        Reads object keys appended to the queue file since the last poll, a truncated file is read
+        from the start again.
+
+        :return: date partitions of the queued keys and partitions whose runs failed, without ETags
+        """
+        try:
+            size = os.path.getsize(self.queue_file)
+        except OSError:
+            return dict.fromkeys(sorted(self._pending))
+        if size < self._queue_offset:
+            self._queue_offset = 0
+        if size > self._queue_offset:
+            with open(self.queue_file, 'rb') as file:
+                file.seek(self._queue_offset)
+                data = file.read(size - self._queue_offset)
+            # a line being written is read on the next poll
+            complete = data.rfind(b'\n') + 1
+            self._queue_offset += complete
+            for key in data[:complete].decode().splitlines():
+                key = key.strip()
+                if not key:
+                    continue
+                date_partition = _key_partition(key)
+                if date_partition is None:
+                    logger.warning(f'Queued key {key} is not under YYYY/MM/DD prefix, skipped')
+                    continue
+                self._pending.add(date_partition)
+        return dict.fromkeys(sorted(self._pending))
+
+
+def _today() -> str:
+    """Current date partition, in UTC"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+def _key_partition(file_key: str) -> Optional[str]:
+    """
+    Gets date partition of object key under YYYY/MM/DD prefix.
+
+    :param file_key: key of object, e.g. 2022/04/15/impressions.csv.
+    :return: date partition in YYYY-MM-DD format, None when key is not under date prefix
+    """
+    parts = file_key.lstrip('/').split('/')
+    if len(parts) < 4:
+        return None
+    try:
+        return datetime.strptime('-'.join(parts[:3]), '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return None